@@ -1,9 +1,14 @@
 import frappe
 
+from uretim_planlama.custom_hooks.production_plan.partial_planning import update_plan_flags
+
 
 def on_cancel(doc, method):
 	# Uretim Plani - Production Plan - On Cancel (START)
 
+	# Plandaki siparişlerin kısmi planlama bayraklarını güncelle
+	update_plan_flags(doc)
+
 	existing_opti_name = frappe.db.exists("Opti", doc.custom_opti_no)
 	if not existing_opti_name:
 		return
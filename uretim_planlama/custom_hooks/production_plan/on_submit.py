@@ -1,5 +1,7 @@
 import frappe
 
+from uretim_planlama.custom_hooks.production_plan.partial_planning import update_plan_flags
+
 
 def on_submit(doc, method):
 	# Uretim Plani - Production Plan - On Submit (START)
@@ -20,4 +22,7 @@ def on_submit(doc, method):
 	opti_doc.set("sales_orders", so_items)
 	opti_doc.save(ignore_permissions=True)
 
+	# Plandaki siparişlerin kısmi planlama bayraklarını güncelle
+	update_plan_flags(doc)
+
 	# Uretim Plani - Production Plan - On Submit (END)
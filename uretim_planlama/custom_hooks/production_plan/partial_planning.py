@@ -0,0 +1,94 @@
+"""
+Kısmi planlama bayrağı (Sales Order Planning Flag)
+
+Bir siparişin herhangi bir kalemi onaylı ve kapatılmamış bir Production Plan'da yer alıyorsa
+ve siparişte seri/renk olarak farklı başka bir kalem varsa sipariş "kısmi planlanmış" sayılır.
+Bayrak Production Plan submit/cancel (ve kapatma/yeniden açma) anında sadece plandaki
+siparişler için yeniden hesaplanır; üretim paneli bunu basit bir JOIN ile okur.
+"""
+
+import frappe
+from frappe.utils import now
+
+from uretim_planlama.uretim_planlama.api.db_utils import upsert_rows
+
+FLAG_DOCTYPE = "Sales Order Planning Flag"
+CHUNK_SIZE = 500
+
+
+def _get_partially_planned(sales_orders=None):
+	"""Kısmi planlanmış siparişleri döndürür. sales_orders None ise tüm siparişler taranır."""
+	condition = "AND soi2.parent IN %(sales_orders)s" if sales_orders is not None else ""
+	return set(
+		frappe.db.sql_list(
+			f"""
+			SELECT DISTINCT soi2.parent
+			FROM `tabProduction Plan Item` ppi2
+			INNER JOIN `tabProduction Plan` pp2 ON ppi2.parent = pp2.name
+			INNER JOIN `tabSales Order Item` soi2 ON ppi2.sales_order_item = soi2.name
+			INNER JOIN `tabItem` i2 ON soi2.item_code = i2.name
+			INNER JOIN `tabSales Order Item` soi3 ON soi2.parent = soi3.parent
+			INNER JOIN `tabItem` i3 ON soi3.item_code = i3.name
+			WHERE pp2.docstatus = 1 AND pp2.status != 'Closed'
+			AND (i2.custom_serial != i3.custom_serial OR i2.custom_color != i3.custom_color)
+			{condition}
+			""",
+			{"sales_orders": tuple(sales_orders or ())},
+		)
+	)
+
+
+def _upsert_flags(flags):
+	"""{sales_order: 0/1} satırlarını çok satırlı INSERT ... ON DUPLICATE KEY UPDATE ile yazar."""
+	if not flags:
+		return
+
+	timestamp = now()
+	user = frappe.session.user
+	upsert_rows(
+		FLAG_DOCTYPE,
+		("name", "sales_order", "kismi_planlama", "last_updated", "creation", "modified", "owner", "modified_by"),
+		[
+			(sales_order, sales_order, flag, timestamp, timestamp, timestamp, user, user)
+			for sales_order, flag in flags.items()
+		],
+		update_columns=("kismi_planlama", "last_updated", "modified", "modified_by"),
+	)
+
+
+def refresh_partial_planning_flags(sales_orders):
+	"""Verilen siparişlerin kısmi planlama bayraklarını yeniden hesaplayıp yazar."""
+	sales_orders = sorted({so for so in sales_orders if so})
+	for start in range(0, len(sales_orders), CHUNK_SIZE):
+		chunk = sales_orders[start : start + CHUNK_SIZE]
+		partial = _get_partially_planned(chunk)
+		_upsert_flags({so: 1 if so in partial else 0 for so in chunk})
+
+
+def get_plan_sales_orders(doc):
+	"""Production Plan'da geçen siparişleri toplar."""
+	sales_orders = {row.sales_order for row in doc.get("sales_orders") or [] if row.sales_order}
+	sales_orders.update(row.sales_order for row in doc.get("po_items") or [] if row.get("sales_order"))
+	return sales_orders
+
+
+def update_plan_flags(doc):
+	"""Production Plan olaylarında plandaki siparişlerin bayraklarını günceller."""
+	try:
+		refresh_partial_planning_flags(get_plan_sales_orders(doc))
+	except Exception:
+		frappe.log_error("Kısmi planlama bayrağı güncelleme HATA", frappe.get_traceback())
+
+
+def rebuild_partial_planning_flags():
+	"""Tüm tabloyu yeniden oluşturur: bayrağı 1 olması gerekenler yazılır, diğerleri 0'lanır."""
+	partial = _get_partially_planned()
+	stale = set(frappe.get_all(FLAG_DOCTYPE, filters={"kismi_planlama": 1}, pluck="name")) - partial
+	flags = {so: 1 for so in partial}
+	flags.update({so: 0 for so in stale})
+
+	items = list(flags.items())
+	for start in range(0, len(items), CHUNK_SIZE):
+		_upsert_flags(dict(items[start : start + CHUNK_SIZE]))
+	frappe.db.commit()
+	return {"partial": len(partial), "cleared": len(stale)}
@@ -5,11 +5,27 @@ from uretim_planlama.uretim_planlama.utils import (
     parse_and_format_length,
     get_or_create_boy_record,
 )
+from uretim_planlama.uretim_planlama.api.boy_registry import get_boy_name
+
+
+def _resolve_boy_names(lengths):
+    """
+    Sabit formatlı boy değerlerini ({fixed: numeric}) Boy kayıtlarına eşler.
+    Mevcut kayıtlar süreç içi Boy kayıt defterinden okunur; eksik boylar bir kez oluşturulur.
+    Dönüş: {fixed: boy_name}
+    """
+    boy_names = {}
+    for fixed, numeric in lengths.items():
+        boy_names[fixed] = get_boy_name(numeric) or get_or_create_boy_record(fixed)
+    return boy_names
 
 
 def _build_profile_exit_from_dn(doc):
-    """Delivery Note içindeki profil satırlarından Profile Exit dokümanı oluşturur (kaydetmez)."""
-    items = []
+    """
+    Delivery Note içindeki profil satırlarından Profile Exit dokümanı oluşturur (kaydetmez).
+    Boy ve Item bilgileri tüm satırlar için toplu çözülür.
+    """
+    rows = []
     for item in getattr(doc, "items", []) or []:
         if not getattr(item, "custom_is_profile", 0):
             continue
@@ -24,30 +40,42 @@ def _build_profile_exit_from_dn(doc):
         try:
             # DN üzerindeki değer her durumda parse edilerek kullanılacak (tek kaynak gerçeklik)
             numeric, fixed = parse_and_format_length(length_link, decimals=1)
-            length_float = numeric
-
             qty_int = int(float(normalize_profile_quantity(qty)))
         except Exception as e:
             frappe.log_error(f"Profile length/qty parse error: {e}", "DN Profile Parse Error")
             continue
 
-        # Boy kaydını bul/oluştur ve Link olarak kullan
-        boy_name = get_or_create_boy_record(fixed)
+        rows.append((item.item_code, numeric, fixed, qty_int))
+
+    if not rows:
+        return None
+
+    # Boy kayıtları ve Item bilgileri tekil değerler üzerinden toplu okunur
+    boy_names = _resolve_boy_names({fixed: numeric for _, numeric, fixed, _ in rows})
+    item_data = {
+        row.name: row
+        for row in frappe.get_all(
+            "Item",
+            filters={"name": ["in", list({item_code for item_code, _, _, _ in rows})]},
+            fields=["name", "item_name", "item_group"],
+        )
+    }
+
+    items = []
+    for item_code, numeric, fixed, qty_int in rows:
+        boy_name = boy_names.get(fixed)
         if not boy_name:
             frappe.log_error(f"Boy not found/created for length {fixed}", "DN Profile Boy Error")
             continue
 
-        # Item bilgilerini al
-        item_data = frappe.db.get_value("Item", item.item_code, 
-                                      ["item_name", "item_group"], as_dict=True)
-        
+        data = item_data.get(item_code)
         items.append({
-            "item_code": item.item_code,
-            "item_name": item_data.item_name if item_data else "",
-            "item_group": item_data.item_group if item_data else "",
+            "item_code": item_code,
+            "item_name": data.item_name if data else "",
+            "item_group": data.item_group if data else "",
             "length": boy_name,              # Link to Boy
             "output_quantity": qty_int,
-            "total_length": length_float * qty_int,
+            "total_length": numeric * qty_int,
         })
 
     if not items:
@@ -58,6 +86,7 @@ def _build_profile_exit_from_dn(doc):
         "date": doc.posting_date,
         "customer": getattr(doc, "customer", None),
         "warehouse": getattr(doc, "set_warehouse", None),
+        "delivery_note": doc.name,
         "remarks": f"Delivery Note: {doc.name}",
         "items": items,
     })
@@ -80,15 +109,14 @@ def on_submit(doc, method=None):
 def on_cancel(doc, method=None):
     """Delivery Note on_cancel: ilgili Profile Exit kaydını iptal et (varsa)."""
     try:
-        # DN kaynaklı oluşturduklarımızı Remarks üzerinden bulalım
+        # DN kaynaklı oluşturduklarımızı index'li delivery_note alanı üzerinden bulalım
         exits = frappe.get_all(
             "Profile Exit",
-            filters={"remarks": ["like", f"%Delivery Note: {doc.name}%"], "docstatus": 1},
-            fields=["name"],
-            limit=10,
+            filters={"delivery_note": doc.name, "docstatus": 1},
+            pluck="name",
         )
         for ex in exits:
-            ex_doc = frappe.get_doc("Profile Exit", ex.name)
+            ex_doc = frappe.get_doc("Profile Exit", ex)
             ex_doc.cancel()
     except Exception as e:
         frappe.log_error(f"Delivery Note -> Profile Exit on_cancel error: {str(e)}", "DN Profile Exit Cancel Error")
@@ -19,6 +19,8 @@ bench --site [site_name] console
 
 import frappe
 
+from uretim_planlama.material_request_reconciliation import get_source_totals
+
 
 @frappe.whitelist()
 def fix_material_request(mr_name, dry_run=True):
@@ -54,51 +56,27 @@ def fix_material_request(mr_name, dry_run=True):
     # Purchase Order'lardan gerçek ordered_qty'yi hesapla
     print(f"\n🔍 Purchase Order'ları tarıyorum...")
     
-    po_items = frappe.db.sql("""
-        SELECT poi.item_code, SUM(poi.stock_qty) as total_ordered
-        FROM `tabPurchase Order Item` poi
-        INNER JOIN `tabPurchase Order` po ON po.name = poi.parent
-        WHERE po.docstatus = 1
-        AND (poi.custom_material_request_references LIKE %(mr_pattern)s
-            OR poi.material_request = %(mr_name)s)
-        GROUP BY poi.item_code
-    """, {"mr_name": mr_name, "mr_pattern": f"%{mr_name}%"}, as_dict=1)
-    
-    real_ordered = {item.item_code: item.total_ordered for item in po_items}
+    # Referanslar index'li Material Request Reference tablosundan okunur
+    real_ordered = {
+        item_code: qty for (_, item_code), qty in get_source_totals("Purchase Order", [mr_name]).items()
+    }
     print(f"  Bulunan PO item'ları: {len(real_ordered)}")
     
     # Purchase Receipt'lerden gerçek received_qty'yi hesapla
     print(f"\n🔍 Purchase Receipt'leri tarıyorum...")
     
-    pr_items = frappe.db.sql("""
-        SELECT pri.item_code, SUM(pri.stock_qty) as total_received
-        FROM `tabPurchase Receipt Item` pri
-        INNER JOIN `tabPurchase Receipt` pr ON pr.name = pri.parent
-        WHERE pr.docstatus = 1
-        AND (pri.custom_material_request_references LIKE %(mr_pattern)s
-            OR pri.material_request = %(mr_name)s)
-        GROUP BY pri.item_code
-    """, {"mr_name": mr_name, "mr_pattern": f"%{mr_name}%"}, as_dict=1)
-    
-    real_received = {item.item_code: item.total_received for item in pr_items}
+    real_received = {
+        item_code: qty for (_, item_code), qty in get_source_totals("Purchase Receipt", [mr_name]).items()
+    }
     print(f"  Bulunan PR item'ları: {len(real_received)}")
     
     # Stock Entry'lerden transferred_qty hesapla (Material Transfer tipinde)
     if mr_doc.material_request_type == "Material Transfer":
         print(f"\n🔍 Stock Entry'leri tarıyorum...")
         
-        se_items = frappe.db.sql("""
-            SELECT sed.item_code, SUM(sed.qty) as total_transferred
-            FROM `tabStock Entry Detail` sed
-            INNER JOIN `tabStock Entry` se ON se.name = sed.parent
-            WHERE se.docstatus = 1
-            AND se.stock_entry_type = 'Material Transfer'
-            AND (sed.custom_material_request_references LIKE %(mr_pattern)s
-                OR sed.material_request = %(mr_name)s)
-            GROUP BY sed.item_code
-        """, {"mr_name": mr_name, "mr_pattern": f"%{mr_name}%"}, as_dict=1)
-        
-        real_ordered = {item.item_code: item.total_transferred for item in se_items}
+        real_ordered = {
+            item_code: qty for (_, item_code), qty in get_source_totals("Stock Entry", [mr_name]).items()
+        }
         print(f"  Bulunan SE item'ları: {len(real_ordered)}")
     
     # Düzeltmeleri uygula
@@ -120,22 +120,46 @@ doctype_js = {
 # DocType Event Hook'ları (yalnızca aktif kullanılanlar)
 doc_events = {
 	"Production Plan": {
-		"on_submit": "uretim_planlama.custom_hooks.production_plan.on_submit.on_submit",
-		"on_cancel": "uretim_planlama.custom_hooks.production_plan.on_cancel.on_cancel",
+		"on_submit": [
+			"uretim_planlama.custom_hooks.production_plan.on_submit.on_submit",
+			"uretim_planlama.uretim_planlama.page.uretim_planlama_paneli.uretim_planlama_paneli.on_panel_source_change",
+		],
+		"on_cancel": [
+			"uretim_planlama.custom_hooks.production_plan.on_cancel.on_cancel",
+			"uretim_planlama.uretim_planlama.page.uretim_planlama_paneli.uretim_planlama_paneli.on_panel_source_change",
+		],
+		"on_update_after_submit": "uretim_planlama.uretim_planlama.page.uretim_planlama_paneli.uretim_planlama_paneli.on_panel_source_change",
 	},
 	"Work Order": {
 		"before_validate": "uretim_planlama.custom_hooks.work_order.before_validate.auto_wip_warehouse",
+		"on_update": "uretim_planlama.uretim_planlama.api.calendar_api.on_work_order_change",
+		"on_trash": "uretim_planlama.uretim_planlama.api.calendar_api.on_work_order_change",
+		"on_cancel": [
+			"uretim_planlama.sales_order_hooks.raw_materials.restore_reservations_on_work_order_cancel",
+			"uretim_planlama.uretim_planlama.api.raw_material_availability.on_doc_event"
+		],
+		"on_update_after_submit": [
+			"uretim_planlama.custom_hooks.work_order.on_update_after_submit.on_update_after_submit",
+			"uretim_planlama.sales_order_hooks.raw_materials.remove_reservations_on_work_order_complete",
+			"uretim_planlama.uretim_planlama.api.calendar_api.on_work_order_change",
+			"uretim_planlama.uretim_planlama.api.raw_material_availability.on_doc_event"
+		]
 	},
 	"Sales Order": {
 		"on_submit": [
 			"uretim_planlama.sales_order_hooks.raw_materials.create_reserved_raw_materials_on_submit",
 			"uretim_planlama.sales_order_hooks.raw_materials.handle_child_sales_order_reserves",
 			"uretim_planlama.sales_order_hooks.profile_reorder.check_profile_reorder_on_sales_order",
+			"uretim_planlama.uretim_planlama.api.raw_material_availability.on_doc_event",
+			"uretim_planlama.uretim_planlama.page.uretim_planlama_paneli.uretim_planlama_paneli.on_panel_source_change",
 		],
 		"on_cancel": [
 			"uretim_planlama.sales_order_hooks.raw_materials.delete_reserved_raw_materials_on_cancel",
 			"uretim_planlama.sales_order_hooks.raw_materials.delete_long_term_reserve_usage_on_cancel",
+			"uretim_planlama.uretim_planlama.api.raw_material_availability.on_doc_event",
+			"uretim_planlama.uretim_planlama.page.uretim_planlama_paneli.uretim_planlama_paneli.on_panel_source_change",
 		],
+		"on_update_after_submit": "uretim_planlama.uretim_planlama.page.uretim_planlama_paneli.uretim_planlama_paneli.on_panel_source_change",
 		"before_submit": "uretim_planlama.sales_order_hooks.raw_materials.check_raw_material_stock_on_submit",
 		"before_save": "uretim_planlama.uretim_planlama.utils.before_save",
 		"validate": "uretim_planlama.uretim_planlama.utils.validate"
@@ -144,19 +168,29 @@ doc_events = {
 	"Profile Stock Ledger": {
 		"after_import": "uretim_planlama.uretim_planlama.doctype.profile_stock_ledger.profile_stock_ledger.after_import"
 	},
-	"Work Order": {
-		"before_validate": "uretim_planlama.custom_hooks.work_order.before_validate.auto_wip_warehouse",
-		"on_cancel": "uretim_planlama.sales_order_hooks.raw_materials.restore_reservations_on_work_order_cancel",
-		"on_update_after_submit": [
-			"uretim_planlama.custom_hooks.work_order.on_update_after_submit.on_update_after_submit",
-			"uretim_planlama.sales_order_hooks.raw_materials.remove_reservations_on_work_order_complete"
-		]
+	"Item": {
+		# Ürün grubu değişince depo stok değeri özet tablosunda eski/yeni grup satırları
+		"on_update": "uretim_planlama.uretim_planlama.api.stock_value_report.on_item_change"
+	},
+	"Stock Ledger Entry": {
+		# Depo stok değeri özet tablosu (commit sonrası, etkilenen depo x ürün grubu satırları)
+		"on_submit": "uretim_planlama.uretim_planlama.api.stock_value_report.on_stock_ledger_entry"
 	},
 	"Delivery Note": {
 		"before_save": "uretim_planlama.uretim_planlama.utils.before_save",
 		"validate": "uretim_planlama.uretim_planlama.utils.validate",
-		"on_submit": "uretim_planlama.delivery_note_events.on_submit",
-		"on_cancel": "uretim_planlama.delivery_note_events.on_cancel"
+		"on_submit": [
+			"uretim_planlama.delivery_note_events.on_submit",
+			"uretim_planlama.uretim_planlama.api.raw_material_availability.on_doc_event"
+		],
+		"on_cancel": [
+			"uretim_planlama.delivery_note_events.on_cancel",
+			"uretim_planlama.uretim_planlama.api.raw_material_availability.on_doc_event"
+		]
+	},
+	"Stock Reconciliation": {
+		"on_submit": "uretim_planlama.uretim_planlama.api.raw_material_availability.on_doc_event",
+		"on_cancel": "uretim_planlama.uretim_planlama.api.raw_material_availability.on_doc_event"
 	},
 	"Purchase Order": {
 		"before_save": "uretim_planlama.uretim_planlama.utils.before_save",
@@ -164,16 +198,29 @@ doc_events = {
 			"uretim_planlama.uretim_planlama.utils.validate",
 			"uretim_planlama.purchase_order_events.validate"
 		],
-		"on_submit": "uretim_planlama.purchase_order_events.on_submit",
-		"on_cancel": "uretim_planlama.purchase_order_events.on_cancel",
-		"on_update_after_submit": "uretim_planlama.purchase_order_events.on_update_after_submit"
+		"on_submit": [
+			"uretim_planlama.purchase_order_events.on_submit",
+			"uretim_planlama.uretim_planlama.api.raw_material_availability.on_doc_event"
+		],
+		"on_cancel": [
+			"uretim_planlama.purchase_order_events.on_cancel",
+			"uretim_planlama.uretim_planlama.api.raw_material_availability.on_doc_event"
+		],
+		"on_update_after_submit": [
+			"uretim_planlama.purchase_order_events.on_update_after_submit",
+			"uretim_planlama.uretim_planlama.api.raw_material_availability.on_doc_event"
+		]
 	},
 	"Purchase Receipt": {
 		"validate": [
 			"uretim_planlama.uretim_planlama.utils.validate",
 			"uretim_planlama.purchase_receipt_events.validate"
 		],
-		"on_submit": "uretim_planlama.purchase_receipt_events.on_submit",
+		"on_submit": [
+			"uretim_planlama.purchase_receipt_events.on_submit",
+			"uretim_planlama.uretim_planlama.api.raw_material_availability.on_doc_event"
+		],
+		"on_cancel": "uretim_planlama.uretim_planlama.api.raw_material_availability.on_doc_event",
 		"before_save": "uretim_planlama.uretim_planlama.utils.before_save"
 	},
 	"Stock Entry": {
@@ -183,9 +230,13 @@ doc_events = {
 		],
 		"on_submit": [
 			"uretim_planlama.sales_order_hooks.raw_materials.release_reservations_on_stock_entry",
-			"uretim_planlama.stock_entry_events.on_submit"
+			"uretim_planlama.stock_entry_events.on_submit",
+			"uretim_planlama.uretim_planlama.api.raw_material_availability.on_doc_event"
+		],
+		"on_cancel": [
+			"uretim_planlama.stock_entry_events.on_cancel",
+			"uretim_planlama.uretim_planlama.api.raw_material_availability.on_doc_event"
 		],
-		"on_cancel": "uretim_planlama.stock_entry_events.on_cancel",
 		"before_save": "uretim_planlama.uretim_planlama.utils.before_save"
 	},
 	"Sales Invoice": {
@@ -198,12 +249,51 @@ doc_events = {
 	},
 	"Material Request": {
 		"before_save": "uretim_planlama.uretim_planlama.utils.before_save",
-		"validate": "uretim_planlama.uretim_planlama.utils.validate"
+		"validate": "uretim_planlama.uretim_planlama.utils.validate",
+		"on_submit": [
+			"uretim_planlama.uretim_planlama.api.raw_material_availability.on_doc_event",
+			"uretim_planlama.uretim_planlama.api.reorder_status.on_material_request_change"
+		],
+		"on_cancel": [
+			"uretim_planlama.uretim_planlama.api.raw_material_availability.on_doc_event",
+			"uretim_planlama.uretim_planlama.api.reorder_status.on_material_request_change"
+		],
+		"on_update_after_submit": "uretim_planlama.uretim_planlama.api.raw_material_availability.on_doc_event"
+	},
+	"Boy": {
+		"after_insert": "uretim_planlama.uretim_planlama.api.boy_registry.invalidate_boy_registry",
+		"on_update": "uretim_planlama.uretim_planlama.api.boy_registry.invalidate_boy_registry",
+		"after_rename": "uretim_planlama.uretim_planlama.api.boy_registry.invalidate_boy_registry",
+		"on_trash": "uretim_planlama.uretim_planlama.api.boy_registry.invalidate_boy_registry"
+	},
+	"Workstation": {
+		"on_update": "uretim_planlama.uretim_planlama.api.workstation_calendar.on_workstation_change",
+		"on_trash": "uretim_planlama.uretim_planlama.api.workstation_calendar.on_workstation_change"
+	},
+	"Holiday List": {
+		"on_update": [
+			"uretim_planlama.uretim_planlama.api.holiday_calendar.invalidate_holiday_calendar",
+			"uretim_planlama.uretim_planlama.api.workstation_calendar.on_holiday_list_change"
+		],
+		"on_trash": [
+			"uretim_planlama.uretim_planlama.api.holiday_calendar.invalidate_holiday_calendar",
+			"uretim_planlama.uretim_planlama.api.workstation_calendar.on_holiday_list_change"
+		]
 	},
 	"Item Group": {
-		"after_insert": "uretim_planlama.uretim_planlama.api.cache_utils.clear_profile_groups_cache",
-		"on_update": "uretim_planlama.uretim_planlama.api.cache_utils.clear_profile_groups_cache",
-		"on_trash": "uretim_planlama.uretim_planlama.api.cache_utils.clear_profile_groups_cache"
+		"after_insert": [
+			"uretim_planlama.uretim_planlama.api.cache_utils.clear_profile_groups_cache",
+			"uretim_planlama.uretim_planlama.api.accessory_requirements.invalidate_accessory_groups"
+		],
+		"on_update": [
+			"uretim_planlama.uretim_planlama.api.cache_utils.clear_profile_groups_cache",
+			"uretim_planlama.uretim_planlama.api.accessory_requirements.invalidate_accessory_groups"
+		],
+		"after_rename": "uretim_planlama.uretim_planlama.api.accessory_requirements.invalidate_accessory_groups",
+		"on_trash": [
+			"uretim_planlama.uretim_planlama.api.cache_utils.clear_profile_groups_cache",
+			"uretim_planlama.uretim_planlama.api.accessory_requirements.invalidate_accessory_groups"
+		]
 	},
 
 }
@@ -231,19 +321,18 @@ override_doctype_class = {
 
 scheduler_events = {
 	"daily": [
+		# Profil yeniden sipariş taraması (önce durum tablosunu baştan oluşturur)
 		"uretim_planlama.uretim_planlama.api.reorder.profile_reorder_sweep",
+		# Hammadde kullanılabilirlik defteri mutabakatı (hook'ların kaçırdığı hareketler)
+		"uretim_planlama.uretim_planlama.api.raw_material_availability.reconcile_availability",
+		# İş emri takvim satırları mutabakatı (db_set ile değişen planlı tarihler)
+		"uretim_planlama.uretim_planlama.api.calendar_api.reconcile_calendar_buckets",
+		# Depo stok değeri özet tablosu (maliyet yeniden hesaplamaları vb. hook dışı değişiklikler)
+		"uretim_planlama.uretim_planlama.api.stock_value_report.rebuild_stock_value_snapshot",
 	],
 	"cron": {
-		# Her 5 dakikada cache refresh (yoğun saatlerde)
-		"*/5 8-18 * * 1-5": [
-			"uretim_planlama.uretim_planlama.page.uretim_planlama_paneli.uretim_planlama_paneli.refresh_cache_background"
-		],
-		# Her 15 dakikada cache refresh (normal saatlerde)
-		"*/15 0-7,19-23 * * *": [
-			"uretim_planlama.uretim_planlama.page.uretim_planlama_paneli.uretim_planlama_paneli.refresh_cache_background"
-		],
-		# Hafta sonları saatlik
-		"0 * * * 6,0": [
+		# Panel cache'i olay bazlı geçersiz kılınır; cron sadece boşalan varsayılan girdiyi ısıtır
+		"*/15 * * * *": [
 			"uretim_planlama.uretim_planlama.page.uretim_planlama_paneli.uretim_planlama_paneli.refresh_cache_background"
 		]
 	}
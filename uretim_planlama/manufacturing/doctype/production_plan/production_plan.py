@@ -23,6 +23,11 @@ class CustomProductionPlan(BaseProductionPlan):
         # Önce orijinal metodu çalıştır
         super().set_status(close=close, update_bin=update_bin)
         
+        # Kapatma / yeniden açma kısmi planlama bayrağını etkiler (sadece açık planlar sayılır)
+        if close is not None:
+            from uretim_planlama.custom_hooks.production_plan.partial_planning import update_plan_flags
+            update_plan_flags(self)
+        
         # Eğer workflow yoksa veya submitted değilse çık
         if self.docstatus != 1:
             return
@@ -0,0 +1,325 @@
+"""
+Material Request miktar ve status mutabakatı
+
+Purchase Order, Purchase Receipt ve Stock Entry event'lerinin ortak motoru.
+Belgenin Material Request Reference satırlarından etkilenen (MR, item_code) anahtarları
+toplanır, kaynak doctype'ın submit edilmiş TÜM belgelerindeki miktarlar referans tablosu
+üzerinden tek gruplu sorguda hesaplanır ve MR item / header güncellemeleri toplu yapılır.
+
+Miktarlar artırılıp azaltılmaz, her seferinde kaynak belgelerden yeniden hesaplanıp
+SET edilir; böylece ERPNext'in kendi güncellemeleriyle çakışsa bile sonuç doğru kalır.
+
+Module: uretim_planlama
+"""
+
+import frappe
+from frappe.utils import flt
+
+from uretim_planlama.material_request_references import (
+	REFERENCE_DOCTYPE,
+	REFERENCE_FIELD,
+	get_item_references,
+)
+
+KEY_CHUNK_SIZE = 500
+
+
+def _ordered_status(row):
+	"""Purchase Order: per_ordered'a göre status"""
+	if flt(row.per_ordered) >= 100:
+		return "Ordered"
+	if flt(row.per_ordered) > 0:
+		return "Partially Ordered"
+	return "Pending"
+
+
+def _transferred_status(row):
+	"""Stock Entry (Material Transfer): per_ordered'a göre status"""
+	if flt(row.per_ordered) >= 100:
+		return "Transferred"
+	if flt(row.per_ordered) > 0:
+		return "Partially Received"
+	return "Pending"
+
+
+def _received_status(row):
+	"""
+	Purchase Receipt: ERPNext'in Material Request status_map önceliğini uygular
+	(set_status ile aynı sonuç, belge yüklemeden).
+	"""
+	per_ordered, per_received = flt(row.per_ordered), flt(row.per_received)
+	if row.status == "Stopped":
+		return row.status
+	if 0 < per_ordered < 100:
+		return "Partially Ordered"
+	if 0 < per_received < 100:
+		return "Partially Received"
+	if per_received == 100:
+		return "Received"
+	if per_ordered == 100:
+		return "Ordered"
+	if per_ordered == 0:
+		return "Pending"
+	return row.status
+
+
+SOURCES = {
+	"Purchase Order": frappe._dict(
+		item_doctype="Purchase Order Item",
+		qty_field="stock_qty",
+		target_field="ordered_qty",
+		percent_field="per_ordered",
+		mr_type=None,
+		condition="",
+		get_status=_ordered_status,
+	),
+	"Purchase Receipt": frappe._dict(
+		item_doctype="Purchase Receipt Item",
+		qty_field="stock_qty",
+		target_field="received_qty",
+		percent_field="per_received",
+		mr_type="Purchase",
+		condition="",
+		get_status=_received_status,
+	),
+	"Stock Entry": frappe._dict(
+		item_doctype="Stock Entry Detail",
+		qty_field="qty",
+		target_field="ordered_qty",
+		percent_field="per_ordered",
+		mr_type="Material Transfer",
+		condition="AND src.stock_entry_type = 'Material Transfer'",
+		get_status=_transferred_status,
+	),
+}
+
+
+def collect_material_request_keys(doc):
+	"""
+	Belgenin etkilediği (MR, item_code) anahtarlarını referans tablosundan toplar.
+	Referans tablosu olmayan belgelerde satırların referansları kullanılır.
+	"""
+	rows = doc.get(REFERENCE_FIELD) or []
+	if rows:
+		return {(row.material_request, row.item_code) for row in rows}
+	return {
+		(mr_name, item.item_code)
+		for item in doc.items or []
+		for mr_name in get_item_references(item)
+	}
+
+
+def _chunks(values, size=KEY_CHUNK_SIZE):
+	values = list(values)
+	for start in range(0, len(values), size):
+		yield values[start : start + size]
+
+
+def _get_material_requests(mr_names):
+	"""MR header bilgilerini tek sorguda döndürür: {name: row}"""
+	return {
+		row.name: row
+		for row in frappe.get_all(
+			"Material Request",
+			filters={"name": ["in", list(mr_names)]},
+			fields=["name", "docstatus", "status", "material_request_type"],
+		)
+	}
+
+
+def get_source_totals(source_doctype, mr_names, keys=None):
+	"""
+	Kaynak doctype'ın submit edilmiş belgelerinde MR'lere referans verilen toplam miktarı
+	(MR, item_code) bazında index'li referans tablosu üzerinden gruplu sorguyla hesaplar;
+	referans satırı olmayan kaynak satırları eski metin eşleşmesiyle eklenir.
+	keys verilirse sadece bu (MR, item_code) anahtarları hesaplanır.
+	Dönüş: {(mr, item_code): qty}
+	"""
+	source = SOURCES[source_doctype]
+	totals = {}
+	for mr_chunk in _chunks(sorted(set(mr_names))):
+		chunk_mrs = set(mr_chunk)
+		chunk_keys = sorted(key for key in keys if key[0] in chunk_mrs) if keys else []
+		key_condition = (
+			f"AND (ref.material_request, ref.item_code) IN ({', '.join(['(%s, %s)'] * len(chunk_keys))})"
+			if chunk_keys
+			else ""
+		)
+		rows = frappe.db.sql(
+			f"""
+			SELECT ref.material_request, ref.item_code, COALESCE(SUM(src_item.`{source.qty_field}`), 0)
+			FROM `tab{REFERENCE_DOCTYPE}` ref
+			JOIN `tab{source.item_doctype}` src_item ON src_item.name = ref.source_item
+			JOIN `tab{source_doctype}` src
+				ON src.name = ref.parent AND src.docstatus = 1 {source.condition}
+			WHERE ref.material_request IN %s
+				AND ref.parenttype = %s
+				{key_condition}
+			GROUP BY ref.material_request, ref.item_code
+			""",
+			(tuple(mr_chunk), source_doctype, *[value for key in chunk_keys for value in key]),
+		)
+		for mr_name, item_code, qty in rows:
+			totals[(mr_name, item_code)] = flt(qty)
+		for key, qty in _get_unreferenced_source_totals(source_doctype, mr_chunk, chunk_keys).items():
+			totals[key] = totals.get(key, 0) + qty
+	return totals
+
+
+def _get_unreferenced_source_totals(source_doctype, mr_names, keys):
+	"""
+	Referans satırı henüz oluşturulmamış kaynak satırlarının (patch/backfill öncesi belgeler)
+	miktarlarını eski yöntemle, material_request alanı ve metin referansları üzerinden toplar.
+	Böylece referans tablosu eksik olan belgeler MR ilerlemesini sıfırlamaz.
+	Dönüş: {(mr, item_code): qty}
+	"""
+	source = SOURCES[source_doctype]
+	key_condition = (
+		f"AND (parent, item_code) IN ({', '.join(['(%s, %s)'] * len(keys))})" if keys else ""
+	)
+	rows = frappe.db.sql(
+		f"""
+		SELECT k.parent, k.item_code, COALESCE(SUM(src_item.`{source.qty_field}`), 0)
+		FROM (
+			SELECT DISTINCT parent, item_code
+			FROM `tabMaterial Request Item`
+			WHERE parent IN %s
+				{key_condition}
+		) k
+		JOIN `tab{source.item_doctype}` src_item
+			ON src_item.item_code = k.item_code
+			AND (src_item.material_request = k.parent
+				OR FIND_IN_SET(k.parent, REPLACE(src_item.custom_material_request_references, ' ', '')))
+		JOIN `tab{source_doctype}` src
+			ON src.name = src_item.parent AND src.docstatus = 1 {source.condition}
+		WHERE NOT EXISTS (
+			SELECT 1 FROM `tab{REFERENCE_DOCTYPE}` ref
+			WHERE ref.source_item = src_item.name AND ref.parenttype = %s
+		)
+		GROUP BY k.parent, k.item_code
+		""",
+		(tuple(mr_names), *[value for key in keys for value in key], source_doctype),
+	)
+	return {(mr_name, item_code): flt(qty) for mr_name, item_code, qty in rows}
+
+
+def _apply_item_quantities(target_field, keys, totals):
+	"""MR item miktarlarını çok satırlı tek UPDATE ile SET eder (stock_qty'yi aşmaz)."""
+	for chunk in _chunks(keys):
+		values = []
+		for key in chunk:
+			values.extend([key[0], key[1], totals.get(key, 0)])
+		frappe.db.sql(
+			f"""
+			UPDATE `tabMaterial Request Item` mri
+			JOIN (
+				{" UNION ALL ".join(["SELECT %s AS parent, %s AS item_code, %s AS qty"] * len(chunk))}
+			) t ON t.parent = mri.parent AND t.item_code = mri.item_code
+			SET mri.`{target_field}` = LEAST(t.qty, mri.stock_qty)
+			""",
+			tuple(values),
+		)
+
+
+def _apply_header_updates(source, mr_names):
+	"""Yüzde alanını tüm MR'ler için tek UPDATE ile, status'ü status başına bir UPDATE ile yazar."""
+	item_field = source.target_field
+	frappe.db.sql(
+		f"""
+		UPDATE `tabMaterial Request` mr
+		JOIN (
+			SELECT parent,
+				CASE WHEN SUM(stock_qty) > 0 THEN (SUM(`{item_field}`) / SUM(stock_qty)) * 100 ELSE 0 END AS pct
+			FROM `tabMaterial Request Item`
+			WHERE parent IN %s
+			GROUP BY parent
+		) t ON t.parent = mr.name
+		SET mr.`{source.percent_field}` = t.pct, mr.modified = NOW()
+		""",
+		(tuple(mr_names),),
+	)
+
+	statuses = {}
+	for row in frappe.get_all(
+		"Material Request",
+		filters={"name": ["in", list(mr_names)]},
+		fields=["name", "status", "per_ordered", "per_received"],
+	):
+		statuses[row.name] = source.get_status(row)
+
+	by_status = {}
+	for mr_name, status in statuses.items():
+		by_status.setdefault(status, []).append(mr_name)
+	for status, names in by_status.items():
+		frappe.db.sql(
+			"""
+			UPDATE `tabMaterial Request`
+			SET status = %s, modified = NOW()
+			WHERE name IN %s AND docstatus = 1
+			""",
+			(status, tuple(names)),
+		)
+	return statuses
+
+
+def reconcile_material_requests(doc, source_doctype, is_submit=True):
+	"""
+	Belgenin referans verdiği MR item'larının miktarlarını ve MR statuslerini toplu günceller.
+
+	Args:
+		doc: Purchase Order / Purchase Receipt / Stock Entry document
+		source_doctype: SOURCES anahtarı
+		is_submit: False ise (cancel) 'Stopped' MR'ler atlanır
+	"""
+	source = SOURCES[source_doctype]
+	keys = collect_material_request_keys(doc)
+	if not keys:
+		return {}
+
+	log_title = f"{source_doctype} MR Status Update"
+	mr_map = _get_material_requests({mr for mr, _ in keys})
+	eligible = set()
+	skipped = []
+	for mr_name in sorted({mr for mr, _ in keys}):
+		mr = mr_map.get(mr_name)
+		if not mr or mr.docstatus != 1:
+			skipped.append(f"{mr_name} (docstatus={mr.docstatus if mr else '-'})")
+		elif source.mr_type and mr.material_request_type != source.mr_type:
+			continue
+		elif not is_submit and mr.status == "Stopped":
+			skipped.append(f"{mr_name} (Stopped)")
+		else:
+			eligible.add(mr_name)
+
+	if skipped:
+		frappe.log_error(f"Status güncellenmeyen Material Request'ler: {', '.join(skipped)}", log_title)
+
+	keys = sorted(key for key in keys if key[0] in eligible)
+	if not keys:
+		return {}
+
+	try:
+		totals = get_source_totals(source_doctype, eligible, keys)
+		_apply_item_quantities(source.target_field, keys, totals)
+		statuses = _apply_header_updates(source, sorted(eligible))
+		frappe.db.commit()
+	except Exception as e:
+		frappe.db.rollback()
+		frappe.log_error(
+			f"Material Request statusleri güncellenirken hata oluştu ({', '.join(sorted(eligible))}): "
+			f"{e!s}\n\n{frappe.get_traceback()}",
+			f"{log_title} Error",
+		)
+		frappe.msgprint(
+			f"Bazı Material Request'ler güncellenemedi: {', '.join(sorted(eligible))}. Detaylar için Error Log kontrol edin.",
+			indicator="red",
+		)
+		return {}
+
+	action_text = "Submit" if is_submit else "Cancel"
+	frappe.msgprint(
+		f"Material Request statusleri güncellendi ({action_text}): "
+		f"{', '.join(f'{name} ({status})' for name, status in sorted(statuses.items()))}",
+		indicator="green" if is_submit else "blue",
+	)
+	return statuses
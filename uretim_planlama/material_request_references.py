@@ -0,0 +1,234 @@
+"""
+Material Request referans satırları
+
+Purchase Order, Purchase Receipt ve Stock Entry satırlarının bağlı olduğu MR satırları
+kaynak belgenin Material Request Reference tablosunda (custom_material_request_reference_rows)
+(kaynak doctype, kaynak satır, material request, mr satırı) anahtarıyla tutulur.
+
+custom_material_request_references metin alanı, birleştirme (get_items_merge.js) sırasında
+referansları taşıyan ve ekranda gösterilen alan olarak kalır; virgülle ayrılmış metin sadece
+burada ayrıştırılır. Ters aramalar (bir MR'ye dokunan belgeler) ve miktar mutabakatı
+index'li referans tablosu üzerinden yapılır.
+
+Module: uretim_planlama
+"""
+
+import frappe
+from frappe import _
+from frappe.model.naming import set_new_name
+from frappe.utils import now
+
+from uretim_planlama.uretim_planlama.api.db_utils import upsert_rows
+
+REFERENCE_DOCTYPE = "Material Request Reference"
+REFERENCE_FIELD = "custom_material_request_reference_rows"
+KEY_CHUNK_SIZE = 500
+
+SOURCE_ITEM_DOCTYPES = {
+	"Purchase Order": "Purchase Order Item",
+	"Purchase Receipt": "Purchase Receipt Item",
+	"Stock Entry": "Stock Entry Detail",
+}
+
+
+def split_references(value):
+	"""Virgülle ayrılmış MR referanslarını listeye çevirir: "MR-001, MR-002" -> ["MR-001", "MR-002"]"""
+	return [x.strip() for x in (value or "").split(",") if x.strip()]
+
+
+def get_item_references(item):
+	"""Satırın MR referansları: metin alanındakiler + material_request alanı (tekrarsız, sıralı)"""
+	refs = split_references(item.get("custom_material_request_references"))
+	mr_name = item.get("material_request")
+	if mr_name and mr_name not in refs:
+		refs.append(mr_name)
+	return refs
+
+
+def _get_mr_item_map(pairs):
+	"""(MR, item_code) çiftlerinin ilk MR satırını tek sorguda döndürür: {(mr, item_code): mr_item}"""
+	pairs = list(pairs)
+	mr_item_map = {}
+	for start in range(0, len(pairs), KEY_CHUNK_SIZE):
+		chunk = pairs[start : start + KEY_CHUNK_SIZE]
+		rows = frappe.db.sql(
+			f"""
+			SELECT parent, item_code, name
+			FROM `tabMaterial Request Item`
+			WHERE (parent, item_code) IN ({", ".join(["(%s, %s)"] * len(chunk))})
+			ORDER BY parent, idx
+			""",
+			[value for key in chunk for value in key],
+		)
+		for parent, item_code, name in rows:
+			mr_item_map.setdefault((parent, item_code), name)
+	return mr_item_map
+
+
+def _resolve_references(items):
+	"""
+	Satırların referanslarını MR satırlarıyla eşler.
+	Satırın kendi material_request_item alanı, kendi material_request'i için önceliklidir;
+	item.flags.material_request_items ({mr: mr_item}) varsa (PO'dan kopyalama) o kullanılır.
+	Dönüş: [(item, [(mr, mr_item), ...]), ...]
+	"""
+	item_refs = [(item, get_item_references(item)) for item in items]
+	mr_item_map = _get_mr_item_map({
+		(mr_name, item.get("item_code")) for item, refs in item_refs for mr_name in refs
+	})
+
+	resolved = []
+	for item, refs in item_refs:
+		inherited = getattr(getattr(item, "flags", None), "material_request_items", None) or {}
+		pairs = []
+		for mr_name in refs:
+			if inherited.get(mr_name):
+				mr_item = inherited[mr_name]
+			elif mr_name == item.get("material_request") and item.get("material_request_item"):
+				mr_item = item.get("material_request_item")
+			else:
+				mr_item = mr_item_map.get((mr_name, item.get("item_code")))
+			pairs.append((mr_name, mr_item))
+		resolved.append((item, pairs))
+	return resolved
+
+
+def sync_material_request_references(doc):
+	"""
+	Belgenin referans tablosunu satırlardaki MR referanslarıyla eşitler (validate sırasında).
+	Mevcut satırlar (kaynak satır, MR) anahtarıyla korunur, sadece farklar eklenir/silinir.
+	"""
+	if not doc.meta.get_field(REFERENCE_FIELD):
+		return
+
+	items = doc.get("items") or []
+	for item in items:
+		# Yeni satırlara isim ver; referans satırı kaynak satırı ismiyle bağlanır
+		if not item.name:
+			set_new_name(item)
+
+	existing = {(row.source_item, row.material_request): row for row in doc.get(REFERENCE_FIELD) or []}
+	rows = []
+	for item, pairs in _resolve_references(items):
+		refs = [mr_name for mr_name, _ in pairs]
+		if refs:
+			item.custom_material_request_references = ", ".join(refs)
+		for mr_name, mr_item in pairs:
+			row = existing.get((item.name, mr_name))
+			if row:
+				row.material_request_item = mr_item
+				row.item_code = item.item_code
+			else:
+				row = {
+					"material_request": mr_name,
+					"material_request_item": mr_item,
+					"item_code": item.item_code,
+					"source_item": item.name,
+				}
+			rows.append(row)
+
+	doc.set(REFERENCE_FIELD, rows)
+
+
+def copy_references_from_purchase_order(doc):
+	"""
+	Purchase Order'dan oluşturulan belgenin satırlarına PO satırlarının MR referanslarını
+	tek sorguyla kopyalar (metin alanı + item.flags.material_request_items).
+	"""
+	po_items = {item.purchase_order_item for item in doc.get("items") or [] if item.get("purchase_order_item")}
+	if not po_items:
+		return
+
+	po_refs = {}
+	for row in frappe.get_all(
+		REFERENCE_DOCTYPE,
+		filters={"parenttype": "Purchase Order", "source_item": ["in", list(po_items)]},
+		fields=["source_item", "material_request", "material_request_item"],
+		order_by="source_item, idx",
+	):
+		po_refs.setdefault(row.source_item, {})[row.material_request] = row.material_request_item
+
+	for item in doc.items:
+		refs = po_refs.get(item.get("purchase_order_item"))
+		if refs:
+			item.custom_material_request_references = ", ".join(refs)
+			item.flags.material_request_items = refs
+
+
+@frappe.whitelist()
+def get_referencing_documents(material_request, source_doctype=None):
+	"""
+	Material Request'e referans veren belgeleri index'li referans tablosundan döndürür.
+	Dönüş: [{"doctype", "name", "docstatus", "items": satır sayısı}, ...]
+	"""
+	frappe.has_permission("Material Request", "read", material_request, throw=True)
+	if source_doctype:
+		if source_doctype not in SOURCE_ITEM_DOCTYPES:
+			frappe.throw(_("Geçersiz kaynak belge türü: {0}").format(source_doctype))
+		frappe.has_permission(source_doctype, "read", throw=True)
+		source_doctypes = [source_doctype]
+	else:
+		# Sadece kullanıcının okuyabildiği kaynak belge türleri listelenir
+		source_doctypes = [dt for dt in SOURCE_ITEM_DOCTYPES if frappe.has_permission(dt, "read")]
+		if not source_doctypes:
+			return []
+
+	return frappe.db.sql(
+		f"""
+		SELECT ref.parenttype AS doctype, ref.parent AS name, ref.docstatus, COUNT(*) AS items
+		FROM `tab{REFERENCE_DOCTYPE}` ref
+		WHERE ref.material_request = %(material_request)s
+			AND ref.parenttype IN %(source_doctypes)s
+		GROUP BY ref.parenttype, ref.parent, ref.docstatus
+		ORDER BY ref.parenttype, ref.parent
+		""",
+		{"material_request": material_request, "source_doctypes": tuple(source_doctypes)},
+		as_dict=True,
+	)
+
+
+def rebuild_material_request_references(source_doctype, chunk_size=2000):
+	"""
+	Mevcut belgelerin referans tablosunu satırlardaki metin/material_request alanlarından
+	yeniden oluşturur (iptal edilmemiş belgeler). Dönüş: yazılan satır sayısı.
+	"""
+	item_doctype = SOURCE_ITEM_DOCTYPES[source_doctype]
+	frappe.db.sql(f"DELETE FROM `tab{REFERENCE_DOCTYPE}` WHERE parenttype = %s", (source_doctype,))
+
+	items = frappe.db.sql(
+		f"""
+		SELECT item.name, item.parent, item.item_code, item.material_request, item.material_request_item,
+			item.custom_material_request_references, src.docstatus
+		FROM `tab{item_doctype}` item
+		JOIN `tab{source_doctype}` src ON src.name = item.parent
+		WHERE src.docstatus < 2
+			AND (IFNULL(item.material_request, '') != '' OR IFNULL(item.custom_material_request_references, '') != '')
+		ORDER BY item.parent, item.idx
+		""",
+		as_dict=True,
+	)
+
+	timestamp = now()
+	user = frappe.session.user
+	written = 0
+	next_idx = {}
+	for start in range(0, len(items), chunk_size):
+		values = []
+		for item, pairs in _resolve_references(items[start : start + chunk_size]):
+			for mr_name, mr_item in pairs:
+				next_idx[item.parent] = next_idx.get(item.parent, 0) + 1
+				values.append((
+					frappe.generate_hash(length=10), item.parent, source_doctype, REFERENCE_FIELD,
+					next_idx[item.parent],
+					item.docstatus, mr_name, mr_item, item.item_code, item.name,
+					timestamp, timestamp, user, user,
+				))
+		written += upsert_rows(
+			REFERENCE_DOCTYPE,
+			(
+				"name", "parent", "parenttype", "parentfield", "idx", "docstatus", "material_request",
+				"material_request_item", "item_code", "source_item", "creation", "modified", "owner", "modified_by",
+			),
+			values,
+		)
+	return written
@@ -0,0 +1,17 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+"""
+Aksesuar malzeme ihtiyacı servisi: birden çok Sales Order'ın Production Plan Item'larını
+sales_order IN (...) ile okur. Mevcut PPI indeksleri parent ile başladığından sales_order
+ile başlayan bir indeks ekler.
+"""
+
+import frappe
+
+
+def execute():
+	if not frappe.db.sql("SHOW INDEX FROM `tabProduction Plan Item` WHERE Key_name = 'idx_ppi_sales_order_bom'"):
+		frappe.db.sql(
+			"CREATE INDEX `idx_ppi_sales_order_bom` ON `tabProduction Plan Item` (`sales_order`, `bom_no`)"
+		)
@@ -0,0 +1,137 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+"""
+Günlük Kesim Matrisi İndeksleri
+get_daily_cutting_matrix sorguları yarı açık tarih aralığıyla (kolon >= başlangıç AND kolon < bitiş)
+filtrelenir. Bu patch sorguların indeks üzerinden okunmasını sağlayan indeksleri ekler ve
+EXPLAIN çıktısı ile indekslerin gerçekten kullanıldığını kontrol eder.
+"""
+
+import frappe
+from frappe.utils import add_days, today
+
+
+def execute():
+    """
+    Kesim matrisi için kapsayan indeksleri ekle ve EXPLAIN ile doğrula
+    """
+    try:
+        indexes = [
+            {
+                'table': 'tabCutting Machine Plan',
+                'name': 'idx_cmp_date_ws_totals',
+                'columns': ['planning_date', 'workstation', 'total_mtul', 'total_quantity'],
+                'description': 'Kesim matrisi - tablo okumadan (covering) toplam için'
+            },
+            {
+                'table': 'tabProduction Plan Item',
+                'name': 'idx_ppi_start_workstation',
+                'columns': ['planned_start_date', 'custom_workstation'],
+                'description': 'Kesim matrisi - Production Plan yedek sorgusu için'
+            }
+        ]
+
+        created_count = 0
+        skipped_count = 0
+
+        for index_config in indexes:
+            try:
+                table_name = index_config['table']
+                index_name = index_config['name']
+                columns = index_config['columns']
+                description = index_config['description']
+
+                # İndeks zaten var mı kontrol et
+                existing_indexes = frappe.db.sql(f"""
+                    SHOW INDEX FROM `{table_name}`
+                    WHERE Key_name = %s
+                """, index_name)
+
+                if existing_indexes:
+                    frappe.logger().info(f"İndeks zaten mevcut: {index_name}")
+                    skipped_count += 1
+                    continue
+
+                # İndeksi oluştur
+                columns_str = ', '.join([f"`{col}`" for col in columns])
+                frappe.db.sql(f"""
+                    CREATE INDEX `{index_name}`
+                    ON `{table_name}` ({columns_str})
+                """)
+                frappe.logger().info(f"İndeks oluşturuldu: {index_name} - {description}")
+                created_count += 1
+
+            except Exception as e:
+                frappe.logger().error(f"İndeks oluşturma hatası ({index_name}): {e!s}")
+                continue
+
+        frappe.db.commit()
+
+        explain_results = check_cutting_matrix_indexes()
+
+        message = f"Kesim matrisi indeksleri eklendi: {created_count} yeni, {skipped_count} mevcut"
+        frappe.logger().info(message)
+        print(message)
+
+        return {
+            'success': True,
+            'created': created_count,
+            'skipped': skipped_count,
+            'explain': explain_results,
+            'message': message
+        }
+
+    except Exception as e:
+        frappe.logger().error(f"İndeks patch hatası: {e!s}")
+        frappe.db.rollback()
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+
+def check_cutting_matrix_indexes(from_date=None, to_date=None):
+    """
+    Kesim matrisi sorgularını EXPLAIN ile çalıştırır ve ilgili tablonun hangi indeksi kullandığını döndürür.
+    Sorgu planı tam tablo taraması (type = ALL) gösterirse uyarı loglanır.
+
+    Kullanım:
+        bench --site sitename execute uretim_planlama.patches.add_cutting_matrix_indexes.check_cutting_matrix_indexes
+    """
+    from uretim_planlama.uretim_planlama.api.production_planning import (
+        CUTTING_MATRIX_QUERY,
+        PRODUCTION_PLAN_MATRIX_QUERY,
+    )
+
+    from_date = from_date or add_days(today(), -7)
+    to_date = to_date or add_days(today(), 7)
+
+    checks = [
+        ('tabCutting Machine Plan', CUTTING_MATRIX_QUERY),
+        ('tabProduction Plan Item', PRODUCTION_PLAN_MATRIX_QUERY),
+    ]
+
+    # get_daily_cutting_matrix ile aynı yarı açık aralık: bitiş gününü de kapsar
+    params = (from_date, add_days(to_date, 1))
+
+    results = {}
+    for table_name, query in checks:
+        plan = frappe.db.sql(f"EXPLAIN {query}", params, as_dict=True)
+        alias = 'ppi' if table_name == 'tabProduction Plan Item' else table_name
+        row = next((r for r in plan if r.get('table') == alias), plan[0] if plan else {})
+
+        results[table_name] = {
+            'type': row.get('type'),
+            'key': row.get('key'),
+            'rows': row.get('rows'),
+            'extra': row.get('Extra'),
+        }
+
+        if row.get('type') == 'ALL' or not row.get('key'):
+            frappe.logger().warning(f"EXPLAIN: {table_name} tam tablo taraması yapıyor - {results[table_name]}")
+        else:
+            frappe.logger().info(f"EXPLAIN: {table_name} indeks kullanıyor - {results[table_name]}")
+        print(f"EXPLAIN {table_name}: key={row.get('key')} type={row.get('type')} rows={row.get('rows')}")
+
+    return results
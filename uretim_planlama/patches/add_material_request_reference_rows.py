@@ -0,0 +1,38 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+"""
+Purchase Order, Purchase Receipt ve Stock Entry'ye Material Request Reference tablosunu ekler
+ve mevcut belgelerin referans satırlarını metin alanlarından (custom_material_request_references)
+ve material_request alanından oluşturur.
+"""
+
+import frappe
+
+from uretim_planlama.material_request_references import (
+	REFERENCE_DOCTYPE,
+	REFERENCE_FIELD,
+	SOURCE_ITEM_DOCTYPES,
+	rebuild_material_request_references,
+)
+
+
+def execute():
+	for source_doctype in SOURCE_ITEM_DOCTYPES:
+		if not frappe.db.exists("Custom Field", {"dt": source_doctype, "fieldname": REFERENCE_FIELD}):
+			frappe.get_doc({
+				"doctype": "Custom Field",
+				"dt": source_doctype,
+				"module": "Uretim Planlama",
+				"fieldname": REFERENCE_FIELD,
+				"label": "Material Request References",
+				"fieldtype": "Table",
+				"options": REFERENCE_DOCTYPE,
+				"insert_after": "items",
+				"hidden": 1,
+				"read_only": 1,
+				"no_copy": 1,
+				"print_hide": 1,
+			}).insert()
+
+		rebuild_material_request_references(source_doctype)
@@ -0,0 +1,22 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+"""
+Üretim Planlama Paneli Sipariş İndeksi
+Panel sorguları onaylı siparişleri (docstatus = 1) delivery_date sırasında okur;
+bu indeks filtre ve sıralamayı aynı indeks üzerinden karşılar.
+"""
+
+import frappe
+
+INDEX_NAME = "idx_so_docstatus_delivery_name"
+
+
+def execute():
+	"""Sales Order üzerine (docstatus, delivery_date, name) indeksini ekle"""
+	if frappe.db.sql("SHOW INDEX FROM `tabSales Order` WHERE Key_name = %s", (INDEX_NAME,)):
+		return
+
+	frappe.db.sql(
+		f"CREATE INDEX `{INDEX_NAME}` ON `tabSales Order` (`docstatus`, `delivery_date`, `name`)"
+	)
@@ -0,0 +1,24 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+"""
+Profile Stock Ledger için (item_code, length, is_scrap_piece) tekil anahtarını ekler.
+Önce mevcut duplicate kayıtlar bir kez birleştirilir, ardından unique constraint oluşturulur.
+Bundan sonra stok güncellemeleri qty = qty + VALUES(qty) ile atomik yapılır.
+"""
+
+import frappe
+
+from uretim_planlama.uretim_planlama.api.consolidate_profile_stock import merge_duplicate_records
+from uretim_planlama.uretim_planlama.doctype.profile_stock_ledger.profile_stock_ledger import (
+	UNIQUE_KEY_FIELDS,
+	UNIQUE_KEY_NAME,
+)
+
+
+def execute():
+	result = merge_duplicate_records()
+	print(f"Profile Stock Ledger: {result['groups']} duplicate grup birleştirildi, {result['deleted']} kayıt silindi")
+
+	frappe.db.add_unique("Profile Stock Ledger", UNIQUE_KEY_FIELDS, constraint_name=UNIQUE_KEY_NAME)
+	frappe.db.commit()
@@ -0,0 +1,13 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+"""
+Profile Reorder Status tablosunu mevcut kurallar, Profile Stock Ledger ve satınalma
+talepleri üzerinden ilk kez oluşturur.
+"""
+
+from uretim_planlama.uretim_planlama.api.reorder_status import rebuild_reorder_status
+
+
+def execute():
+	rebuild_reorder_status()
@@ -0,0 +1,19 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+"""
+Raw Material Availability defterini ilk kez doldurur.
+Sonraki güncellemeler doc_events ve günlük mutabakat ile yapılır.
+"""
+
+import frappe
+
+from uretim_planlama.uretim_planlama.api.raw_material_availability import reconcile_availability
+
+
+def execute():
+	if not frappe.db.table_exists("Raw Material Availability"):
+		return
+
+	result = reconcile_availability()
+	print(f"Raw Material Availability: {result['items']} kalem, {result['drifted']} satır yazıldı")
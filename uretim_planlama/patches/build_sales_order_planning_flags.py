@@ -0,0 +1,19 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+"""
+Sales Order Planning Flag tablosunu ilk kez doldurur.
+Sonraki güncellemeler Production Plan submit/cancel/kapatma olaylarında yapılır.
+"""
+
+import frappe
+
+from uretim_planlama.custom_hooks.production_plan.partial_planning import rebuild_partial_planning_flags
+
+
+def execute():
+	if not frappe.db.table_exists("Sales Order Planning Flag"):
+		return
+
+	result = rebuild_partial_planning_flags()
+	print(f"Sales Order Planning Flag: {result['partial']} kısmi planlı sipariş, {result['cleared']} satır temizlendi")
@@ -0,0 +1,18 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+"""
+Depo bazında stok değeri: Bin üzerinde (warehouse, item_code) keyset sayfalama indeksini ekler
+ve Warehouse Stock Value Snapshot tablosunu ilk kez oluşturur.
+"""
+
+import frappe
+
+from uretim_planlama.uretim_planlama.api.stock_value_report import rebuild_stock_value_snapshot
+
+
+def execute():
+	if not frappe.db.sql("SHOW INDEX FROM `tabBin` WHERE Key_name = 'idx_bin_warehouse_item'"):
+		frappe.db.sql("CREATE INDEX `idx_bin_warehouse_item` ON `tabBin` (`warehouse`, `item_code`)")
+
+	rebuild_stock_value_snapshot()
@@ -0,0 +1,15 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+"""
+İş emri takvimi için Work Order Calendar Bucket satırlarını ilk kez oluşturur.
+get_work_orders_for_calendar aralık sorgusunu bu tablo üzerinden yapar.
+"""
+
+import frappe
+
+from uretim_planlama.uretim_planlama.api.calendar_api import rebuild_calendar_buckets
+
+
+def execute():
+	rebuild_calendar_buckets()
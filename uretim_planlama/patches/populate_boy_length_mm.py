@@ -0,0 +1,17 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+"""
+Boy kayıtlarının kanonik length_mm değerini doldurur.
+get_or_create_boy_record ve reorder kural araması bu indeksli sütunu kullanır.
+"""
+
+import frappe
+
+from uretim_planlama.uretim_planlama.api.boy_registry import invalidate_boy_registry
+
+
+def execute():
+	frappe.db.sql("UPDATE `tabBoy` SET length_mm = ROUND(length * 1000)")
+	frappe.db.commit()
+	invalidate_boy_registry()
@@ -0,0 +1,22 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+"""
+Delivery Note'tan oluşturulmuş mevcut Profile Exit kayıtlarının delivery_note alanını
+"Delivery Note: <ad>" açıklamasından doldurur. İrsaliye iptali bu alan üzerinden arama yapar.
+"""
+
+import frappe
+
+
+def execute():
+	frappe.db.sql(
+		"""
+		UPDATE `tabProfile Exit` pe
+		JOIN `tabDelivery Note` dn
+			ON dn.name = TRIM(SUBSTRING(pe.remarks, CHAR_LENGTH('Delivery Note: ') + 1))
+		SET pe.delivery_note = dn.name
+		WHERE pe.remarks LIKE 'Delivery Note: %%'
+			AND IFNULL(pe.delivery_note, '') = ''
+		"""
+	)
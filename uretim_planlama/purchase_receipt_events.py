@@ -1,10 +1,12 @@
 import frappe
+from uretim_planlama.material_request_reconciliation import reconcile_material_requests
+from uretim_planlama.material_request_references import copy_references_from_purchase_order, sync_material_request_references
 from uretim_planlama.uretim_planlama.utils import normalize_profile_length, normalize_profile_quantity, get_or_create_boy_record
 
 def validate(doc, method=None):
     """
-    Purchase Receipt validate sırasında, Purchase Order'dan 
-    custom_material_request_references field'ını kopyala
+    Purchase Receipt validate sırasında, Purchase Order'dan
+    Material Request referanslarını kopyala
     """
     copy_material_request_references_from_po(doc)
 
@@ -15,6 +17,9 @@ def on_submit(doc, method=None):
     # Material Request statuslerini güncelle (ERPNext'in kendi işlemleri bittikten SONRA)
     frappe.db.after_commit.add(lambda: update_material_request_statuses(doc))
     
+    # Profil satırları depo bazında tek Profile Entry'de toplanır; Profile Entry submit'i
+    # stoku tek toplu güncellemeyle (update_profile_stock_bulk) uygular
+    entry_rows = {}
     for item in doc.items:
         # Profil ürünü kontrolü
         if not getattr(item, "custom_is_profile", 0):
@@ -36,28 +41,40 @@ def on_submit(doc, method=None):
         if not boy_name:
             frappe.log_error(f"Boy kaydı bulunamadı/oluşturulamadı: {length}", "Purchase Receipt Boy Error")
             continue
-            
+        
+        entry_rows.setdefault(item.warehouse, []).append({
+            "item_code": item.item_code,
+            "length": boy_name,
+            "received_quantity": int(qty),
+            "total_length": float(length) * float(qty),
+            "purchase_receipt": doc.name
+        })
+    
+    if not entry_rows:
+        return
+    
+    # Item bilgilerini tek sorguda al
+    item_codes = list({row["item_code"] for rows in entry_rows.values() for row in rows})
+    item_data = {
+        row.name: row
+        for row in frappe.get_all("Item", filters={"name": ["in", item_codes]}, fields=["name", "item_name", "item_group"])
+    }
+    
+    for warehouse, rows in entry_rows.items():
         try:
-            # Item bilgilerini al
-            item_data = frappe.db.get_value("Item", item.item_code, 
-                                          ["item_name", "item_group"], as_dict=True)
+            for row in rows:
+                data = item_data.get(row["item_code"])
+                row["item_name"] = data.item_name if data else ""
+                row["item_group"] = data.item_group if data else ""
             
             # Profile Entry oluştur
             profile_entry = frappe.get_doc({
                 "doctype": "Profile Entry",
                 "date": doc.posting_date,
                 "supplier": doc.supplier,
-                "warehouse": item.warehouse,
+                "warehouse": warehouse,
                 "remarks": f"Purchase Receipt: {doc.name}",
-                "items": [{
-                    "item_code": item.item_code,
-                    "item_name": item_data.item_name if item_data else "",
-                    "item_group": item_data.item_group if item_data else "",
-                    "length": boy_name,
-                    "received_quantity": int(qty),
-                    "total_length": float(length) * float(qty),
-                    "purchase_receipt": doc.name
-                }]
+                "items": rows
             })
 
             # PR kaynaklı olduğu için grup kontrolünü atla
@@ -72,167 +89,25 @@ def on_submit(doc, method=None):
 
 def copy_material_request_references_from_po(doc):
     """
-    Purchase Order'dan Purchase Receipt oluşturulurken
-    custom_material_request_references field'ını kopyala
-    
+    Purchase Order'dan Purchase Receipt oluşturulurken PO satırlarının
+    Material Request referanslarını tek sorguda kopyalar ve referans tablosunu günceller
+
     Args:
         doc: Purchase Receipt document
     """
     if not doc.items:
         return
-    
-    for pr_item in doc.items:
-        # Eğer Purchase Order Item referansı varsa
-        po_detail = getattr(pr_item, "purchase_order_item", None)
-        if not po_detail:
-            continue
-        
-        # Purchase Order Item'dan custom_material_request_references'ı al
-        po_item_data = frappe.db.get_value(
-            "Purchase Order Item",
-            po_detail,
-            ["custom_material_request_references"],
-            as_dict=1
-        )
-        
-        if po_item_data and po_item_data.custom_material_request_references:
-            # PR Item'a kopyala
-            pr_item.custom_material_request_references = po_item_data.custom_material_request_references
+
+    copy_references_from_purchase_order(doc)
+    sync_material_request_references(doc)
 
 
-def update_material_request_statuses(doc):
+def update_material_request_statuses(doc, is_submit=True):
     """
-    Purchase Receipt Item'larındaki Material Request referanslarını bulup
-    SADECE ALINAN item'ların received_qty'sini günceller ve MR statuslerini belirler
-    
+    Purchase Receipt Item'larındaki Material Request referanslarından etkilenen
+    MR item'larının received_qty'sini ve MR statuslerini toplu günceller
+
     Args:
         doc: Purchase Receipt document
     """
-    if not doc.items:
-        return
-    
-    # MR'leri ve ilgili item bilgilerini topla: {mr_name: {item_code: {"qty": x, "stock_qty": y}}}
-    mr_item_data = {}
-    
-    for pr_item in doc.items:
-        item_code = pr_item.item_code
-        qty = pr_item.qty or 0
-        stock_qty = pr_item.stock_qty or 0
-        
-        # Custom text field'dan MR referanslarını al
-        mr_references_str = getattr(pr_item, "custom_material_request_references", "") or ""
-        
-        # Önce custom field'ı kontrol et
-        if mr_references_str and mr_references_str.strip():
-            # Virgülle ayrılmış string'i listeye çevir
-            mr_list = [x.strip() for x in mr_references_str.split(",") if x.strip()]
-            
-            # Her MR için item bilgisini kaydet
-            for mr_name in mr_list:
-                if mr_name:
-                    if mr_name not in mr_item_data:
-                        mr_item_data[mr_name] = {}
-                    
-                    # Aynı item birden fazla satırda olabilir, topla
-                    if item_code not in mr_item_data[mr_name]:
-                        mr_item_data[mr_name][item_code] = {"qty": 0, "stock_qty": 0}
-                    
-                    mr_item_data[mr_name][item_code]["qty"] += qty
-                    mr_item_data[mr_name][item_code]["stock_qty"] += stock_qty
-        
-        # Custom field boşsa, standart material_request field'ına bak
-        else:
-            old_mr = getattr(pr_item, "material_request", None)
-            if old_mr:
-                if old_mr not in mr_item_data:
-                    mr_item_data[old_mr] = {}
-                
-                if item_code not in mr_item_data[old_mr]:
-                    mr_item_data[old_mr][item_code] = {"qty": 0, "stock_qty": 0}
-                
-                mr_item_data[old_mr][item_code]["qty"] += qty
-                mr_item_data[old_mr][item_code]["stock_qty"] += stock_qty
-    
-    # Hiç MR referansı yoksa çık
-    if not mr_item_data:
-        return
-    
-    # Her MR için status güncelle
-    updated_mrs = []
-    failed_mrs = []
-    
-    for mr_name, items_dict in mr_item_data.items():
-        try:
-            # MR'nin mevcut durumunu kontrol et
-            mr_doc = frappe.get_doc("Material Request", mr_name)
-            
-            # Sadece submit edilmiş Purchase tipindeki MR'leri güncelle
-            if mr_doc.docstatus != 1:
-                continue
-            
-            if mr_doc.material_request_type != "Purchase":
-                # Sadece Purchase tipindeki MR'leri işle
-                continue
-            
-            # ✅ SADECE PR'daki item'ların received_qty'sini güncelle
-            for item_code, item_data in items_dict.items():
-                stock_qty = item_data["stock_qty"]
-                
-                # Bu item'ın received_qty'sini artır
-                frappe.db.sql("""
-                    UPDATE `tabMaterial Request Item`
-                    SET received_qty = LEAST(received_qty + %(stock_qty)s, stock_qty)
-                    WHERE parent = %(mr_name)s
-                    AND item_code = %(item_code)s
-                """, {"mr_name": mr_name, "item_code": item_code, "stock_qty": stock_qty})
-            
-            # per_received yüzdesini hesapla ve güncelle
-            frappe.db.sql("""
-                UPDATE `tabMaterial Request` mr
-                SET per_received = (
-                    SELECT 
-                        CASE 
-                            WHEN SUM(stock_qty) > 0 
-                            THEN (SUM(received_qty) / SUM(stock_qty)) * 100
-                            ELSE 0
-                        END
-                    FROM `tabMaterial Request Item`
-                    WHERE parent = mr.name
-                ),
-                modified = NOW()
-                WHERE name = %s
-            """, (mr_name,))
-            
-            frappe.db.commit()
-            
-            # Status ERPNext'in kendi set_status() metoduna bırak
-            mr_doc.reload()
-            
-            try:
-                # ERPNext'in standart status güncelleme mekanizması
-                mr_doc.set_status(update=True)
-            except:
-                pass
-            
-            updated_mrs.append(f"{mr_name}")
-            
-        except Exception as e:
-            # Hata durumunda log'a yaz ama işlemi durdurma
-            failed_mrs.append(mr_name)
-            frappe.log_error(
-                f"Material Request {mr_name} status güncellenirken hata oluştu: {str(e)}\n\n{frappe.get_traceback()}",
-                "Purchase Receipt MR Status Update Error"
-            )
-    
-    # Özet mesajı
-    if updated_mrs:
-        frappe.msgprint(
-            f"Material Request statusleri güncellendi: {', '.join(updated_mrs)}",
-            indicator="green"
-        )
-    
-    if failed_mrs:
-        frappe.msgprint(
-            f"Bazı Material Request'ler güncellenemedi: {', '.join(failed_mrs)}. Detaylar için Error Log kontrol edin.",
-            indicator="red"
-        )
\ No newline at end of file
+    reconcile_material_requests(doc, "Purchase Receipt", is_submit=is_submit)
@@ -0,0 +1,161 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+"""
+Set tabanlı BOM patlatma motoru.
+
+Satış siparişi kalemlerinin varsayılan BOM'larını, çok seviyeli alt montajlarını ve
+stock_qty çarpanlarını her BOM seviyesi için iki toplu sorgu ile çözer.
+Kalem başına frappe.get_doc("BOM") ve frappe.db.get_value("Item") çağrısı yapılmaz.
+"""
+
+import frappe
+from frappe.utils import flt
+
+# Döngüsel BOM tanımlarına karşı koruma
+MAX_BOM_DEPTH = 10
+
+
+def _stock_qty(row):
+	"""stock_qty (stok birimi) varsa onu, yoksa qty (UOM) değerini döndürür."""
+	stock_qty = flt(row.get("stock_qty"), 5)
+	return stock_qty if stock_qty > 0 else flt(row.get("qty"), 5)
+
+
+def get_default_bom_map(item_codes):
+	"""
+	Verilen ürünlerin aktif ve varsayılan BOM'larını tek sorguda döndürür.
+	Dönüş: {item_code: (bom_name, bom_quantity)}
+	"""
+	if not item_codes:
+		return {}
+
+	rows = frappe.db.sql(
+		"""
+		SELECT item, name, quantity
+		FROM `tabBOM`
+		WHERE item IN %s AND is_active = 1 AND is_default = 1
+		ORDER BY modified DESC
+		""",
+		(tuple(item_codes),),
+		as_dict=True,
+	)
+	bom_map = {}
+	for row in rows:
+		bom_map.setdefault(row.item, (row.name, flt(row.quantity) or 1))
+	return bom_map
+
+
+def get_bom_items_map(bom_names):
+	"""
+	Verilen BOM'ların kalemlerini, ürün bayraklarıyla birlikte tek sorguda döndürür.
+	Dönüş: {bom_name: [bom_item_row, ...]}
+	"""
+	if not bom_names:
+		return {}
+
+	rows = frappe.db.sql(
+		"""
+		SELECT bi.parent, bi.item_code, bi.qty, bi.stock_qty,
+			i.item_name, i.is_stock_item, i.is_purchase_item
+		FROM `tabBOM Item` bi
+		LEFT JOIN `tabItem` i ON i.name = bi.item_code
+		WHERE bi.parent IN %s AND bi.parenttype = 'BOM'
+		ORDER BY bi.parent, bi.idx
+		""",
+		(tuple(bom_names),),
+		as_dict=True,
+	)
+	items_map = {}
+	for row in rows:
+		items_map.setdefault(row.parent, []).append(row)
+	return items_map
+
+
+def explode_sales_order_items(so_items):
+	"""
+	Satış siparişi kalemlerini çok seviyeli olarak hammaddelerine patlatır.
+
+	Sadece stoklu ve satın alınabilir ürünler hammadde kabul edilir. Diğer BOM kalemleri
+	varsayılan BOM'u varsa bir alt seviyede patlatılır, yoksa atlanır.
+
+	Miktar kuralı:
+	- Üst seviye: BOM Item stock_qty * satış kalemi stock_qty (1 adet ürün için tanımlı)
+	- Alt montaj: üst ihtiyaç * BOM Item stock_qty / alt BOM quantity
+
+	so_items: item_code, qty, stock_qty alanlarına sahip satırlar (Sales Order Item)
+	Dönüş: {raw_material: {"raw_material", "item_name", "qty", "so_items": set()}}
+	"""
+	raw_materials = {}
+	bom_map = {}
+	bom_items_map = {}
+
+	# (satış kalemi, patlatılacak ürün, ihtiyaç çarpanı, üst seviye mi)
+	frontier = []
+	for item in so_items:
+		item_code = str(item.get("item_code") or "").strip()
+		if item_code:
+			frontier.append((item_code, item_code, _stock_qty(item), True))
+
+	depth = 0
+	while frontier and depth < MAX_BOM_DEPTH:
+		missing_codes = {code for _, code, _, _ in frontier if code not in bom_map}
+		resolved = get_default_bom_map(missing_codes)
+		for code in missing_codes:
+			bom_map[code] = resolved.get(code)
+
+		missing_boms = {
+			bom_map[code][0] for _, code, _, _ in frontier if bom_map.get(code)
+		} - set(bom_items_map)
+		bom_items_map.update(get_bom_items_map(missing_boms))
+
+		next_frontier = []
+		for so_item_code, code, multiplier, is_top_level in frontier:
+			bom = bom_map.get(code)
+			if not bom:
+				continue
+			bom_name, bom_quantity = bom
+			divisor = 1 if is_top_level else bom_quantity
+			for rm in bom_items_map.get(bom_name, []):
+				rm_code = str(rm.item_code).strip()
+				need = flt(_stock_qty(rm) * multiplier / divisor, 5)
+				if rm.is_stock_item and rm.is_purchase_item:
+					entry = raw_materials.setdefault(
+						rm_code,
+						{
+							"raw_material": rm_code,
+							"item_name": rm.item_name or "",
+							"qty": 0,
+							"so_items": set(),
+						},
+					)
+					entry["qty"] = flt(entry["qty"] + need, 5)
+					entry["so_items"].add(so_item_code)
+				else:
+					next_frontier.append((so_item_code, rm_code, need, False))
+		frontier = next_frontier
+		depth += 1
+
+	if frontier:
+		frappe.log_error(
+			f"BOM patlatma {MAX_BOM_DEPTH} seviyede durduruldu, döngüsel BOM olabilir: "
+			f"{sorted({code for _, code, _, _ in frontier})}",
+			"BOM Explosion Depth",
+		)
+
+	return raw_materials
+
+
+def explode_sales_order(sales_order):
+	"""Kaydedilmiş bir satış siparişinin kalemlerini tek sorguda okuyup patlatır."""
+	so_items = frappe.db.sql(
+		"""
+		SELECT item_code, qty, stock_qty
+		FROM `tabSales Order Item`
+		WHERE parent = %s AND parenttype = 'Sales Order'
+		ORDER BY idx
+		""",
+		(sales_order,),
+		as_dict=True,
+	)
+	return explode_sales_order_items(so_items)
@@ -1,9 +1,16 @@
 import json
+import time
 from datetime import datetime, timedelta
 
 import frappe
 from frappe import _
-from frappe.utils import flt
+from frappe.utils import cint, flt
+
+from uretim_planlama.sales_order_hooks.bom_explosion import explode_sales_order_items
+from uretim_planlama.uretim_planlama.api.raw_material_availability import (
+	get_availability_map,
+	queue_availability_refresh,
+)
 
 
 # Utility functions for quantity handling - ERPNext flt() ile hassasiyet kontrolü
@@ -167,11 +174,142 @@ def get_reserve_warehouse_stock_map(item_codes, reserve_warehouse):
 	return reserve_warehouse_stock_map
 
 
+def get_reserved_details_map(item_codes):
+	"""
+	Verilen item_codes için rezerv detaylarını (child siparişlere aktarılan kullanımlar dahil) tek seferde döndürür.
+	"""
+	if not item_codes:
+		return {}
+
+	details_map = {item_code: [] for item_code in item_codes}
+	reserved_rows = frappe.db.sql(
+		"""
+        SELECT rrm.item_code, rrm.sales_order, so.customer, IFNULL(so.custom_end_customer, '') as custom_end_customer, so.delivery_date, rrm.quantity,
+               so.is_long_term_child, so.parent_sales_order
+        FROM `tabRezerved Raw Materials` rrm
+        INNER JOIN `tabSales Order` so ON rrm.sales_order = so.name
+        WHERE rrm.item_code IN %s
+        """,
+		(tuple(item_codes),),
+		as_dict=True,
+	)
+	for row in reserved_rows:
+		details_map.setdefault(row.pop("item_code"), []).append(row)
+
+	child_usage_rows = frappe.db.sql(
+		"""
+        SELECT ltru.item_code, ltru.sales_order as child_sales_order, ltru.parent_sales_order, ltru.used_qty as quantity,
+               so.customer, IFNULL(so.custom_end_customer, '') as custom_end_customer, so.delivery_date,
+               so.is_long_term_child, so.parent_sales_order
+        FROM `tabLong Term Reserve Usage` ltru
+        INNER JOIN `tabSales Order` so ON ltru.sales_order = so.name
+        WHERE ltru.item_code IN %s AND ltru.parent_sales_order IS NOT NULL
+        """,
+		(tuple(item_codes),),
+		as_dict=True,
+	)
+	for row in child_usage_rows:
+		# Child satırı için sales_order alanını child_sales_order olarak ayarla
+		row["sales_order"] = row["child_sales_order"]
+		row["is_child_usage"] = True  # Bu satırın child usage olduğunu belirt
+		details_map.setdefault(row.pop("item_code"), []).append(row)
+	return details_map
+
+
+def get_open_mr_items_map(item_codes):
+	"""
+	Verilen item_codes için karşılanmamış satınalma talebi satırlarını item bazında gruplar.
+	Tamamen sipariş edilmiş olanlar listeye alınmaz.
+	"""
+	if not item_codes:
+		return {}
+
+	rows = frappe.db.sql(
+		"""
+        SELECT 
+            mri.item_code,
+            mri.parent, 
+            mri.qty,
+            mri.stock_qty,
+            mri.ordered_qty, 
+            mri.sales_order,
+            mr.transaction_date, 
+            mr.status
+        FROM `tabMaterial Request Item` mri
+        INNER JOIN `tabMaterial Request` mr ON mri.parent = mr.name
+        WHERE mri.item_code IN %s
+          AND mr.material_request_type = 'Purchase'
+          AND mr.docstatus IN (0, 1)
+          AND mr.status NOT IN ('Cancelled', 'Received')
+        ORDER BY mr.transaction_date DESC, mri.sales_order
+        """,
+		(tuple(item_codes),),
+		as_dict=True,
+	)
+	mr_items_map = {}
+	for d in rows:
+		# Karşılanmamış miktar = stock_qty - ordered_qty (sipariş edilmemiş kısım)
+		# ÖNEMLİ: ordered_qty stock_qty cinsinden tutulur
+		ordered_qty = get_real_qty(d.get("ordered_qty") or 0)
+		total_qty = get_real_qty(d.get("stock_qty") or d.get("qty") or 0)
+		pending_qty = total_qty - ordered_qty
+		# Sadece karşılanmamış miktarı olan talepleri göster (küçük farkları da dikkate al)
+		if pending_qty <= 0.001:
+			continue
+		d["pending_qty"] = pending_qty
+		d["ordered_qty"] = ordered_qty
+		d["qty"] = total_qty or ""  # Toplam miktar (stock_qty) bilgisi de saklanır
+		d["quantity"] = d["qty"]
+		d["parent"] = d.get("parent", "") or ""
+		d["name"] = d["parent"]
+		d["transaction_date"] = str(d.get("transaction_date", "") or "")
+		d["schedule_date"] = d["transaction_date"]
+		d["date"] = d["transaction_date"]
+		mr_items_map.setdefault(d.pop("item_code"), []).append(d)
+	return mr_items_map
+
+
+def get_open_po_items_map(item_codes):
+	"""
+	Verilen item_codes için teslim alınmamış satınalma siparişi satırlarını item bazında gruplar.
+	"""
+	if not item_codes:
+		return {}
+
+	rows = frappe.db.sql(
+		"""
+        SELECT poi.item_code, poi.parent, poi.qty, poi.schedule_date, poi.received_qty
+        FROM `tabPurchase Order Item` poi
+        INNER JOIN `tabPurchase Order` po ON poi.parent = po.name
+        WHERE poi.item_code IN %s
+          AND poi.docstatus = 1
+          AND po.docstatus = 1
+          AND (poi.qty > IFNULL(poi.received_qty, 0))
+        """,
+		(tuple(item_codes),),
+		as_dict=True,
+	)
+	po_items_map = {}
+	for d in rows:
+		# Sadece tamamlanmamış (kalan miktar > 0) olanları göster
+		if get_real_qty(d.get("qty", 0)) <= get_real_qty(d.get("received_qty", 0)):
+			continue
+		d["qty"] = d.get("qty", "") or ""
+		d["quantity"] = d["qty"]
+		d["parent"] = d.get("parent", "") or ""
+		d["name"] = d["parent"]
+		d["schedule_date"] = str(d.get("schedule_date", "") or "")
+		d["transaction_date"] = d["schedule_date"]
+		d["date"] = d["schedule_date"]
+		po_items_map.setdefault(d.pop("item_code"), []).append(d)
+	return po_items_map
+
+
 @frappe.whitelist()
 def get_sales_order_raw_materials(sales_order):
 	"""
 	Verilen satış siparişi için, siparişin item'ları üzerinden her bir hammaddeye ait toplam ihtiyaç, stok, rezerv, uzun vadeli rezerv ve kullanılan rezerv gibi bilgileri döndürür.
-	Clean code ve performans için toplu sorgu ve yardımcı fonksiyonlar kullanır.
+	BOM patlatma (çok seviyeli) bom_explosion motoru ile, hammadde detayları ise item_code IN (...) toplu sorguları ile çekilir.
 	"""
 	if not sales_order or sales_order.startswith("new-"):
 		frappe.throw(_("Lütfen önce Satış Siparişini kaydedin."), frappe.ValidationError)
@@ -181,40 +319,19 @@ def get_sales_order_raw_materials(sales_order):
 		frappe.throw(_("Sales Order bulunamadı."))
 	is_long_term_child = getattr(so, "is_long_term_child", 0)
 	parent_sales_order = getattr(so, "parent_sales_order", None)
-	raw_materials = {}
-
-	# 1. Siparişteki tüm hammaddeleri topla
-	all_item_codes = set()
-	item_bom_map = {}
-	for item in so.items:
-		bom = frappe.db.get_value(
-			"BOM", {"item": item.item_code, "is_active": 1, "is_default": 1}, "name"
-		)
-		if not bom:
-			continue
-		bom_doc = frappe.get_doc("BOM", bom)
-		for rm in bom_doc.items:
-			# Sadece gerçek hammadde olanlar eklensin
-			is_hammadde = frappe.db.get_value(
-				"Item", rm.item_code, ["is_stock_item", "is_purchase_item"], as_dict=True
-			)
-			if not is_hammadde or not (is_hammadde.is_stock_item and is_hammadde.is_purchase_item):
-				continue  # Nihai ürün veya satılamaz/tedarik edilemez ürün, atla
-			all_item_codes.add(rm.item_code)
-			item_bom_map.setdefault(rm.item_code, []).append((item, rm))
-	all_item_codes = list(all_item_codes)
+
+	# 1. Siparişteki tüm hammaddeleri toplu BOM patlatma ile topla
+	raw_materials = explode_sales_order_items(so.items)
 
 	# Eğer hiç hammadde bulunamadıysa boş liste döndür
-	if not all_item_codes:
+	if not raw_materials:
 		return []
 
 	# 2. Toplu olarak rezerv, usage, stok, isim, depo verilerini çek (yardımcı fonksiyonlarla)
-	# Item code'ları normalize et
-	all_item_codes = [str(code).strip() for code in all_item_codes]
+	all_item_codes = list(raw_materials)
 	rezerv_map = get_rezerv_map(all_item_codes)
 	usage_map = get_usage_map(all_item_codes)
 	stock_map, stock_by_warehouse_map = get_stock_maps(all_item_codes)
-	item_names = get_item_names(all_item_codes)
 	reserve_warehouse = (
 		frappe.db.get_value(
 			"Warehouse", {"name": ["in", ["REZERV DEPO", "REZERV DEPO - O"]]}, "name"
@@ -225,59 +342,38 @@ def get_sales_order_raw_materials(sales_order):
 		all_item_codes, reserve_warehouse
 	)
 
-	# Her item için sistemdeki toplam rezerv ve uzun vadeli rezervi çek
-	# Tüm aktif/onaylanmış siparişler için toplam rezerv (aktif rezerv)
-	total_rezerv_rows = frappe.db.sql(
-		"""
-        SELECT item_code, SUM(quantity) as total_quantity
-        FROM `tabRezerved Raw Materials`
-        GROUP BY item_code
-        """,
-		as_dict=True,
-	)
-	total_rezerv_map = {
-		row.item_code: get_real_qty(row.total_quantity) for row in total_rezerv_rows
-	}
-
-	# Kullanılmış rezervleri (usage) da topla
-	total_usage_rows = frappe.db.sql(
-		"""
-        SELECT item_code, SUM(used_qty) as total_used
-        FROM `tabLong Term Reserve Usage`
-        GROUP BY item_code
-        """,
-		as_dict=True,
-	)
-	total_usage_map = {
-		row.item_code: get_real_qty(row.total_used) for row in total_usage_rows
-	}
+	# Toplam aktif rezerv, bekleyen talep ve bekleyen satınalma: materyalize kullanılabilirlik defterinden
+	availability_map = get_availability_map(all_item_codes)
 
 	# Tüm aktif/onaylanmış uzun vadeli siparişler için toplam uzun vadeli rezerv
-	today = frappe.utils.nowdate()
 	thirty_days_later = (
-		datetime.strptime(today, "%Y-%m-%d") + timedelta(days=30)
+		datetime.strptime(frappe.utils.nowdate(), "%Y-%m-%d") + timedelta(days=30)
 	).strftime("%Y-%m-%d")
 	total_long_term_rows = frappe.db.sql(
 		"""
         SELECT rrm.item_code, SUM(rrm.quantity) as total_long_term
         FROM `tabRezerved Raw Materials` rrm
         INNER JOIN `tabSales Order` so ON rrm.sales_order = so.name
-        WHERE so.delivery_date >= %s
+        WHERE so.delivery_date >= %s AND rrm.item_code IN %s
         GROUP BY rrm.item_code
         """,
-		(thirty_days_later,),
+		(thirty_days_later, tuple(all_item_codes)),
 		as_dict=True,
 	)
 	total_long_term_map = {
 		row.item_code: get_real_qty(row.total_long_term) for row in total_long_term_rows
 	}
 
-	# Ana döngü
-	for item_code, item_pairs in item_bom_map.items():
-		item_code = str(item_code).strip()  # normalize
+	# Kalem başına sorgu yerine tüm detaylar item_code IN (...) ile tek seferde
+	reserved_details_map = get_reserved_details_map(all_item_codes)
+	mr_items_map = get_open_mr_items_map(all_item_codes)
+	po_items_map = get_open_po_items_map(all_item_codes)
+	long_term_details_map = get_long_term_reserve_details_map(all_item_codes)
+	used_long_term_details_map = get_used_long_term_reserve_details_map(all_item_codes)
+
+	result = []
+	for item_code, data in raw_materials.items():
 		# Parent/child ve uzun vadeli rezerv ayrımı
-		long_term_reserve_qty = 0
-		used_from_long_term_reserve = 0
 		if is_long_term_child and parent_sales_order:
 			# SADECE child usage alınacak, parent usage eklenmeyecek
 			used_from_long_term_reserve = usage_map.get((so.name, item_code), 0)
@@ -291,246 +387,55 @@ def get_sales_order_raw_materials(sales_order):
 				(None, item_code), 0
 			)
 			long_term_reserve_qty = rezerv_map.get(long_term_key, 0)
-		# Toplam rezerv detayları
-		total_reserved_details = frappe.db.sql(
-			"""
-            SELECT rrm.sales_order, so.customer, IFNULL(so.custom_end_customer, '') as custom_end_customer, so.delivery_date, rrm.quantity,
-                   so.is_long_term_child, so.parent_sales_order
-            FROM `tabRezerved Raw Materials` rrm
-            INNER JOIN `tabSales Order` so ON rrm.sales_order = so.name
-            WHERE rrm.item_code = %s
-        """,
-			(item_code,),
-			as_dict=True,
-		)
 
-		# Child siparişlere aktarılan rezerv detaylarını ekle
-		child_usage_details = frappe.db.sql(
-			"""
-            SELECT ltru.sales_order as child_sales_order, ltru.parent_sales_order, ltru.used_qty as quantity,
-                   so.customer, IFNULL(so.custom_end_customer, '') as custom_end_customer, so.delivery_date,
-                   so.is_long_term_child, so.parent_sales_order
-            FROM `tabLong Term Reserve Usage` ltru
-            INNER JOIN `tabSales Order` so ON ltru.sales_order = so.name
-            WHERE ltru.item_code = %s AND ltru.parent_sales_order IS NOT NULL
-        """,
-			(item_code,),
-			as_dict=True,
-		)
+		toplam_stok = get_real_qty(stock_map.get(item_code, 0))
+		# Sistemdeki tüm rezervlerin toplamı
+		availability = availability_map.get(item_code) or {}
+		toplam_rezerv = get_real_qty(availability.get("reserved_qty"))
+		pending_mr_qty = get_real_qty(availability.get("pending_mr_qty"))
+		pending_po_qty = get_real_qty(availability.get("pending_po_qty"))
 
-		# Child usage detaylarını total_reserved_details'e ekle
-		for child_detail in child_usage_details:
-			# Child satırı için sales_order alanını child_sales_order olarak ayarla
-			child_detail["sales_order"] = child_detail["child_sales_order"]
-			child_detail["is_child_usage"] = (
-				True  # Bu satırın child usage olduğunu belirt
-			)
-			total_reserved_details.append(child_detail)
-		# İlk kez ekleniyorsa
-		if item_code not in raw_materials:
-			reserved_qty = rezerv_map.get((so.name, item_code), 0)
-			stock_total = stock_map.get(item_code, 0)
-			stock_by_warehouse = stock_by_warehouse_map.get(item_code, {})
-			item_name = item_names.get(item_code, "")
-			reserve_warehouse_stock = reserve_warehouse_stock_map.get(item_code, 0)
-			# Toplam rezerv ve toplam uzun vadeli rezerv
-			aktif_rezerv = total_rezerv_map.get(item_code, 0)
-			kullanilmis_rezerv = total_usage_map.get(item_code, 0)
-			toplam_rezerv = aktif_rezerv
-			toplam_uzun_vadeli_rezerv = total_long_term_map.get(item_code, 0)
-			raw_materials[item_code] = {
-				"raw_material": item_code,
-				"item_name": item_name,
-				"qty": 0,
-				"stock": stock_total,
-				"stock_by_warehouse": stock_by_warehouse,
-				"reserved_qty": reserved_qty,
-				"reserve_warehouse": reserve_warehouse,
-				"reserve_warehouse_stock": reserve_warehouse_stock,
-				"so_items": set(),
-						"long_term_reserve_qty": get_real_qty(long_term_reserve_qty),
-		"used_from_long_term_reserve": get_real_qty(used_from_long_term_reserve),
-				# Yeni toplamlar
-				"total_reserved_qty": toplam_rezerv,
-				"total_long_term_reserve_qty": toplam_uzun_vadeli_rezerv,
-				"total_reserved_details": total_reserved_details,
-			}
-		# Miktarları topla (BOM miktarı * satış siparişi miktarı) → her hammadde için gerçek toplam ihtiyaç
-		# ÖNEMLİ: BOM Item'da qty UOM cinsinden, stock_qty stok birimi cinsinden. Stok hesaplamaları için stock_qty kullanılmalı
-		for item, rm in item_pairs:
-			# item.qty: satış siparişi kalemi miktarı (UOM cinsinden)
-			# item.stock_qty: satış siparişi kalemi miktarı (stok birimi cinsinden)
-			# rm.qty: BOM'da tanımlı hammadde miktarı (UOM cinsinden, 1 adet ürün için)
-			# rm.stock_qty: BOM'da tanımlı hammadde miktarı (stok birimi cinsinden, 1 adet ürün için)
-			# Stok hesaplamaları stok birimi cinsinden yapıldığı için stock_qty kullanılmalı
-			# stock_qty yoksa veya 0 ise qty kullan (fallback)
-			rm_stock_qty = get_real_qty(rm.stock_qty if hasattr(rm, 'stock_qty') and rm.stock_qty and rm.stock_qty > 0 else rm.qty)
-			item_stock_qty = get_real_qty(item.stock_qty if hasattr(item, 'stock_qty') and item.stock_qty and item.stock_qty > 0 else item.qty)
-			ihtiyac_miktar = get_real_qty(rm_stock_qty * item_stock_qty, precision=5)
-			raw_materials[item_code]["qty"] += ihtiyac_miktar
-			raw_materials[item_code]["so_items"].add(item.item_code)
-
-	result = []
-	is_submitted = so.docstatus == 1
-	for data in raw_materials.values():
-		toplam_stok = get_real_qty(data["stock"] or 0)
-		toplam_rezerv = get_real_qty(
-			data["total_reserved_qty"] or 0
-		)  # sistemdeki tüm rezervlerin toplamı
-		
-		# Mevcut malzeme talepleri (karşılanmamış - sipariş edilmemiş kısım) - TÜM siparişler için
-		# ÖNEMLİ: ordered_qty stock_qty cinsinden tutulur, bu yüzden stock_qty ile karşılaştırmalıyız
-		pending_mr_qty = frappe.db.sql("""
-            SELECT SUM(GREATEST(0, COALESCE(mri.stock_qty, mri.qty) - COALESCE(mri.ordered_qty, 0))) as pending_qty
-            FROM `tabMaterial Request Item` mri
-            INNER JOIN `tabMaterial Request` mr ON mri.parent = mr.name
-            WHERE mri.item_code = %s
-              AND mr.material_request_type = 'Purchase'
-              AND mr.docstatus IN (0, 1)
-              AND mr.status NOT IN ('Cancelled', 'Received')
-        """, (data["raw_material"],), as_dict=True)
-		pending_mr_qty = get_real_qty(pending_mr_qty[0]['pending_qty'] if pending_mr_qty and pending_mr_qty[0]['pending_qty'] else 0)
-		
-		# Satınalma siparişleri (teslim alınmamış kısım) - TÜM siparişler için
-		pending_po_qty = frappe.db.sql("""
-            SELECT SUM(GREATEST(0, poi.qty - COALESCE(poi.received_qty, 0))) as pending_qty
-            FROM `tabPurchase Order Item` poi
-            INNER JOIN `tabPurchase Order` po ON poi.parent = po.name
-            WHERE poi.item_code = %s
-              AND po.docstatus IN (0, 1)
-              AND po.status NOT IN ('Cancelled', 'Completed')
-        """, (data["raw_material"],), as_dict=True)
-		pending_po_qty = get_real_qty(pending_po_qty[0]['pending_qty'] if pending_po_qty and pending_po_qty[0]['pending_qty'] else 0)
-		
 		if is_long_term_child and parent_sales_order:
 			acik_miktar = get_real_qty(data["qty"] or 0)
 			kullanilabilir_stok = 0
 		else:
 			kullanilabilir_stok = toplam_stok - toplam_rezerv
-			# DÜZELTME: Açık miktar hesaplamasında mevcut talepleri ve satınalma siparişlerini dikkate al
+			# Açık miktar hesaplamasında mevcut talepleri ve satınalma siparişlerini dikkate al
 			# Bu, create_material_request_for_shortages ile aynı mantık
 			acik_miktar = max(
-				get_real_qty(data["qty"] or 0) - kullanilabilir_stok - pending_mr_qty - pending_po_qty, 
+				get_real_qty(data["qty"] or 0) - kullanilabilir_stok - pending_mr_qty - pending_po_qty,
 				0
 			)
-		
-		# TÜM siparişler için malzeme talepleri - Bu hammadde için olan tüm talepler gösterilsin
-		# Bu sipariş için olanlar da dahil, diğer siparişler için olanlar da dahil
-		mr_items = frappe.db.sql(
-			"""
-            SELECT 
-                mri.parent, 
-                mri.qty,
-                mri.stock_qty,
-                mri.ordered_qty, 
-                mri.sales_order,
-                mr.transaction_date, 
-                mr.status
-            FROM `tabMaterial Request Item` mri
-            INNER JOIN `tabMaterial Request` mr ON mri.parent = mr.name
-            WHERE mri.item_code = %s
-              AND mr.material_request_type = 'Purchase'
-              AND mr.docstatus IN (0, 1)
-              AND mr.status NOT IN ('Cancelled', 'Received')
-            ORDER BY mr.transaction_date DESC, mri.sales_order
-            """,
-			(data["raw_material"],),
-			as_dict=True,
-		)
-		# Sadece karşılanmamış (teslim alınmamış) talepleri göster
-		# Tamamen sipariş edilip teslim alınmış olanlar tablodan kalkmalı
-		filtered_mr_items = []
-		for d in mr_items:
-			# Karşılanmamış miktar = stock_qty - ordered_qty (sipariş edilmemiş kısım)
-			# ÖNEMLİ: ordered_qty stock_qty cinsinden tutulur
-			ordered_qty = get_real_qty(d.get("ordered_qty") or 0)
-			total_qty = get_real_qty(d.get("stock_qty") or d.get("qty") or 0)
-			pending_qty = total_qty - ordered_qty
-			
-			# Sadece karşılanmamış miktarı olan talepleri göster (pending_qty > 0)
-			if pending_qty > 0.001:  # Küçük farkları da dikkate al
-				d["pending_qty"] = pending_qty
-				d["ordered_qty"] = ordered_qty
-				d["qty"] = total_qty  # Toplam miktar (stock_qty) bilgisi de saklanır
-				filtered_mr_items.append(d)
-		mr_items = filtered_mr_items
-		# Detayları normalize et
-		for d in mr_items:
-			d["qty"] = d.get("qty", "") or ""
-			d["quantity"] = d["qty"]
-			d["parent"] = d.get("parent", "") or ""
-			d["name"] = d["parent"]
-			d["transaction_date"] = str(d.get("transaction_date", "") or "")
-			d["schedule_date"] = d["transaction_date"]
-			d["date"] = d["transaction_date"]
-		po_items = frappe.db.sql(
-			"""
-            SELECT poi.parent, poi.qty, poi.schedule_date, poi.received_qty
-            FROM `tabPurchase Order Item` poi
-            INNER JOIN `tabPurchase Order` po ON poi.parent = po.name
-            WHERE poi.item_code = %s
-              AND poi.docstatus = 1
-              AND po.docstatus = 1
-              AND (poi.qty > IFNULL(poi.received_qty, 0))
-            """,
-			(data["raw_material"],),
-			as_dict=True,
-		)
-		# Sadece tamamlanmamış (kalan miktar > 0) olanları göster
-		po_items = [d for d in po_items if get_real_qty(d.get("qty", 0)) > get_real_qty(d.get("received_qty", 0))]
-		for d in po_items:
-			d["qty"] = d.get("qty", "") or ""
-			d["quantity"] = d["qty"]
-			d["parent"] = d.get("parent", "") or ""
-			d["name"] = d["parent"]
-			d["schedule_date"] = str(d.get("schedule_date", "") or "")
-			d["transaction_date"] = d["schedule_date"]
-			d["date"] = d["schedule_date"]
+
+		po_items = po_items_map.get(item_code, [])
 		beklenen_teslim_tarihi = min(
 			[row.schedule_date for row in po_items if row.schedule_date], default=None
 		)
-		long_term_details = get_long_term_reserve_details(data["raw_material"])
-		for d in long_term_details:
-			if not d.get("custom_end_customer") and d.get("sales_order"):
-				d["custom_end_customer"] = (
-					frappe.db.get_value(
-						"Sales Order", d["sales_order"], "custom_end_customer"
-					)
-					or ""
-				)
-		used_long_term_details = get_used_long_term_reserve_details(data["raw_material"])
-		for d in used_long_term_details:
-			if not d.get("custom_end_customer") and d.get("sales_order"):
-				d["custom_end_customer"] = (
-					frappe.db.get_value(
-						"Sales Order", d["sales_order"], "custom_end_customer"
-					)
-					or ""
-				)
+
 		result.append(
 			{
-				"raw_material": data["raw_material"],
+				"raw_material": item_code,
 				"item_name": data["item_name"],
 				"qty": data["qty"],
-				"stock": data["stock"],
-				"stock_by_warehouse": data["stock_by_warehouse"],
-				"reserved_qty": data["reserved_qty"],
-				"reserve_warehouse": data["reserve_warehouse"],
-				"reserve_warehouse_stock": data["reserve_warehouse_stock"],
+				"stock": toplam_stok,
+				"stock_by_warehouse": stock_by_warehouse_map.get(item_code, {}),
+				"reserved_qty": rezerv_map.get((so.name, item_code), 0),
+				"reserve_warehouse": reserve_warehouse,
+				"reserve_warehouse_stock": reserve_warehouse_stock_map.get(item_code, 0),
 				"so_items": ", ".join(data["so_items"]),
 				"kullanilabilir_stok": kullanilabilir_stok,
 				"acik_miktar": acik_miktar,
-				"malzeme_talep_details": mr_items,
+				"malzeme_talep_details": mr_items_map.get(item_code, []),
 				"siparis_edilen_details": po_items,
 				"beklenen_teslim_tarihi": beklenen_teslim_tarihi,
-				"long_term_reserve_qty": data["long_term_reserve_qty"],
-				"used_from_long_term_reserve": data["used_from_long_term_reserve"],
-				"long_term_details": long_term_details,
-				"used_long_term_details": used_long_term_details,
+				"long_term_reserve_qty": get_real_qty(long_term_reserve_qty),
+				"used_from_long_term_reserve": get_real_qty(used_from_long_term_reserve),
+				"long_term_details": long_term_details_map.get(item_code, []),
+				"used_long_term_details": used_long_term_details_map.get(item_code, []),
 				# Yeni toplamlar
-				"total_reserved_qty": data["total_reserved_qty"],
-				"total_long_term_reserve_qty": data["total_long_term_reserve_qty"],
-				"total_reserved_details": data["total_reserved_details"],
+				"total_reserved_qty": toplam_rezerv,
+				"total_long_term_reserve_qty": total_long_term_map.get(item_code, 0),
+				"total_reserved_details": reserved_details_map.get(item_code, []),
 				# Child bilgisini ekle
 				"is_long_term_child": is_long_term_child,
 				"parent_sales_order": parent_sales_order,
@@ -560,51 +465,61 @@ def get_long_term_reserve_details(item_code):
 	Verilen hammadde (item_code) için, teslim tarihi bugünden 30 gün sonrası ve daha ileri olan satış siparişlerine ait uzun vadeli rezerv detaylarını döndürür.
 	Dönen detaylar: sales_order, customer, delivery_date, custom_end_customer, quantity
 	"""
+	return get_long_term_reserve_details_map([item_code]).get(item_code, [])
+
+
+def get_long_term_reserve_details_map(item_codes):
+	"""
+	get_long_term_reserve_details'in toplu versiyonu: {item_code: [detay, ...]}
+	custom_end_customer JOIN ile geldiği için satır başına Sales Order sorgusu yapılmaz.
+	"""
+	if not item_codes:
+		return {}
+
 	thirty_days_later = (
 		datetime.strptime(frappe.utils.nowdate(), "%Y-%m-%d") + timedelta(days=30)
 	).strftime("%Y-%m-%d")
 	rows = frappe.db.sql(
 		"""
-        SELECT so.name as sales_order, so.customer, so.delivery_date, IFNULL(so.custom_end_customer, '') as custom_end_customer, rrm.quantity
+        SELECT rrm.item_code, so.name as sales_order, so.customer, so.delivery_date, IFNULL(so.custom_end_customer, '') as custom_end_customer, rrm.quantity
         FROM `tabRezerved Raw Materials` rrm
         INNER JOIN `tabSales Order` so ON rrm.sales_order = so.name
-        WHERE rrm.item_code = %s AND so.delivery_date >= %s
+        WHERE rrm.item_code IN %s AND so.delivery_date >= %s
     """,
-		(item_code, thirty_days_later),
+		(tuple(item_codes), thirty_days_later),
 		as_dict=True,
 	)
-	# Eksik custom_end_customer varsa, satış siparişinden çek
+	details_map = {}
 	for row in rows:
-		if not row.get("custom_end_customer") and row.get("sales_order"):
-			row["custom_end_customer"] = (
-				frappe.db.get_value(
-					"Sales Order", row["sales_order"], "custom_end_customer"
-				)
-				or ""
-			)
-	return rows
+		details_map.setdefault(row.pop("item_code"), []).append(row)
+	return details_map
 
 
 def get_used_long_term_reserve_details(item_code):
+	return get_used_long_term_reserve_details_map([item_code]).get(item_code, [])
+
+
+def get_used_long_term_reserve_details_map(item_codes):
+	"""
+	get_used_long_term_reserve_details'in toplu versiyonu: {item_code: [detay, ...]}
+	"""
+	if not item_codes:
+		return {}
+
 	rows = frappe.db.sql(
 		"""
-        SELECT ltru.sales_order, ltru.parent_sales_order, ltru.used_qty, ltru.usage_date, so.customer, IFNULL(so.custom_end_customer, '') as custom_end_customer
+        SELECT ltru.item_code, ltru.sales_order, ltru.parent_sales_order, ltru.used_qty, ltru.usage_date, so.customer, IFNULL(so.custom_end_customer, '') as custom_end_customer
         FROM `tabLong Term Reserve Usage` ltru
         INNER JOIN `tabSales Order` so ON ltru.sales_order = so.name
-        WHERE ltru.item_code = %s
+        WHERE ltru.item_code IN %s
     """,
-		(item_code,),
+		(tuple(item_codes),),
 		as_dict=True,
 	)
+	details_map = {}
 	for row in rows:
-		if not row.get("custom_end_customer") and row.get("sales_order"):
-			row["custom_end_customer"] = (
-				frappe.db.get_value(
-					"Sales Order", row["sales_order"], "custom_end_customer"
-				)
-				or ""
-			)
-	return rows
+		details_map.setdefault(row.pop("item_code"), []).append(row)
+	return details_map
 
 
 def update_or_delete_reserved_raw_material(row_name, consume_qty):
@@ -741,7 +656,8 @@ def create_reserved_raw_materials_on_submit(doc, method):
 			doc, "parent_sales_order", None
 		):
 			return
-		raw_materials = get_sales_order_raw_materials(doc.name)
+		# Rezerv için sadece ihtiyaç miktarı gerekli; stok/talep detayları hesaplanmaz
+		raw_materials = explode_sales_order_items(doc.items).values()
 		for row in raw_materials:
 			upsert_reserved_raw_material(
 				sales_order=doc.name,
@@ -823,49 +739,48 @@ def check_long_term_reserve_availability(sales_order):
 	is_long_term_child = getattr(so, "is_long_term_child", 0)
 	parent_sales_order = getattr(so, "parent_sales_order", None)
 	raw_materials = get_sales_order_raw_materials(sales_order)
+	if not raw_materials:
+		return []
+	item_codes = [row.get("raw_material") for row in raw_materials]
+	if is_long_term_child and parent_sales_order:
+		parent_rezerv_map = {
+			item_code: qty
+			for (so_name, item_code), qty in get_rezerv_map(item_codes).items()
+			if so_name == parent_sales_order
+		}
+		usage_rows = frappe.db.sql(
+			"""
+            SELECT item_code, SUM(used_qty) as used_qty FROM `tabLong Term Reserve Usage`
+            WHERE (sales_order = %s OR parent_sales_order = %s) AND item_code IN %s
+            GROUP BY item_code
+        """,
+			(parent_sales_order, parent_sales_order, tuple(item_codes)),
+			as_dict=True,
+		)
+	else:
+		usage_rows = frappe.db.sql(
+			"""
+            SELECT item_code, SUM(used_qty) as used_qty FROM `tabLong Term Reserve Usage`
+            WHERE item_code IN %s
+            GROUP BY item_code
+        """,
+			(tuple(item_codes),),
+			as_dict=True,
+		)
+	total_usage_map = {row.item_code: get_real_qty(row.used_qty) for row in usage_rows}
 	recommendations = []
 	for row in raw_materials:
 		acik_miktar = get_real_qty(row.get("acik_miktar", 0) or 0)
 		item_code = row.get("raw_material")
+		total_usage = total_usage_map.get(item_code, 0)
 		if is_long_term_child and parent_sales_order:
-			parent_so = parent_sales_order
-			parent_rezerv = get_real_qty(
-				frappe.db.get_value(
-					"Rezerved Raw Materials",
-					{"sales_order": parent_so, "item_code": item_code},
-					"quantity",
-				)
-			)
-			total_usage = get_real_qty(
-				frappe.db.sql(
-					"""
-                SELECT SUM(used_qty) FROM `tabLong Term Reserve Usage`
-                WHERE (sales_order = %s OR parent_sales_order = %s) AND item_code = %s
-            """,
-					(parent_so, parent_so, item_code),
-				)[0][0]
-			)
-			kalan_kullanilabilir = max(parent_rezerv - total_usage, 0)
-			onerilen_kullanim = min(acik_miktar, kalan_kullanilabilir)
+			parent_rezerv = parent_rezerv_map.get(item_code, 0)
 		else:
-			# Bağımsız siparişler için sistemdeki tüm aktif uzun vadeli rezervleri item_code bazında bul
-			# parent_rezerv = get_long_term_reserve_qty(item_code)
-			parent_rezerv_result = get_long_term_reserve_details(item_code)
-			parent_rezerv = (
-				parent_rezerv_result[0].quantity if parent_rezerv_result else 0
-			)
-
-			total_usage = get_real_qty(
-				frappe.db.sql(
-					"""
-                SELECT SUM(used_qty) FROM `tabLong Term Reserve Usage`
-                WHERE item_code = %s
-            """,
-					(item_code,),
-				)[0][0]
-			)
-			kalan_kullanilabilir = max(parent_rezerv - total_usage, 0)
-			onerilen_kullanim = min(acik_miktar, kalan_kullanilabilir)
+			# Bağımsız siparişler için sistemdeki aktif uzun vadeli rezervler (detaylar zaten satırda mevcut)
+			long_term_details = row.get("long_term_details") or []
+			parent_rezerv = long_term_details[0].quantity if long_term_details else 0
+		kalan_kullanilabilir = max(parent_rezerv - total_usage, 0)
+		onerilen_kullanim = min(acik_miktar, kalan_kullanilabilir)
 		if acik_miktar > 0 and parent_rezerv > 0 and onerilen_kullanim > 0:
 			recommendations.append(
 				{
@@ -1087,6 +1002,7 @@ def use_long_term_reserve_bulk(sales_order, usage_data):
 					customer=getattr(so, "customer", ""),
 					end_customer=getattr(so, "custom_end_customer", ""),
 				)
+		queue_availability_refresh(str(usage.get("item_code")).strip() for usage in usage_list)
 		frappe.db.commit()
 		return {
 			"success": True,
@@ -1145,6 +1061,7 @@ def clear_remaining_reserves(parent_sales_order, reason=None):
 			frappe.delete_doc(
 				"Rezerved Raw Materials", row["name"], ignore_permissions=True
 			)
+		queue_availability_refresh(row["item_code"] for row in rezervler)
 		frappe.db.commit()
 		return {"success": True, "message": "Kalan uzun vadeli rezervler silindi."}
 	except Exception:
@@ -1213,32 +1130,26 @@ def handle_child_sales_order_reserves(doc, method):
 		return
 
 	parent_so = doc.parent_sales_order
-	# 1. Child'ın tüm item'ları için BOM'dan çıkan hammaddeleri ve miktarlarını topla
-	toplam_ihtiyac = {}
-	for item in doc.items:
-		bom = frappe.db.get_value(
-			"BOM", {"item": item.item_code, "is_active": 1, "is_default": 1}, "name"
-		)
-		if not bom:
-			continue
-		bom_doc = frappe.get_doc("BOM", bom)
-		for rm in bom_doc.items:
-			hammadde_code = str(rm.item_code).strip()
-			# ÖNEMLİ: BOM Item'da qty UOM cinsinden, stock_qty stok birimi cinsinden. Stok hesaplamaları için stock_qty kullanılmalı
-			# stock_qty yoksa veya 0 ise qty kullan (fallback)
-			rm_stock_qty = get_real_qty(rm.stock_qty if hasattr(rm, 'stock_qty') and rm.stock_qty and rm.stock_qty > 0 else rm.qty)
-			item_stock_qty = get_real_qty(item.stock_qty if hasattr(item, 'stock_qty') and item.stock_qty and item.stock_qty > 0 else item.qty)
-			ihtiyac = get_real_qty(rm_stock_qty * item_stock_qty)
-			toplam_ihtiyac[hammadde_code] = toplam_ihtiyac.get(hammadde_code, 0) + ihtiyac
+	# 1. Child'ın tüm item'ları için BOM'dan çıkan hammaddeleri ve miktarlarını toplu patlatma ile topla
+	toplam_ihtiyac = {
+		code: data["qty"] for code, data in explode_sales_order_items(doc.items).items()
+	}
+	if not toplam_ihtiyac:
+		return
+	# Parent rezervleri tek sorguda çek
+	parent_reserve_map = {}
+	for row in frappe.get_all(
+		"Rezerved Raw Materials",
+		filters={"sales_order": parent_so, "item_code": ["in", list(toplam_ihtiyac)]},
+		fields=["name", "item_code", "quantity"],
+		order_by="creation asc",
+	):
+		parent_reserve_map.setdefault(row.item_code, []).append(row)
 	# 2. Her hammadde için parent rezervde yeterli miktar var mı kontrol et
 	for hammadde_code, ihtiyac_raw in toplam_ihtiyac.items():
 		# İhtiyaç ve mevcut rezerv hesaplamalarını 5 basamak hassasiyetle yap
 		ihtiyac = get_real_qty(ihtiyac_raw, precision=5)
-		parent_reserve = frappe.get_all(
-			"Rezerved Raw Materials",
-			filters={"sales_order": parent_so, "item_code": hammadde_code},
-			fields=["name", "quantity"],
-		)
+		parent_reserve = parent_reserve_map.get(hammadde_code)
 		if parent_reserve:
 			mevcut_rezerv = get_real_qty(parent_reserve[0]["quantity"], precision=5)
 			# Eski 2 basamaklı kayıtlarla uyum için: 2 haneye yuvarlandığında eşitse
@@ -1511,119 +1422,137 @@ def cleanup_unused_reserves():
     frappe.logger().info(f"Rezerv Temizlik: {deleted} satır silindi.")
     return f"{deleted} rezerve satırı silindi."
 
-@frappe.whitelist()
-def create_material_request_for_all_shortages():
+
+def get_all_order_shortages():
     """
-    Tüm Siparişlere Ait Eksikler İçin Satınalma Talebi Oluştur butonu için:
-    ULTRA OPTIMIZE EDİLDİ: Tek sorgu ile tüm eksik hammaddeleri hesaplar.
-    Cam ürünleri (item_group="Camlar") eklenmez, ama cam ürünlerinin BOM'undaki hammaddeler eklenir.
-    Aynı üründen birden fazla satır oluşturmaz, toplam miktarı birleştirir.
+    Tüm onaylı siparişler için hammadde eksiklerini tek bir gruplu sorgu ile hesaplar.
+    İhtiyaç, rezerv, stok, bekleyen talep ve bekleyen satınalma siparişi item bazında
+    türetilmiş tablolarda bir kez toplanır ve hammadde listesine tek seferde JOIN edilir.
+    Cam hammaddeleri (item_group="Camlar") hariç tutulur.
     """
-    try:
-        # SATIŞ SİPARİŞİ MANTIĞI: Tüm onaylı siparişler için BOM'dan toplam ihtiyaç hesapla
-        # Satış siparişi formunda: qty = bu sipariş için BOM'dan hesaplanan ihtiyaç
-        # Burada: total_needed = tüm onaylı siparişler için BOM'dan hesaplanan toplam ihtiyaç
-        item_rows = frappe.db.sql("""
-            SELECT DISTINCT 
+    rows = frappe.db.sql("""
+        SELECT
+            needs.item_code as raw_material,
+            needs.item_name,
+            needs.stock_uom,
+            needs.total_needed,
+            COALESCE(stock.total_stock, 0) as total_stock,
+            COALESCE(reserves.total_reserved, 0) as total_reserved,
+            COALESCE(mr.pending_mr_qty, 0) as pending_mr_qty,
+            COALESCE(po.pending_po_qty, 0) as pending_po_qty
+        FROM (
+            -- Tüm onaylı siparişler için BOM'dan toplam ihtiyaç
+            -- ÖNEMLİ: BOM Item'da qty UOM cinsinden, stock_qty stok birimi cinsinden
+            SELECT
                 bi.item_code,
                 i.item_name,
-                i.stock_uom
+                i.stock_uom,
+                SUM(COALESCE(bi.stock_qty, bi.qty) * COALESCE(soi.stock_qty, soi.qty)) as total_needed
             FROM `tabSales Order` so
             INNER JOIN `tabSales Order Item` soi ON soi.parent = so.name
-            INNER JOIN `tabBOM` b ON b.item = soi.item_code 
+            INNER JOIN `tabBOM` b ON b.item = soi.item_code
                 AND b.is_active = 1 AND b.is_default = 1
             INNER JOIN `tabBOM Item` bi ON bi.parent = b.name
             INNER JOIN `tabItem` i ON i.item_code = bi.item_code
             WHERE so.docstatus = 1  -- Sadece onaylı siparişler
-                AND i.is_stock_item = 1 
+                AND i.is_stock_item = 1
                 AND i.is_purchase_item = 1
-                AND LOWER(COALESCE(i.item_group, '')) != 'camlar'  -- Cam hammaddeleri hariç
-        """, as_dict=True)
-        
-        shortage_data = []
-        for item_row in item_rows:
-            item_code = item_row['item_code']
-            
-            # SATIŞ SİPARİŞİ MANTIĞI: BOM'dan toplam ihtiyaç hesapla (tüm onaylı siparişler için)
-            # ÖNEMLİ: BOM Item'da qty UOM cinsinden, stock_qty stok birimi cinsinden. Stok hesaplamaları için stock_qty kullanılmalı
-            total_needed_rows = frappe.db.sql("""
-                SELECT 
-                    SUM(COALESCE(bi.stock_qty, bi.qty) * COALESCE(soi.stock_qty, soi.qty)) as total_needed
-                FROM `tabSales Order` so
-                INNER JOIN `tabSales Order Item` soi ON soi.parent = so.name
-                INNER JOIN `tabBOM` b ON b.item = soi.item_code 
-                    AND b.is_active = 1 AND b.is_default = 1
-                INNER JOIN `tabBOM Item` bi ON bi.parent = b.name
-                WHERE bi.item_code = %s
-                    AND so.docstatus = 1  -- Sadece onaylı siparişler
-            """, (item_code,), as_dict=True)
-            total_needed = get_real_qty(total_needed_rows[0]['total_needed'] if total_needed_rows and total_needed_rows[0]['total_needed'] else 0)
-            
-            # Toplam rezerv (sadece onaylı siparişler için) - sistemdeki tüm rezervlerin toplamı
-            total_reserved_rows = frappe.db.sql("""
-                SELECT SUM(rrm.quantity) as total_reserved
-                FROM `tabRezerved Raw Materials` rrm
-                INNER JOIN `tabSales Order` so ON so.name = rrm.sales_order
-                WHERE rrm.item_code = %s AND so.docstatus = 1
-            """, (item_code,), as_dict=True)
-            total_reserved = get_real_qty(total_reserved_rows[0]['total_reserved'] if total_reserved_rows and total_reserved_rows[0]['total_reserved'] else 0)
-            
-            # Toplam stok
-            total_stock_rows = frappe.db.sql("""
-                SELECT SUM(actual_qty) as total_stock
-                FROM `tabBin`
-                WHERE item_code = %s
-            """, (item_code,), as_dict=True)
-            total_stock = get_real_qty(total_stock_rows[0]['total_stock'] if total_stock_rows and total_stock_rows[0]['total_stock'] else 0)
-            
-            # Mevcut malzeme talepleri (karşılanmamış - sipariş edilmemiş kısım) - TÜM siparişler için
-            pending_mr_rows = frappe.db.sql("""
-                SELECT SUM(GREATEST(0, COALESCE(mri.stock_qty, mri.qty) - COALESCE(mri.ordered_qty, 0))) as pending_qty
-                FROM `tabMaterial Request Item` mri
-                INNER JOIN `tabMaterial Request` mr ON mri.parent = mr.name
-                WHERE mri.item_code = %s
-                    AND mr.material_request_type = 'Purchase'
-                    AND mr.docstatus IN (0, 1)
-                    AND mr.status NOT IN ('Cancelled', 'Received')
-            """, (item_code,), as_dict=True)
-            pending_mr_qty = get_real_qty(pending_mr_rows[0]['pending_qty'] if pending_mr_rows and pending_mr_rows[0]['pending_qty'] else 0)
-            
-            # Satınalma siparişleri (teslim alınmamış kısım) - TÜM siparişler için
-            pending_po_rows = frappe.db.sql("""
-                SELECT SUM(GREATEST(0, poi.qty - COALESCE(poi.received_qty, 0))) as pending_qty
-                FROM `tabPurchase Order Item` poi
-                INNER JOIN `tabPurchase Order` po ON poi.parent = po.name
-                WHERE poi.item_code = %s
-                    AND po.docstatus IN (0, 1)
-                    AND po.status NOT IN ('Cancelled', 'Completed')
-            """, (item_code,), as_dict=True)
-            pending_po_qty = get_real_qty(pending_po_rows[0]['pending_qty'] if pending_po_rows and pending_po_rows[0]['pending_qty'] else 0)
-            
-            # SATIŞ SİPARİŞİ MANTIĞI: kullanilabilir_stok = toplam_stok - toplam_rezerv
-            available_stock = total_stock - total_reserved
-            
-            # SATIŞ SİPARİŞİ MANTIĞI: acik_miktar = max(qty - kullanilabilir_stok - pending_mr_qty - pending_po_qty, 0)
-            # Satış siparişinde: qty = bu sipariş için BOM'dan hesaplanan ihtiyaç (total_reserved ile eşit)
-            # Rapor sayfası ve burada: qty yerine total_reserved kullanılır (tüm onaylı siparişler için toplam rezerv)
-            # DOĞRU FORMÜL: Açık miktar = Rezerv edilen miktar - Mevcut stok - Mevcut talep - Satınalma siparişi
-            shortage = max(0, total_reserved - total_stock - pending_mr_qty - pending_po_qty)
-            
-            if shortage > 0.0001:
-                shortage_data.append({
-                    'raw_material': item_code,
-                    'total_needed': total_needed,  # BOM'dan hesaplanan toplam ihtiyaç
-                    'total_stock': total_stock,
-                    'total_reserved': total_reserved,
-                    'pending_mr_qty': pending_mr_qty,
-                    'pending_po_qty': pending_po_qty,
-                    'available_stock': available_stock,
-                    'shortage': shortage
-                })
-        
-        # Sıralama
-        shortage_data.sort(key=lambda x: get_real_qty(x.get('shortage', 0)), reverse=True)
+                AND COALESCE(i.item_group, '') != 'Camlar'  -- Cam hammaddeleri hariç
+            GROUP BY bi.item_code, i.item_name, i.stock_uom
+        ) needs
+        LEFT JOIN (
+            -- Toplam rezerv (sadece onaylı siparişler için)
+            SELECT rrm.item_code, SUM(rrm.quantity) as total_reserved
+            FROM `tabRezerved Raw Materials` rrm
+            INNER JOIN `tabSales Order` so ON so.name = rrm.sales_order
+            WHERE so.docstatus = 1
+            GROUP BY rrm.item_code
+        ) reserves ON reserves.item_code = needs.item_code
+        LEFT JOIN (
+            SELECT item_code, SUM(actual_qty) as total_stock
+            FROM `tabBin`
+            GROUP BY item_code
+        ) stock ON stock.item_code = needs.item_code
+        LEFT JOIN (
+            -- Mevcut malzeme talepleri (karşılanmamış - sipariş edilmemiş kısım)
+            SELECT mri.item_code,
+                SUM(GREATEST(0, COALESCE(mri.stock_qty, mri.qty) - COALESCE(mri.ordered_qty, 0))) as pending_mr_qty
+            FROM `tabMaterial Request Item` mri
+            INNER JOIN `tabMaterial Request` mr ON mri.parent = mr.name
+            WHERE mr.material_request_type = 'Purchase'
+                AND mr.docstatus IN (0, 1)
+                AND mr.status NOT IN ('Cancelled', 'Received')
+            GROUP BY mri.item_code
+        ) mr ON mr.item_code = needs.item_code
+        LEFT JOIN (
+            -- Satınalma siparişleri (teslim alınmamış kısım)
+            SELECT poi.item_code,
+                SUM(GREATEST(0, poi.qty - COALESCE(poi.received_qty, 0))) as pending_po_qty
+            FROM `tabPurchase Order Item` poi
+            INNER JOIN `tabPurchase Order` po ON poi.parent = po.name
+            WHERE po.docstatus IN (0, 1)
+                AND po.status NOT IN ('Cancelled', 'Completed')
+            GROUP BY poi.item_code
+        ) po ON po.item_code = needs.item_code
+    """, as_dict=True)
 
-        if not shortage_data:
+    shortage_data = []
+    for row in rows:
+        total_stock = get_real_qty(row.total_stock)
+        total_reserved = get_real_qty(row.total_reserved)
+        pending_mr_qty = get_real_qty(row.pending_mr_qty)
+        pending_po_qty = get_real_qty(row.pending_po_qty)
+        # DOĞRU FORMÜL: Açık miktar = Rezerv edilen miktar - Mevcut stok - Mevcut talep - Satınalma siparişi
+        shortage = max(0, total_reserved - total_stock - pending_mr_qty - pending_po_qty)
+        if shortage > 0.0001:
+            shortage_data.append({
+                'raw_material': row.raw_material,
+                'item_name': row.item_name,
+                'stock_uom': row.stock_uom,
+                'total_needed': get_real_qty(row.total_needed),  # BOM'dan hesaplanan toplam ihtiyaç
+                'total_stock': total_stock,
+                'total_reserved': total_reserved,
+                'pending_mr_qty': pending_mr_qty,
+                'pending_po_qty': pending_po_qty,
+                'available_stock': total_stock - total_reserved,
+                'shortage': get_real_qty(shortage),
+            })
+
+    shortage_data.sort(key=lambda x: x['shortage'], reverse=True)
+    return shortage_data
+
+
+@frappe.whitelist()
+def create_material_request_for_all_shortages(dry_run=0):
+    """
+    Tüm Siparişlere Ait Eksikler İçin Satınalma Talebi Oluştur butonu için:
+    Eksikler get_all_order_shortages() ile tek gruplu sorguda hesaplanır.
+    Cam ürünleri (item_group="Camlar") eklenmez, ama cam ürünlerinin BOM'undaki hammaddeler eklenir.
+    Aynı üründen birden fazla satır oluşturmaz, toplam miktarı birleştirir.
+    dry_run=1 ise talep oluşturulmaz; birleştirilmiş eksik listesi ve süre bilgisi döner.
+    """
+    dry_run = cint(dry_run)
+    start_time = time.time()
+    try:
+        shortage_data = get_all_order_shortages()
+        query_time = time.time() - start_time
+
+        # Consolidated items - sorgu item bazında gruplu olduğu için her ürün tek satır
+        consolidated_items = {row['raw_material']: row['shortage'] for row in shortage_data}
+
+        if dry_run:
+            return {
+                "success": True,
+                "dry_run": True,
+                "message": f"Tüm siparişlere ait {len(consolidated_items)} kalem hammadde eksiği bulundu (talep oluşturulmadı).",
+                "mr_name": None,
+                "created_rows": consolidated_items,
+                "shortages": shortage_data,
+                "query_time": round(query_time, 3),
+                "execution_time": round(time.time() - start_time, 3),
+            }
+
+        if not consolidated_items:
             return {
                 "success": True,
                 "message": "Tüm siparişlere ait eksik hammadde yok, talep oluşturulmadı.",
@@ -1640,26 +1569,6 @@ def create_material_request_for_all_shortages():
         if not company:
             return {"success": False, "message": "Aktif satış siparişi bulunamadı."}
 
-        # Consolidated items - aynı üründen birden fazla satır olmasın
-        consolidated_items = {}
-        for row in shortage_data:
-            item_code = row['raw_material']
-            shortage_qty = get_real_qty(row['shortage'])
-            
-            if shortage_qty > 0:
-                if item_code in consolidated_items:
-                    consolidated_items[item_code] += shortage_qty
-                else:
-                    consolidated_items[item_code] = shortage_qty
-
-        if not consolidated_items:
-            return {
-                "success": True,
-                "message": "Tüm siparişlere ait eksik hammadde yok, talep oluşturulmadı.",
-                "mr_name": None,
-                "created_rows": {},
-            }
-
         # Material Request oluştur
         mr = frappe.new_doc("Material Request")
         mr.material_request_type = "Purchase"
@@ -1677,12 +1586,19 @@ def create_material_request_for_all_shortages():
         
         mr.insert(ignore_permissions=True)
         mr.submit()
+
+        execution_time = time.time() - start_time
+        frappe.logger().info(
+            f"create_material_request_for_all_shortages: {len(consolidated_items)} kalem, "
+            f"sorgu {query_time:.2f}s, toplam {execution_time:.2f}s"
+        )
         
         return {
             "success": True,
             "message": f"Tüm siparişlere ait {len(consolidated_items)} kalem hammadde eksiklerine ait satınalma talebi başarıyla oluşturuldu. {mr.name}",
             "mr_name": mr.name,
             "created_rows": consolidated_items,
+            "execution_time": round(execution_time, 3),
         }
     except Exception as e:
         frappe.log_error("create_material_request_for_all_shortages HATA", frappe.get_traceback())
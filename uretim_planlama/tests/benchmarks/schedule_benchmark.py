@@ -0,0 +1,121 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+"""
+Haftalık üretim takvimi performans ölçümü
+
+Geçici bir iş istasyonu, iş emirleri ve operasyonlar (varsayılan 20.000) oluşturur,
+get_weekly_production_schedule ve tek sorguluk operasyon okumasının süresini ölçer.
+Tüm veriler tek transaction içinde oluşturulur ve ölçüm sonunda geri alınır.
+
+Kullanım:
+    bench --site sitename execute uretim_planlama.tests.benchmarks.schedule_benchmark.benchmark_weekly_schedule --kwargs "{'operations': 20000}"
+"""
+
+import time
+from datetime import datetime, timedelta
+
+import frappe
+from frappe.utils import getdate, now
+
+from uretim_planlama.uretim_planlama.api.db_utils import upsert_rows
+from uretim_planlama.uretim_planlama.api.production_planning import (
+	_fetch_schedule_operations,
+	get_weekly_production_schedule,
+)
+
+BENCH_PREFIX = "BENCH-SCHEDULE"
+
+
+def _create_fixture(operations, ops_per_work_order, week_start):
+	"""Geçici iş istasyonu, iş emri ve operasyon satırlarını oluşturur."""
+	timestamp = now()
+	user = frappe.session.user
+	workstation = f"{BENCH_PREFIX}-WS"
+
+	upsert_rows(
+		"Workstation",
+		("name", "workstation_name", "creation", "modified", "owner", "modified_by"),
+		[(workstation, workstation, timestamp, timestamp, user, user)],
+	)
+	upsert_rows(
+		"Workstation Working Hour",
+		("name", "parent", "parenttype", "parentfield", "idx", "start_time", "end_time", "enabled",
+			"creation", "modified", "owner", "modified_by"),
+		[(f"{BENCH_PREFIX}-WH", workstation, "Workstation", "working_hours", 1, "08:00:00", "18:00:00", 1,
+			timestamp, timestamp, user, user)],
+	)
+
+	work_order_count = max(operations // ops_per_work_order, 1)
+	work_orders = [
+		(f"{BENCH_PREFIX}-WO-{i:06d}", f"{BENCH_PREFIX}-ITEM", f"{BENCH_PREFIX} Ürün", 1,
+			timestamp, timestamp, user, user)
+		for i in range(work_order_count)
+	]
+	upsert_rows(
+		"Work Order",
+		("name", "production_item", "item_name", "docstatus", "creation", "modified", "owner", "modified_by"),
+		work_orders,
+	)
+
+	# Operasyonlar haftanın 7 gününe dağıtılır; bir kısmının bitiş zamanı boş bırakılır
+	week_start_dt = datetime.combine(week_start, datetime.min.time())
+	ops = []
+	for i in range(operations):
+		start = week_start_dt + timedelta(days=i % 7, hours=8 + (i % 10))
+		end = None if i % 10 == 0 else start + timedelta(minutes=45)
+		ops.append((
+			f"{BENCH_PREFIX}-OP-{i:07d}", work_orders[i % work_order_count][0], "Work Order", "operations",
+			i // work_order_count + 1, f"{BENCH_PREFIX}-OPERATION", workstation, start, end, "Pending", 45, 0,
+			timestamp, timestamp, user, user,
+		))
+	upsert_rows(
+		"Work Order Operation",
+		("name", "parent", "parenttype", "parentfield", "idx", "operation", "workstation",
+			"planned_start_time", "planned_end_time", "status", "time_in_mins", "completed_qty",
+			"creation", "modified", "owner", "modified_by"),
+		ops,
+	)
+	return workstation
+
+
+def benchmark_weekly_schedule(operations=20000, ops_per_work_order=10, week_start=None, repeat=3):
+	"""
+	Geçici veri üzerinde haftalık takvim sorgularını ölçer ve sonuçları döndürür.
+	Oluşturulan tüm veriler ölçüm sonunda rollback ile geri alınır.
+	"""
+	week_start = getdate(week_start) if week_start else getdate()
+	week_start -= timedelta(days=week_start.weekday())
+	week_end = week_start + timedelta(days=6)
+	result = {"operations": int(operations), "week_start": str(week_start), "week_end": str(week_end)}
+
+	try:
+		start_time = time.time()
+		workstation = _create_fixture(int(operations), int(ops_per_work_order), week_start)
+		result["fixture_seconds"] = round(time.time() - start_time, 3)
+
+		fetch_timings = []
+		for _ in range(int(repeat)):
+			start_time = time.time()
+			rows = _fetch_schedule_operations(week_start, week_end, workstation)
+			fetch_timings.append(round(time.time() - start_time, 3))
+		result["fetched_operations"] = len(rows)
+		result["fetch_seconds"] = fetch_timings
+
+		schedule_timings = []
+		for _ in range(int(repeat)):
+			start_time = time.time()
+			schedule = get_weekly_production_schedule(
+				week_start=str(week_start), week_end=str(week_end), workstation=workstation
+			)
+			schedule_timings.append(round(time.time() - start_time, 3))
+		result["scheduled_operations"] = sum(ws["total_operations"] for ws in schedule["workstations"])
+		result["schedule_seconds"] = schedule_timings
+	finally:
+		frappe.db.rollback()
+
+	print(
+		f"{result['operations']} operasyon: tek sorgu {min(result.get('fetch_seconds') or [0])}s, "
+		f"haftalık takvim {min(result.get('schedule_seconds') or [0])}s"
+	)
+	return result
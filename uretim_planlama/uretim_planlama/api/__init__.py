@@ -23,6 +23,8 @@ from uretim_planlama.uretim_planlama.api.profile_stock_api import (
 
 # Warehouse stock value report
 from uretim_planlama.uretim_planlama.api.stock_value_report import (
+    get_warehouse_stock_items,
+    get_warehouse_stock_summary,
     get_warehouse_stock_value,
 )
 
@@ -95,6 +97,8 @@ __all__ = [
     "get_profile_stock_panel",
     # Warehouse Stock Value
     "get_warehouse_stock_value",
+    "get_warehouse_stock_summary",
+    "get_warehouse_stock_items",
     # Cache
     "clear_profile_groups_cache",
     "get_cache_info",
@@ -0,0 +1,184 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+"""
+Aksesuar malzeme ihtiyacı servisi (Accessory Delivery Package)
+
+- Aksesuar ürün grupları (ACCESSORY_GROUP_ROOTS ve tüm alt grupları) Item Group ağacının
+  lft/rgt aralığından bir kez çözülür ve süreç seviyesinde, site bazında tutulur. Item Group değişiklikleri
+  Redis'teki sürüm anahtarını değiştirir; her süreç bir sonraki okumada önbelleği yeniler.
+- Birden çok Sales Order'ın Production Plan Item'ları tek sorguda okunur; BOM'lar seviye
+  seviye patlatılır (her seviye tek sorgu). Aksesuar grubundaki kalemler toplanır, alt
+  montaj BOM'u olan diğer kalemler bir sonraki seviyeye aktarılır.
+- Böylece sevkiyat bir tır dolusu sipariş için paketleri tek çağrıda hazırlayabilir.
+"""
+
+import frappe
+from frappe.utils import flt
+
+VERSION_KEY = "uretim_planlama:accessory_groups_version"
+
+# Aksesuar ağaçlarının kök grupları (büyük/küçük harf duyarsız eşleşir)
+ACCESSORY_GROUP_ROOTS = ("montaj ve izolasyon", "pvc kolları", "pvc montaj aksesuarları")
+
+# Alt montaj döngülerine karşı en fazla patlatma derinliği
+MAX_BOM_DEPTH = 10
+
+# Accessory Delivery Package assembly_items tablosunun kullandığı PPI kolonları
+PPI_FIELDS = (
+	"sales_order", "item_code", "bom_no", "custom_mtul_per_piece", "custom_serial", "custom_color",
+	"custom_workstation", "planned_qty", "stock_uom", "warehouse", "planned_start_date",
+	"pending_qty", "ordered_qty", "produced_qty",
+)
+
+# Site adı -> önbellek; aynı süreç birden çok siteye hizmet verebilir
+_groups = {}
+
+
+def _site_groups():
+	return _groups.setdefault(frappe.local.site, {"version": None, "map": None})
+
+
+def get_accessory_groups():
+	"""
+	Aksesuar ağaçlarındaki tüm grupları döndürür (önbellekli).
+	Dönüş: {item_group: parent_item_group}
+	"""
+	groups = _site_groups()
+	version = frappe.cache().get_value(VERSION_KEY)
+	if groups["map"] is None or groups["version"] != version:
+		groups["map"] = {
+			row.name: row.parent_item_group
+			for row in frappe.db.sql(
+				"""
+				SELECT DISTINCT ig.name, ig.parent_item_group
+				FROM `tabItem Group` root
+				INNER JOIN `tabItem Group` ig ON ig.lft >= root.lft AND ig.rgt <= root.rgt
+				WHERE LOWER(root.name) IN %s
+				""",
+				(ACCESSORY_GROUP_ROOTS,),
+				as_dict=True,
+			)
+		}
+		groups["version"] = version
+	return groups["map"]
+
+
+def invalidate_accessory_groups(doc=None, method=None):
+	"""Item Group doc_events hook'u: tüm süreçlerdeki aksesuar grup önbelleğini geçersiz kılar."""
+
+	def _bump_version():
+		_site_groups()["map"] = None
+		frappe.cache().set_value(VERSION_KEY, frappe.generate_hash(length=8))
+
+	# Ağaç (lft/rgt) commit ile kesinleşir; commit sonrası tekrar geçersiz kıl
+	_bump_version()
+	frappe.db.after_commit.add(_bump_version)
+
+
+def get_production_plan_items(sales_orders):
+	"""Sales Order'ların Production Plan Item'larını (sadece gerekli kolonlar) tek sorguda okur."""
+	return frappe.db.sql(
+		f"""
+		SELECT {", ".join(f"ppi.`{field}`" for field in PPI_FIELDS)}
+		FROM `tabProduction Plan Item` ppi
+		WHERE ppi.sales_order IN %s
+		ORDER BY ppi.sales_order, ppi.parent, ppi.idx
+		""",
+		(tuple(sales_orders),),
+		as_dict=True,
+	)
+
+
+def _get_bom_items(bom_names):
+	"""BOM kalemlerini BOM birim miktarına bölünmüş miktarla tek sorguda okur."""
+	return frappe.db.sql(
+		"""
+		SELECT
+			bi.parent AS bom, bi.item_code, bi.item_name, bi.bom_no, bi.do_not_explode,
+			bi.qty / bom.quantity AS qty_per_unit,
+			i.item_group, i.stock_uom
+		FROM `tabBOM Item` bi
+		INNER JOIN `tabBOM` bom ON bom.name = bi.parent
+		INNER JOIN `tabItem` i ON i.name = bi.item_code
+		WHERE bi.parent IN %s AND bi.parenttype = 'BOM'
+		""",
+		(tuple(bom_names),),
+		as_dict=True,
+	)
+
+
+def explode_accessory_materials(ppi_items):
+	"""
+	PPI satırlarının BOM'larını çok seviyeli patlatıp aksesuar ihtiyacını Sales Order bazında toplar.
+	Dönüş: {sales_order: [{"item_code", "item_name", "qty", "item_group", "parent_item_group", "uom"}, ...]}
+	"""
+	accessory_groups = get_accessory_groups()
+	if not accessory_groups:
+		return {}
+
+	# Seviye girdisi: {bom: {sales_order: üretilecek BOM birimi}}
+	frontier = {}
+	for ppi in ppi_items:
+		if ppi.bom_no and flt(ppi.planned_qty):
+			by_so = frontier.setdefault(ppi.bom_no, {})
+			by_so[ppi.sales_order] = by_so.get(ppi.sales_order, 0) + flt(ppi.planned_qty)
+
+	totals = {}
+	item_details = {}
+	for _depth in range(MAX_BOM_DEPTH):
+		if not frontier:
+			break
+		next_frontier = {}
+		for bi in _get_bom_items(frontier):
+			for sales_order, bom_qty in frontier[bi.bom].items():
+				qty = flt(bi.qty_per_unit) * bom_qty
+				if bi.item_group in accessory_groups:
+					key = (sales_order, bi.item_code)
+					totals[key] = totals.get(key, 0) + qty
+					item_details.setdefault(bi.item_code, bi)
+				elif bi.bom_no and not bi.do_not_explode:
+					by_so = next_frontier.setdefault(bi.bom_no, {})
+					by_so[sales_order] = by_so.get(sales_order, 0) + qty
+		frontier = next_frontier
+
+	if frontier:
+		frappe.log_error(
+			f"BOM patlatma {MAX_BOM_DEPTH} seviyede durduruldu (döngü olabilir): {', '.join(sorted(frontier))}",
+			"Accessory Requirements",
+		)
+
+	materials = {}
+	for (sales_order, item_code), qty in totals.items():
+		item = item_details[item_code]
+		materials.setdefault(sales_order, []).append(
+			frappe._dict(
+				item_code=item_code,
+				item_name=item.item_name,
+				qty=qty,
+				item_group=item.item_group,
+				parent_item_group=accessory_groups.get(item.item_group),
+				uom=item.stock_uom,
+			)
+		)
+	for rows in materials.values():
+		rows.sort(key=lambda row: (row.item_group or "", row.item_code))
+	return materials
+
+
+def get_accessory_requirements(sales_orders):
+	"""
+	Birden çok Sales Order için PPI satırlarını ve aksesuar malzemelerini tek geçişte döndürür.
+	Dönüş: {sales_order: {"ppi_items": [...], "materials": [...]}}
+	"""
+	sales_orders = sorted({so for so in sales_orders or [] if so})
+	if not sales_orders:
+		return {}
+
+	ppi_items = get_production_plan_items(sales_orders)
+	materials = explode_accessory_materials(ppi_items)
+
+	result = {so: {"ppi_items": [], "materials": materials.get(so, [])} for so in sales_orders}
+	for ppi in ppi_items:
+		result[ppi.sales_order]["ppi_items"].append(ppi)
+	return result
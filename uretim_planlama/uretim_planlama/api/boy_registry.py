@@ -0,0 +1,110 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+"""
+Süreç seviyesinde, site bazında Boy kayıt defteri.
+
+Her sitenin tabBoy tablosu bir kez okunup iki sözlükte tutulur:
+- by_name: Boy adı -> sayısal boy (metre)
+- by_mm:   kanonik boy (milimetre, tamsayı) -> Boy adları
+
+Boy ekleme/güncelleme/silme olayları Redis'teki sürüm anahtarını değiştirir; her süreç bir
+sonraki okumada sürüm farkını görüp defteri yeniden kurar. Defterde olmayan değerler
+length_mm indeksi üzerinden tek eşitlik sorgusuyla aranır.
+"""
+
+import frappe
+from frappe.utils import cint, flt
+
+VERSION_KEY = "uretim_planlama:boy_registry_version"
+
+# Site adı -> defter; aynı süreç birden çok siteye hizmet verebilir
+_registries = {}
+
+
+def length_to_mm(length):
+	"""Sayısal boyu (metre) kanonik milimetre tamsayısına çevirir: 6.5 -> 6500"""
+	return cint(round(flt(length) * 1000))
+
+
+def _site_registry():
+	return _registries.setdefault(
+		frappe.local.site, {"loaded": False, "version": None, "by_name": {}, "by_mm": {}}
+	)
+
+
+def _add(name, length):
+	registry = _site_registry()
+	registry["by_name"][name] = flt(length)
+	names = registry["by_mm"].setdefault(length_to_mm(length), [])
+	if name not in names:
+		names.append(name)
+
+
+def _get_registry():
+	"""Sürüm değiştiyse veya hiç yüklenmediyse defteri tabBoy'dan yeniden kurar."""
+	registry = _site_registry()
+	version = frappe.cache().get_value(VERSION_KEY)
+	if not registry["loaded"] or registry["version"] != version:
+		registry["by_name"] = {}
+		registry["by_mm"] = {}
+		for row in frappe.db.sql("SELECT name, length FROM `tabBoy` ORDER BY creation", as_dict=True):
+			_add(row.name, row.length)
+		registry["loaded"] = True
+		registry["version"] = version
+	return registry
+
+
+def get_boy_length(name):
+	"""Boy adının sayısal değerini (metre) döndürür. Bulunamazsa None."""
+	if not name:
+		return None
+	registry = _get_registry()
+	if name in registry["by_name"]:
+		return registry["by_name"][name]
+
+	length = frappe.db.get_value("Boy", name, "length")
+	if length is None:
+		return None
+	_add(name, length)
+	return flt(length)
+
+
+def get_boy_lengths(names):
+	"""Birden çok Boy adının sayısal değerlerini döndürür: {name: length}"""
+	return {name: length for name in set(names) if (length := get_boy_length(name))}
+
+
+def get_boy_names(length):
+	"""Sayısal boya eşit tüm Boy adlarını döndürür (eski '6,5' biçimli adlar dahil)."""
+	length_mm = length_to_mm(length)
+	registry = _get_registry()
+	if length_mm in registry["by_mm"]:
+		return list(registry["by_mm"][length_mm])
+
+	rows = frappe.db.sql(
+		"SELECT name, length FROM `tabBoy` WHERE length_mm = %s ORDER BY creation",
+		(length_mm,),
+		as_dict=True,
+	)
+	for row in rows:
+		_add(row.name, row.length)
+	return [row.name for row in rows]
+
+
+def get_boy_name(length):
+	"""Sayısal boya eşit ilk (en eski) Boy adını döndürür. Bulunamazsa None."""
+	names = get_boy_names(length)
+	return names[0] if names else None
+
+
+def invalidate_boy_registry(doc=None, method=None):
+	"""Boy doc_events hook'u: tüm süreçlerdeki defterleri geçersiz kılar."""
+
+	def _bump_version():
+		_site_registry()["loaded"] = False
+		frappe.cache().set_value(VERSION_KEY, frappe.generate_hash(length=8))
+
+	# Commit öncesi yeniden kurulan defterler yeni kaydı görmeyebilir; commit sonrası tekrar geçersiz kıl
+	_bump_version()
+	frappe.db.after_commit.add(_bump_version)
@@ -4,118 +4,387 @@
 """
 Bulk Profile Stock Import Handler
 
-Bu modül Profile Stock Ledger import işlemleri için özel handler sağlar.
-Import sırasında Profile Entry kayıtları da otomatik oluşturulur.
+Bu modül Profile Stock Ledger import işlemleri için akış (streaming) tabanlı handler sağlar.
+
+- CSV dosyası belleğe alınmadan satır satır okunur
+- Ürün kodları ve Boy değerleri import başında bir kez yüklenen kümelere karşı doğrulanır
+- Geçerli satırlar chunk_size'lık parçalar halinde tek çok satırlı
+  INSERT ... ON DUPLICATE KEY UPDATE qty = qty + VALUES(qty) ile ledger'a eklenir
+- Her parça ilerleme kaydı (tabDefaultValue) ile aynı transaction'da commit edilir;
+  yarıda kalan import son commit edilen parçadan devam ettirilebilir
+- İsteğe bağlı olarak her parça için tarih bazında Profile Entry kayıtları oluşturulur
+  (stok zaten ledger'a yazıldığı için frappe.flags.in_import ile submit edilir)
 
 Kullanım:
     bench --site sitename execute uretim_planlama.api.bulk_profile_import.process_bulk_import --args "{'file_path': '/path/to/file.csv'}"
+
+Arka plan işi:
+    start_bulk_import(file_path) -> import_id
+    get_bulk_import_status(import_id)
+    resume_bulk_import(import_id)
 """
 
 import frappe
 from frappe import _
-from frappe.utils import flt, today
+from frappe.utils import cint, flt, now, today
 import csv
-import io
+import json
+import time
+
+from uretim_planlama.uretim_planlama.api.boy_registry import get_boy_name
+from uretim_planlama.uretim_planlama.api.db_utils import upsert_rows
+from uretim_planlama.uretim_planlama.api.reorder_status import refresh_reorder_status
+from uretim_planlama.uretim_planlama.doctype.profile_stock_ledger.profile_stock_ledger import (
+    LEDGER_ACCUMULATE_UPDATE,
+    LEDGER_COLUMNS,
+)
+from uretim_planlama.uretim_planlama.utils import get_allowed_profile_groups, is_profile_item_group
 
+CHUNK_SIZE = 1000
+STATE_KEY_PREFIX = "profile_stock_import:"
+MAX_ERROR_SAMPLES = 100
+REQUIRED_FIELDS = ['item_code', 'length', 'qty']
 
-def process_bulk_import(file_path, create_profile_entries=True, submit_entries=True):
+
+def process_bulk_import(file_path, create_profile_entries=True, submit_entries=True, chunk_size=CHUNK_SIZE, import_id=None):
     """
-    Profile Stock Ledger bulk import işlemi yapar ve Profile Entry kayıtları oluşturur.
-    
+    Profile Stock Ledger bulk import işlemini parça parça commit ederek yapar.
+
     Args:
         file_path (str): CSV dosya yolu
         create_profile_entries (bool): Profile Entry kayıtları oluşturulsun mu?
         submit_entries (bool): Profile Entry kayıtları submit edilsin mi?
+        chunk_size (int): Her commit'te işlenecek satır sayısı
+        import_id (str): Verilirse kayıtlı ilerlemeden devam edilir
     """
+    state = _load_state(import_id) if import_id else None
+    if not state:
+        state = _new_state(import_id or frappe.generate_hash(length=10), file_path, create_profile_entries, submit_entries, chunk_size)
+
     print(f"{'='*60}")
     print(f"BULK PROFILE STOCK IMPORT")
     print(f"{'='*60}")
-    print(f"Dosya: {file_path}")
-    print(f"Profile Entry Oluştur: {'Evet' if create_profile_entries else 'Hayır'}")
-    print(f"Profile Entry Submit: {'Evet' if submit_entries else 'Hayır'}")
+    print(f"Import ID: {state['import_id']}")
+    print(f"Dosya: {state['file_path']}")
+    print(f"Parça boyutu: {state['chunk_size']}")
+    print(f"Profile Entry Oluştur: {'Evet' if state['create_profile_entries'] else 'Hayır'}")
+    print(f"Profile Entry Submit: {'Evet' if state['submit_entries'] else 'Hayır'}")
+    if state['rows_committed']:
+        print(f"↻ {state['rows_committed']} satırdan devam ediliyor")
     print()
-    
+
     try:
-        # CSV dosyasını oku
-        import_data = _read_csv_file(file_path)
-        print(f"📊 {len(import_data)} satır veri okundu")
-        
-        # Verileri grupla (aynı gün için bir Profile Entry)
-        grouped_data = _group_by_date(import_data)
-        print(f"📅 {len(grouped_data)} farklı tarih grubu bulundu")
-        
-        # Profile Stock Ledger kayıtlarını oluştur
-        stock_records = _create_stock_records(import_data)
-        print(f"📦 {len(stock_records)} Profile Stock Ledger kaydı oluşturuldu")
-        
-        # Profile Entry kayıtlarını oluştur (isteğe bağlı)
-        if create_profile_entries:
-            entry_records = _create_profile_entries(grouped_data, submit_entries)
-            print(f"📝 {len(entry_records)} Profile Entry kaydı oluşturuldu")
-        else:
-            entry_records = []
-        
-        # Sonuç raporu
-        _print_import_summary(import_data, stock_records, entry_records)
-        
-        return {
-            "status": "success",
-            "stock_records": len(stock_records),
-            "entry_records": len(entry_records),
-            "total_rows": len(import_data)
-        }
-        
+        state = _run_import(state)
+        _print_import_summary(state)
+        return _get_report(state)
+
     except Exception as e:
+        frappe.db.rollback()
+        state = _load_state(state['import_id']) or state
+        state['status'] = "Failed"
+        state['last_error'] = str(e)
+        _save_state(state)
+        frappe.db.commit()
         frappe.log_error(f"Bulk import hatası: {str(e)}", "Bulk Profile Import Error")
         print(f"❌ Hata: {str(e)}")
         return {
             "status": "error",
-            "error": str(e)
+            "error": str(e),
+            **_get_report(state)
         }
 
 
-def _read_csv_file(file_path):
-    """CSV dosyasını okur ve veriyi döner"""
-    import_data = []
-    
-    with open(file_path, 'r', encoding='utf-8') as file:
-        # CSV header'ını oku
+@frappe.whitelist()
+def start_bulk_import(file_path, create_profile_entries=0, submit_entries=1, chunk_size=CHUNK_SIZE):
+    """Import işini arka planda (long kuyruğu) başlatır. Dönüş: import_id"""
+    frappe.only_for(["System Manager", "Stock Manager"])
+
+    state = _new_state(
+        frappe.generate_hash(length=10), _resolve_file_path(file_path),
+        cint(create_profile_entries), cint(submit_entries), cint(chunk_size) or CHUNK_SIZE
+    )
+    _enqueue(state)
+    return {"import_id": state['import_id'], "status": state['status']}
+
+
+@frappe.whitelist()
+def resume_bulk_import(import_id):
+    """Yarıda kalan bir import işini son commit edilen parçadan devam ettirir."""
+    frappe.only_for(["System Manager", "Stock Manager"])
+
+    state = _load_state(import_id)
+    if not state:
+        frappe.throw(_("Import kaydı bulunamadı: {0}").format(import_id))
+    if state['status'] == "Completed":
+        return _get_report(state)
+
+    state['status'] = "Queued"
+    _save_state(state)
+    frappe.db.commit()
+    _enqueue(state)
+    return {"import_id": import_id, "status": state['status']}
+
+
+@frappe.whitelist()
+def get_bulk_import_status(import_id):
+    """İlerleme, hız (satır/sn) ve tahmini kalan süre bilgisini döner."""
+    state = _load_state(import_id)
+    if not state:
+        frappe.throw(_("Import kaydı bulunamadı: {0}").format(import_id))
+    return _get_report(state)
+
+
+def _enqueue(state):
+    frappe.enqueue(
+        "uretim_planlama.uretim_planlama.api.bulk_profile_import.process_bulk_import",
+        queue="long",
+        timeout=6 * 3600,
+        job_id=f"{STATE_KEY_PREFIX}{state['import_id']}",
+        deduplicate=True,
+        file_path=state['file_path'],
+        import_id=state['import_id'],
+    )
+
+
+def _resolve_file_path(file_path):
+    """File URL'si (/files/..., /private/files/...) verildiyse disk yoluna çevirir."""
+    if file_path and file_path.startswith(("/files/", "/private/files/")):
+        return frappe.get_doc("File", {"file_url": file_path}).get_full_path()
+    return file_path
+
+
+def _new_state(import_id, file_path, create_profile_entries, submit_entries, chunk_size):
+    state = {
+        "import_id": import_id,
+        "file_path": file_path,
+        "create_profile_entries": cint(create_profile_entries),
+        "submit_entries": cint(submit_entries),
+        "chunk_size": cint(chunk_size) or CHUNK_SIZE,
+        "status": "Queued",
+        "total_rows": _count_rows(file_path),
+        "rows_committed": 0,
+        "rows_imported": 0,
+        "rows_failed": 0,
+        "chunks": 0,
+        "entries": [],
+        "error_samples": [],
+        "elapsed": 0,
+        "started_at": now(),
+        "updated_at": now(),
+        "last_error": None,
+    }
+    _save_state(state)
+    frappe.db.commit()
+    return state
+
+
+def _load_state(import_id):
+    value = frappe.db.get_global(f"{STATE_KEY_PREFIX}{import_id}")
+    return json.loads(value) if value else None
+
+
+def _save_state(state):
+    """İlerleme kaydını yazar; chunk ile aynı transaction'da commit edilir."""
+    state['updated_at'] = now()
+    frappe.db.set_global(f"{STATE_KEY_PREFIX}{state['import_id']}", json.dumps(state, default=str))
+
+
+def _count_rows(file_path):
+    """Veri satırı sayısını (başlık hariç) akış halinde sayar; ilerleme yüzdesi için kullanılır."""
+    with open(file_path, encoding='utf-8') as file:
+        return max(sum(1 for _ in csv.reader(file)) - 1, 0)
+
+
+def _iter_csv_rows(file_path, skip_rows=0):
+    """
+    CSV satırlarını tek tek üretir: (row_idx, ham satır).
+    skip_rows kadar satır doğrulama yapılmadan atlanır (devam ettirme).
+    """
+    with open(file_path, encoding='utf-8') as file:
         reader = csv.DictReader(file)
-        
         for row_idx, row in enumerate(reader, 1):
-            try:
-                # Gerekli alanları kontrol et
-                required_fields = ['item_code', 'length', 'qty']
-                missing_fields = [field for field in required_fields if not row.get(field)]
-                
-                if missing_fields:
-                    print(f"⚠️ Satır {row_idx}: Eksik alanlar - {missing_fields}")
-                    continue
-                
-                # Veriyi temizle ve dönüştür
-                clean_data = {
-                    'item_code': row['item_code'].strip(),
-                    'length': flt(row['length']),
-                    'qty': flt(row['qty']),
-                    'is_scrap_piece': row.get('is_scrap_piece', '0').strip() in ['1', 'true', 'yes'],
-                    'date': row.get('date', today()),
-                    'supplier': row.get('supplier', '').strip() or None,
-                    'remarks': row.get('remarks', '').strip() or None
-                }
-                
-                import_data.append(clean_data)
-                
-            except Exception as e:
-                print(f"❌ Satır {row_idx} okuma hatası: {str(e)}")
+            if row_idx <= skip_rows:
                 continue
-    
-    return import_data
+            yield row_idx, row
+
+
+def _iter_chunks(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _load_profile_items():
+    """Profil ürünlerini tek sorguda yükler: {item_code: (item_name, item_group)}"""
+    items = frappe.get_all(
+        "Item",
+        filters={"item_group": ["in", get_allowed_profile_groups() or [""]]},
+        fields=["name", "item_name", "item_group"],
+    )
+    # "profil" içeren ama izinli listede olmayan gruplar is_profile_item_group ile yakalanır
+    return {row.name: (row.item_name or "", row.item_group) for row in items if is_profile_item_group(row.item_group)}
+
+
+def _clean_row(row_idx, row, profile_items, boy_cache):
+    """Satırı doğrular ve temizler. Dönüş: (clean_data, hata mesajı)"""
+    missing_fields = [field for field in REQUIRED_FIELDS if not (row.get(field) or '').strip()]
+    if missing_fields:
+        return None, f"Satır {row_idx}: Eksik alanlar - {missing_fields}"
+
+    item_code = row['item_code'].strip()
+    if item_code not in profile_items:
+        return None, f"Satır {row_idx}: Profil ürünü bulunamadı - {item_code}"
+
+    length_value = flt(row['length'].strip().replace(',', '.'))
+    if length_value not in boy_cache:
+        boy_cache[length_value] = get_boy_name(length_value) if length_value > 0 else None
+    boy_name = boy_cache[length_value]
+    if not boy_name:
+        return None, f"Satır {row_idx}: Geçersiz boy - {row['length']} (Boy DocType'ında bulunamadı)"
+
+    qty = flt(row['qty'])
+    if qty <= 0:
+        return None, f"Satır {row_idx}: Miktar sıfırdan büyük olmalı - {row['qty']}"
+
+    return {
+        'item_code': item_code,
+        'length': boy_name,
+        'length_value': length_value,
+        'qty': qty,
+        'is_scrap_piece': 1 if (row.get('is_scrap_piece') or '0').strip().lower() in ['1', 'true', 'yes'] else 0,
+        'date': (row.get('date') or '').strip() or today(),
+        'supplier': (row.get('supplier') or '').strip() or None,
+        'remarks': (row.get('remarks') or '').strip() or None
+    }, None
+
+
+def _run_import(state):
+    """Dosyayı parça parça işler; her parça ilerleme kaydıyla birlikte commit edilir."""
+    profile_items = _load_profile_items()
+    boy_cache = {}
+    chunk_size = state['chunk_size']
+    started = time.time() - flt(state['elapsed'])
+
+    state['status'] = "Running"
+    _save_state(state)
+    frappe.db.commit()
+
+    rows = _iter_csv_rows(state['file_path'], skip_rows=state['rows_committed'])
+    for chunk in _iter_chunks(rows, chunk_size):
+        valid_rows = []
+        for row_idx, row in chunk:
+            clean_data, error = _clean_row(row_idx, row, profile_items, boy_cache)
+            if error:
+                state['rows_failed'] += 1
+                if len(state['error_samples']) < MAX_ERROR_SAMPLES:
+                    state['error_samples'].append(error)
+                continue
+            valid_rows.append(clean_data)
+
+        _upsert_stock_rows(valid_rows, profile_items)
+        if state['create_profile_entries'] and valid_rows:
+            state['entries'].extend(_create_profile_entries(_group_by_date(valid_rows), state['submit_entries']))
+
+        state['rows_committed'] = chunk[-1][0]
+        state['rows_imported'] += len(valid_rows)
+        state['chunks'] += 1
+        state['elapsed'] = round(time.time() - started, 3)
+        _save_state(state)
+        frappe.db.commit()
+
+        _publish_progress(state)
+
+    state['status'] = "Completed"
+    state['elapsed'] = round(time.time() - started, 3)
+    _save_state(state)
+    frappe.db.commit()
+    _publish_progress(state)
+    return state
+
+
+def _upsert_stock_rows(valid_rows, profile_items):
+    """
+    Parçadaki satırları (item_code, length, is_scrap_piece) anahtarında toplayıp
+    çok satırlı INSERT ... ON DUPLICATE KEY UPDATE ile ledger'a ekler.
+    """
+    net = {}
+    length_values = {}
+    for data in valid_rows:
+        key = (data['item_code'], data['length'], data['is_scrap_piece'])
+        net[key] = net.get(key, 0) + data['qty']
+        length_values[data['length']] = data['length_value']
+
+    if not net:
+        return
+
+    timestamp = now()
+    user = frappe.session.user
+    rows = []
+    for (item_code, length, is_scrap_piece), qty in net.items():
+        item_name, item_group = profile_items[item_code]
+        rows.append((
+            frappe.generate_hash(length=10), item_code, item_name, item_group, length,
+            qty, length_values[length] * qty, is_scrap_piece, timestamp, timestamp, user, user,
+        ))
+
+    upsert_rows(
+        "Profile Stock Ledger",
+        LEDGER_COLUMNS,
+        rows,
+        update_columns=LEDGER_ACCUMULATE_UPDATE,
+    )
+
+    # Yeniden sipariş durumu tablosu - parça olmayan anahtarların ürünleri (aynı transaction)
+    refresh_reorder_status({item_code for item_code, _length, is_scrap_piece in net if not is_scrap_piece})
+
+
+def _publish_progress(state):
+    report = _get_report(state)
+    frappe.publish_realtime(
+        "profile_stock_import_progress",
+        report,
+        user=frappe.session.user,
+    )
+    frappe.logger().info(
+        f"Profil stok importu {report['import_id']}: {report['rows_committed']}/{report['total_rows']} satır "
+        f"({report['progress']}%) - {report['rows_per_second']} satır/sn"
+    )
+
+
+def _get_report(state):
+    """İlerleme ve hız raporu"""
+    elapsed = flt(state['elapsed'])
+    total_rows = cint(state['total_rows'])
+    rows_committed = cint(state['rows_committed'])
+    rows_per_second = flt(rows_committed / elapsed, 1) if elapsed else 0
+    remaining = max(total_rows - rows_committed, 0)
+    return {
+        "import_id": state['import_id'],
+        "status": state['status'],
+        "total_rows": total_rows,
+        "rows_committed": rows_committed,
+        "rows_imported": state['rows_imported'],
+        "rows_failed": state['rows_failed'],
+        "chunks": state['chunks'],
+        "entry_records": len(state['entries']),
+        "progress": flt(rows_committed * 100 / total_rows, 1) if total_rows else 100,
+        "elapsed": elapsed,
+        "rows_per_second": rows_per_second,
+        "eta_seconds": flt(remaining / rows_per_second, 1) if rows_per_second else None,
+        "error_samples": state['error_samples'],
+        "last_error": state.get('last_error'),
+    }
 
 
 def _group_by_date(import_data):
     """Verileri tarihe göre gruplar"""
     grouped = {}
-    
+
     for data in import_data:
         date_key = data['date']
         if date_key not in grouped:
@@ -125,51 +394,27 @@ def _group_by_date(import_data):
                 'remarks': data.get('remarks'),
                 'items': []
             }
-        
+
         grouped[date_key]['items'].append({
             'item_code': data['item_code'],
             'length': data['length'],
             'qty': data['qty']
         })
-    
-    return grouped
-
 
-def _create_stock_records(import_data):
-    """Profile Stock Ledger kayıtlarını oluşturur"""
-    created_records = []
-    
-    for data in import_data:
-        try:
-            # Profile Stock Ledger kaydı oluştur
-            stock_doc = frappe.get_doc({
-                "doctype": "Profile Stock Ledger",
-                "item_code": data['item_code'],
-                "length": data['length'],
-                "qty": data['qty'],
-                "is_scrap_piece": data['is_scrap_piece']
-            })
-            
-            # Import flag'ini set et
-            stock_doc.flags.in_import = True
-            stock_doc.flags.ignore_validate = True
-            
-            stock_doc.insert()
-            created_records.append(stock_doc.name)
-            
-        except Exception as e:
-            print(f"❌ Profile Stock Ledger oluşturma hatası: {str(e)}")
-            frappe.log_error(f"Stock record creation error: {str(e)}", "Profile Stock Import Error")
-    
-    return created_records
+    return grouped
 
 
 def _create_profile_entries(grouped_data, submit_entries=True):
-    """Profile Entry kayıtlarını oluşturur"""
+    """
+    Profile Entry kayıtlarını oluşturur.
+    Stok ledger'a toplu yazıldığı için submit sırasında frappe.flags.in_import ile stok güncellemesi atlanır.
+    """
     created_entries = []
-    
-    for date_key, group_data in grouped_data.items():
-        try:
+    in_import = frappe.flags.in_import
+    frappe.flags.in_import = True
+
+    try:
+        for group_data in grouped_data.values():
             # Profile Entry oluştur
             entry_doc = frappe.get_doc({
                 "doctype": "Profile Entry",
@@ -178,7 +423,7 @@ def _create_profile_entries(grouped_data, submit_entries=True):
                 "remarks": group_data.get('remarks') or f"Bulk import - {len(group_data['items'])} ürün",
                 "items": []
             })
-            
+
             # Items ekle
             for item in group_data['items']:
                 entry_doc.append("items", {
@@ -187,56 +432,48 @@ def _create_profile_entries(grouped_data, submit_entries=True):
                     "received_quantity": item['qty'],
                     "reference_type": "Manual Entry"
                 })
-            
+
             # Validation'ları bypass et
             entry_doc.flags.ignore_validate = True
             entry_doc.flags.ignore_permissions = True
             entry_doc.flags.bypass_group_check = True
-            
+
             entry_doc.insert()
-            
+
             # Submit et (isteğe bağlı)
             if submit_entries:
                 entry_doc.flags.ignore_validate = True
                 entry_doc.submit()
-            
+
             created_entries.append(entry_doc.name)
-            
-        except Exception as e:
-            print(f"❌ Profile Entry oluşturma hatası: {str(e)}")
-            frappe.log_error(f"Entry creation error: {str(e)}", "Profile Entry Import Error")
-    
+    finally:
+        frappe.flags.in_import = in_import
+
     return created_entries
 
 
-def _print_import_summary(import_data, stock_records, entry_records):
+def _print_import_summary(state):
     """Import özetini yazdırır"""
+    report = _get_report(state)
     print(f"{'='*60}")
     print(f"IMPORT ÖZETİ")
     print(f"{'='*60}")
-    print(f"📊 Toplam satır: {len(import_data)}")
-    print(f"📦 Profile Stock Ledger: {len(stock_records)} kayıt")
-    print(f"📝 Profile Entry: {len(entry_records)} kayıt")
-    
-    # Ürün bazında özet
-    profile_summary = {}
-    for data in import_data:
-        key = f"{data['item_code']} - {data['length']}m"
-        if key not in profile_summary:
-            profile_summary[key] = 0
-        profile_summary[key] += data['qty']
-    
-    print(f"\n📋 ÜRÜN BAZINDA ÖZET:")
-    for profile, total_qty in sorted(profile_summary.items()):
-        print(f"   {profile}: {total_qty} adet")
-    
+    print(f"📊 Toplam satır: {report['total_rows']}")
+    print(f"📦 Profile Stock Ledger: {report['rows_imported']} satır, {report['chunks']} parça")
+    print(f"⚠️ Hatalı satır: {report['rows_failed']}")
+    print(f"📝 Profile Entry: {report['entry_records']} kayıt")
+    print(f"⏱️ Süre: {report['elapsed']}s ({report['rows_per_second']} satır/sn)")
+
+    for error in report['error_samples'][:20]:
+        print(f"   {error}")
+
     print(f"{'='*60}")
 
 
 def create_import_template():
     """Import için örnek CSV template oluşturur"""
     template_path = "/tmp/profile_stock_import_template.csv"
-    
+
     sample_data = [
         {
             'item_code': '101073427',
@@ -257,13 +494,13 @@ def create_import_template():
             'remarks': 'Açıklama'
         }
     ]
-    
+
     with open(template_path, 'w', newline='', encoding='utf-8') as file:
         if sample_data:
             writer = csv.DictWriter(file, fieldnames=sample_data[0].keys())
             writer.writeheader()
             writer.writerows(sample_data)
-    
+
     print(f"✅ Template oluşturuldu: {template_path}")
     return template_path
 
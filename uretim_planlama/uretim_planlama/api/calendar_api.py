@@ -4,9 +4,25 @@
 """
 Calendar API Functions
 Takvim ile ilgili API fonksiyonları
+
+İş emri takvimi, iş emirlerinin planlı tarih aralığını gün bazında tutan
+Work Order Calendar Bucket tablosu üzerinden okunur: (bucket_date, work_order) indeksiyle
+görünen aralık için sadece o günlere düşen iş emirleri taranır. "since" verilirse
+sadece o zamandan sonra değişen iş emirleri ve silinen/aralıktan çıkanlar döner.
 """
 
+from datetime import date, datetime, timedelta
+
 import frappe
+from frappe.utils import getdate, now
+
+from uretim_planlama.uretim_planlama.api.db_utils import upsert_rows
+from uretim_planlama.uretim_planlama.api.holiday_calendar import get_company_holiday_list, get_holiday_map
+
+BUCKET_DOCTYPE = "Work Order Calendar Bucket"
+# Çok uzun planlı aralıklar için gün satırı üst sınırı
+MAX_BUCKET_DAYS = 366
+BUCKET_CHUNK_SIZE = 500
 
 
 @frappe.whitelist()
@@ -21,45 +37,158 @@ def get_holidays_for_calendar(start: str, end: str) -> dict[str, str]:
     Returns:
         Tarih ve açıklama eşleştirmesi: {"2025-01-01": "Yılbaşı", ...}
     """
-    # Default company'yi al
-    company = frappe.defaults.get_defaults().get("company")
-    if not company:
-        companies = frappe.get_all("Company", limit=1, pluck="name")
-        company = companies[0] if companies else None
-    
-    if not company:
-        return {}
-    
-    # Company'nin default holiday list'ini al
-    holiday_list = frappe.get_cached_value("Company", company, "default_holiday_list")
-    
-    if not holiday_list:
-        return {}
-    
-    # Belirtilen tarih aralığındaki tatilleri getir
-    holidays = frappe.get_all(
-        "Holiday",
-        filters={
-            "parent": holiday_list,
-            "holiday_date": ["between", [start, end]]
-        },
-        fields=["holiday_date", "description"],
-        order_by="holiday_date"
+    # Şirketin varsayılan tatil listesi önbellekten, aralık bisect ile bulunur (HTML temizliği yüklemede bir kez)
+    return get_holiday_map(get_company_holiday_list(), start, end)
+
+
+def _bucket_dates(planned_start_date, planned_end_date):
+    """İş emrinin planlı aralığındaki günleri döndürür (tek tarih varsa tek gün)."""
+    start_date = getdate(planned_start_date or planned_end_date)
+    end_date = getdate(planned_end_date or planned_start_date)
+    if end_date < start_date:
+        start_date, end_date = end_date, start_date
+    days = min((end_date - start_date).days, MAX_BUCKET_DAYS - 1)
+    return [start_date + timedelta(days=i) for i in range(days + 1)]
+
+
+def refresh_calendar_buckets(work_orders):
+    """
+    Verilen iş emirlerinin gün satırlarını yeniden oluşturur:
+    tek DELETE + çok satırlı INSERT (tarihi olmayan iş emirleri için satır yazılmaz).
+    """
+    work_orders = sorted({name for name in work_orders if name})
+    if not work_orders:
+        return 0
+
+    timestamp = now()
+    user = frappe.session.user
+    created = 0
+    for start in range(0, len(work_orders), BUCKET_CHUNK_SIZE):
+        chunk = work_orders[start : start + BUCKET_CHUNK_SIZE]
+        frappe.db.sql(
+            f"DELETE FROM `tab{BUCKET_DOCTYPE}` WHERE work_order IN %s",
+            (tuple(chunk),),
+        )
+
+        values = []
+        for wo in frappe.db.sql(
+            """
+            SELECT name, planned_start_date, planned_end_date
+            FROM `tabWork Order`
+            WHERE name IN %s AND (planned_start_date IS NOT NULL OR planned_end_date IS NOT NULL)
+            """,
+            (tuple(chunk),),
+            as_dict=True,
+        ):
+            for day in _bucket_dates(wo.planned_start_date, wo.planned_end_date):
+                values.append((f"{wo.name}::{day}", wo.name, day, timestamp, timestamp, user, user))
+
+        created += upsert_rows(
+            BUCKET_DOCTYPE,
+            ("name", "work_order", "bucket_date", "creation", "modified", "owner", "modified_by"),
+            values,
+            ignore=True,
+            chunk_size=BUCKET_CHUNK_SIZE,
+        )
+    return created
+
+
+def on_work_order_change(doc, method=None):
+    """
+    Work Order doc_events hook'u: planlı tarihler değiştiyse gün satırlarını yeniler,
+    iş emri silinirse satırlarını temizler.
+    """
+    try:
+        if method == "on_trash":
+            frappe.db.delete(BUCKET_DOCTYPE, {"work_order": doc.name})
+            return
+
+        if (
+            doc.get_doc_before_save() is None
+            or doc.has_value_changed("planned_start_date")
+            or doc.has_value_changed("planned_end_date")
+        ):
+            refresh_calendar_buckets([doc.name])
+    except Exception:
+        frappe.log_error("Work Order takvim satırı güncelleme HATA", frappe.get_traceback())
+
+
+def reconcile_calendar_buckets(days=2):
+    """
+    Günlük mutabakat: Son günlerde değişen iş emirlerinin satırlarını yeniler.
+    db_set ile güncellenen (hook tetiklemeyen) planlı tarihler burada yakalanır.
+    """
+    work_orders = frappe.get_all(
+        "Work Order",
+        filters={"modified": [">=", frappe.utils.add_days(now(), -int(days))]},
+        pluck="name",
     )
-    
-    # Dictionary formatına çevir: {date: description}
-    holidays_dict = {}
-    for holiday in holidays:
-        date_str = str(holiday.holiday_date)
-        # HTML tag'lerini temizle
-        description = frappe.utils.strip_html(holiday.description or "").strip()
-        holidays_dict[date_str] = description or "Tatil"
-    
-    return holidays_dict
+    refresh_calendar_buckets(work_orders)
+    frappe.db.commit()
+    return {"work_orders": len(work_orders)}
+
+
+def rebuild_calendar_buckets():
+    """Tüm iş emirlerinin gün satırlarını yeniden oluşturur (patch / elle çalıştırma)."""
+    work_orders = frappe.get_all(
+        "Work Order",
+        filters={"docstatus": ["<", 2]},
+        or_filters={"planned_start_date": ["is", "set"], "planned_end_date": ["is", "set"]},
+        pluck="name",
+    )
+    created = 0
+    for start in range(0, len(work_orders), BUCKET_CHUNK_SIZE):
+        created += refresh_calendar_buckets(work_orders[start : start + BUCKET_CHUNK_SIZE])
+        frappe.db.commit()
+    return {"work_orders": len(work_orders), "buckets": created}
+
+
+def _to_date_str(value):
+    """Datetime/date/str değerinden YYYY-MM-DD döndürür."""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value).split()[0]  # İlk kısmı al (tarih)
+
+
+def _to_calendar_event(wo, today):
+    """İş emri satırını takvim event formatına çevirir. Gösterilemiyorsa None."""
+    start_date = wo.planned_start_date
+    end_date = wo.planned_end_date
+
+    # Tarih yoksa ve taslak değilse atla
+    if not start_date and not end_date:
+        if wo.status != "Draft":
+            return None
+        # Taslak için bugünün tarihini kullan
+        start_date = datetime.combine(today, datetime.min.time())
+        end_date = datetime.combine(today, datetime.min.time())
+
+    # Başlangıç ve bitiş tarihlerini ayarla
+    start_str = _to_date_str(start_date or end_date)
+    end_str = _to_date_str(end_date or start_date)
+    if not start_str or not end_str:
+        return None
+
+    return {
+        "id": wo.name,
+        # Başlık - Production Item veya Work Order adı
+        "title": wo.production_item or wo.name,
+        "start": start_str,
+        "end": end_str,
+        "status": wo.status or "",
+        "sales_order": wo.sales_order or "",
+        "customer": wo.customer or "",
+        "custom_end_customer": wo.custom_end_customer or "",
+        "production_item": wo.production_item or "",
+        "qty": wo.qty or 0,
+        "produced_qty": wo.produced_qty or 0
+    }
 
 
 @frappe.whitelist()
-def get_work_orders_for_calendar(start: str, end: str, include_draft: bool = False) -> list[dict]:
+def get_work_orders_for_calendar(start: str, end: str, include_draft: bool = False, since: str | None = None):
     """
     Belirtilen tarih aralığındaki iş emirlerini takvim için döndürür.
     
@@ -67,28 +196,38 @@ def get_work_orders_for_calendar(start: str, end: str, include_draft: bool = Fal
         start: Başlangıç tarihi (YYYY-MM-DD formatında veya ISO format)
         end: Bitiş tarihi (YYYY-MM-DD formatında veya ISO format)
         include_draft: Taslak iş emirlerini dahil et (varsayılan: False)
+        since: Verilirse sadece bu zamandan sonra değişen iş emirleri döner (artımlı okuma).
+            Boş string ilk artımlı okumadır: tüm aralık döner, server_time sonraki okumada kullanılır.
         
     Returns:
-        İş emirleri listesi, her biri takvim event formatında
+        since yoksa: İş emirleri listesi, her biri takvim event formatında
+        since varsa: {"events": [...], "removed": [iş emri adları], "server_time": "..."}
     """
-    from frappe.utils import getdate
-    from datetime import date, datetime
-    
+    # Sonraki artımlı okuma için sorgulardan ÖNCE alınır (arada değişen kayıt kaçmasın)
+    server_time = now()
+
     # Tarih stringlerini temizle (ISO formatından sadece tarih kısmını al)
     start_date = start.split('T')[0] if 'T' in start else start
     end_date = end.split('T')[0] if 'T' in end else end
-    
+    include_draft = frappe.utils.cint(include_draft)
+
     # Durum filtreleme
     status_list = ["Not Started", "In Process", "Completed"]
     if include_draft:
         status_list.append("Draft")
-    
-    # SQL sorgusu ile overlap mantığı kullanarak filtreleme
-    # Bir iş emri, eğer planned_start_date <= end VE planned_end_date >= start ise aralıkta
-    # veya tarihi olmayan taslak iş emirleri
-    placeholders = ','.join(['%s'] * len(status_list))
-    sql_query = f"""
-        SELECT 
+
+    params = {
+        "status_list": tuple(status_list),
+        "start_date": start_date,
+        "end_date": end_date,
+        "since": since,
+    }
+    since_condition = "AND wo.modified >= %(since)s" if since else ""
+
+    # Aralıktaki günlere düşen iş emirleri (bucket_date, work_order) indeksi üzerinden bulunur
+    work_orders = frappe.db.sql(
+        f"""
+        SELECT
             wo.name,
             wo.status,
             wo.production_item,
@@ -96,103 +235,66 @@ def get_work_orders_for_calendar(start: str, end: str, include_draft: bool = Fal
             wo.planned_start_date,
             wo.planned_end_date,
             wo.qty,
-            wo.produced_qty
+            wo.produced_qty,
+            so.customer,
+            so.custom_end_customer
         FROM `tabWork Order` wo
-        WHERE wo.status IN ({placeholders})
-        AND (
-            (wo.planned_start_date IS NOT NULL 
-             AND DATE(wo.planned_start_date) <= %s
-             AND (wo.planned_end_date IS NULL OR DATE(wo.planned_end_date) >= %s))
-            OR (wo.planned_end_date IS NOT NULL 
-                AND DATE(wo.planned_end_date) >= %s
-                AND (wo.planned_start_date IS NULL OR DATE(wo.planned_start_date) <= %s))
-            OR (wo.status = 'Draft' AND wo.planned_start_date IS NULL AND wo.planned_end_date IS NULL)
-        )
+        INNER JOIN (
+            SELECT DISTINCT work_order
+            FROM `tab{BUCKET_DOCTYPE}`
+            WHERE bucket_date BETWEEN %(start_date)s AND %(end_date)s
+        ) b ON b.work_order = wo.name
+        LEFT JOIN `tabSales Order` so ON so.name = wo.sales_order
+        WHERE wo.status IN %(status_list)s
+        {since_condition}
         ORDER BY wo.planned_start_date ASC
-    """
-    
-    work_orders = frappe.db.sql(
-        sql_query,
-        status_list + [end_date, start_date, start_date, end_date],
-        as_dict=True
+        """,
+        params,
+        as_dict=True,
     )
-    
-    # Sales Order bilgilerini toplu olarak al
-    sales_orders = {}
-    if work_orders:
-        so_names = list(set([wo.sales_order for wo in work_orders if wo.sales_order]))
-        if so_names:
-            sales_order_data = frappe.get_all(
-                "Sales Order",
-                filters={"name": ["in", so_names]},
-                fields=["name", "customer", "custom_end_customer"]
-            )
-            sales_orders = {so.name: so for so in sales_order_data}
-    
+
+    # Tarihi olmayan taslak iş emirleri (bugünün tarihinde gösterilir)
+    if include_draft:
+        work_orders += frappe.db.sql(
+            f"""
+            SELECT
+                wo.name, wo.status, wo.production_item, wo.sales_order,
+                wo.planned_start_date, wo.planned_end_date, wo.qty, wo.produced_qty,
+                so.customer, so.custom_end_customer
+            FROM `tabWork Order` wo
+            LEFT JOIN `tabSales Order` so ON so.name = wo.sales_order
+            WHERE wo.status = 'Draft' AND wo.planned_start_date IS NULL AND wo.planned_end_date IS NULL
+            {since_condition}
+            """,
+            params,
+            as_dict=True,
+        )
+
     # Takvim formatına çevir
-    calendar_events = []
     today = date.today()
-    
-    for wo in work_orders:
-        # Tarihleri al ve formatla
-        start_date = wo.planned_start_date
-        end_date = wo.planned_end_date
-        
-        # Tarih yoksa ve taslak değilse atla
-        if not start_date and not end_date:
-            if wo.status != "Draft":
-                continue
-            # Taslak için bugünün tarihini kullan
-            start_date = datetime.combine(today, datetime.min.time())
-            end_date = datetime.combine(today, datetime.min.time())
-        
-        # Başlangıç ve bitiş tarihlerini ayarla
-        if not start_date:
-            start_date = end_date
-        if not end_date:
-            end_date = start_date
-        
-        # Datetime ise sadece tarih kısmını al (YYYY-MM-DD formatı)
-        if isinstance(start_date, datetime):
-            start_str = start_date.date().isoformat()
-        elif isinstance(start_date, date):
-            start_str = start_date.isoformat()
-        else:
-            start_str = str(start_date).split()[0]  # İlk kısmı al (tarih)
-        
-        if isinstance(end_date, datetime):
-            end_str = end_date.date().isoformat()
-        elif isinstance(end_date, date):
-            end_str = end_date.isoformat()
-        else:
-            end_str = str(end_date).split()[0]  # İlk kısmı al (tarih)
-        
-        if not start_str or not end_str:
-            continue
-        
-        # Sales Order bilgilerini al
-        so_info = sales_orders.get(wo.sales_order, {}) if wo.sales_order else {}
-        customer = so_info.get("customer", "")
-        custom_end_customer = so_info.get("custom_end_customer", "")
-        
-        # Başlık oluştur - Production Item veya Work Order adı
-        title = wo.production_item or wo.name
-        
-        calendar_events.append({
-            "id": wo.name,
-            "title": title,
-            "start": start_str,
-            "end": end_str,
-            "status": wo.status or "",
-            "sales_order": wo.sales_order or "",
-            "customer": customer,
-            "custom_end_customer": custom_end_customer,
-            "production_item": wo.production_item or "",
-            "qty": wo.qty or 0,
-            "produced_qty": wo.produced_qty or 0
-        })
-    
-    return calendar_events
+    calendar_events = [
+        event for event in (_to_calendar_event(wo, today) for wo in work_orders) if event
+    ]
+
+    if since is None:
+        return calendar_events
+
+    # Değişen ama artık aralıkta/durum filtresinde olmayan ve silinen iş emirleri istemciden kaldırılır
+    removed = []
+    if since:
+        event_names = {event["id"] for event in calendar_events}
+        removed = [
+            name
+            for name in frappe.get_all("Work Order", filters={"modified": [">=", since]}, pluck="name")
+            if name not in event_names
+        ]
+        removed += frappe.get_all(
+            "Deleted Document",
+            filters={"deleted_doctype": "Work Order", "creation": [">=", since]},
+            pluck="deleted_name",
+        )
+
+    return {"events": calendar_events, "removed": removed, "server_time": server_time}
 
 
 @frappe.whitelist()
@@ -8,6 +8,9 @@ Bu script mevcut duplicate kayıtları bulur ve birleştirir.
 Aynı profile_type, length, is_scrap_piece kombinasyonu için
 birden fazla kayıt varsa, bunları tek kayıtta birleştirir.
 
+Tekil anahtar (unique_item_length_scrap) eklendikten sonra yeni duplicate oluşamaz;
+merge_duplicate_records bu anahtarı ekleyen patch tarafından bir kez çalıştırılır.
+
 Kullanım:
     bench --site sitename execute uretim_planlama.api.consolidate_profile_stock.consolidate_duplicates
 """
@@ -40,8 +43,10 @@ def consolidate_duplicates(dry_run=True):
     print(f"🔍 {len(duplicates)} adet duplicate grup bulundu:")
     print()
     
-    total_consolidated = 0
-    total_deleted = 0
+    if not dry_run:
+        result = merge_duplicate_records()
+        print(f"   ✅ {result['groups']} grup birleştirildi, {result['deleted']} kayıt silindi")
+        return
     
     for group in duplicates:
         item_code = group['item_code']
@@ -57,31 +62,15 @@ def consolidate_duplicates(dry_run=True):
         for record in records:
             print(f"     - {record['name']}: {record['qty']} adet")
         
-        if not dry_run:
-            try:
-                # Birleştirme işlemi
-                _consolidate_group(records, item_code, length, is_scrap)
-                total_consolidated += len(records) - 1  # Ana kayıt hariç
-                total_deleted += len(records) - 1
-                print(f"   ✅ Birleştirildi!")
-            except Exception as e:
-                print(f"   ❌ Hata: {str(e)}")
-                frappe.log_error(f"Consolidation error: {str(e)}", "Profile Stock Consolidation Error")
-        else:
-            print(f"   📋 DRY RUN - Birleştirilecek")
+        print(f"   📋 DRY RUN - Birleştirilecek")
         
         print()
     
     print(f"{'='*60}")
     print(f"ÖZET:")
     print(f"   Toplam duplicate grup: {len(duplicates)}")
-    
-    if dry_run:
-        print(f"   DRY RUN - Hiçbir değişiklik yapılmadı")
-        print(f"   Gerçek çalıştırmak için: dry_run=False kullanın")
-    else:
-        print(f"   Birleştirilen kayıt: {total_consolidated}")
-        print(f"   Silinen kayıt: {total_deleted}")
+    print(f"   DRY RUN - Hiçbir değişiklik yapılmadı")
+    print(f"   Gerçek çalıştırmak için: dry_run=False kullanın")
     
     print(f"{'='*60}")
 
@@ -129,30 +118,56 @@ def _find_duplicate_records():
     return result
 
 
-def _consolidate_group(records, item_code, length, is_scrap_piece):
-    """Bir duplicate grubu birleştirir"""
-    
-    # Toplam miktarı hesapla
-    total_qty = sum(flt(record['qty']) for record in records)
-    
-    # En son oluşturulan kaydı ana kayıt olarak seç
-    main_record = records[0]  # creation desc ile sıralandı
-    main_doc = frappe.get_doc("Profile Stock Ledger", main_record['name'])
-    
-    # Ana kaydı güncelle
-    main_doc.qty = total_qty
-    main_doc.save()
-    
-    # Diğer kayıtları sil
-    for record in records[1:]:
-        frappe.delete_doc("Profile Stock Ledger", record['name'])
-    
-    # Log kaydı
-    frappe.logger().info(
-        f"Profile Stock Ledger consolidation: {item_code} {length}m "
-        f"(scrap: {is_scrap_piece}) -> {len(records)} kayıt birleştirildi, "
-        f"toplam qty: {total_qty}"
-    )
+def merge_duplicate_records():
+    """
+    Tüm duplicate grupları set tabanlı birleştirir: her grupta en eski kayıt tutulur,
+    qty ve total_length toplamları ona yazılır, diğer kayıtlar tek DELETE ile silinir.
+    """
+    rows = frappe.db.sql("""
+        SELECT psl.name, psl.item_code, psl.length, psl.is_scrap_piece, psl.qty, psl.total_length
+        FROM `tabProfile Stock Ledger` psl
+        INNER JOIN (
+            SELECT item_code, length, is_scrap_piece
+            FROM `tabProfile Stock Ledger`
+            GROUP BY item_code, length, is_scrap_piece
+            HAVING COUNT(*) > 1
+        ) dup ON dup.item_code = psl.item_code
+            AND dup.length <=> psl.length
+            AND dup.is_scrap_piece = psl.is_scrap_piece
+        ORDER BY psl.creation ASC, psl.name ASC
+    """, as_dict=True)
+    
+    groups = {}
+    for row in rows:
+        groups.setdefault((row.item_code, row.length, row.is_scrap_piece), []).append(row)
+    
+    delete_names = []
+    for (item_code, length, is_scrap_piece), records in groups.items():
+        keep = records[0]
+        frappe.db.sql("""
+            UPDATE `tabProfile Stock Ledger`
+            SET qty = %s, total_length = %s
+            WHERE name = %s
+        """, (
+            sum(flt(r.qty) for r in records),
+            sum(flt(r.total_length) for r in records),
+            keep.name
+        ))
+        delete_names.extend(r.name for r in records[1:])
+        
+        frappe.logger().info(
+            f"Profile Stock Ledger consolidation: {item_code} {length}m "
+            f"(scrap: {is_scrap_piece}) -> {len(records)} kayıt birleştirildi"
+        )
+    
+    if delete_names:
+        frappe.db.sql(
+            "DELETE FROM `tabProfile Stock Ledger` WHERE name IN %(names)s",
+            {"names": tuple(delete_names)}
+        )
+    frappe.db.commit()
+    
+    return {"groups": len(groups), "deleted": len(delete_names)}
 
 
 def get_consolidation_report():
@@ -0,0 +1,51 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+"""
+Toplu SQL yazma yardımcısı
+
+Özet / defter tablolarını (kullanılabilirlik, takvim, yeniden sipariş durumu, stok değeri özeti,
+kesim planı satırları, profil stok defteri vb.) yazan modüllerin ortak çok satırlı
+INSERT / INSERT IGNORE / INSERT ... ON DUPLICATE KEY UPDATE cümlesi burada kurulur.
+"""
+
+import frappe
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def _update_clause(update_columns):
+	"""Kolon adları `kolon` = VALUES(`kolon`), {kolon: ifade} sözlüğü olduğu gibi yazılır."""
+	if isinstance(update_columns, dict):
+		return ", ".join(f"`{col}` = {expression}" for col, expression in update_columns.items())
+	return ", ".join(f"`{col}` = VALUES(`{col}`)" for col in update_columns)
+
+
+def upsert_rows(doctype, columns, rows, update_columns=None, ignore=False, chunk_size=DEFAULT_CHUNK_SIZE):
+	"""
+	Satırları (columns sırasında değer dizileri) chunk_size'lık çok satırlı INSERT'lerle yazar.
+
+	- update_columns: anahtar çakışmasında güncellenecek kolonlar (ON DUPLICATE KEY UPDATE).
+	  Kolon adı listesi VALUES() ile, {kolon: SQL ifadesi} sözlüğü verilen ifadeyle güncellenir,
+	  ör. {"qty": "`qty` + VALUES(`qty`)"}. Verilmezse düz INSERT yapılır.
+	- ignore: INSERT IGNORE; mevcut anahtarlar olduğu gibi bırakılır.
+	Dönüş: yazılan satır sayısı
+	"""
+	rows = list(rows)
+	if not rows:
+		return 0
+
+	placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+	column_list = ", ".join(f"`{col}`" for col in columns)
+	update = f"ON DUPLICATE KEY UPDATE {_update_clause(update_columns)}" if update_columns else ""
+	for start in range(0, len(rows), chunk_size):
+		chunk = rows[start : start + chunk_size]
+		frappe.db.sql(
+			f"""
+			INSERT {"IGNORE " if ignore else ""}INTO `tab{doctype}` ({column_list})
+			VALUES {", ".join([placeholders] * len(chunk))}
+			{update}
+			""",
+			tuple(value for row in chunk for value in row),
+		)
+	return len(rows)
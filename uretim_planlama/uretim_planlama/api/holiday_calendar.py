@@ -0,0 +1,118 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+"""
+Süreç seviyesinde, site bazında tatil takvimi servisi.
+
+Her Holiday List ilk kullanımda bir kez okunur; açıklamalar bir kez HTML'den temizlenir ve
+tarih sırasına göre iki paralel listede tutulur (dates, descriptions). Aralık ve
+çalışma günü sorguları bisect ile O(log n) cevaplanır.
+
+Holiday List güncelleme/silme olayları Redis'teki sürüm anahtarını değiştirir; her süreç bir
+sonraki okumada sürüm farkını görüp önbelleği boşaltır.
+"""
+
+from bisect import bisect_left, bisect_right
+
+import frappe
+from frappe.utils import getdate, strip_html
+
+VERSION_KEY = "uretim_planlama:holiday_calendar_version"
+
+# Site adı -> önbellek; aynı süreç birden çok siteye hizmet verebilir
+_calendars = {}
+
+
+def _site_calendars():
+	return _calendars.setdefault(frappe.local.site, {"version": None, "lists": {}})
+
+
+def _get_calendar(holiday_list):
+	"""Tatil listesinin (dates, descriptions) sıralı listelerini döndürür."""
+	calendars = _site_calendars()
+	version = frappe.cache().get_value(VERSION_KEY)
+	if calendars["version"] != version:
+		calendars["lists"] = {}
+		calendars["version"] = version
+
+	if holiday_list not in calendars["lists"]:
+		rows = frappe.db.sql(
+			"""
+			SELECT holiday_date, description
+			FROM `tabHoliday`
+			WHERE parent = %s AND parenttype = 'Holiday List'
+			ORDER BY holiday_date
+			""",
+			(holiday_list,),
+		)
+		dates = []
+		descriptions = []
+		for holiday_date, description in rows:
+			holiday_date = getdate(holiday_date)
+			# Aynı gün birden fazla kayıt varsa ilki kullanılır
+			if dates and dates[-1] == holiday_date:
+				continue
+			dates.append(holiday_date)
+			descriptions.append(strip_html(description or "").strip() or "Tatil")
+		calendars["lists"][holiday_list] = (dates, descriptions)
+
+	return calendars["lists"][holiday_list]
+
+
+def get_holidays(holiday_list, start_date, end_date):
+	"""
+	[start_date, end_date] aralığındaki tatilleri sıralı döndürür.
+	Dönüş: [(date, açıklama), ...]
+	"""
+	if not holiday_list:
+		return []
+	dates, descriptions = _get_calendar(holiday_list)
+	lo = bisect_left(dates, getdate(start_date))
+	hi = bisect_right(dates, getdate(end_date))
+	return list(zip(dates[lo:hi], descriptions[lo:hi], strict=True))
+
+
+def get_holiday_map(holiday_list, start_date, end_date):
+	"""Aralıktaki tatilleri {"YYYY-MM-DD": açıklama} olarak döndürür."""
+	return {str(day): description for day, description in get_holidays(holiday_list, start_date, end_date)}
+
+
+def get_holiday_reason(holiday_list, day):
+	"""Gün tatilse açıklamasını, değilse None döndürür."""
+	if not holiday_list:
+		return None
+	dates, descriptions = _get_calendar(holiday_list)
+	day = getdate(day)
+	index = bisect_left(dates, day)
+	if index < len(dates) and dates[index] == day:
+		return descriptions[index]
+	return None
+
+
+def is_working_day(holiday_list, day):
+	"""Gün tatil listesinde yoksa True döndürür."""
+	return get_holiday_reason(holiday_list, day) is None
+
+
+def get_company_holiday_list(company=None):
+	"""Şirketin (verilmezse varsayılan şirketin) varsayılan tatil listesini döndürür."""
+	if not company:
+		company = frappe.defaults.get_defaults().get("company")
+	if not company:
+		companies = frappe.get_all("Company", limit=1, pluck="name")
+		company = companies[0] if companies else None
+	if not company:
+		return None
+	return frappe.get_cached_value("Company", company, "default_holiday_list")
+
+
+def invalidate_holiday_calendar(doc=None, method=None):
+	"""Holiday List doc_events hook'u: tüm süreçlerdeki tatil önbelleğini geçersiz kılar."""
+
+	def _bump_version():
+		_site_calendars()["lists"] = {}
+		frappe.cache().set_value(VERSION_KEY, frappe.generate_hash(length=8))
+
+	# Commit öncesi yeniden yüklenen listeler eski veriyi görebilir; commit sonrası tekrar geçersiz kıl
+	_bump_version()
+	frappe.db.after_commit.add(_bump_version)
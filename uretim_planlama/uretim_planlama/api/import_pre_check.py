@@ -1,7 +1,33 @@
 import frappe
 from frappe import _
 from frappe.utils import flt
-from uretim_planlama.uretim_planlama.utils import get_profile_stock
+
+# Tek IN sorgusunda okunacak (item_code, length) anahtarı sayısı
+KEY_CHUNK_SIZE = 500
+
+
+def _get_existing_stock_map(keys):
+	"""
+	(item_code, length) anahtarlarının mevcut (hurda olmayan) ledger miktarlarını
+	KEY_CHUNK_SIZE'lık parçalar halinde (item_code, length) IN (...) sorgularıyla okur.
+	Tekil anahtar (unique_item_length_scrap) sayesinde her anahtar için en fazla bir kayıt döner.
+	Dönüş: {(item_code, length): qty}
+	"""
+	keys = list(keys)
+	stock_map = {}
+	for start in range(0, len(keys), KEY_CHUNK_SIZE):
+		chunk = keys[start : start + KEY_CHUNK_SIZE]
+		rows = frappe.db.sql(
+			f"""
+			SELECT item_code, length, qty
+			FROM `tabProfile Stock Ledger`
+			WHERE is_scrap_piece = 0
+				AND (item_code, length) IN ({", ".join(["(%s, %s)"] * len(chunk))})
+			""",
+			[value for key in chunk for value in key],
+		)
+		stock_map.update({(row[0], row[1]): flt(row[2]) for row in rows})
+	return stock_map
 
 @frappe.whitelist()
 def check_existing_stock_before_import(import_data):
@@ -30,6 +56,13 @@ def check_existing_stock_before_import(import_data):
 		total_decrease_qty = 0
 		total_new_qty = 0
 		
+		# Tüm anahtarların mevcut stoklarını satır başına sorgu yerine toplu oku
+		existing_stock_map = _get_existing_stock_map({
+			(row.get("item_code"), str(row.get("length", "")))
+			for row in import_data
+			if row.get("item_code") and str(row.get("length", "")) and flt(row.get("qty", 0)) >= 0
+		})
+		
 		for row in import_data:
 			item_code = row.get("item_code")
 			length = str(row.get("length", ""))
@@ -39,7 +72,7 @@ def check_existing_stock_before_import(import_data):
 				continue
 			
 			# Mevcut stok kontrolü
-			existing_stock = get_profile_stock(item_code, length)
+			existing_stock = existing_stock_map.get((item_code, length), 0)
 			stock_difference = qty - existing_stock
 			
 			if existing_stock > 0:
@@ -15,6 +15,12 @@ import frappe
 from frappe import _
 from frappe.utils import add_days, get_datetime, getdate
 
+from uretim_planlama.uretim_planlama.api.db_utils import upsert_rows
+from uretim_planlama.uretim_planlama.api.workstation_calendar import (
+    get_working_hours_map,
+    get_workstation_calendar,
+)
+
 day_name_tr = {
     "Monday": "Pazartesi",
     "Tuesday": "Salı",
@@ -35,6 +41,37 @@ status_map = {
     "İptal Edildi": "İptal Edildi",
 }
 
+# Günlük kesim matrisi sorguları - parametreler: (başlangıç dahil, bitiş hariç)
+# İndeksler: idx_cmp_date_ws_totals, idx_ppi_start_workstation (patches/add_cutting_matrix_indexes.py)
+CUTTING_MATRIX_QUERY = """
+    SELECT
+        DATE(planning_date) AS date,
+        workstation,
+        SUM(total_mtul) AS total_mtul,
+        SUM(total_quantity) AS total_quantity
+    FROM `tabCutting Machine Plan`
+    WHERE planning_date >= %s AND planning_date < %s
+    GROUP BY DATE(planning_date), workstation
+    ORDER BY DATE(planning_date), workstation
+"""
+
+PRODUCTION_PLAN_MATRIX_QUERY = """
+    SELECT
+        DATE(ppi.planned_start_date) AS date,
+        ppi.custom_workstation AS workstation,
+        SUM(COALESCE(ppi.custom_mtul_per_piece, 0) * COALESCE(ppi.planned_qty, 0)) AS total_mtul,
+        SUM(COALESCE(ppi.planned_qty, 0)) AS total_quantity
+    FROM `tabProduction Plan Item` ppi
+    INNER JOIN `tabProduction Plan` pp ON ppi.parent = pp.name
+    WHERE ppi.planned_start_date >= %s AND ppi.planned_start_date < %s
+    AND ppi.custom_workstation IS NOT NULL
+    AND ppi.custom_workstation != ''
+    AND pp.docstatus = 1
+    GROUP BY DATE(ppi.planned_start_date), ppi.custom_workstation
+    ORDER BY DATE(ppi.planned_start_date), ppi.custom_workstation
+"""
+
+
 @frappe.whitelist()
 def get_daily_cutting_matrix(from_date, to_date):
 	"""
@@ -55,22 +92,11 @@ def get_daily_cutting_matrix(from_date, to_date):
 			frappe.logger().error(f"[API] Tarih formatı hatası: {e!s}")
 			return []
 
+		# Yarı açık aralık [from_date, to_date + 1 gün): kolon DATE() ile sarılmadığı için indeks kullanılır
+		params = (from_date, add_days(to_date, 1))
+
 		# Önce Cutting Machine Plan tablosundan veri çek
-		result = frappe.db.sql(
-			"""
-            SELECT
-                DATE(planning_date) AS date,
-                workstation,
-                SUM(total_mtul) AS total_mtul,
-                SUM(total_quantity) AS total_quantity
-            FROM `tabCutting Machine Plan`
-            WHERE DATE(planning_date) BETWEEN %s AND %s
-            GROUP BY DATE(planning_date), workstation
-            ORDER BY DATE(planning_date), workstation
-        """,
-			(from_date, to_date),
-			as_dict=True,
-		)
+		result = frappe.db.sql(CUTTING_MATRIX_QUERY, params, as_dict=True)
 
 		# Cutting Machine Plan'da veri varsa döndür
 		if result:
@@ -79,25 +105,7 @@ def get_daily_cutting_matrix(from_date, to_date):
 
 		# Cutting Machine Plan'da veri yoksa Production Plan'dan çek
 		frappe.logger().info("[API] Cutting Machine Plan boş, Production Plan'dan veri çekiliyor")
-		result = frappe.db.sql(
-			"""
-            SELECT
-                DATE(ppi.planned_start_date) AS date,
-                ppi.custom_workstation AS workstation,
-                SUM(COALESCE(ppi.custom_mtul_per_piece, 0) * COALESCE(ppi.planned_qty, 0)) AS total_mtul,
-                SUM(COALESCE(ppi.planned_qty, 0)) AS total_quantity
-            FROM `tabProduction Plan Item` ppi
-            INNER JOIN `tabProduction Plan` pp ON ppi.parent = pp.name
-            WHERE DATE(ppi.planned_start_date) BETWEEN %s AND %s
-            AND ppi.custom_workstation IS NOT NULL
-            AND ppi.custom_workstation != ''
-            AND pp.docstatus = 1
-            GROUP BY DATE(ppi.planned_start_date), ppi.custom_workstation
-            ORDER BY DATE(ppi.planned_start_date), ppi.custom_workstation
-        """,
-			(from_date, to_date),
-			as_dict=True,
-		)
+		result = frappe.db.sql(PRODUCTION_PLAN_MATRIX_QUERY, params, as_dict=True)
 
 		frappe.logger().info(f"[API] Production Plan'dan {len(result)} kayıt getirildi")
 		return result if result else []
@@ -117,6 +125,56 @@ def get_daily_cutting_table(from_date, to_date):
 	return get_daily_cutting_matrix(from_date, to_date)
 
 
+def _fetch_schedule_operations(start_date, end_date, workstation=None, status=None):
+    """
+    Tarih aralığıyla çakışan Work Order Operation satırlarını iş emri, üretim planı ve
+    satış siparişi bilgileriyle birlikte tek sorguda döndürür.
+
+    Çakışma: planned_start_time <= aralık sonu VE
+    (planned_end_time >= aralık başı VEYA planned_end_time boş ve planned_start_time aralık içinde)
+    """
+    conditions = []
+    if workstation:
+        conditions.append("AND woo.workstation = %(workstation)s")
+    if status:
+        conditions.append("AND woo.status = %(status)s")
+
+    # Bazı kurulumlarda Production Plan üzerinde 'workstation' alanı yok
+    pp_workstation = (
+        "pp.workstation" if frappe.get_meta("Production Plan").has_field("workstation") else "NULL"
+    )
+
+    return frappe.db.sql(
+        f"""
+        SELECT
+            woo.name, woo.parent AS work_order, woo.operation, woo.workstation,
+            woo.planned_start_time, woo.planned_end_time, woo.status,
+            woo.actual_start_time, woo.actual_end_time, woo.time_in_mins, woo.completed_qty,
+            wo.item_name, wo.production_item, wo.bom_no, wo.sales_order, wo.produced_qty,
+            wo.production_plan, {pp_workstation} AS pp_workstation,
+            so.customer, so.custom_end_customer
+        FROM `tabWork Order Operation` woo
+        LEFT JOIN `tabWork Order` wo ON wo.name = woo.parent
+        LEFT JOIN `tabProduction Plan` pp ON pp.name = wo.production_plan
+        LEFT JOIN `tabSales Order` so ON so.name = wo.sales_order
+        WHERE woo.parenttype = 'Work Order'
+            AND woo.planned_start_time <= %(end_ts)s
+            AND (
+                woo.planned_end_time >= %(start_ts)s
+                OR (woo.planned_end_time IS NULL AND woo.planned_start_time >= %(start_ts)s)
+            )
+            {" ".join(conditions)}
+        """,
+        {
+            "start_ts": str(start_date),
+            "end_ts": f"{end_date!s} 23:59:59",
+            "workstation": workstation,
+            "status": status,
+        },
+        as_dict=True,
+    )
+
+
 @frappe.whitelist()
 def get_weekly_production_schedule(
     year=None, month=None, week_start=None, week_end=None, workstation=None, status=None
@@ -148,158 +206,42 @@ def get_weekly_production_schedule(
 
         frappe.logger().debug(f"Workstations bulundu: {len(workstations)} adet")
 
-        # Çalışma saatlerini toplu çek ve hazırla (N+1 azaltma)
+        # Çalışma saatleri ve gün bazında kullanılabilir dakikalar önceden hesaplanmış takvimden okunur
         ws_names = [ws["name"] for ws in workstations]
-        ws_work_hours_map = {}
-        if ws_names:
-            ws_work_hours_rows = []
-            # DocType isimleri sürüme göre değişebildiği için iki olası adı dene; yoksa fallback
-            try:
-                ws_work_hours_rows = frappe.get_all(
-                    "Workstation Working Hour",
-                    filters={"parent": ["in", ws_names], "enabled": 1},
-                    fields=["parent", "start_time", "end_time"],
-                )
-            except Exception:
-                try:
-                    ws_work_hours_rows = frappe.get_all(
-                        "Workstation Working Hours",
-                        filters={"parent": ["in", ws_names], "enabled": 1},
-                        fields=["parent", "start_time", "end_time"],
-                    )
-                except Exception:
-                    ws_work_hours_rows = []
-            if ws_work_hours_rows:
-                for row in ws_work_hours_rows:
-                    ws_work_hours_map.setdefault(row["parent"], []).append(
-                        {"start_time": row["start_time"], "end_time": row["end_time"]}
-                    )
-            else:
-                # Fallback: DocType bulunamazsa Workstation doc üzerinden child tabloyu oku
-                for ws in workstations:
-                    try:
-                        ws_doc = frappe.get_doc("Workstation", ws.name)
-                        for row in getattr(ws_doc, "working_hours", []):
-                            if getattr(row, "enabled", 1):
-                                ws_work_hours_map.setdefault(ws.name, []).append(
-                                    {"start_time": row.start_time, "end_time": row.end_time}
-                                )
-                    except Exception:
-                        continue
+        ws_work_hours_map = get_working_hours_map(ws_names)
+        ws_calendar = get_workstation_calendar(ws_names, start_date, end_date)
 
-        # Tüm operasyonları topluca çek - tarih aralığına çakışma (overlap) mantığı
-        # (planned_start_time <= end_date) AND (planned_end_time >= start_date)
-        # Eğer planned_end_time yoksa start_time aralığına göre değerlendir
-        overlapping_ops = frappe.get_all(
-            "Work Order Operation",
-            filters={
-                "planned_start_time": ["<=", f"{end_date!s} 23:59:59"],
-                "planned_end_time": [">=", str(start_date)],
-                **({"workstation": workstation} if workstation else {}),
-                **({"status": status} if status else {}),
-            },
-            fields=[
-                "name",
-                "parent as work_order",
-                "operation",
-                "workstation",
-                "planned_start_time",
-                "planned_end_time",
-                "status",
-                "actual_start_time",
-                "actual_end_time",
-                "time_in_mins",
-                "completed_qty",
-            ],
+        # Çakışan operasyonlar iş emri / üretim planı / satış siparişi bilgileriyle tek sorguda gelir.
+        # Tek sorgu olduğundan her operasyon bir kez döner; yine de ada göre O(n) tekilleştirilir.
+        all_operations = list(
+            {op["name"]: op for op in _fetch_schedule_operations(start_date, end_date, workstation, status)}.values()
         )
 
-        # Ek olarak, planned_end_time boş olan fakat start_time aralığa düşenleri de dahil et
-        start_range_ops = frappe.get_all(
-            "Work Order Operation",
-            filters={
-                "planned_end_time": ["in", [None, ""]],
-                "planned_start_time": [
-                    "between",
-                    [str(start_date), f"{end_date!s} 23:59:59"],
-                ],
-                **({"workstation": workstation} if workstation else {}),
-                **({"status": status} if status else {}),
-            },
-            fields=[
-                "name",
-                "parent as work_order",
-                "operation",
-                "workstation",
-                "planned_start_time",
-                "planned_end_time",
-                "status",
-                "actual_start_time",
-                "actual_end_time",
-                "time_in_mins",
-                "completed_qty",
-            ],
-        )
-
-        all_operations = overlapping_ops + [
-            op for op in start_range_ops if op["name"] not in {o["name"] for o in overlapping_ops}
-        ]
-
-        # Tüm work order isimlerini topla
-        work_order_names = list(set([op["work_order"] for op in all_operations]))
-        # Tüm work order'ları topluca çek
-        work_orders = {
-            wo.name: wo
-            for wo in frappe.get_all(
-                "Work Order",
-                filters={"name": ["in", work_order_names]},
-                fields=[
-                    "name",
-                    "item_name",
-                    "production_item",
-                    "bom_no",
-                    "sales_order",
-                    "produced_qty",
-                    "production_plan",
-                ],
-            )
-        }
-
-        # Tüm production plan isimlerini topla
-        production_plan_names = list(
-            set([wo.production_plan for wo in work_orders.values() if wo.production_plan])
-        )
-        # Tüm production plan'ları topluca çek (workstation bilgisi için)
+        work_orders = {}
         production_plans = {}
-        if production_plan_names:
-            try:
-                for pp in frappe.get_all(
-                    "Production Plan",
-                    filters={"name": ["in", production_plan_names]},
-                    fields=["name", "workstation"],
-                ):
-                    production_plans[pp.name] = pp
-            except Exception:
-                # Bazı kurulumlarda 'workstation' alanı yok; yalnızca name çek
-                for pp in frappe.get_all(
-                    "Production Plan",
-                    filters={"name": ["in", production_plan_names]},
-                    fields=["name"],
-                ):
-                    production_plans[pp.name] = pp
-
-        # Tüm sales order isimlerini topla
-        sales_order_names = list(
-            set([wo.sales_order for wo in work_orders.values() if wo.sales_order])
-        )
-        # Tüm sales order'ları topluca çek (customer ve custom_end_customer ile)
         sales_orders = {}
-        if sales_order_names:
-            for so in frappe.get_all(
-                "Sales Order",
-                filters={"name": ["in", sales_order_names]},
-                fields=["name", "customer", "custom_end_customer"],
-            ):
-                sales_orders[so.name] = so
+        for op in all_operations:
+            if op.work_order and op.work_order not in work_orders and op.production_item is not None:
+                work_orders[op.work_order] = frappe._dict(
+                    name=op.work_order,
+                    item_name=op.item_name,
+                    production_item=op.production_item,
+                    bom_no=op.bom_no,
+                    sales_order=op.sales_order,
+                    produced_qty=op.produced_qty,
+                    production_plan=op.production_plan,
+                )
+            if op.production_plan and op.production_plan not in production_plans:
+                production_plans[op.production_plan] = frappe._dict(
+                    name=op.production_plan, workstation=op.pp_workstation
+                )
+            if op.sales_order and op.sales_order not in sales_orders:
+                sales_orders[op.sales_order] = frappe._dict(
+                    name=op.sales_order,
+                    customer=op.customer,
+                    custom_end_customer=op.custom_end_customer,
+                )
+        work_order_names = list({op["work_order"] for op in all_operations})
 
         # Tüm job card'ları topluca çek
         job_cards = frappe.get_all(
@@ -313,7 +255,7 @@ def get_weekly_production_schedule(
                 "status",
                 "total_completed_qty",
             ],
-        )
+        ) if work_order_names else []
         job_card_map = {}
         for jc in job_cards:
             key = (jc["work_order"], jc["operation"])
@@ -340,27 +282,14 @@ def get_weekly_production_schedule(
             ws_ops = ops_by_ws.get(ws.name, [])
             # Çalışma saatleri map'ten al
             work_hours = ws_work_hours_map.get(ws.name, [])
-            daily_work_minutes = {}
-            from datetime import datetime
-
-            if work_hours:
-                for i in range(7):
-                    total = 0
-                    for wh in work_hours:
-                        s = (
-                            datetime.strptime(str(wh["start_time"]), "%H:%M:%S")
-                            if ":" in str(wh["start_time"]) else datetime.strptime(str(wh["start_time"]), "%H:%M")
-                        )
-                        e = (
-                            datetime.strptime(str(wh["end_time"]), "%H:%M:%S")
-                            if ":" in str(wh["end_time"]) else datetime.strptime(str(wh["end_time"]), "%H:%M")
-                        )
-                        diff = (e - s).seconds // 60
-                        total += diff
-                    daily_work_minutes[i] = total
-            else:
-                for i in range(7):
-                    daily_work_minutes[i] = 0
+            # Haftanın her günü için tek günlük kapasite (aralıktaki en yüksek değer) ve aralık
+            # boyunca aynı günlerin toplam kullanılabilir dakikası ayrı tutulur (tatiller 0)
+            daily_work_minutes = {i: 0 for i in range(7)}
+            range_work_minutes = {i: 0 for i in range(7)}
+            for day, row in ws_calendar.get(ws.name, {}).items():
+                weekday = day.weekday()
+                daily_work_minutes[weekday] = max(daily_work_minutes[weekday], row.available_minutes)
+                range_work_minutes[weekday] += row.available_minutes
 
             day_schedule = {}
             ops_in_this_week = set()
@@ -447,9 +376,12 @@ def get_weekly_production_schedule(
                 planned = daily_summary.get(day, {}).get("planned_minutes", 0)
                 jobs = daily_summary.get(day, {}).get("jobs", 0)
                 work_min = daily_work_minutes.get(i, 0)
-                doluluk = int((planned / work_min) * 100) if work_min > 0 else 0
+                total_work_min = range_work_minutes.get(i, 0)
+                # Planlanan dakikalar aralıktaki aynı günlerin toplamı olduğundan aralık kapasitesine oranlanır
+                doluluk = int((planned / total_work_min) * 100) if total_work_min > 0 else 0
                 daily_info[day] = {
                     "work_minutes": work_min,
+                    "total_work_minutes": total_work_min,
                     "planned_minutes": planned,
                     "jobs": jobs,
                     "doluluk": doluluk,
@@ -469,20 +401,15 @@ def get_weekly_production_schedule(
                 )
 
         week_dates = get_week_dates(start_date)
-        # Sadece ilgili istasyonların holiday_list'leri ile holiday sorgusu
-        holiday_lists = list(
-            set([ws["holiday_list"] for ws in workstations if ws.get("holiday_list")])
-        )
+        # Tatil günleri takvim tablosundan (istasyonların tatil listelerinden) gelir
         holidays = []
-        for hl in holiday_lists:
-            for h in frappe.get_all(
-                "Holiday",
-                filters={"parent": hl, "holiday_date": ["between", [start_date, end_date]]},
-                fields=["holiday_date", "description"],
-            ):
-                holidays.append(
-                    {"date": str(h.holiday_date), "reason": h.description or "Tatil"}
-                )
+        seen_holidays = set()
+        for ws_days in ws_calendar.values():
+            for day, row in sorted(ws_days.items()):
+                if row.is_holiday and day not in seen_holidays:
+                    seen_holidays.add(day)
+                    holidays.append({"date": str(day), "reason": row.holiday_reason or "Tatil"})
+        holidays.sort(key=lambda h: h["date"])
 
         holiday_map = {h["date"]: h["reason"] for h in holidays}
         days = []
@@ -933,6 +860,173 @@ def calculate_summary_data(planned_data, unplanned_data):
         }
 
 
+CUTTING_ROW_FIELDS = (
+	"item_code",
+	"item_name",
+	"item_group",
+	"mtul_per_piece",
+	"quantity",
+	"total_mtul",
+	"production_plan",
+	"production_plan_item",
+)
+
+
+def _get_existing_cutting_plans(pairs):
+	"""
+	Verilen (planning_date, workstation) çiftleri için mevcut Cutting Machine Plan'ları tek sorguda okur.
+	Aynı çift için birden fazla plan varsa en eski olan kullanılır.
+	Dönüş: {(planning_date, workstation): plan_name}
+	"""
+	if not pairs:
+		return {}
+
+	rows = frappe.db.sql(
+		f"""
+		SELECT name, planning_date, workstation
+		FROM `tabCutting Machine Plan`
+		WHERE (planning_date, workstation) IN ({", ".join(["(%s, %s)"] * len(pairs))})
+		ORDER BY creation
+		""",
+		[value for pair in pairs for value in pair],
+		as_dict=True,
+	)
+	plan_map = {}
+	for row in rows:
+		plan_map.setdefault((row.planning_date, row.workstation), row.name)
+	return plan_map
+
+
+def _upsert_cutting_plan_rows(rows):
+	"""Kesim planı satırlarını çok satırlı INSERT ... ON DUPLICATE KEY UPDATE ile yazar."""
+	if not rows:
+		return
+
+	timestamp = frappe.utils.now()
+	user = frappe.session.user
+	upsert_rows(
+		"Cutting Plan Row",
+		("name", "parent", "parenttype", "parentfield", "idx", *CUTTING_ROW_FIELDS, "creation", "modified", "owner", "modified_by"),
+		[
+			(
+				row["name"], row["parent"], "Cutting Machine Plan", "plan_details", row["idx"],
+				*[row[field] for field in CUTTING_ROW_FIELDS], timestamp, timestamp, user, user,
+			)
+			for row in rows
+		],
+		update_columns=("parent", "idx", *CUTTING_ROW_FIELDS, "modified", "modified_by"),
+	)
+
+
+def _sync_cutting_plan_rows(docname, grouped_items, plan_map):
+	"""
+	Production Plan'a ait kesim satırlarını hedef gruplarla karşılaştırır (production_plan_item anahtarı):
+	- Değişmeyen satırlara dokunulmaz
+	- Yeni veya değişen satırlar tek çok satırlı upsert ile yazılır
+	- Artık planda olmayan satırlar tek DELETE ile silinir
+	Diğer Production Plan'lara ait satırlar korunur.
+	Dönüş: etkilenen Cutting Machine Plan adları
+	"""
+	existing_rows = {
+		row.production_plan_item: row
+		for row in frappe.db.sql(
+			f"""
+			SELECT name, parent, idx, {", ".join(CUTTING_ROW_FIELDS)}
+			FROM `tabCutting Plan Row`
+			WHERE production_plan = %s AND parenttype = 'Cutting Machine Plan'
+			""",
+			(docname,),
+			as_dict=True,
+		)
+	}
+
+	# Yeni satırlar her planın mevcut son idx değerinin arkasına eklenir
+	plan_names = set(plan_map.values())
+	next_idx = {}
+	if plan_names:
+		next_idx = {
+			row[0]: row[1]
+			for row in frappe.db.sql(
+				"""
+				SELECT parent, MAX(idx) FROM `tabCutting Plan Row`
+				WHERE parent IN %s AND parenttype = 'Cutting Machine Plan'
+				GROUP BY parent
+				""",
+				(tuple(plan_names),),
+			)
+		}
+
+	changed_rows = []
+	removed = []
+	seen = set()
+	touched_plans = set()
+	for group_data in grouped_items.values():
+		parent = plan_map[(group_data["planning_date"], group_data["workstation"])]
+		for item_data in group_data["items"]:
+			seen.add(item_data["production_plan_item"])
+			current = existing_rows.get(item_data["production_plan_item"])
+			if current and current.parent == parent and all(
+				current[field] == item_data[field] for field in CUTTING_ROW_FIELDS
+			):
+				continue
+
+			if current and current.parent == parent:
+				name, idx = current.name, current.idx
+			else:
+				next_idx[parent] = (next_idx.get(parent) or 0) + 1
+				name, idx = frappe.generate_hash(length=10), next_idx[parent]
+				if current:
+					# Başka plana taşınan satır: eski planından silinir
+					removed.append(current)
+			changed_rows.append({"name": name, "parent": parent, "idx": idx, **item_data})
+			touched_plans.add(parent)
+
+	# Artık planda olmayan satırlar
+	removed.extend(row for key, row in existing_rows.items() if key not in seen)
+	if removed:
+		frappe.db.sql(
+			"DELETE FROM `tabCutting Plan Row` WHERE name IN %s",
+			(tuple(row.name for row in removed),),
+		)
+		touched_plans.update(row.parent for row in removed)
+
+	_upsert_cutting_plan_rows(changed_rows)
+	return touched_plans
+
+
+def _refresh_cutting_plan_totals(plan_names):
+	"""Planların toplamlarını satırlardan tek UPDATE ile yeniden hesaplar, satırı kalmayan planları siler."""
+	if not plan_names:
+		return
+
+	plan_names = tuple(plan_names)
+	frappe.db.sql(
+		"""
+		UPDATE `tabCutting Machine Plan` cmp
+		LEFT JOIN (
+			SELECT parent, SUM(total_mtul) AS total_mtul, SUM(quantity) AS total_quantity
+			FROM `tabCutting Plan Row`
+			WHERE parent IN %(plans)s AND parenttype = 'Cutting Machine Plan'
+			GROUP BY parent
+		) totals ON totals.parent = cmp.name
+		SET cmp.total_mtul = COALESCE(totals.total_mtul, 0),
+			cmp.total_quantity = COALESCE(totals.total_quantity, 0),
+			cmp.modified = %(modified)s,
+			cmp.modified_by = %(user)s
+		WHERE cmp.name IN %(plans)s
+		""",
+		{"plans": plan_names, "modified": frappe.utils.now(), "user": frappe.session.user},
+	)
+	frappe.db.sql(
+		"""
+		DELETE cmp FROM `tabCutting Machine Plan` cmp
+		WHERE cmp.name IN %s
+			AND NOT EXISTS (SELECT 1 FROM `tabCutting Plan Row` cpr WHERE cpr.parent = cmp.name)
+		""",
+		(plan_names,),
+	)
+
+
 @frappe.whitelist()
 def generate_cutting_plan(docname):
 	"""
@@ -985,69 +1079,27 @@ def generate_cutting_plan(docname):
 			grouped_items[key]["total_mtul"] += total_mtul
 			grouped_items[key]["total_quantity"] += quantity
 
-		# Her grup için Cutting Machine Plan oluştur
-		created_count = 0
-
-		for key, group_data in grouped_items.items():
-			# Aynı tarih ve workstation için mevcut plan var mı kontrol et
-			existing_plans = frappe.get_all(
-				"Cutting Machine Plan",
-				filters={
-					"planning_date": group_data["planning_date"],
-					"workstation": group_data["workstation"]
-				},
-				fields=["name"],
-				limit=1
-			)
-			existing_plan = existing_plans[0].name if existing_plans else None
-
-			if existing_plan:
-				# Mevcut planı güncelle
-				cutting_plan = frappe.get_doc("Cutting Machine Plan", existing_plan)
-				cutting_plan.total_mtul = group_data["total_mtul"]
-				cutting_plan.total_quantity = group_data["total_quantity"]
-
-				# Plan detaylarını temizle ve yeniden ekle
-				cutting_plan.plan_details = []
-
-				for item_data in group_data["items"]:
-					cutting_plan.append("plan_details", {
-						"item_code": item_data["item_code"],
-						"item_name": item_data["item_name"],
-						"item_group": item_data["item_group"],
-						"mtul_per_piece": item_data["mtul_per_piece"],
-						"quantity": item_data["quantity"],
-						"total_mtul": item_data["total_mtul"],
-						"production_plan": item_data["production_plan"],
-						"production_plan_item": item_data["production_plan_item"]
-					})
-
-				cutting_plan.save(ignore_permissions=True)
-				created_count += 1
-			else:
-				# Yeni plan oluştur
+		# Tarih/workstation çiftleri için mevcut planları tek sorguda oku, eksik planların başlıklarını oluştur
+		plan_map = _get_existing_cutting_plans(
+			[(group_data["planning_date"], group_data["workstation"]) for group_data in grouped_items.values()]
+		)
+		for group_data in grouped_items.values():
+			pair = (group_data["planning_date"], group_data["workstation"])
+			if pair not in plan_map:
 				cutting_plan = frappe.get_doc({
 					"doctype": "Cutting Machine Plan",
 					"planning_date": group_data["planning_date"],
 					"workstation": group_data["workstation"],
-					"total_mtul": group_data["total_mtul"],
-					"total_quantity": group_data["total_quantity"]
+					"total_mtul": 0,
+					"total_quantity": 0
 				})
-
-				for item_data in group_data["items"]:
-					cutting_plan.append("plan_details", {
-						"item_code": item_data["item_code"],
-						"item_name": item_data["item_name"],
-						"item_group": item_data["item_group"],
-						"mtul_per_piece": item_data["mtul_per_piece"],
-						"quantity": item_data["quantity"],
-						"total_mtul": item_data["total_mtul"],
-						"production_plan": item_data["production_plan"],
-						"production_plan_item": item_data["production_plan_item"]
-					})
-
 				cutting_plan.insert(ignore_permissions=True)
-				created_count += 1
+				plan_map[pair] = cutting_plan.name
+
+		# Sadece değişen satırları yaz/sil, toplamları satırlardan yeniden hesapla
+		touched_plans = _sync_cutting_plan_rows(docname, grouped_items, plan_map)
+		_refresh_cutting_plan_totals(touched_plans | set(plan_map.values()))
+		created_count = len(grouped_items)
 
 		frappe.db.commit()
 
@@ -5,6 +5,8 @@ import frappe
 from frappe import _
 from frappe.utils import flt
 
+from uretim_planlama.uretim_planlama.api.reorder_status import get_length_mm, get_reorder_status_map
+
 
 @frappe.whitelist()
 def get_profile_stock_panel(profil=None, depo=None, scrap=0):
@@ -15,6 +17,7 @@ def get_profile_stock_panel(profil=None, depo=None, scrap=0):
 	- Depo Bazında Toplam Profil Stoku  -> ERPNext çekirdek stok verisinden (Bin)
 	- Boy Bazında Profil Stok Detayı   -> Profile Stock Ledger (özel belge)
 	- Parça Profil Kayıtları (scrap)   -> Profile Stock Ledger (is_scrap_piece = 1)
+	- Min. stok / eksik / son talep    -> Profile Reorder Status
 	- Hammadde Rezervleri              -> Rezerved Raw Materials
 	"""
 	try:
@@ -138,11 +141,15 @@ def _get_profile_ledger_stoklar(profil: str | None, scrap: int):
 		)
 	}
 
+	# Yeniden sipariş durumu (minimum, eksik, son talep) - index'li durum tablosundan tek sorgu
+	reorder_status = get_reorder_status_map(item_codes) if not scrap else {}
+
 	boy_bazinda_stok = []
 	scrap_profiller = []
 
 	for stock in stocks:
 		item_name = item_names.get(stock.item_code, stock.item_code)
+		status = reorder_status.get((stock.item_code, get_length_mm(stock.length))) or {}
 
 		# Boy bazında stok detayı
 		boy_bazinda_stok.append(
@@ -153,6 +160,10 @@ def _get_profile_ledger_stoklar(profil: str | None, scrap: int):
 				"adet": stock.qty or 0,
 				"mtul": stock.total_length or 0,
 				"guncelleme": stock.modified,
+				"min_stok": flt(status.get("min_qty")),
+				"eksik": flt(status.get("deficit")),
+				"minimum_altinda": status.get("is_below_min") or 0,
+				"son_talep": status.get("last_material_request"),
 			}
 		)
 
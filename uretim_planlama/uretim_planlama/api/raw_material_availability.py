@@ -0,0 +1,275 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+"""
+Hammadde Kullanılabilirlik Defteri (Raw Material Availability)
+
+Fiziki stok (Bin), aktif rezerv, kullanılan uzun vadeli rezerv, bekleyen talep ve
+bekleyen satınalma siparişi toplamları hammadde bazında materyalize tabloda tutulur.
+
+- Sales Order, Stock Entry, Purchase Order, Purchase Receipt, Delivery Note, Stock Reconciliation,
+  Work Order ve Material Request olayları, sadece belgede geçen hammaddelerin satırlarını
+  yeniden hesaplar (commit sonrası).
+- Günlük mutabakat işi (reconcile_availability) tüm tabloyu kaynak tablolarla karşılaştırıp
+  kaymaları düzeltir.
+- Okuma (get_availability_map) salt okunurdur: tabloda olmayan hammaddeler bellekte hesaplanır,
+  tabloya yazma arka plan işine bırakılır.
+"""
+
+import time
+
+import frappe
+from frappe.utils import flt, now
+
+from uretim_planlama.sales_order_hooks.bom_explosion import explode_sales_order_items
+from uretim_planlama.uretim_planlama.api.db_utils import upsert_rows
+
+AVAILABILITY_DOCTYPE = "Raw Material Availability"
+CHUNK_SIZE = 500
+QTY_FIELDS = (
+	"actual_qty",
+	"reserved_qty",
+	"long_term_used_qty",
+	"pending_mr_qty",
+	"pending_po_qty",
+	"available_qty",
+	"shortage_qty",
+)
+
+
+def _sum_map(query, column, item_codes):
+	"""(item_code, qty) dönen gruplu sorguyu sözlüğe çevirir. item_codes None ise filtre uygulanmaz."""
+	condition = f"AND {column} IN %(item_codes)s" if item_codes is not None else ""
+	rows = frappe.db.sql(
+		query.format(condition=condition),
+		{"item_codes": tuple(item_codes or ())},
+	)
+	return {row[0]: flt(row[1], 5) for row in rows}
+
+
+def _compute_availability(item_codes=None):
+	"""
+	Verilen hammaddeler (None ise kaynak tablolarda geçen tüm hammaddeler) için
+	kullanılabilirlik değerlerini item bazında gruplu sorgularla hesaplar.
+	"""
+	actual_map = _sum_map(
+		"""
+		SELECT item_code, SUM(actual_qty) FROM `tabBin`
+		WHERE 1=1 {condition} GROUP BY item_code
+		""",
+		"item_code",
+		item_codes,
+	)
+	# Aktif rezerv: tüm Rezerved Raw Materials kayıtları (sipariş ve takip sayfasıyla aynı toplam)
+	reserved_map = _sum_map(
+		"""
+		SELECT item_code, SUM(quantity) FROM `tabRezerved Raw Materials`
+		WHERE 1=1 {condition} GROUP BY item_code
+		""",
+		"item_code",
+		item_codes,
+	)
+	used_map = _sum_map(
+		"""
+		SELECT item_code, SUM(used_qty) FROM `tabLong Term Reserve Usage`
+		WHERE 1=1 {condition} GROUP BY item_code
+		""",
+		"item_code",
+		item_codes,
+	)
+	# ÖNEMLİ: ordered_qty stock_qty cinsinden tutulur
+	pending_mr_map = _sum_map(
+		"""
+		SELECT mri.item_code, SUM(GREATEST(0, COALESCE(mri.stock_qty, mri.qty) - COALESCE(mri.ordered_qty, 0)))
+		FROM `tabMaterial Request Item` mri
+		INNER JOIN `tabMaterial Request` mr ON mri.parent = mr.name
+		WHERE mr.material_request_type = 'Purchase'
+			AND mr.docstatus IN (0, 1)
+			AND mr.status NOT IN ('Cancelled', 'Received')
+			{condition}
+		GROUP BY mri.item_code
+		""",
+		"mri.item_code",
+		item_codes,
+	)
+	pending_po_map = _sum_map(
+		"""
+		SELECT poi.item_code, SUM(GREATEST(0, poi.qty - COALESCE(poi.received_qty, 0)))
+		FROM `tabPurchase Order Item` poi
+		INNER JOIN `tabPurchase Order` po ON poi.parent = po.name
+		WHERE po.docstatus IN (0, 1)
+			AND po.status NOT IN ('Cancelled', 'Completed')
+			{condition}
+		GROUP BY poi.item_code
+		""",
+		"poi.item_code",
+		item_codes,
+	)
+
+	if item_codes is None:
+		# Sadece rezerv/talep/sipariş tarafında geçen hammaddeler tabloda tutulur;
+		# yalnızca Bin'de olan ürünler okuma anında talep üzerine hesaplanır.
+		item_codes = set(reserved_map) | set(used_map) | set(pending_mr_map) | set(pending_po_map)
+		item_codes |= set(frappe.get_all(AVAILABILITY_DOCTYPE, pluck="name"))
+
+	result = {}
+	for item_code in item_codes:
+		actual_qty = actual_map.get(item_code, 0)
+		reserved_qty = reserved_map.get(item_code, 0)
+		pending_mr_qty = pending_mr_map.get(item_code, 0)
+		pending_po_qty = pending_po_map.get(item_code, 0)
+		result[item_code] = frappe._dict(
+			item_code=item_code,
+			actual_qty=actual_qty,
+			reserved_qty=reserved_qty,
+			long_term_used_qty=used_map.get(item_code, 0),
+			pending_mr_qty=pending_mr_qty,
+			pending_po_qty=pending_po_qty,
+			available_qty=flt(actual_qty - reserved_qty, 5),
+			# Açık miktar = Rezerv - Stok - Bekleyen talep - Bekleyen satınalma
+			shortage_qty=flt(max(0, reserved_qty - actual_qty - pending_mr_qty - pending_po_qty), 5),
+		)
+	return result
+
+
+def _upsert_rows(rows):
+	"""Hesaplanan satırları çok satırlı INSERT ... ON DUPLICATE KEY UPDATE ile yazar."""
+	if not rows:
+		return
+
+	timestamp = now()
+	user = frappe.session.user
+	upsert_rows(
+		AVAILABILITY_DOCTYPE,
+		("name", "item_code", *QTY_FIELDS, "last_updated", "creation", "modified", "owner", "modified_by"),
+		[
+			(row.item_code, row.item_code, *[row[field] for field in QTY_FIELDS], timestamp, timestamp, timestamp, user, user)
+			for row in rows
+		],
+		update_columns=(*QTY_FIELDS, "last_updated", "modified", "modified_by"),
+	)
+
+
+def refresh_availability(item_codes):
+	"""Verilen hammaddelerin satırlarını yeniden hesaplayıp yazar. Hesaplanan satırları döndürür."""
+	item_codes = sorted({str(code).strip() for code in item_codes if code})
+	refreshed = {}
+	for start in range(0, len(item_codes), CHUNK_SIZE):
+		chunk = _compute_availability(item_codes[start : start + CHUNK_SIZE])
+		_upsert_rows(list(chunk.values()))
+		refreshed.update(chunk)
+	return refreshed
+
+
+def backfill_availability(item_codes):
+	"""Arka plan işi: okuma sırasında tabloda bulunamayan hammaddelerin satırlarını yazar."""
+	refresh_availability(item_codes)
+	frappe.db.commit()
+
+
+def get_availability_map(item_codes):
+	"""
+	Hammadde kullanılabilirlik değerlerini materyalize tablodan okur (salt okunur).
+	Tabloda olmayan hammaddeler bellekte hesaplanır; satırların yazılması kuyruğa alınır.
+	Dönüş: {item_code: {actual_qty, reserved_qty, ..., shortage_qty}}
+	"""
+	item_codes = list({str(code).strip() for code in item_codes if code})
+	if not item_codes:
+		return {}
+
+	availability = {
+		row.item_code: row
+		for row in frappe.get_all(
+			AVAILABILITY_DOCTYPE,
+			filters={"name": ["in", item_codes]},
+			fields=["item_code", *QTY_FIELDS],
+		)
+	}
+	missing = sorted(code for code in item_codes if code not in availability)
+	if missing:
+		for start in range(0, len(missing), CHUNK_SIZE):
+			availability.update(_compute_availability(missing[start : start + CHUNK_SIZE]))
+		frappe.enqueue(
+			"uretim_planlama.uretim_planlama.api.raw_material_availability.backfill_availability",
+			queue="short",
+			item_codes=missing,
+		)
+	return availability
+
+
+def _collect_item_codes(doc):
+	"""Belgenin etkilediği hammadde kodlarını toplar."""
+	if doc.doctype == "Sales Order":
+		item_codes = set(explode_sales_order_items(doc.items))
+		for doctype in ("Rezerved Raw Materials", "Long Term Reserve Usage"):
+			item_codes.update(
+				frappe.get_all(doctype, filters={"sales_order": doc.name}, pluck="item_code")
+			)
+		return item_codes
+	if doc.doctype == "Work Order":
+		return {row.item_code for row in doc.get("required_items") or []}
+	return {row.item_code for row in doc.get("items") or []}
+
+
+def queue_availability_refresh(item_codes):
+	"""Hammadde satırlarının commit sonrasında yeniden hesaplanmasını planlar."""
+	item_codes = {code for code in item_codes if code}
+	if not item_codes:
+		return
+
+	def _refresh():
+		try:
+			refresh_availability(item_codes)
+			frappe.db.commit()
+		except Exception:
+			frappe.log_error("Raw Material Availability refresh HATA", frappe.get_traceback())
+
+	frappe.db.after_commit.add(_refresh)
+
+
+def on_doc_event(doc, method=None):
+	"""
+	doc_events hook'u: Belgedeki hammaddelerin kullanılabilirlik satırlarını günceller.
+	Diğer hook'ların after_commit işlemlerinden SONRA çalışması için listelerin sonuna eklenmelidir.
+	"""
+	try:
+		queue_availability_refresh(_collect_item_codes(doc))
+	except Exception:
+		frappe.log_error("Raw Material Availability hook HATA", frappe.get_traceback())
+
+
+def reconcile_availability():
+	"""
+	Günlük mutabakat: Tüm satırları kaynak tablolardan yeniden hesaplar ve kaymaları düzeltir.
+	Hook'ların yakalayamadığı hareketler (Repost Item Valuation, doğrudan SQL güncellemeleri vb.) burada düzelir.
+	"""
+	start_time = time.time()
+	computed = _compute_availability()
+	stored = {
+		row.item_code: row
+		for row in frappe.get_all(AVAILABILITY_DOCTYPE, fields=["item_code", *QTY_FIELDS])
+	}
+
+	drifted = [
+		row
+		for item_code, row in computed.items()
+		if item_code not in stored
+		or any(abs(flt(stored[item_code][field]) - row[field]) > 0.0001 for field in QTY_FIELDS)
+	]
+	for start in range(0, len(drifted), CHUNK_SIZE):
+		_upsert_rows(drifted[start : start + CHUNK_SIZE])
+	frappe.db.commit()
+
+	message = (
+		f"Hammadde kullanılabilirlik mutabakatı: {len(computed)} kalem, "
+		f"{len(drifted)} düzeltme, {time.time() - start_time:.2f}s"
+	)
+	frappe.logger().info(message)
+	return {"items": len(computed), "drifted": len(drifted), "execution_time": round(time.time() - start_time, 3)}
+
+
+@frappe.whitelist()
+def rebuild_availability():
+	"""Defteri elle yeniden oluşturur (System Manager)."""
+	frappe.only_for("System Manager")
+	return reconcile_availability()
@@ -1,29 +1,30 @@
+import time
+
 import frappe
 from frappe import _
+from frappe.utils import flt
 from datetime import date, timedelta
 
+from uretim_planlama.uretim_planlama.api.boy_registry import get_boy_names
+from uretim_planlama.uretim_planlama.api.reorder_status import (
+	get_below_min_status,
+	rebuild_reorder_status,
+	refresh_reorder_status,
+)
+
 
 def _get_reorder_rule(profile_type: str, length: float, warehouse: str | None):
-	"""Boy Link'i virgül/nokta ile adlandırılmış olabilir. Olası ad varyantlarını dene."""
-	candidates = set()
-	# Doğrudan str
-	candidates.add(str(length))
-	# 1 ve 3 ondalık biçimleri
-	candidates.add(f"{length:.1f}")
-	candidates.add(f"{length:.3f}".rstrip('0').rstrip('.'))
-	# Nokta/virgül dönüşümleri
-	for s in list(candidates):
-		candidates.add(s.replace('.', ','))
-		candidates.add(s.replace(',', '.'))
-	
-	# Debug için log
-	frappe.logger().info(f"Reorder rule search candidates for {profile_type} {length}: {candidates}")
+	"""Boy Link'i virgül/nokta ile adlandırılmış olabilir. Aynı sayısal boya sahip Boy adları kayıt defterinden alınır."""
+	boy_names = get_boy_names(length)
+	if not boy_names:
+		frappe.logger().info(f"No Boy record for {profile_type} {length}")
+		return None
 
 	rules = frappe.get_all(
 		"Profile Reorder Rule",
 		filters={
 			"item_code": profile_type,
-			"length": ("in", list(candidates)),
+			"length": ("in", boy_names),
 			"active": 1,
 		},
 		fields=["name", "min_qty", "reorder_qty", "default_supplier", "length"],
@@ -65,59 +66,66 @@ def _check_draft_purchase_mr(profile_type: str, warehouse: str | None) -> bool:
 		return False
 
 
-def _create_material_request(profile_type: str, qty: float, warehouse: str | None, supplier: str | None, length: float = None, profile_qty: int = None):
+def _new_profile_material_request(supplier: str | None, description: str):
 	mr = frappe.new_doc("Material Request")
 	mr.material_request_type = "Purchase"
 	mr.schedule_date = date.today() + timedelta(days=1)
-	
+
 	# Profil için özel alanlar
 	if supplier:
 		mr.supplier = supplier
-	
+
 	# Profil işaretle (eğer custom field varsa)
 	if hasattr(mr, 'is_profile_request'):
 		mr.is_profile_request = 1
 	if hasattr(mr, 'custom_is_profile_request'):
 		mr.custom_is_profile_request = 1
-	
+
 	# Açıklama ekle
-	mr.description = f"Profil Malzeme Talebi - {profile_type} {length}m"
-	
+	mr.description = description
+	return mr
+
+
+def _append_profile_row(mr, profile_type: str, qty: float, warehouse: str | None, length: float | None = None, profile_qty: int | None = None, boy_name: str | None = None):
 	row = mr.append("items", {})
 	row.item_code = profile_type
 	row.qty = qty
 	if warehouse:
 		row.warehouse = warehouse
-	
+
 	# Profil için özel alanlar ekle
 	if length:
 		# Boy bilgisini description'a ekle
 		row.description = f"Profil Boyu: {length}m"
-		
+
 		# Profil boy adedi ve boyu bilgilerini ekle
 		if hasattr(row, 'custom_is_profile'):
 			row.custom_is_profile = 1
 		if hasattr(row, 'custom_profile_length_m'):
 			# Güçlü boy kayıt bulma fonksiyonunu kullan
-			from uretim_planlama.uretim_planlama.utils import get_or_create_boy_record
-			boy_name = get_or_create_boy_record(length)
+			if not boy_name:
+				from uretim_planlama.uretim_planlama.utils import get_or_create_boy_record
+				boy_name = get_or_create_boy_record(length)
 			if boy_name:
 				row.custom_profile_length_m = boy_name
 		if hasattr(row, 'custom_profile_length_qty') and profile_qty:
 			row.custom_profile_length_qty = profile_qty
-		
+
 		# Eğer custom field'lar varsa onları da doldur
 		if hasattr(row, 'custom_length'):
 			row.custom_length = length
 		if hasattr(row, 'custom_profile_length'):
 			row.custom_profile_length = length
-	
+
 	# Profil işaretle (eğer custom field varsa)
 	if hasattr(row, 'is_profile'):
 		row.is_profile = 1
 	if hasattr(row, 'custom_is_profile'):
 		row.custom_is_profile = 1
-	
+	return row
+
+
+def _insert_and_submit(mr):
 	mr.insert(ignore_permissions=True)
 	# Otomatik submit et
 	try:
@@ -128,26 +136,101 @@ def _create_material_request(profile_type: str, qty: float, warehouse: str | Non
 	return mr.name
 
 
+def _create_material_request(profile_type: str, qty: float, warehouse: str | None, supplier: str | None, length: float = None, profile_qty: int = None):
+	mr = _new_profile_material_request(supplier, f"Profil Malzeme Talebi - {profile_type} {length}m")
+	_append_profile_row(mr, profile_type, qty, warehouse, length, profile_qty)
+	return _insert_and_submit(mr)
+
+
 # test_reorder_for_profile fonksiyonu kaldırıldı - ensure_reorder_for_profile kullanılıyor
 
 
+def _get_below_min_rules():
+	"""
+	Minimumun altındaki anahtarları Profile Reorder Status tablosundan okur.
+	Tablo ledger güncellemeleriyle güncel tutulur ve sweep başında yeniden kurulur; aynı sayısal boya sahip farklı Boy adları
+	(6,5 / 6.5) length_mm üzerinden birlikte toplanmış, stok kaydı olmayanlar 0 kabul edilmiştir.
+	"""
+	return get_below_min_status()
+
+
+def _get_open_mr_keys(item_codes):
+	"""
+	Açık (taslak veya sipariş bekleyen) satınalma taleplerini tek sorguda okur.
+	Dönüş: {(item_code, length_mm)}; boy bilgisi olmayan satırlar için length_mm None (ürünün tüm boylarını kapsar)
+	"""
+	if not item_codes:
+		return set()
+	rows = frappe.db.sql("""
+		SELECT DISTINCT mri.item_code, b.length_mm
+		FROM `tabMaterial Request Item` mri
+		INNER JOIN `tabMaterial Request` mr ON mr.name = mri.parent
+		LEFT JOIN `tabBoy` b ON b.name = mri.custom_profile_length_m
+		WHERE mr.material_request_type = 'Purchase'
+			AND (mr.docstatus = 0 OR (mr.docstatus = 1 AND mr.status IN ('Pending', 'Partially Ordered')))
+			AND mri.item_code IN %(item_codes)s
+	""", {"item_codes": tuple(item_codes)})
+	return {(row[0], row[1]) for row in rows}
+
+
 def profile_reorder_sweep():
-	"""Scan all non-scrap stocks and trigger reorders when below threshold."""
-	stocks = frappe.get_all(
-		"Profile Stock Ledger",
-		filters={"is_scrap_piece": 0},
-		fields=["item_code", "length", "qty"],
-		limit=10000,
-	)
-	created = 0
-	for s in stocks:
+	"""
+	Minimum stok altındaki profilleri set tabanlı tarar ve tedarikçi başına tek Material Request oluşturur.
+	Dönüş: sayılar ve süreler
+	"""
+	start_time = time.time()
+	# Hook dışı ledger/kural değişiklikleri eski durum bırakmasın: tablo taramadan önce yeniden kurulur
+	rebuild_reorder_status()
+	below_min = _get_below_min_rules()
+	query_time = time.time() - start_time
+
+	open_keys = _get_open_mr_keys({rule.item_code for rule in below_min})
+	to_order = [
+		rule for rule in below_min
+		if (rule.item_code, rule.length_mm) not in open_keys and (rule.item_code, None) not in open_keys
+	]
+
+	by_supplier = {}
+	for rule in to_order:
+		by_supplier.setdefault(rule.default_supplier, []).append(rule)
+
+	created = []
+	for supplier, rules in by_supplier.items():
+		# Tedarikçi başına savepoint: yarım kalan talep ve last_request_on güncellemesi geri alınır
+		save_point = f"profile_reorder_{frappe.generate_hash(length=8)}"
+		frappe.db.savepoint(save_point)
 		try:
-			mr = ensure_reorder_for_profile(s["item_code"], float(s["length"]), float(s["qty"]))
-			if mr:
-				created += 1
+			mr = _new_profile_material_request(supplier, f"Profil Malzeme Talebi (Otomatik) - {len(rules)} kalem")
+			for rule in rules:
+				_append_profile_row(
+					mr, rule.item_code, flt(rule.reorder_qty), None,
+					flt(rule.length_value), int(rule.reorder_qty), boy_name=rule.length
+				)
+			created.append(_insert_and_submit(mr))
+
+			# Son talep tarihini tek sorguda güncelle
+			frappe.db.sql(
+				"UPDATE `tabProfile Reorder Rule` SET last_request_on = %(now)s WHERE name IN %(names)s",
+				{"now": frappe.utils.now(), "names": tuple(rule.name for rule in rules)},
+			)
 		except Exception as e:
-			frappe.log_error(f"Reorder sweep error: {s} -> {e}", "Profile Reorder Sweep Error")
-	return created
+			frappe.db.rollback(save_point=save_point)
+			frappe.log_error(f"Reorder sweep error: {supplier} -> {e}", "Profile Reorder Sweep Error")
+
+	# Son talep bilgisini durum tablosuna yansıt (taslak kalan talepler dahil)
+	refresh_reorder_status({rule.item_code for rule in to_order})
+	frappe.db.commit()
+
+	result = {
+		"below_min": len(below_min),
+		"skipped_open_mr": len(below_min) - len(to_order),
+		"rows_ordered": len(to_order),
+		"material_requests": created,
+		"query_time": round(query_time, 3),
+		"execution_time": round(time.time() - start_time, 3),
+	}
+	frappe.logger().info(f"Profile reorder sweep: {result}")
+	return result
 
 
 def ensure_reorder_for_profile(profile_type: str, length: float, current_qty: float, warehouse: str | None = None):
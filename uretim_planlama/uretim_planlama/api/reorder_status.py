@@ -0,0 +1,249 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+"""
+Profil yeniden sipariş durumu (Profile Reorder Status)
+
+Her aktif Profile Reorder Rule için (item_code, boy) başına bir satır tutulur:
+mevcut stok (parça olmayan, aynı length_mm'e sahip tüm Boy adları toplamı), eksik miktar,
+minimum altında mı ve son satınalma talebi. Satır adı {item_code}::{length_mm}.
+
+- Profile Stock Ledger toplu güncellemesi, toplu/Data Import ledger yazımları, kural
+  değişiklikleri ve Material Request submit/cancel olayları etkilenen ürünlerin satırlarını
+  yeniden hesaplar.
+- Profil Boy Stok Özeti raporu, profil stok paneli ve reorder sweep bu tabloyu okur;
+  kural x stok x boy çarpımı okuma sırasında yeniden kurulmaz.
+- Günlük reorder sweep taramadan önce tabloyu baştan oluşturur (hook dışı değişiklikler için
+  mutabakat); sweep eski bir tabloyu okumaz.
+"""
+
+import frappe
+from frappe.utils import flt, now
+
+from uretim_planlama.uretim_planlama.api.boy_registry import get_boy_length, length_to_mm
+from uretim_planlama.uretim_planlama.api.db_utils import upsert_rows
+
+STATUS_DOCTYPE = "Profile Reorder Status"
+CHUNK_SIZE = 500
+
+
+def _status_name(item_code, length_mm):
+	return f"{item_code}::{length_mm}"
+
+
+def _chunks(values, size=CHUNK_SIZE):
+	values = list(values)
+	for start in range(0, len(values), size):
+		yield values[start : start + size]
+
+
+def _get_last_material_requests(item_codes):
+	"""
+	Ürünlerin boy bazında en son satınalma talebini tek sorguda döndürür (iptal edilenler hariç).
+	En son talep (item_code, length_mm) başına MAX(creation) alt sorgusuyla seçilir; tüm talep
+	geçmişi Python'a taşınmaz.
+	Dönüş: {(item_code, length_mm): {"name", "status", "creation"}}
+	"""
+	condition = "AND mri.item_code IN %(item_codes)s" if item_codes is not None else ""
+	last = {}
+	for row in frappe.db.sql(
+		f"""
+		SELECT mri.item_code, b.length_mm, mr.name, mr.docstatus, mr.status, mr.creation
+		FROM `tabMaterial Request Item` mri
+		INNER JOIN `tabMaterial Request` mr ON mr.name = mri.parent
+		INNER JOIN `tabBoy` b ON b.name = mri.custom_profile_length_m
+		INNER JOIN (
+			SELECT mri.item_code, b.length_mm, MAX(mr.creation) AS last_creation
+			FROM `tabMaterial Request Item` mri
+			INNER JOIN `tabMaterial Request` mr ON mr.name = mri.parent
+			INNER JOIN `tabBoy` b ON b.name = mri.custom_profile_length_m
+			WHERE mr.material_request_type = 'Purchase'
+				AND mr.docstatus < 2
+				{condition}
+			GROUP BY mri.item_code, b.length_mm
+		) latest ON latest.item_code = mri.item_code
+			AND latest.length_mm = b.length_mm
+			AND latest.last_creation = mr.creation
+		WHERE mr.material_request_type = 'Purchase'
+			AND mr.docstatus < 2
+			{condition}
+		ORDER BY mr.name DESC
+		""",
+		{"item_codes": tuple(item_codes or ())},
+		as_dict=True,
+	):
+		# Aynı anda oluşturulmuş talepler varsa ada göre sonuncusu
+		last.setdefault((row.item_code, row.length_mm), row)
+	return last
+
+
+def _compute_status_rows(item_codes=None):
+	"""
+	Aktif kuralların durum satırlarını tek gruplu sorguda hesaplar (item_codes verilmezse tümü).
+	Dönüş: [frappe._dict, ...]
+	"""
+	item_condition = "AND r.item_code IN %(item_codes)s" if item_codes is not None else ""
+	stock_condition = "AND psl.item_code IN %(item_codes)s" if item_codes is not None else ""
+	rules = frappe.db.sql(
+		f"""
+		SELECT
+			r.name AS rule, r.item_code, r.item_group, r.length, b.length AS length_value, b.length_mm,
+			r.min_qty, r.reorder_qty, r.default_supplier, r.last_request_on,
+			COALESCE(st.qty, 0) AS current_qty
+		FROM `tabProfile Reorder Rule` r
+		INNER JOIN `tabBoy` b ON b.name = r.length
+		LEFT JOIN (
+			SELECT psl.item_code, lb.length_mm, SUM(psl.qty) AS qty
+			FROM `tabProfile Stock Ledger` psl
+			INNER JOIN `tabBoy` lb ON lb.name = psl.length
+			WHERE psl.is_scrap_piece = 0
+				{stock_condition}
+			GROUP BY psl.item_code, lb.length_mm
+		) st ON st.item_code = r.item_code AND st.length_mm = b.length_mm
+		WHERE r.active = 1
+			{item_condition}
+		ORDER BY r.item_code, b.length_mm, r.creation
+		""",
+		{"item_codes": tuple(item_codes or ())},
+		as_dict=True,
+	)
+	if not rules:
+		return []
+
+	last_requests = _get_last_material_requests(
+		None if item_codes is None else {rule.item_code for rule in rules}
+	)
+	timestamp = now()
+	rows = {}
+	for rule in rules:
+		name = _status_name(rule.item_code, rule.length_mm)
+		# Aynı sayısal boya ait birden fazla kural varsa ilk (en eski) kural kullanılır
+		if name in rows:
+			continue
+		last_mr = last_requests.get((rule.item_code, rule.length_mm))
+		current_qty, min_qty = flt(rule.current_qty), flt(rule.min_qty)
+		rows[name] = frappe._dict(
+			name=name,
+			item_code=rule.item_code,
+			item_group=rule.item_group,
+			length=rule.length,
+			length_value=flt(rule.length_value),
+			length_mm=rule.length_mm,
+			rule=rule.rule,
+			default_supplier=rule.default_supplier,
+			min_qty=min_qty,
+			reorder_qty=flt(rule.reorder_qty),
+			current_qty=current_qty,
+			deficit=max(min_qty - current_qty, 0),
+			is_below_min=1 if current_qty < min_qty else 0,
+			last_material_request=last_mr.name if last_mr else None,
+			last_material_request_status=(
+				("Draft" if last_mr.docstatus == 0 else last_mr.status) if last_mr else None
+			),
+			last_request_on=rule.last_request_on,
+			last_updated=timestamp,
+		)
+	return list(rows.values())
+
+
+def _upsert_status_rows(rows):
+	"""Durum satırlarını çok satırlı INSERT ... ON DUPLICATE KEY UPDATE ile yazar."""
+	if not rows:
+		return
+
+	fields = [
+		"item_code", "item_group", "length", "length_value", "length_mm", "rule", "default_supplier",
+		"min_qty", "reorder_qty", "current_qty", "deficit", "is_below_min", "last_material_request",
+		"last_material_request_status", "last_request_on", "last_updated",
+	]
+	timestamp = now()
+	user = frappe.session.user
+	upsert_rows(
+		STATUS_DOCTYPE,
+		("name", *fields, "creation", "modified", "owner", "modified_by"),
+		[(row.name, *[row[field] for field in fields], timestamp, timestamp, user, user) for row in rows],
+		update_columns=(*fields, "modified", "modified_by"),
+	)
+
+
+def refresh_reorder_status(item_codes):
+	"""
+	Ürünlerin tüm boy satırlarını yeniden hesaplar; artık aktif kuralı olmayan satırları siler.
+	Dönüş: yazılan satır sayısı
+	"""
+	item_codes = sorted({item_code for item_code in item_codes if item_code})
+	written = 0
+	for chunk in _chunks(item_codes):
+		rows = _compute_status_rows(chunk)
+		for start in range(0, len(rows), CHUNK_SIZE):
+			_upsert_status_rows(rows[start : start + CHUNK_SIZE])
+
+		stale_condition = "AND name NOT IN %(names)s" if rows else ""
+		frappe.db.sql(
+			f"DELETE FROM `tab{STATUS_DOCTYPE}` WHERE item_code IN %(item_codes)s {stale_condition}",
+			{"item_codes": tuple(chunk), "names": tuple(row.name for row in rows)},
+		)
+		written += len(rows)
+	return written
+
+
+def rebuild_reorder_status():
+	"""Reorder sweep / patch: durum tablosunu baştan oluşturur."""
+	rows = _compute_status_rows()
+	frappe.db.sql(f"DELETE FROM `tab{STATUS_DOCTYPE}`")
+	for start in range(0, len(rows), CHUNK_SIZE):
+		_upsert_status_rows(rows[start : start + CHUNK_SIZE])
+	frappe.db.commit()
+	return len(rows)
+
+
+def get_reorder_status_map(item_codes=None):
+	"""
+	Durum satırlarını (item_code, length_mm) anahtarıyla tek sorguda döndürür.
+	Dönüş: {(item_code, length_mm): row}
+	"""
+	if item_codes is not None and not item_codes:
+		return {}
+	filters = {"item_code": ["in", list(item_codes)]} if item_codes is not None else {}
+	return {
+		(row.item_code, row.length_mm): row
+		for row in frappe.get_all(
+			STATUS_DOCTYPE,
+			filters=filters,
+			fields=[
+				"item_code", "length", "length_mm", "min_qty", "reorder_qty", "current_qty", "deficit",
+				"is_below_min", "last_material_request", "last_material_request_status",
+			],
+		)
+	}
+
+
+def get_below_min_status():
+	"""Minimum altındaki ve sipariş miktarı tanımlı satırları (sweep girdisi) index üzerinden okur."""
+	return frappe.db.sql(
+		f"""
+		SELECT
+			rule AS name, item_code, length, length_value, length_mm,
+			min_qty, reorder_qty, default_supplier, current_qty
+		FROM `tab{STATUS_DOCTYPE}`
+		WHERE is_below_min = 1 AND reorder_qty > 0
+		ORDER BY default_supplier, item_code, length_value
+		""",
+		as_dict=True,
+	)
+
+
+def get_length_mm(length):
+	"""Profile Stock Ledger / MR satırındaki Boy adının length_mm karşılığı (bulunamazsa None)."""
+	length_value = get_boy_length(length)
+	return length_to_mm(length_value) if length_value else None
+
+
+def on_material_request_change(doc, method=None):
+	"""Material Request doc_events hook'u: profil satırlarının son talep bilgisini günceller."""
+	try:
+		refresh_reorder_status(
+			{item.item_code for item in doc.get("items") or [] if item.get("custom_profile_length_m")}
+		)
+	except Exception:
+		frappe.log_error("Profile Reorder Status güncelleme HATA", frappe.get_traceback())
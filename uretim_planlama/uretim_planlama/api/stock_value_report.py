@@ -1,124 +1,371 @@
+"""
+Depo bazında stok değeri
+
+- Kaynak: `Bin` (ERPNext çekirdek stok tablosu) + `Item` (ürün adı / grubu)
+- Stok değeri = `Bin.stock_value` (varsa) aksi halde `actual_qty * valuation_rate`
+- Depo toplamları, ürün grubu filtresi ve ortalama maliyet tek SQL aggregate'te hesaplanır.
+- Satır detayı (warehouse, item_code) üzerinden keyset sayfalama ile okunur.
+- Warehouse Stock Value Snapshot: depo + ürün grubu başına özet tablo. Stock Ledger Entry
+  kayıtlarında etkilenen (depo, ürün grubu) satırları commit sonrası, ürün grubu değişen
+  Item'larda eski ve yeni grup satırları kayıt sırasında yeniden hesaplanır; günlük iş tüm
+  tabloyu yeniler (repost gibi olay tetiklemeyen değişiklikler için). Ürün filtresi olmayan
+  özet okumaları bu tablodan yapılır; satır detayı dönen rapor toplamları canlı hesaplanır.
+"""
+
 import frappe
-from frappe.utils import flt
+from frappe.utils import cint, flt, now
+
+from uretim_planlama.uretim_planlama.api.db_utils import upsert_rows
+
+SNAPSHOT_DOCTYPE = "Warehouse Stock Value Snapshot"
+SNAPSHOT_READY_KEY = "uretim_planlama:stock_value_snapshot_ready"
+DEFAULT_PAGE_LENGTH = 500
+MAX_PAGE_LENGTH = 5000
+CHUNK_SIZE = 500
+
+STOCK_VALUE_SQL = "COALESCE(b.stock_value, b.actual_qty * b.valuation_rate)"
+
+
+def _parse_list(value):
+    """Whitelisted çağrılardan gelen liste / JSON / virgüllü metni listeye çevirir."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = frappe.parse_json(value) if value.strip().startswith("[") else value.split(",")
+    return [v.strip() for v in value if v and v.strip()]
+
+
+def _bin_conditions(item_code=None, item_group=None, warehouse=None, exclude_item_groups=None):
+    """Bin + Item sorguları için ortak WHERE koşulları ve parametreleri."""
+    conditions = ["b.actual_qty != 0"]
+    params = {}
+    if item_code:
+        conditions.append("b.item_code = %(item_code)s")
+        params["item_code"] = item_code
+    if item_group:
+        conditions.append("i.item_group = %(item_group)s")
+        params["item_group"] = item_group
+    if warehouse:
+        conditions.append("b.warehouse = %(warehouse)s")
+        params["warehouse"] = warehouse
+    exclude_item_groups = _parse_list(exclude_item_groups)
+    if exclude_item_groups:
+        conditions.append("IFNULL(i.item_group, '') NOT IN %(exclude_item_groups)s")
+        params["exclude_item_groups"] = tuple(exclude_item_groups)
+    return " AND ".join(conditions), params
+
+
+def _with_average(rows):
+    for row in rows:
+        row["total_qty"] = flt(row.total_qty)
+        row["total_stock_value"] = flt(row.total_stock_value)
+        row["avg_valuation_rate"] = (
+            flt(row.total_stock_value / row.total_qty) if row.total_qty else 0
+        )
+    return rows
+
+
+def _snapshot_ready():
+    return bool(frappe.db.get_global(SNAPSHOT_READY_KEY))
+
+
+@frappe.whitelist()
+def get_warehouse_stock_summary(item_code: str | None = None,
+                                item_group: str | None = None,
+                                warehouse: str | None = None,
+                                exclude_item_groups=None,
+                                use_snapshot: int = 1) -> list:
+    """
+    Depo bazında toplam miktar, toplam stok değeri ve ortalama maliyet.
+
+    Ürün filtresi yoksa ve özet tablo hazırsa Warehouse Stock Value Snapshot'tan
+    (depo x ürün grubu satırları) okunur; aksi halde Bin üzerinde tek gruplu sorgu çalışır.
+    """
+    if cint(use_snapshot) and not item_code and _snapshot_ready():
+        conditions = ["1 = 1"]
+        params = {}
+        if item_group:
+            conditions.append("s.item_group = %(item_group)s")
+            params["item_group"] = item_group
+        if warehouse:
+            conditions.append("s.warehouse = %(warehouse)s")
+            params["warehouse"] = warehouse
+        exclude_item_groups = _parse_list(exclude_item_groups)
+        if exclude_item_groups:
+            conditions.append("IFNULL(s.item_group, '') NOT IN %(exclude_item_groups)s")
+            params["exclude_item_groups"] = tuple(exclude_item_groups)
+
+        return _with_average(frappe.db.sql(
+            f"""
+            SELECT s.warehouse,
+                SUM(s.total_qty) AS total_qty,
+                SUM(s.total_stock_value) AS total_stock_value
+            FROM `tab{SNAPSHOT_DOCTYPE}` s
+            WHERE {" AND ".join(conditions)}
+            GROUP BY s.warehouse
+            HAVING SUM(s.item_count) > 0
+            ORDER BY s.warehouse
+            """,
+            params,
+            as_dict=True,
+        ))
+
+    where, params = _bin_conditions(item_code, item_group, warehouse, exclude_item_groups)
+    return _with_average(frappe.db.sql(
+        f"""
+        SELECT b.warehouse,
+            SUM(b.actual_qty) AS total_qty,
+            SUM({STOCK_VALUE_SQL}) AS total_stock_value
+        FROM `tabBin` b
+        JOIN `tabItem` i ON i.name = b.item_code
+        WHERE {where}
+        GROUP BY b.warehouse
+        ORDER BY b.warehouse
+        """,
+        params,
+        as_dict=True,
+    ))
+
+
+@frappe.whitelist()
+def get_warehouse_stock_items(item_code: str | None = None,
+                              item_group: str | None = None,
+                              warehouse: str | None = None,
+                              exclude_item_groups=None,
+                              after_warehouse: str | None = None,
+                              after_item_code: str | None = None,
+                              page_length: int = DEFAULT_PAGE_LENGTH) -> dict:
+    """
+    Stok değeri satır detayı, (warehouse, item_code) sırasında keyset sayfalama ile.
+    Sonraki sayfa için dönen next_cursor değerleri after_warehouse / after_item_code olarak verilir.
+    """
+    page_length = min(max(cint(page_length) or DEFAULT_PAGE_LENGTH, 1), MAX_PAGE_LENGTH)
+    where, params = _bin_conditions(item_code, item_group, warehouse, exclude_item_groups)
+    if after_warehouse:
+        where += """ AND (b.warehouse > %(after_warehouse)s
+            OR (b.warehouse = %(after_warehouse)s AND b.item_code > %(after_item_code)s))"""
+        params["after_warehouse"] = after_warehouse
+        params["after_item_code"] = after_item_code or ""
+    params["limit"] = page_length + 1
+
+    rows = frappe.db.sql(
+        f"""
+        SELECT b.warehouse, b.item_code,
+            IFNULL(NULLIF(i.item_name, ''), b.item_code) AS item_name,
+            i.item_group,
+            b.actual_qty AS qty,
+            IFNULL(b.valuation_rate, 0) AS valuation_rate,
+            {STOCK_VALUE_SQL} AS stock_value
+        FROM `tabBin` b
+        JOIN `tabItem` i ON i.name = b.item_code
+        WHERE {where}
+        ORDER BY b.warehouse, b.item_code
+        LIMIT %(limit)s
+        """,
+        params,
+        as_dict=True,
+    )
+
+    next_cursor = None
+    if len(rows) > page_length:
+        rows = rows[:page_length]
+        next_cursor = {"after_warehouse": rows[-1].warehouse, "after_item_code": rows[-1].item_code}
+
+    for row in rows:
+        row["qty"] = flt(row.qty)
+        row["valuation_rate"] = flt(row.valuation_rate)
+        row["stock_value"] = flt(row.stock_value)
+    return {"items": rows, "next_cursor": next_cursor}
 
 
 @frappe.whitelist()
 def get_warehouse_stock_value(item_code: str | None = None,
                               item_group: str | None = None,
-                              warehouse: str | None = None) -> dict:
+                              warehouse: str | None = None,
+                              exclude_item_groups=None,
+                              limit: int = 50000) -> dict:
     """
     Depo bazında stok değeri raporu.
 
-    - Kaynak: `Bin` (ERPNext çekirdek stok tablosu)
-    - Stok değeri = `Bin.stock_value` (varsa) aksi halde `actual_qty * valuation_rate`
+    - warehouse_summary: get_warehouse_stock_summary (tek aggregate / özet tablo)
+    - items: get_warehouse_stock_items sayfaları (en fazla `limit` satır)
     - Filtreler:
         * item_code  -> Ürün bazında
         * item_group -> Ürün grubu bazında
         * warehouse  -> Depo bazında
+        * exclude_item_groups -> Hariç tutulacak ürün grupları
     """
     try:
-        bin_filters: dict[str, object] = {}
-        if item_code:
-            bin_filters["item_code"] = item_code
-        if warehouse:
-            bin_filters["warehouse"] = warehouse
-
-        bins = frappe.get_all(
-            "Bin",
-            filters=bin_filters,
-            fields=[
-                "item_code",
-                "warehouse",
-                "actual_qty",
-                "valuation_rate",
-                "stock_value",
-            ],
-            order_by="warehouse, item_code",
-            limit=50000,
-        )
-
-        if not bins:
-            return {"warehouse_summary": [], "items": []}
+        filters = {
+            "item_code": item_code,
+            "item_group": item_group,
+            "warehouse": warehouse,
+            "exclude_item_groups": exclude_item_groups,
+        }
+        limit = cint(limit)
 
-        # Item bilgilerini tek seferde çek
-        item_codes = {row.item_code for row in bins}
-        items = frappe.get_all(
-            "Item",
-            filters={"name": ["in", list(item_codes)]},
-            fields=["name", "item_name", "item_group"],
-        )
-        item_map = {row.name: row for row in items}
-
-        rows: list[dict] = []
-        warehouse_totals: dict[str, dict] = {}
-
-        for row in bins:
-            item = item_map.get(row.item_code)
-            if not item:
-                continue
-
-            # Ürün grubu filtresi
-            if item_group and item.item_group != item_group:
-                continue
-
-            qty = flt(row.actual_qty)
-            if not qty:
-                continue
-
-            valuation_rate = flt(row.valuation_rate)
-            stock_value = flt(row.stock_value) if row.stock_value is not None else qty * valuation_rate
-
-            rows.append(
-                {
-                    "warehouse": row.warehouse,
-                    "item_code": row.item_code,
-                    "item_name": item.item_name or row.item_code,
-                    "item_group": item.item_group,
-                    "qty": qty,
-                    "valuation_rate": valuation_rate,
-                    "stock_value": stock_value,
-                }
+        items = []
+        cursor = {}
+        while len(items) < limit:
+            page = get_warehouse_stock_items(
+                **filters, **cursor, page_length=min(MAX_PAGE_LENGTH, limit - len(items))
             )
+            items.extend(page["items"])
+            if not page["next_cursor"]:
+                break
+            cursor = page["next_cursor"]
 
-            wh = row.warehouse
-            if wh not in warehouse_totals:
-                warehouse_totals[wh] = {
-                    "warehouse": wh,
-                    "total_qty": 0.0,
-                    "total_stock_value": 0.0,
-                }
-
-            warehouse_totals[wh]["total_qty"] += qty
-            warehouse_totals[wh]["total_stock_value"] += stock_value
-
-        # Ortalama maliyet
-        warehouse_summary = []
-        for wh, data in warehouse_totals.items():
-            total_qty = data["total_qty"]
-            total_value = data["total_stock_value"]
-            avg_rate = total_value / total_qty if total_qty else 0
-            data["avg_valuation_rate"] = flt(avg_rate)
-            warehouse_summary.append(data)
-
-        # Depo adına göre sırala
-        warehouse_summary.sort(key=lambda x: x["warehouse"])
-
+        # Satır detayı Bin'den canlı okunduğu için toplamlar da aynı kaynaktan hesaplanır
+        # (özet tablo commit sonrası güncellendiğinden satırlarla çelişebilir)
         return {
-            "warehouse_summary": warehouse_summary,
-            "items": rows,
+            "warehouse_summary": get_warehouse_stock_summary(**filters, use_snapshot=0),
+            "items": items,
         }
 
     except Exception as e:
-        frappe.log_error(f"get_warehouse_stock_value error: {str(e)}", "Warehouse Stock Value Report")
+        frappe.log_error(f"get_warehouse_stock_value error: {e!s}", "Warehouse Stock Value Report")
         return {"error": str(e), "warehouse_summary": [], "items": []}
 
 
+def _compute_snapshot_rows(pairs=None):
+    """
+    Bin üzerinden depo x ürün grubu özet satırlarını hesaplar.
+    pairs verilirse sadece bu (warehouse, item_group) satırları hesaplanır.
+    """
+    condition = ""
+    values = []
+    if pairs is not None:
+        warehouses = sorted({warehouse for warehouse, _ in pairs})
+        condition = (
+            f"AND b.warehouse IN ({', '.join(['%s'] * len(warehouses))}) "
+            f"AND (b.warehouse, IFNULL(i.item_group, '')) IN ({', '.join(['(%s, %s)'] * len(pairs))})"
+        )
+        values = warehouses + [value for pair in pairs for value in pair]
+
+    return frappe.db.sql(
+        f"""
+        SELECT b.warehouse, IFNULL(i.item_group, '') AS item_group,
+            COUNT(*) AS item_count,
+            SUM(b.actual_qty) AS total_qty,
+            SUM({STOCK_VALUE_SQL}) AS total_stock_value
+        FROM `tabBin` b
+        JOIN `tabItem` i ON i.name = b.item_code
+        WHERE b.actual_qty != 0
+            {condition}
+        GROUP BY b.warehouse, IFNULL(i.item_group, '')
+        """,
+        tuple(values),
+        as_dict=True,
+    )
+
+
+def _write_snapshot_rows(rows):
+    """Özet satırlarını çok satırlı INSERT ... ON DUPLICATE KEY UPDATE ile yazar."""
+    if not rows:
+        return
+
+    timestamp = now()
+    user = frappe.session.user
+    upsert_rows(
+        SNAPSHOT_DOCTYPE,
+        (
+            "name", "warehouse", "item_group", "item_count", "total_qty", "total_stock_value",
+            "last_updated", "creation", "modified", "owner", "modified_by",
+        ),
+        [
+            (
+                f"{row.warehouse}::{row.item_group}", row.warehouse, row.item_group or None,
+                row.item_count, flt(row.total_qty), flt(row.total_stock_value),
+                timestamp, timestamp, timestamp, user, user,
+            )
+            for row in rows
+        ],
+        update_columns=(
+            "item_count", "total_qty", "total_stock_value", "last_updated", "modified", "modified_by",
+        ),
+    )
+
+
+def refresh_stock_value_snapshot(pairs):
+    """Verilen (warehouse, item_group) satırlarını Bin'den yeniden hesaplar; stoğu kalmayanları siler."""
+    pairs = sorted({(warehouse, item_group or "") for warehouse, item_group in pairs if warehouse})
+    for start in range(0, len(pairs), CHUNK_SIZE):
+        chunk = pairs[start : start + CHUNK_SIZE]
+        rows = _compute_snapshot_rows(chunk)
+        _write_snapshot_rows(rows)
+
+        found = {(row.warehouse, row.item_group) for row in rows}
+        empty = [f"{warehouse}::{item_group}" for warehouse, item_group in chunk if (warehouse, item_group) not in found]
+        if empty:
+            frappe.db.sql(f"DELETE FROM `tab{SNAPSHOT_DOCTYPE}` WHERE name IN %s", (tuple(empty),))
 
 
+def rebuild_stock_value_snapshot():
+    """Günlük iş / patch: özet tabloyu baştan oluşturur ve okumalara açar."""
+    rows = _compute_snapshot_rows()
+    frappe.db.sql(f"DELETE FROM `tab{SNAPSHOT_DOCTYPE}`")
+    for start in range(0, len(rows), CHUNK_SIZE):
+        _write_snapshot_rows(rows[start : start + CHUNK_SIZE])
+    frappe.db.set_global(SNAPSHOT_READY_KEY, 1)
+    frappe.db.commit()
+    return len(rows)
 
 
+def _flush_pending_snapshot():
+    pending = frappe.flags.pop("stock_value_snapshot_pending", None) or set()
+    if not pending:
+        return
+    try:
+        item_groups = dict(frappe.get_all(
+            "Item",
+            filters={"name": ["in", list({item_code for _, item_code in pending})]},
+            fields=["name", "item_group"],
+            as_list=True,
+        ))
+        refresh_stock_value_snapshot(
+            {(warehouse, item_groups.get(item_code)) for warehouse, item_code in pending}
+        )
+        frappe.db.commit()
+    except Exception:
+        frappe.log_error("Warehouse Stock Value Snapshot refresh HATA", frappe.get_traceback())
+
 
+def on_stock_ledger_entry(doc, method=None):
+    """
+    Stock Ledger Entry doc_events hook'u: (depo, ürün) çiftini biriktirir; Bin güncellemeleri
+    bittikten sonra (commit sonrası) etkilenen özet satırları tek seferde yeniden hesaplanır.
+    """
+    if not doc.warehouse or not doc.item_code:
+        return
 
+    pending = frappe.flags.get("stock_value_snapshot_pending")
+    if pending is None:
+        pending = frappe.flags.stock_value_snapshot_pending = set()
+        frappe.db.after_commit.add(_flush_pending_snapshot)
+    pending.add((doc.warehouse, doc.item_code))
 
 
+def on_item_change(doc, method=None):
+    """
+    Item doc_events hook'u: ürün grubu değiştiyse ürünün stoğu olan depolarda eski ve yeni
+    (depo, ürün grubu) özet satırlarını yeniden hesaplar (aynı transaction içinde).
+    """
+    before = doc.get_doc_before_save()
+    if not before or before.item_group == doc.item_group:
+        return
 
+    try:
+        warehouses = frappe.get_all(
+            "Bin",
+            filters={"item_code": doc.name, "actual_qty": ["!=", 0]},
+            pluck="warehouse",
+        )
+        refresh_stock_value_snapshot(
+            {
+                (warehouse, item_group)
+                for warehouse in warehouses
+                for item_group in (before.item_group, doc.item_group)
+            }
+        )
+    except Exception:
+        frappe.log_error("Warehouse Stock Value Snapshot refresh HATA", frappe.get_traceback())
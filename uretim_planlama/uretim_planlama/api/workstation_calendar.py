@@ -0,0 +1,362 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+"""
+İş İstasyonu Takvimi (Workstation Calendar Day)
+
+Her iş istasyonu için gün bazında kullanılabilir dakika, Workstation Working Hour
+satırları ve istasyonun tatil listesinden hesaplanıp materyalize tabloda tutulur.
+
+- Satırlar ISO hafta bazında oluşturulur; okumalar salt okunurdur, eksik haftalar bellekte
+  hesaplanıp tabloya yazılmaları arka plan işine bırakılır. Bir hafta bir kez yazıldıktan
+  sonra okumalar tek sorguya iner.
+- Workstation veya Holiday List değiştiğinde sadece etkilenen istasyonların kayıtlı
+  tarih aralığı yeniden hesaplanır.
+- get_workstation_capacity, takvimi iş emri operasyonlarının tek gruplu sorguyla alınan
+  günlük toplamlarıyla birleştirir (en fazla MAX_RANGE_DAYS gün).
+"""
+
+from datetime import timedelta
+
+import frappe
+from frappe import _
+from frappe.utils import getdate, now
+
+from uretim_planlama.uretim_planlama.api.db_utils import upsert_rows
+from uretim_planlama.uretim_planlama.api.holiday_calendar import get_holidays
+
+CALENDAR_DOCTYPE = "Workstation Calendar Day"
+CHUNK_SIZE = 500
+# Okuma/oluşturma isteklerinde izin verilen en uzun tarih aralığı (gün)
+MAX_RANGE_DAYS = 366
+
+
+def _iso_week(date):
+	"""Tarihin ISO hafta anahtarı: 2025-W03"""
+	year, week, _ = date.isocalendar()
+	return f"{year}-W{week:02d}"
+
+
+def _to_minutes(value):
+	"""Time alanı değerini (timedelta veya 'HH:MM[:SS]') gün içi dakikaya çevirir."""
+	if value is None:
+		return 0
+	if isinstance(value, timedelta):
+		return int(value.total_seconds() // 60)
+	parts = str(value).split(":")
+	return int(parts[0]) * 60 + (int(parts[1]) if len(parts) > 1 else 0)
+
+
+def _daily_minutes(work_hours):
+	"""Bir günün toplam çalışma dakikası. Gece yarısını geçen vardiyalar ertesi güne taşar."""
+	return sum((_to_minutes(wh["end_time"]) - _to_minutes(wh["start_time"])) % 1440 for wh in work_hours)
+
+
+def _date_range(start_date, end_date):
+	return [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+
+
+def get_working_hours_map(workstations):
+	"""
+	Aktif çalışma saatlerini tek sorguda döndürür.
+	Dönüş: {workstation: [{"start_time", "end_time"}, ...]}
+	"""
+	if not workstations:
+		return {}
+
+	work_hours_map = {}
+	for row in frappe.get_all(
+		"Workstation Working Hour",
+		filters={"parent": ["in", list(workstations)], "parenttype": "Workstation", "enabled": 1},
+		fields=["parent", "start_time", "end_time"],
+		order_by="parent, idx",
+	):
+		work_hours_map.setdefault(row.parent, []).append(
+			{"start_time": row.start_time, "end_time": row.end_time}
+		)
+	return work_hours_map
+
+
+def _get_holiday_map(holiday_lists, start_date, end_date):
+	"""Tatil listelerinin aralıktaki günlerini önbellekli tatil takviminden döndürür: {(holiday_list, date): açıklama}"""
+	return {
+		(holiday_list, day): description
+		for holiday_list in holiday_lists
+		for day, description in get_holidays(holiday_list, start_date, end_date)
+	}
+
+
+def _compute_calendar(workstations, start_date, end_date):
+	"""Verilen istasyonlar ve tarih aralığı için takvim satırlarını hesaplar."""
+	ws_rows = frappe.get_all(
+		"Workstation", filters={"name": ["in", list(workstations)]}, fields=["name", "holiday_list"]
+	)
+	work_hours_map = get_working_hours_map([ws.name for ws in ws_rows])
+	holiday_map = _get_holiday_map(
+		{ws.holiday_list for ws in ws_rows if ws.holiday_list}, start_date, end_date
+	)
+
+	rows = []
+	for ws in ws_rows:
+		daily_minutes = _daily_minutes(work_hours_map.get(ws.name, []))
+		for date in _date_range(start_date, end_date):
+			holiday_reason = holiday_map.get((ws.holiday_list, date))
+			rows.append(
+				frappe._dict(
+					name=f"{ws.name}::{date}",
+					workstation=ws.name,
+					calendar_date=date,
+					iso_week=_iso_week(date),
+					available_minutes=0 if holiday_reason else daily_minutes,
+					is_holiday=1 if holiday_reason else 0,
+					holiday_reason=holiday_reason or "",
+				)
+			)
+	return rows
+
+
+def _upsert_calendar_rows(rows):
+	"""Takvim satırlarını çok satırlı INSERT ... ON DUPLICATE KEY UPDATE ile yazar."""
+	if not rows:
+		return
+
+	timestamp = now()
+	user = frappe.session.user
+	upsert_rows(
+		CALENDAR_DOCTYPE,
+		(
+			"name", "workstation", "calendar_date", "iso_week", "available_minutes", "is_holiday",
+			"holiday_reason", "last_updated", "creation", "modified", "owner", "modified_by",
+		),
+		[
+			(
+				row.name, row.workstation, row.calendar_date, row.iso_week, row.available_minutes,
+				row.is_holiday, row.holiday_reason, timestamp, timestamp, timestamp, user, user,
+			)
+			for row in rows
+		],
+		update_columns=(
+			"available_minutes", "is_holiday", "holiday_reason", "last_updated", "modified", "modified_by",
+		),
+	)
+
+
+def build_workstation_calendar(workstations, start_date, end_date):
+	"""İstasyonların takvimini verilen aralık için hesaplayıp yazar."""
+	workstations = sorted({ws for ws in workstations if ws})
+	if not workstations:
+		return 0
+
+	rows = _compute_calendar(workstations, getdate(start_date), getdate(end_date))
+	for start in range(0, len(rows), CHUNK_SIZE):
+		_upsert_calendar_rows(rows[start : start + CHUNK_SIZE])
+	return len(rows)
+
+
+def _validate_range(start_date, end_date):
+	"""Okuma aralığını doğrular: bitiş başlangıçtan önce olamaz, aralık MAX_RANGE_DAYS'i aşamaz."""
+	if start_date > end_date:
+		frappe.throw(_("Bitiş tarihi başlangıç tarihinden önce olamaz"))
+	if (end_date - start_date).days + 1 > MAX_RANGE_DAYS:
+		frappe.throw(_("Tarih aralığı en fazla {0} gün olabilir").format(MAX_RANGE_DAYS))
+
+
+def _get_missing_weeks(workstations, start_date, end_date):
+	"""
+	Aralığı kapsayan ISO haftalarından tabloda eksik olanları (istasyon bazında) döndürür.
+	Dönüş: {iso_week: (pazartesi, [workstation, ...])}
+	"""
+	# Aralığı tam ISO haftalarına genişlet (Pazartesi - Pazar)
+	week_start = start_date - timedelta(days=start_date.weekday())
+	mondays = {}
+	monday = week_start
+	while monday <= end_date:
+		mondays[_iso_week(monday)] = monday
+		monday += timedelta(days=7)
+
+	complete = {
+		(row[0], row[1])
+		for row in frappe.db.sql(
+			f"""
+			SELECT workstation, iso_week
+			FROM `tab{CALENDAR_DOCTYPE}`
+			WHERE workstation IN %s AND iso_week IN %s
+			GROUP BY workstation, iso_week
+			HAVING COUNT(*) = 7
+			""",
+			(tuple(workstations), tuple(mondays)),
+		)
+	}
+
+	missing = {}
+	for iso_week, monday in mondays.items():
+		week_missing = [ws for ws in workstations if (ws, iso_week) not in complete]
+		if week_missing:
+			missing[iso_week] = (monday, week_missing)
+	return missing
+
+
+def ensure_workstation_calendar(workstations, start_date, end_date):
+	"""
+	Aralığı kapsayan ISO haftalarından tabloda eksik olanları (istasyon bazında) oluşturur.
+	Tamamlanmış haftalar yeniden hesaplanmaz. Arka plan işi olarak çalışır (commit eder).
+	"""
+	workstations = sorted({ws for ws in workstations if ws})
+	start_date, end_date = getdate(start_date), getdate(end_date)
+	if not workstations or start_date > end_date:
+		return
+
+	_validate_range(start_date, end_date)
+	for monday, missing in _get_missing_weeks(workstations, start_date, end_date).values():
+		build_workstation_calendar(missing, monday, monday + timedelta(days=6))
+	frappe.db.commit()
+
+
+def get_workstation_calendar(workstations, start_date, end_date):
+	"""
+	Takvim satırlarını salt okunur olarak döndürür: kayıtlı satırlar tek sorguda okunur,
+	eksik haftalar bellekte hesaplanır ve tabloya yazılmaları arka plan işine bırakılır.
+	Dönüş: {workstation: {date: {"available_minutes", "is_holiday", "holiday_reason"}}}
+	"""
+	workstations = sorted({ws for ws in workstations if ws})
+	start_date, end_date = getdate(start_date), getdate(end_date)
+	if not workstations:
+		return {}
+
+	_validate_range(start_date, end_date)
+	calendar = {}
+	for row in frappe.db.sql(
+		f"""
+		SELECT workstation, calendar_date, available_minutes, is_holiday, holiday_reason
+		FROM `tab{CALENDAR_DOCTYPE}`
+		WHERE workstation IN %s AND calendar_date BETWEEN %s AND %s
+		""",
+		(tuple(workstations), start_date, end_date),
+		as_dict=True,
+	):
+		calendar.setdefault(row.workstation, {})[getdate(row.calendar_date)] = row
+
+	missing = _get_missing_weeks(workstations, start_date, end_date)
+	for monday, week_missing in missing.values():
+		for row in _compute_calendar(week_missing, monday, monday + timedelta(days=6)):
+			if start_date <= row.calendar_date <= end_date:
+				calendar.setdefault(row.workstation, {})[row.calendar_date] = row
+
+	if missing:
+		frappe.enqueue(
+			"uretim_planlama.uretim_planlama.api.workstation_calendar.ensure_workstation_calendar",
+			queue="short",
+			workstations=sorted({ws for _, week_missing in missing.values() for ws in week_missing}),
+			start_date=str(start_date),
+			end_date=str(end_date),
+		)
+	return calendar
+
+
+@frappe.whitelist()
+def get_workstation_capacity(start_date, end_date, workstation=None):
+	"""
+	İstasyon/gün bazında kullanılabilir ve planlanan dakikaları döndürür (en fazla MAX_RANGE_DAYS gün).
+	Planlanan dakika: operasyonun time_in_mins değeri, yoksa planlanan başlangıç-bitiş farkı.
+	"""
+	frappe.has_permission("Workstation", "read", throw=True)
+	start_date, end_date = getdate(start_date), getdate(end_date)
+	_validate_range(start_date, end_date)
+
+	workstations = [workstation] if workstation else frappe.get_all("Workstation", pluck="name")
+	calendar = get_workstation_calendar(workstations, start_date, end_date)
+
+	condition = "AND woo.workstation = %(workstation)s" if workstation else ""
+	planned = {
+		(row.workstation, getdate(row.op_date)): row
+		for row in frappe.db.sql(
+			f"""
+			SELECT
+				woo.workstation,
+				DATE(woo.planned_start_time) AS op_date,
+				SUM(CASE WHEN woo.time_in_mins > 0 THEN woo.time_in_mins
+					ELSE COALESCE(TIMESTAMPDIFF(MINUTE, woo.planned_start_time, woo.planned_end_time), 0) END) AS planned_minutes,
+				COUNT(*) AS jobs
+			FROM `tabWork Order Operation` woo
+			WHERE woo.planned_start_time >= %(start_date)s AND woo.planned_start_time < %(end_exclusive)s
+				{condition}
+			GROUP BY woo.workstation, DATE(woo.planned_start_time)
+			""",
+			{
+				"start_date": start_date,
+				"end_exclusive": end_date + timedelta(days=1),
+				"workstation": workstation,
+			},
+			as_dict=True,
+		)
+	}
+
+	rows = []
+	for ws in sorted(calendar):
+		for date in sorted(calendar[ws]):
+			day = calendar[ws][date]
+			ops = planned.get((ws, date)) or {}
+			planned_minutes = ops.get("planned_minutes") or 0
+			rows.append(
+				frappe._dict(
+					workstation=ws,
+					calendar_date=date,
+					available_minutes=day.available_minutes,
+					is_holiday=day.is_holiday,
+					holiday_reason=day.holiday_reason,
+					planned_minutes=planned_minutes,
+					jobs=ops.get("jobs") or 0,
+					doluluk=int(planned_minutes * 100 / day.available_minutes) if day.available_minutes else 0,
+				)
+			)
+	return rows
+
+
+def refresh_workstation_calendar(workstations):
+	"""İstasyonların tabloda kayıtlı tarih aralığını yeniden hesaplar."""
+	workstations = sorted({ws for ws in workstations if ws})
+	if not workstations:
+		return
+
+	for ws, min_date, max_date in frappe.db.sql(
+		f"""
+		SELECT workstation, MIN(calendar_date), MAX(calendar_date)
+		FROM `tab{CALENDAR_DOCTYPE}`
+		WHERE workstation IN %s
+		GROUP BY workstation
+		""",
+		(tuple(workstations),),
+	):
+		build_workstation_calendar([ws], min_date, max_date)
+
+
+def on_workstation_change(doc, method=None):
+	"""Workstation doc_events hook'u: istasyonun takvimini yeniden hesaplar (silinirse temizler)."""
+	try:
+		if method == "on_trash":
+			frappe.db.delete(CALENDAR_DOCTYPE, {"workstation": doc.name})
+		else:
+			refresh_workstation_calendar([doc.name])
+	except Exception:
+		frappe.log_error("Workstation Calendar güncelleme HATA", frappe.get_traceback())
+
+
+def on_holiday_list_change(doc, method=None):
+	"""
+	Holiday List doc_events hook'u: listeyi kullanan istasyonların takvimini yeniden hesaplar.
+	Silmede tatil satırları commit ile kalkacağından yeniden hesaplama commit sonrasına bırakılır.
+	"""
+	workstations = frappe.get_all("Workstation", filters={"holiday_list": doc.name}, pluck="name")
+
+	def _refresh():
+		try:
+			refresh_workstation_calendar(workstations)
+			if method == "on_trash":
+				frappe.db.commit()
+		except Exception:
+			frappe.log_error("Workstation Calendar güncelleme HATA", frappe.get_traceback())
+
+	if method == "on_trash":
+		frappe.db.after_commit.add(_refresh)
+	else:
+		_refresh()
@@ -4,6 +4,8 @@
 import frappe
 from frappe.model.document import Document
 
+from uretim_planlama.uretim_planlama.api.accessory_requirements import get_accessory_requirements
+
 
 @frappe.whitelist()
 def get_materials(sales_order):
@@ -12,39 +14,80 @@ def get_materials(sales_order):
     """
     if not sales_order:
         return {"ppi_items": [], "materials": []}
-    
-    # Production Plan Item'ları çek
-    ppi_items = frappe.db.sql("""
-        SELECT ppi.*
-        FROM `tabProduction Plan Item` ppi
-        WHERE ppi.sales_order = %(sales_order)s
-    """, {"sales_order": sales_order}, as_dict=1)
-    
-    # Montaj ve İzolasyon, PVC Kolları, PVC Montaj Aksesuarları malzemelerini çek
-    # Case-insensitive karşılaştırma ile tüm varyantları yakala
-    materials = frappe.db.sql("""
-        SELECT
-            bi.item_code,
-            bi.item_name,
-            SUM((bi.qty / bom.quantity) * ppi.planned_qty) AS qty,
-            i.item_group,
-            ig.parent_item_group,
-            i.stock_uom AS uom
-        FROM `tabProduction Plan Item` ppi
-        INNER JOIN `tabBOM` bom ON ppi.bom_no = bom.name
-        INNER JOIN `tabBOM Item` bi ON bi.parent = bom.name
-        INNER JOIN `tabItem` i ON i.item_code = bi.item_code
-        INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
-        WHERE ppi.sales_order = %(sales_order)s
-        AND (
-            LOWER(i.item_group) IN ('montaj ve izolasyon', 'pvc kolları', 'pvc montaj aksesuarları')
-            OR LOWER(ig.parent_item_group) IN ('montaj ve izolasyon', 'pvc kolları', 'pvc montaj aksesuarları')
+
+    return get_accessory_requirements([sales_order])[sales_order]
+
+
+@frappe.whitelist()
+def get_materials_for_sales_orders(sales_orders):
+    """
+    Birden çok Sales Order (ör. bir sevkiyat yükü) için malzemeleri tek çağrıda döndürür.
+    Dönüş: {sales_order: {"ppi_items": [...], "materials": [...]}}
+    """
+    if isinstance(sales_orders, str):
+        sales_orders = frappe.parse_json(sales_orders) if sales_orders.strip().startswith("[") else sales_orders.split(",")
+    return get_accessory_requirements([so.strip() for so in sales_orders or [] if so and so.strip()])
+
+
+@frappe.whitelist()
+def prepare_delivery_packages(sales_orders):
+    """
+    Sevkiyattaki Sales Order'lar için taslak Aksesuar Teslimat Paketlerini tek çağrıda oluşturur.
+    İptal edilmemiş (taslak veya gönderilmiş) paketi zaten olan siparişler ile üretim planı
+    satırı ya da aksesuar malzemesi olmayan siparişler atlanır.
+    Dönüş: {"created": {sales_order: paket}, "skipped": [...]}
+    """
+    requirements = get_materials_for_sales_orders(sales_orders)
+    if not requirements:
+        return {"created": {}, "skipped": []}
+
+    existing = set(frappe.get_all(
+        "Accessory Delivery Package",
+        filters={"sales_order": ["in", list(requirements)], "docstatus": ["!=", 2]},
+        pluck="sales_order",
+    ))
+    customers = {
+        row.name: row
+        for row in frappe.get_all(
+            "Sales Order",
+            filters={"name": ["in", list(requirements)]},
+            fields=["name", "customer", "custom_end_customer"],
         )
-        GROUP BY bi.item_code, i.item_group, ig.parent_item_group, i.stock_uom
-        ORDER BY i.item_group, bi.item_code
-    """, {"sales_order": sales_order}, as_dict=1)
-    
-    return {"ppi_items": ppi_items, "materials": materials}
+    }
+
+    created = {}
+    skipped = set(existing)
+    for sales_order, data in requirements.items():
+        if sales_order in existing:
+            continue
+        if not data["ppi_items"] or not data["materials"]:
+            skipped.add(sales_order)
+            continue
+        customer = customers.get(sales_order) or frappe._dict()
+        doc = frappe.get_doc({
+            "doctype": "Accessory Delivery Package",
+            "sales_order": sales_order,
+            "dealer": customer.customer,
+            "end_customer": customer.custom_end_customer,
+            "assembly_items": [
+                {field: ppi.get(field) for field in ppi if field != "sales_order"}
+                for ppi in data["ppi_items"]
+            ],
+            "item_list": [
+                {
+                    "item_code": row.item_code,
+                    "item_name": row.item_name,
+                    "item_group": row.item_group,
+                    "qty": row.qty,
+                    "uom": row.uom,
+                }
+                for row in data["materials"]
+            ],
+        })
+        doc.insert()
+        created[sales_order] = doc.name
+
+    return {"created": created, "skipped": sorted(skipped)}
 
 
 class AccessoryDeliveryPackage(Document):
@@ -4,6 +4,8 @@
 import frappe
 from frappe.model.document import Document
 
+from uretim_planlama.uretim_planlama.api.boy_registry import length_to_mm
+
 
 class Boy(Document):
 	def before_insert(self):
@@ -12,3 +14,7 @@ class Boy(Document):
 			formatted_length = f"{float(self.length):.1f}"
 			self.length = float(formatted_length)
 			self.name = formatted_length
+
+	def validate(self):
+		# İndeksli eşitlik aramaları için kanonik mm değeri
+		self.length_mm = length_to_mm(self.length)
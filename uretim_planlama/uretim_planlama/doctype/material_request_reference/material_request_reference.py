@@ -1,9 +1,21 @@
 # Copyright (c) 2025, idris and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
 
 
+def on_doctype_update():
+	"""Ters arama (MR'ye dokunan belgeler) ve kaynak satır eşlemesi için index'ler"""
+	frappe.db.add_index("Material Request Reference", ["material_request", "parenttype"])
+	frappe.db.add_index("Material Request Reference", ["parenttype", "source_item"])
+
+
 class MaterialRequestReference(Document):
+	"""
+	Purchase Order / Purchase Receipt / Stock Entry satırının bağlı olduğu MR satırı.
+	Kaynak doctype parenttype, kaynak satır source_item alanıdır.
+	material_request_references modülü tarafından yönetilir.
+	"""
+
 	pass
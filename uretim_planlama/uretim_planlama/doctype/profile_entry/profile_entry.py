@@ -4,7 +4,9 @@
 import frappe
 from frappe.model.document import Document
 from frappe.utils import flt
-from uretim_planlama.uretim_planlama.doctype.profile_stock_ledger.profile_stock_ledger import update_profile_stock
+from uretim_planlama.uretim_planlama.doctype.profile_stock_ledger.profile_stock_ledger import (
+    _profile_stock_key, update_profile_stock_bulk
+)
 from uretim_planlama.uretim_planlama.utils import (
     log_profile_operation, show_operation_result,
     normalize_length_to_string, get_length_value_from_boy_doctype,
@@ -90,33 +92,33 @@ class ProfileEntry(Document):
 		success_count = 0
 		error_count = 0
 		
+		# Tüm satırlar tek toplu stok güncellemesiyle uygulanır
+		valid_items = []
 		for item in self.items:
-			try:
-				# Gerekli alanları kontrol et
-				if not item.length:
-					frappe.throw(_(f"Satır {item.idx}: Boy (Length) alanı boş olamaz"))
-				if not item.item_code:
-					frappe.throw(_(f"Satır {item.idx}: Ürün Kodu (Item Code) boş olamaz"))
-				
-				# Stok güncelle (length artık Link tipinde)
-				update_profile_stock(
-					item_code=item.item_code,
-					length=item.length,
-					qty=item.received_quantity,
-					action="add"
-				)
-				
+			# Gerekli alanları kontrol et
+			if not item.length or not item.item_code:
+				error_count += 1
+				frappe.log_error(f"Profile Entry stok güncelleme hatası: Satır {item.idx}: Boy veya ürün kodu boş", "Profile Entry Stock Error")
+				continue
+			valid_items.append(item)
+		
+		try:
+			result = update_profile_stock_bulk([
+				(item.item_code, item.length, item.received_quantity, "add")
+				for item in valid_items
+			])
+		except Exception as e:
+			frappe.log_error(f"Profile Entry stok güncelleme hatası: {str(e)}", "Profile Entry Stock Error")
+			frappe.throw(f"Profil stok güncellemesi sırasında hata oluştu: {str(e)}", title=_("Sistem Hatası"))
+		
+		for item in valid_items:
+			key = _profile_stock_key(item.item_code, item.length)
+			if key in result["errors"]:
+				error_count += 1
+				frappe.log_error(f"Profile Entry stok güncelleme hatası: {result['errors'][key]}", "Profile Entry Stock Error")
+			else:
 				success_count += 1
 				log_profile_operation("Entry", item.item_code, item.length, item.received_quantity, "in")
-				
-			except Exception as e:
-				error_count += 1
-				# Import sırasında database bağlantısı kopabiliyor, güvenli loglama
-				try:
-					frappe.log_error(f"Profile Entry stok güncelleme hatası: {str(e)}", "Profile Entry Stock Error")
-				except:
-					# Database bağlantısı yoksa sadece print ile logla
-					print(f"Profile Entry stok güncelleme hatası: {str(e)}")
 		
 		show_operation_result(success_count, error_count, self.total_received_length, self.total_received_qty, "Entry")
 
@@ -126,22 +128,20 @@ class ProfileEntry(Document):
 			success_count = 0
 			error_count = 0
 			
+			# Tüm satırlar tek toplu stok güncellemesiyle geri alınır
+			result = update_profile_stock_bulk([
+				(item.item_code, item.length, item.received_quantity, "subtract")
+				for item in self.items
+			])
+			
 			for item in self.items:
-				try:
-					# Stok güncelle (geri al) - length artık Link tipinde
-					update_profile_stock(
-						item_code=item.item_code,
-						length=item.length,
-						qty=item.received_quantity,
-						action="subtract"
-					)
-					
+				key = _profile_stock_key(item.item_code, item.length)
+				if key in result["errors"]:
+					error_count += 1
+					frappe.log_error(f"Profile Entry cancel stok hatası: {result['errors'][key][:100]}", "Profile Entry Cancel Error")
+				else:
 					success_count += 1
 					log_profile_operation("Entry Cancel", item.item_code, item.length, item.received_quantity, "out")
-					
-				except Exception as e:
-					error_count += 1
-					frappe.log_error(f"Profile Entry cancel stok hatası: {str(e)[:100]}", "Profile Entry Cancel Error")
 			
 			# Sonuç bildirimi
 			if error_count == 0:
@@ -4,7 +4,9 @@
 import frappe
 from frappe.model.document import Document
 from frappe.utils import flt
-from uretim_planlama.uretim_planlama.doctype.profile_stock_ledger.profile_stock_ledger import update_profile_stock
+from uretim_planlama.uretim_planlama.doctype.profile_stock_ledger.profile_stock_ledger import (
+    _profile_stock_key, update_profile_stock_bulk
+)
 from uretim_planlama.uretim_planlama.utils import (
     validate_profile_item, log_profile_operation, show_operation_result,
     normalize_length_to_string, get_length_value_from_boy_doctype,
@@ -115,27 +117,20 @@ class ProfileExit(Document):
 			success_count = 0
 			error_count = 0
 			
+			# Tüm satırlar tek toplu stok güncellemesiyle uygulanır
+			result = update_profile_stock_bulk([
+				(item.item_code, item.length, item.output_quantity, "subtract")
+				for item in self.items
+			])
+			
 			for item in self.items:
-				try:
-					# Stok güncelle (length artık Link tipinde)
-					update_profile_stock(
-						item_code=item.item_code,
-						length=item.length,
-						qty=item.output_quantity,
-						action="subtract"
-					)
-					
+				key = _profile_stock_key(item.item_code, item.length)
+				if key in result["errors"]:
+					error_count += 1
+					frappe.log_error(f"Profile Exit stok güncelleme hatası: {result['errors'][key]}", "Profile Exit Stock Error")
+				else:
 					success_count += 1
 					log_profile_operation("Exit", item.item_code, item.length, item.output_quantity, "out")
-					
-				except Exception as e:
-					error_count += 1
-					# Import sırasında database bağlantısı kopabiliyor, güvenli loglama
-					try:
-						frappe.log_error(f"Profile Exit stok güncelleme hatası: {str(e)}", "Profile Exit Stock Error")
-					except:
-						# Database bağlantısı yoksa sadece print ile logla
-						print(f"Profile Exit stok güncelleme hatası: {str(e)}")
 			
 			# Sonuç bildirimi
 			show_operation_result(success_count, error_count, self.total_output_length, self.total_output_qty, "Exit")
@@ -155,22 +150,20 @@ class ProfileExit(Document):
 			success_count = 0
 			error_count = 0
 			
+			# Tüm satırlar tek toplu stok güncellemesiyle geri eklenir
+			result = update_profile_stock_bulk([
+				(item.item_code, item.length, item.output_quantity, "add")
+				for item in self.items
+			])
+			
 			for item in self.items:
-				try:
-					# Stok güncelle (geri ekle) - length artık Link tipinde
-					update_profile_stock(
-						item_code=item.item_code,
-						length=item.length,
-						qty=item.output_quantity,
-						action="add"
-					)
-					
+				key = _profile_stock_key(item.item_code, item.length)
+				if key in result["errors"]:
+					error_count += 1
+					frappe.log_error(f"Profile Exit cancel stok güncelleme hatası: {result['errors'][key]}", "Profile Exit Cancel Stock Error")
+				else:
 					success_count += 1
 					log_profile_operation("Exit Cancel", item.item_code, item.length, item.output_quantity, "in")
-					
-				except Exception as e:
-					error_count += 1
-					frappe.log_error(f"Profile Exit cancel stok güncelleme hatası: {str(e)}", "Profile Exit Cancel Stock Error")
 			
 			# Sonuç bildirimi (cancel için özel mesaj - geri ekleme)
 			if error_count == 0:
@@ -5,6 +5,8 @@ import frappe
 from frappe.model.document import Document
 from frappe import _
 
+from uretim_planlama.uretim_planlama.api.reorder_status import refresh_reorder_status
+
 class ProfileReorderRule(Document):
 	"""Boy bazlı asgari stok eşiği tanımı. (profile_type, length) tekildir."""
 
@@ -12,6 +14,15 @@ class ProfileReorderRule(Document):
 		self._set_item_details()
 		self._validate_numbers()
 		self._validate_unique_key()
+
+	def on_update(self):
+		"""Yeniden sipariş durumu satırlarını günceller (ürün değiştiyse eski ürün dahil)."""
+		before = self.get_doc_before_save()
+		refresh_reorder_status({self.item_code, before.item_code if before else None})
+
+	def after_delete(self):
+		"""Kural silindikten sonra ürünün satırlarını yeniden hesaplar (aynı boyda başka kural varsa o kullanılır)."""
+		refresh_reorder_status({self.item_code})
 	
 	def _set_item_details(self):
 		"""Item code'dan item_name ve item_group bilgilerini otomatik doldur"""
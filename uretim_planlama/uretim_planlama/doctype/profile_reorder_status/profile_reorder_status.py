@@ -0,0 +1,20 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+def on_doctype_update():
+	"""Rapor/panel birleşimi ve sweep taraması için index'ler"""
+	frappe.db.add_index("Profile Reorder Status", ["item_code", "length_mm"])
+	frappe.db.add_index("Profile Reorder Status", ["is_below_min", "default_supplier"])
+
+
+class ProfileReorderStatus(Document):
+	"""
+	(item_code, boy) başına yeniden sipariş durumu: mevcut stok, eksik miktar, son talep.
+	api/reorder_status tarafından yönetilir.
+	"""
+
+	pass
@@ -3,19 +3,42 @@
 
 import frappe
 from frappe import _
-from frappe.utils import flt
+from frappe.utils import cint, flt, now
 from frappe.model.document import Document
 
 # Reorder fonksiyonu için import
+from uretim_planlama.uretim_planlama.api.boy_registry import get_boy_lengths
+from uretim_planlama.uretim_planlama.api.db_utils import upsert_rows
 from uretim_planlama.uretim_planlama.api.reorder import ensure_reorder_for_profile
+from uretim_planlama.uretim_planlama.api.reorder_status import refresh_reorder_status
 from uretim_planlama.uretim_planlama.utils import (
     normalize_length_to_string, get_length_value_from_boy_doctype, is_profile_item_group
 )
 
 
+# (item_code, length, is_scrap_piece) için veritabanı seviyesinde tekil anahtar
+UNIQUE_KEY_FIELDS = ["item_code", "length", "is_scrap_piece"]
+UNIQUE_KEY_NAME = "unique_item_length_scrap"
+
+# Toplu yazımlarda (ledger güncellemesi, CSV import) kullanılan kolonlar; mevcut anahtarda
+# miktar ve toplam uzunluk üzerine eklenir
+LEDGER_COLUMNS = (
+	"name", "item_code", "item_name", "item_group", "length", "qty",
+	"total_length", "is_scrap_piece", "creation", "modified", "owner", "modified_by",
+)
+LEDGER_ACCUMULATE_UPDATE = {
+	"qty": "`qty` + VALUES(`qty`)",
+	"total_length": "`total_length` + VALUES(`total_length`)",
+	"item_name": "VALUES(`item_name`)",
+	"item_group": "VALUES(`item_group`)",
+	"modified": "VALUES(`modified`)",
+	"modified_by": "VALUES(`modified_by`)",
+}
+
+
 def on_doctype_update():
 	"""DocType güncellendiğinde index ekle"""
-	frappe.db.add_index("Profile Stock Ledger", ["item_code", "length", "is_scrap_piece"])
+	frappe.db.add_unique("Profile Stock Ledger", UNIQUE_KEY_FIELDS, constraint_name=UNIQUE_KEY_NAME)
 	frappe.db.add_index("Profile Stock Ledger", ["item_code", "length"])
 	frappe.db.add_index("Profile Stock Ledger", ["item_code"])
 
@@ -74,28 +97,26 @@ class ProfileStockLedger(Document):
 			frappe.log_error(error_msg, "Profile Stock Ledger Validation Error")
 			frappe.throw(_(error_msg))
 	
-	def check_for_duplicates(self):
-		"""Duplicate kayıt kontrolü - aynı kombinasyon var mı?"""
-		length_str = normalize_length_to_string(self.length)
-		
+	def get_existing_record(self):
+		"""Aynı (item_code, length, is_scrap_piece) anahtarına sahip kaydı döndürür (tekil anahtar sayesinde en fazla bir)"""
 		existing_records = frappe.get_all(
 			"Profile Stock Ledger",
 			filters={
 				"item_code": self.item_code,
-				"length": length_str,
+				"length": normalize_length_to_string(self.length),
 				"is_scrap_piece": self.is_scrap_piece or 0
 			},
-			fields=["name", "qty", "creation"],
-			order_by="creation DESC"
+			fields=["name", "qty"],
+			limit=1
 		)
+		return existing_records[0] if existing_records else None
+	
+	def check_for_duplicates(self):
+		"""Duplicate kayıt kontrolü - aynı kombinasyon var mı?"""
+		length_str = normalize_length_to_string(self.length)
 		
-		# Eğer birden fazla kayıt varsa, duplicate var demektir - temizle
-		if len(existing_records) > 1:
-			self.cleanup_duplicate_records(existing_records)
-		elif len(existing_records) == 1:
-			# Tek kayıt var - duplicate değil ama mevcut kayıt var
-			# Bu durumda normal insert işlemi devam edecek
-			# Import değilse hata ver
+		if self.get_existing_record():
+			# Mevcut kayıt var - import değilse hata ver (import mevcut kaydı günceller)
 			if not frappe.flags.in_import:
 				frappe.throw(_(
 					f"Aynı ürün ({self.item_code}) ve boy ({length_str}m) kombinasyonu zaten mevcut. "
@@ -135,45 +156,14 @@ class ProfileStockLedger(Document):
 	
 	def handle_import_record(self):
 		"""Import sırasında kayıt işleme"""
-		# Duplicate kontrolü - aynı item_code, length, is_scrap_piece kombinasyonu var mı?
+		# Aynı item_code, length, is_scrap_piece kombinasyonu var mı? (tekil anahtar)
 		length_str = normalize_length_to_string(self.length)
-		
-		# Daha sıkı duplicate kontrolü - tüm kombinasyonları kontrol et
-		existing_records = frappe.get_all(
-			"Profile Stock Ledger",
-			filters={
-				"item_code": self.item_code,
-				"length": length_str,
-				"is_scrap_piece": self.is_scrap_piece or 0
-			},
-			fields=["name", "qty", "creation"],
-			order_by="creation DESC"
-		)
-		
-		# Eğer birden fazla kayıt varsa, duplicate var demektir - temizle
-		if len(existing_records) > 1:
-			self.cleanup_duplicate_records(existing_records)
-			# Temizlik sonrası tekrar kontrol et
-			existing_records = frappe.get_all(
-				"Profile Stock Ledger",
-				filters={
-					"item_code": self.item_code,
-					"length": length_str,
-					"is_scrap_piece": self.is_scrap_piece or 0
-				},
-				fields=["name", "qty", "creation"],
-				limit=1
-			)
-			existing_record = existing_records
-		elif len(existing_records) == 1:
-			existing_record = existing_records
-		else:
-			existing_record = []
+		existing_record = self.get_existing_record()
 		
 		if existing_record:
 			# Mevcut kayıt var - güncelle
-			existing_name = existing_record[0].name
-			old_qty = existing_record[0].qty
+			existing_name = existing_record.name
+			old_qty = existing_record.qty
 			new_qty = self.qty
 			
 			# Bu kayıt güncellenecek, yeni kayıt oluşturma
@@ -260,6 +250,10 @@ class ProfileStockLedger(Document):
 				except:
 					print(f"Profile Entry oluşturulamadı: {str(e)}")
 				raise e
+
+		# Kayıt doğrudan güncellendi/silindi; yeniden sipariş durumu satırlarını yenile
+		if not self.is_scrap_piece:
+			refresh_reorder_status({self.item_code})
 	
 	def after_insert(self):
 		"""Kayıt oluşturulduktan sonra Profile Entry oluştur"""
@@ -267,42 +261,6 @@ class ProfileStockLedger(Document):
 		# Bu fonksiyon import sırasında çalışmamalı
 		pass
 	
-	def cleanup_duplicate_records(self, duplicate_records):
-		"""Duplicate kayıtları temizle - toplam miktarı en eski kayıtta birleştir"""
-		if len(duplicate_records) <= 1:
-			return
-		
-		# En eski kayıt (ilk kayıt) - bunu güncelleyeceğiz
-		keep_record = duplicate_records[-1]  # En eski kayıt (creation ASC'de son)
-		
-		# Toplam miktarı hesapla
-		total_qty = sum(record.qty for record in duplicate_records)
-		
-		# Boy değerini Boy DocType'ından al
-		length_value = get_length_value_from_boy_doctype(self.length)
-		if not length_value:
-			length_value = flt(self.length)  # Fallback
-		
-		# En eski kayıtı toplam miktarla güncelle
-		frappe.db.set_value('Profile Stock Ledger', keep_record.name, {
-			'qty': total_qty,
-			'total_length': flt(length_value) * flt(total_qty)
-		})
-		
-		# Diğer duplicate kayıtları sil
-		for record in duplicate_records[:-1]:  # En eski hariç diğerleri
-			frappe.delete_doc("Profile Stock Ledger", record.name, force=1)
-		
-		# Loglama
-		try:
-			frappe.logger().info(
-				f"Import: Duplicate temizlendi - {self.item_code} {self.length}m "
-				f"Toplam: {total_qty} adet, {len(duplicate_records)-1} duplicate silindi"
-			)
-		except:
-			print(f"Import: Duplicate temizlendi - {self.item_code} {self.length}m "
-				f"Toplam: {total_qty} adet, {len(duplicate_records)-1} duplicate silindi")
-	
 	def create_stock_adjustment_entry(self, existing_name, length_str, stock_difference, old_qty, new_qty):
 		"""Stok farkı için Profile Entry veya Exit oluştur"""
 		try:
@@ -543,127 +501,175 @@ class ProfileStockLedger(Document):
 
 
 def _check_reorder(item_code, length, qty):
-	"""Reorder kontrolü yapar"""
+	"""Reorder kontrolü yapar (length: Boy sayısal değeri)"""
 	try:
 		ensure_reorder_for_profile(item_code, float(length), float(qty))
 	except Exception as e:
 		frappe.log_error(f"Reorder ensure error: {item_code} {length} -> {e}", "Profile Reorder Ensure Error")
 
 
-def update_profile_stock(item_code, length, qty, action, is_scrap_piece=0):
+def _profile_stock_key(item_code, length, is_scrap_piece=0):
+	"""Profile Stock Ledger anahtarı: (item_code, length, is_scrap_piece)"""
+	return (str(item_code or "").strip(), normalize_length_to_string(length), cint(is_scrap_piece))
+
+
+def _aggregate_profile_deltas(deltas):
 	"""
-	Profile stok güncellemesi yapar.
-	action: "add" veya "subtract"
-	
-	Bu fonksiyon duplicate kayıtları önlemek için:
-	1. Mevcut kaydı bulur
-	2. Varsa günceller, yoksa yeni oluşturur
-	3. Unique constraint kontrolü yapar
+	(item_code, length, qty, action, is_scrap_piece) hareketlerini anahtar bazında net miktara indirger.
+	Satırlar tuple veya dict olabilir. Dönüş: ({anahtar: net_qty}, {anahtar: hata})
 	"""
-	# Length normalize ve validate et
-	length_name = normalize_length_to_string(length)
-	length_value = get_length_value_from_boy_doctype(length_name)
-	
-	qty = flt(qty)
-	
-	# Mevcut stok kaydını bul - tüm kayıtları al (duplicate kontrolü için)
-	existing_records = frappe.get_all(
-		"Profile Stock Ledger",
-		filters={
-			"item_code": item_code,
-			"length": length_name,
-			"is_scrap_piece": is_scrap_piece
-		},
-		fields=["name", "qty"],
-		order_by="creation desc"
-	)
-	
-	if existing_records:
-		# Duplicate kayıt varsa birleştir
-		if len(existing_records) > 1:
-			frappe.log_error(
-				f"Duplicate Profile Stock Ledger kayıtları bulundu: {item_code} {length or 'None'}. Birleştiriliyor...",
-				"Profile Stock Ledger Duplicate Fix"
-			)
-			_consolidate_duplicate_records(existing_records, item_code, length, is_scrap_piece)
-			
-			# Birleştirme sonrası tekrar al
-			existing_records = frappe.get_all(
-				"Profile Stock Ledger",
-				filters={
-					"item_code": item_code,
-					"length": length,
-					"is_scrap_piece": is_scrap_piece
-				},
-				fields=["name", "qty"],
-				limit=1
-			)
-		
-		# Mevcut kaydı güncelle
-		doc = frappe.get_doc("Profile Stock Ledger", existing_records[0].name)
-		old_qty = doc.qty
-		
-		if action == "add":
-			doc.qty = flt(doc.qty) + qty
-		elif action == "subtract":
-			doc.qty = flt(doc.qty) - qty
+	net = {}
+	errors = {}
+	for delta in deltas:
+		if isinstance(delta, dict):
+			item_code, length, qty = delta.get("item_code"), delta.get("length"), delta.get("qty")
+			action, is_scrap_piece = delta.get("action"), delta.get("is_scrap_piece", 0)
 		else:
-			frappe.throw(f"Geçersiz action: {action}. Sadece 'add' veya 'subtract' kullanın.")
-		
-		if doc.qty <= 0:
-			doc.delete()
-			frappe.logger().info(f"Profile Stock Ledger kaydı silindi: {item_code} {length or 'None'} (qty: {old_qty} -> 0)")
-			# Reorder kontrolü (sıfır stok için)
-			_check_reorder(item_code, length, 0)
-		else:
-			doc.save()
-			frappe.logger().info(f"Profile Stock Ledger güncellendi: {item_code} {length or 'None'} (qty: {old_qty} -> {doc.qty})")
-			# Reorder kontrolü
-			_check_reorder(item_code, length, doc.qty)
-			
-	else:
-		# Yeni kayıt oluştur
+			item_code, length, qty, action, *rest = delta
+			is_scrap_piece = rest[0] if rest else 0
+
+		key = _profile_stock_key(item_code, length, is_scrap_piece)
 		if action == "add":
-			# Item'dan item_name ve item_group bilgilerini al
-			item_data = frappe.db.get_value("Item", item_code, 
-											["item_name", "item_group"], as_dict=True)
-			
-			doc = frappe.get_doc({
-				"doctype": "Profile Stock Ledger",
-				"item_code": item_code,
-				"item_name": item_data.item_name if item_data else "",
-				"item_group": item_data.item_group if item_data else "",
-				"length": length,
-				"qty": qty,
-				"is_scrap_piece": is_scrap_piece
-			})
-			doc.insert()
-			frappe.logger().info(f"Yeni Profile Stock Ledger kaydı oluşturuldu: {item_code} {length or 'None'} (qty: {qty})")
-			
-			# Reorder kontrolü
-			_check_reorder(item_code, length, qty)
+			net[key] = net.get(key, 0) + flt(qty)
+		elif action == "subtract":
+			net[key] = net.get(key, 0) - flt(qty)
 		else:
-			frappe.throw(f"Stok çıkışı yapılamaz: {item_code} {length or 'None'} profil stoku bulunamadı")
+			errors[key] = f"Geçersiz action: {action}. Sadece 'add' veya 'subtract' kullanın."
+	return net, errors
 
 
-def _consolidate_duplicate_records(records, item_code, length, is_scrap_piece):
-	"""Duplicate kayıtları birleştirir"""
-	total_qty = sum(flt(record.qty) for record in records)
-	
-	# İlk kaydı tut, diğerlerini sil
-	main_record = records[0]
-	main_doc = frappe.get_doc("Profile Stock Ledger", main_record.name)
-	main_doc.qty = total_qty
-	main_doc.save()
-	
-	# Diğer kayıtları sil
-	for record in records[1:]:
-		frappe.delete_doc("Profile Stock Ledger", record.name)
-	
+def _key_conditions(keys):
+	"""Anahtar listesi için (item_code, length, is_scrap_piece) eşleşme koşulu ve parametreleri"""
+	conditions = " OR ".join(["(item_code = %s AND length = %s AND is_scrap_piece = %s)"] * len(keys))
+	return conditions, [value for key in keys for value in key]
+
+
+def _lock_profile_stock_rows(keys):
+	"""
+	Anahtarlara ait mevcut kayıtları tek sorguda SELECT ... FOR UPDATE ile kilitler.
+	Tekil anahtar sayesinde her anahtar için en fazla bir kayıt döner. Dönüş: {anahtar: kayıt}
+	"""
+	conditions, params = _key_conditions(keys)
+	rows = frappe.db.sql(
+		f"""
+		SELECT name, item_code, length, is_scrap_piece, qty
+		FROM `tabProfile Stock Ledger`
+		WHERE {conditions}
+		FOR UPDATE
+		""",
+		params,
+		as_dict=True,
+	)
+	return {_profile_stock_key(row.item_code, row.length, row.is_scrap_piece): row for row in rows}
+
+
+def update_profile_stock_bulk(deltas):
+	"""
+	Profile stok hareketlerini toplu uygular.
+
+	deltas: (item_code, length, qty, action, is_scrap_piece) tuple'ları veya aynı alanlara sahip dict'ler.
+	action: "add" veya "subtract"
+
+	1. Hareketler (item_code, length, is_scrap_piece) anahtarında net miktara toplanır
+	2. Mevcut kayıtlar tek sorguda kilitlenir, Boy ve Item bilgileri toplu okunur
+	3. Net miktarlar çok satırlı INSERT ... ON DUPLICATE KEY UPDATE qty = qty + VALUES(qty)
+	   ile atomik olarak uygulanır (tekil anahtar: unique_item_length_scrap), sıfıra düşen kayıtlar tek DELETE ile silinir
+	4. Etkilenen ürünlerin Profile Reorder Status satırları yeniden hesaplanır
+	5. Reorder kontrolü her anahtar için bir kez yapılır
+
+	Hatalı anahtarlar (geçersiz boy/ürün, stok bulunamadı) atlanır ve errors içinde döner.
+	Dönüş: {"updated": [anahtar, ...], "errors": {anahtar: mesaj}}
+	"""
+	net, errors = _aggregate_profile_deltas(deltas)
+	keys = [key for key in net if key not in errors]
+	if not keys:
+		return {"updated": [], "errors": errors}
+
+	# Boy ve ürün bilgileri - anahtar başına sorgu yerine toplu okuma
+	length_values = get_boy_lengths(key[1] for key in keys)
+	item_data = {
+		row.name: row
+		for row in frappe.get_all(
+			"Item", filters={"name": ["in", list({key[0] for key in keys})]}, fields=["name", "item_name", "item_group"]
+		)
+	}
+
+	existing = _lock_profile_stock_rows(keys)
+	timestamp = now()
+	user = frappe.session.user
+	ledger_rows = []
+	applied = []
+
+	for key in keys:
+		item_code, length, is_scrap_piece = key
+		if not length_values.get(length):
+			errors[key] = f"Geçersiz boy: {length}. Boy DocType'ında bu değer bulunamadı."
+			continue
+		item = item_data.get(item_code)
+		if not item:
+			errors[key] = f"Ürün bulunamadı: {item_code}"
+			continue
+		if not frappe.flags.in_import and not is_profile_item_group(item.item_group):
+			errors[key] = f"Sadece profil ürünleri kaydedilebilir: {item.item_group}"
+			continue
+		if key not in existing and net[key] < 0:
+			errors[key] = f"Stok çıkışı yapılamaz: {item_code} {length} profil stoku bulunamadı"
+			continue
+
+		applied.append(key)
+		ledger_rows.append((
+			frappe.generate_hash(length=10), item_code, item.item_name or "", item.item_group or "", length,
+			net[key], length_values[length] * net[key], is_scrap_piece, timestamp, timestamp, user, user,
+		))
+
+	if not applied:
+		return {"updated": [], "errors": errors}
+
+	upsert_rows("Profile Stock Ledger", LEDGER_COLUMNS, ledger_rows, update_columns=LEDGER_ACCUMULATE_UPDATE)
+
+	# Güncel miktarları oku, sıfıra düşen kayıtları sil
+	conditions, params = _key_conditions(applied)
+	current = {
+		_profile_stock_key(row.item_code, row.length, row.is_scrap_piece): flt(row.qty)
+		for row in frappe.db.sql(
+			f"""
+			SELECT item_code, length, is_scrap_piece, qty
+			FROM `tabProfile Stock Ledger`
+			WHERE {conditions}
+			""",
+			params,
+			as_dict=True,
+		)
+	}
+	if any(qty <= 0 for qty in current.values()):
+		frappe.db.sql(
+			f"DELETE FROM `tabProfile Stock Ledger` WHERE ({conditions}) AND qty <= 0",
+			params,
+		)
+
 	frappe.logger().info(
-		f"Duplicate kayıtlar birleştirildi: {item_code} {length or 'None'} -> Toplam qty: {total_qty}"
+		f"Profile Stock Ledger toplu güncelleme: {len(applied)} anahtar, {len(errors)} hata"
 	)
 
+	# Yeniden sipariş durumu tablosu - parça olmayan anahtarların ürünleri için tek hesaplama
+	refresh_reorder_status({key[0] for key in applied if not key[2]})
+
+	# Reorder kontrolü - anahtar başına bir kez
+	for key in applied:
+		_check_reorder(key[0], length_values[key[1]], max(current.get(key, 0), 0))
+
+	return {"updated": applied, "errors": errors}
+
+
+def update_profile_stock(item_code, length, qty, action, is_scrap_piece=0):
+	"""
+	Tek satırlık profile stok güncellemesi yapar (update_profile_stock_bulk üzerinden).
+	action: "add" veya "subtract"
+	"""
+	result = update_profile_stock_bulk([(item_code, length, qty, action, is_scrap_piece)])
+	if result["errors"]:
+		frappe.throw(next(iter(result["errors"].values())))
+
 
 def get_all_profile_stocks(item_code=None, is_scrap_piece=0):
 	"""Tüm profil stoklarını döner."""
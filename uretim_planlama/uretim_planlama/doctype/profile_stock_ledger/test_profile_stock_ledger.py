@@ -0,0 +1,84 @@
+# Copyright (c) 2025, idris and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from uretim_planlama.uretim_planlama.doctype.profile_stock_ledger.profile_stock_ledger import (
+	update_profile_stock_bulk,
+)
+
+TEST_ITEM_GROUP = "_Test Profil Grubu"
+TEST_ITEM = "_Test Profil 7.5"
+TEST_LENGTH = "7.5"
+
+
+class TestProfileStockLedger(FrappeTestCase):
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		if not frappe.db.exists("Item Group", TEST_ITEM_GROUP):
+			frappe.get_doc({
+				"doctype": "Item Group",
+				"item_group_name": TEST_ITEM_GROUP,
+				"parent_item_group": "All Item Groups",
+			}).insert()
+		if not frappe.db.exists("Item", TEST_ITEM):
+			frappe.get_doc({
+				"doctype": "Item",
+				"item_code": TEST_ITEM,
+				"item_name": TEST_ITEM,
+				"item_group": TEST_ITEM_GROUP,
+				"stock_uom": "Nos",
+			}).insert()
+		if not frappe.db.exists("Boy", TEST_LENGTH):
+			frappe.get_doc({"doctype": "Boy", "length": 7.5}).insert()
+
+	def setUp(self):
+		frappe.db.delete("Profile Stock Ledger", {"item_code": TEST_ITEM})
+
+	def _qty(self, is_scrap_piece=0):
+		return frappe.db.get_value(
+			"Profile Stock Ledger",
+			{"item_code": TEST_ITEM, "length": TEST_LENGTH, "is_scrap_piece": is_scrap_piece},
+			"qty",
+		)
+
+	def test_add_creates_row(self):
+		result = update_profile_stock_bulk([(TEST_ITEM, TEST_LENGTH, 4, "add", 0)])
+
+		self.assertEqual(result["errors"], {})
+		self.assertEqual(result["updated"], [(TEST_ITEM, TEST_LENGTH, 0)])
+		self.assertEqual(self._qty(), 4)
+		total_length = frappe.db.get_value(
+			"Profile Stock Ledger", {"item_code": TEST_ITEM, "length": TEST_LENGTH}, "total_length"
+		)
+		self.assertAlmostEqual(total_length, 30.0)
+
+	def test_subtract_reduces_and_removes_empty_row(self):
+		update_profile_stock_bulk([(TEST_ITEM, TEST_LENGTH, 4, "add", 0)])
+
+		update_profile_stock_bulk([(TEST_ITEM, TEST_LENGTH, 1, "subtract", 0)])
+		self.assertEqual(self._qty(), 3)
+
+		update_profile_stock_bulk([(TEST_ITEM, TEST_LENGTH, 3, "subtract", 0)])
+		self.assertIsNone(self._qty())
+
+	def test_subtract_missing_row_returns_error(self):
+		result = update_profile_stock_bulk([(TEST_ITEM, TEST_LENGTH, 2, "subtract", 1)])
+
+		self.assertEqual(result["updated"], [])
+		self.assertIn((TEST_ITEM, TEST_LENGTH, 1), result["errors"])
+		self.assertFalse(frappe.db.exists("Profile Stock Ledger", {"item_code": TEST_ITEM}))
+
+	def test_repeated_key_in_batch_is_netted(self):
+		result = update_profile_stock_bulk([
+			(TEST_ITEM, TEST_LENGTH, 5, "add", 0),
+			(TEST_ITEM, TEST_LENGTH, 3, "add", 0),
+			(TEST_ITEM, TEST_LENGTH, 2, "subtract", 0),
+		])
+
+		self.assertEqual(result["errors"], {})
+		self.assertEqual(result["updated"], [(TEST_ITEM, TEST_LENGTH, 0)])
+		self.assertEqual(frappe.db.count("Profile Stock Ledger", {"item_code": TEST_ITEM}), 1)
+		self.assertEqual(self._qty(), 6)
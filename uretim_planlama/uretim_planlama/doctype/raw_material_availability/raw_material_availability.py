@@ -0,0 +1,11 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+# import frappe
+from frappe.model.document import Document
+
+
+class RawMaterialAvailability(Document):
+	"""Hammadde bazında materyalize kullanılabilirlik satırı. api/raw_material_availability tarafından yönetilir."""
+
+	pass
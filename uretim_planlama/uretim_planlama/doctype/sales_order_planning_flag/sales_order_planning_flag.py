@@ -0,0 +1,11 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+# import frappe
+from frappe.model.document import Document
+
+
+class SalesOrderPlanningFlag(Document):
+	"""Sipariş bazında kısmi planlama bayrağı. custom_hooks/production_plan tarafından yönetilir."""
+
+	pass
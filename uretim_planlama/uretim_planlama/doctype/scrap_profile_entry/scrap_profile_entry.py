@@ -4,7 +4,7 @@
 import frappe
 from frappe.model.document import Document
 from frappe.utils import flt
-from uretim_planlama.uretim_planlama.doctype.profile_stock_ledger.profile_stock_ledger import update_profile_stock
+from uretim_planlama.uretim_planlama.doctype.profile_stock_ledger.profile_stock_ledger import update_profile_stock_bulk
 from uretim_planlama.uretim_planlama.utils import (
     normalize_length_to_string, get_length_value_from_boy_doctype,
     is_profile_item_group
@@ -44,13 +44,11 @@ class ScrapProfileEntry(Document):
         """Profile Stock Ledger'a parça kaydı ekle (toplam stoklara dahil edilmez)"""
         try:
             # Scrap stok güncelle (length artık Link tipinde)
-            update_profile_stock(
-                item_code=self.item_code,
-                length=self.length,
-                qty=self.qty,
-                action="add",
-                is_scrap_piece=1
-            )
+            result = update_profile_stock_bulk([
+                (self.item_code, self.length, self.qty, "add", 1)
+            ])
+            if result["errors"]:
+                frappe.throw(next(iter(result["errors"].values())))
             
             # Başarı mesajı
             frappe.msgprint(
@@ -74,13 +72,11 @@ class ScrapProfileEntry(Document):
         """Scrap profil girişi iptal edildiğinde stok geri al"""
         try:
             # Scrap stok geri al (length artık Link tipinde)
-            update_profile_stock(
-                item_code=self.item_code,
-                length=self.length,
-                qty=self.qty,
-                action="subtract",
-                is_scrap_piece=1
-            )
+            result = update_profile_stock_bulk([
+                (self.item_code, self.length, self.qty, "subtract", 1)
+            ])
+            if result["errors"]:
+                frappe.throw(next(iter(result["errors"].values())))
             
             # Başarı mesajı
             frappe.msgprint(
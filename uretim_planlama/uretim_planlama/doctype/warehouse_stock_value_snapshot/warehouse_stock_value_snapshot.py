@@ -0,0 +1,11 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+# import frappe
+from frappe.model.document import Document
+
+
+class WarehouseStockValueSnapshot(Document):
+	"""Depo ve ürün grubu başına stok miktarı/değeri özeti. api/stock_value_report tarafından yönetilir."""
+
+	pass
@@ -0,0 +1,16 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+def on_doctype_update():
+	"""Takvim aralık sorgusu (bucket_date BETWEEN ...) için iş emrini de kapsayan index"""
+	frappe.db.add_index("Work Order Calendar Bucket", ["bucket_date", "work_order"])
+
+
+class WorkOrderCalendarBucket(Document):
+	"""İş emrinin planlı tarih aralığındaki her gün için bir satır. api/calendar_api tarafından yönetilir."""
+
+	pass
@@ -0,0 +1,11 @@
+# Copyright (c) 2025, idris and contributors
+# For license information, please see license.txt
+
+# import frappe
+from frappe.model.document import Document
+
+
+class WorkstationCalendarDay(Document):
+	"""İş istasyonu başına günlük kullanılabilir dakika. api/workstation_calendar tarafından yönetilir."""
+
+	pass
@@ -196,7 +196,7 @@ def get_all_shortages_report(filters=None):
 		where_params = []
 
 		if filters.get('item_code'):
-			where_conditions.append("rrm.item_code LIKE %s")
+			where_conditions.append("rma.item_code LIKE %s")
 			where_params.append(f"%{filters['item_code']}%")
 
 		if filters.get('item_name'):
@@ -211,59 +211,30 @@ def get_all_shortages_report(filters=None):
 		if where_conditions:
 			where_clause = "AND " + " AND ".join(where_conditions)
 
-		# YENİ OPTİMİZE SORGU - Çok daha basit ve hızlı
+		# Toplamlar materyalize Raw Material Availability defterinden okunur
+		# (doc_events ile güncellenir, günlük mutabakat ile düzeltilir)
 		# Sadece rezervi olan hammaddeleri göster (en önemli veri)
 		optimized_query = """
 			SELECT
-				rrm.item_code,
-				MAX(i.item_name) as item_name,
-				MAX(i.stock_uom) as stock_uom,
-				MAX(i.item_group) as item_group,
-				SUM(rrm.quantity) as total_reserved,
-				COALESCE(MAX(stock.total_stock), 0) as total_stock,
-				COALESCE(MAX(mr.pending_qty), 0) as pending_mr_qty,
-				COALESCE(MAX(po.pending_qty), 0) as pending_po_qty,
-				COALESCE(MAX(stock.total_stock), 0) - SUM(rrm.quantity) as available_stock,
-				GREATEST(0, SUM(rrm.quantity) - COALESCE(MAX(stock.total_stock), 0) - COALESCE(MAX(mr.pending_qty), 0) - COALESCE(MAX(po.pending_qty), 0)) as shortage
-			FROM `tabRezerved Raw Materials` rrm
-			INNER JOIN `tabSales Order` so ON so.name = rrm.sales_order
-				AND so.docstatus = 1
-			INNER JOIN `tabItem` i ON i.item_code = rrm.item_code
+				rma.item_code,
+				i.item_name,
+				i.stock_uom,
+				i.item_group,
+				rma.reserved_qty as total_reserved,
+				rma.actual_qty as total_stock,
+				rma.pending_mr_qty,
+				rma.pending_po_qty,
+				rma.available_qty as available_stock,
+				rma.shortage_qty as shortage
+			FROM `tabRaw Material Availability` rma
+			INNER JOIN `tabItem` i ON i.item_code = rma.item_code
 				AND i.is_stock_item = 1
 				AND i.is_purchase_item = 1
 				AND LOWER(COALESCE(i.item_group, '')) != 'camlar'
+			WHERE rma.reserved_qty > 0
+				AND (rma.shortage_qty > 0.0001 OR rma.pending_mr_qty > 0.0001)
 				{where_clause}
-			LEFT JOIN (
-				SELECT item_code, SUM(actual_qty) as total_stock
-				FROM `tabBin`
-				GROUP BY item_code
-			) stock ON stock.item_code = rrm.item_code
-			LEFT JOIN (
-				SELECT
-					mri.item_code,
-					SUM(GREATEST(0, COALESCE(mri.stock_qty, mri.qty) - COALESCE(mri.ordered_qty, 0))) as pending_qty
-				FROM `tabMaterial Request Item` mri
-				INNER JOIN `tabMaterial Request` mr ON mri.parent = mr.name
-					AND mr.material_request_type = 'Purchase'
-					AND mr.docstatus IN (0, 1)
-					AND mr.status NOT IN ('Cancelled', 'Received')
-				GROUP BY mri.item_code
-			) mr ON mr.item_code = rrm.item_code
-			LEFT JOIN (
-				SELECT
-					poi.item_code,
-					SUM(GREATEST(0, poi.qty - COALESCE(poi.received_qty, 0))) as pending_qty
-				FROM `tabPurchase Order Item` poi
-				INNER JOIN `tabPurchase Order` po ON poi.parent = po.name
-					AND po.docstatus IN (0, 1)
-					AND po.status NOT IN ('Cancelled', 'Completed')
-				GROUP BY poi.item_code
-			) po ON po.item_code = rrm.item_code
-			GROUP BY rrm.item_code
-			HAVING GREATEST(0, SUM(rrm.quantity) - COALESCE(MAX(stock.total_stock), 0) - COALESCE(MAX(mr.pending_qty), 0) - COALESCE(MAX(po.pending_qty), 0)) > 0.0001
-				OR COALESCE(MAX(mr.pending_qty), 0) > 0.0001
-			ORDER BY GREATEST(0, SUM(rrm.quantity) - COALESCE(MAX(stock.total_stock), 0) - COALESCE(MAX(mr.pending_qty), 0) - COALESCE(MAX(po.pending_qty), 0)) DESC,
-				COALESCE(MAX(mr.pending_qty), 0) DESC
+			ORDER BY rma.shortage_qty DESC, rma.pending_mr_qty DESC
 			LIMIT 500
 		"""
 
@@ -3,6 +3,8 @@ let currentDate = new Date();
 const months = ['Ocak', 'Şubat', 'Mart', 'Nisan', 'Mayıs', 'Haziran', 'Temmuz', 'Ağustos', 'Eylül', 'Ekim', 'Kasım', 'Aralık'];
 let calendar = null;
 let holidaysMap = {};
+// Görünen aralık bazında iş emri önbelleği: {"start|end": {since, byId}} - tekrar ziyarette sadece değişiklikler çekilir
+let workOrderFeedCache = {};
 
 // Status colors dosyasını yükle
 frappe.require(['/assets/uretim_planlama/js/status_colors.js'], function() {
@@ -231,16 +233,24 @@ function initializeCalendar() {
 		},
 		events: function(fetchInfo, successCallback, failureCallback) {
 			try {
+				const cacheKey = `${fetchInfo.startStr}|${fetchInfo.endStr}`;
+				const feed = workOrderFeedCache[cacheKey] || { since: '', byId: {} };
 				frappe.call({
 					method: 'uretim_planlama.uretim_planlama.api.get_work_orders_for_calendar',
 					args: {
 						start: fetchInfo.startStr,
 						end: fetchInfo.endStr,
-						include_draft: true  // Taslak iş emirlerini dahil et
+						include_draft: true,  // Taslak iş emirlerini dahil et
+						since: feed.since  // Boşsa tüm aralık, doluysa sadece değişiklikler
 					},
 					callback: function(r) {
 						if (r.message) {
-							const events = r.message.map(wo => {
+							(r.message.removed || []).forEach(name => delete feed.byId[name]);
+							(r.message.events || []).forEach(wo => { feed.byId[wo.id] = wo; });
+							feed.since = r.message.server_time || '';
+							workOrderFeedCache[cacheKey] = feed;
+
+							const events = Object.values(feed.byId).map(wo => {
 								try {
 									const isDraft = wo.status === 'Draft';
 									let start = formatDate(wo.start);
@@ -329,6 +329,9 @@ frappe.pages['profil_stok_paneli'].on_page_load = function(wrapper) {
                     <th class="sticky-header">Boy</th>
                     <th class="sticky-header">Adet</th>
                     <th class="sticky-header">Toplam (mtül)</th>
+                    <th class="sticky-header">Min. Stok</th>
+                    <th class="sticky-header">Eksik</th>
+                    <th class="sticky-header">Son Talep</th>
                     <th class="sticky-header">Güncelleme</th>
                 </tr>
             </thead>
@@ -336,6 +339,7 @@ frappe.pages['profil_stok_paneli'].on_page_load = function(wrapper) {
         data.forEach((row, i) => {
             let tarih = row.guncelleme ? frappe.datetime.str_to_user(row.guncelleme) : '';
             if (((Number(row.mtul) || 0) <= 0) && ((Number(row.adet) || 0) <= 0)) { return; }
+            let eksik_stil = row.minimum_altinda ? ' style="color:#c0392b; font-weight:bold;"' : '';
             tablo += `<tr>
                 <td class="sticky-col">${i+1}</td>
                 <td>${row.profil}</td>
@@ -343,11 +347,14 @@ frappe.pages['profil_stok_paneli'].on_page_load = function(wrapper) {
                 <td>${row.boy}</td>
                 <td>${row.adet}</td>
                 <td>${row.mtul}</td>
+                <td>${row.min_stok || ''}</td>
+                <td${eksik_stil}>${row.eksik || ''}</td>
+                <td>${row.son_talep || ''}</td>
                 <td>${tarih}</td>
             </tr>`;
         });
         // Genel toplam satırı
-        tablo += `<tr style="font-weight:bold; background:#f5f5f5;"><td class="sticky-col"></td><td colspan="4" style="text-align:right;">Genel Toplam</td><td>${toplam}</td><td></td></tr>`;
+        tablo += `<tr style="font-weight:bold; background:#f5f5f5;"><td class="sticky-col"></td><td colspan="4" style="text-align:right;">Genel Toplam</td><td>${toplam}</td><td colspan="4"></td></tr>`;
         tablo += '</tbody></table></div>';
         $('#profil-boy-tablo').html(tablo);
     }
@@ -10,6 +10,7 @@ OPTIMIZE EDİLMİŞ VERSİYON - N+1 Query problemleri çözüldü
 """
 
 # Standard library imports
+import hashlib
 import json
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Union
@@ -62,6 +63,7 @@ CONSTANTS = {
     },
     'DEFAULT_LIMIT': 0,  # 0 = sınırsız
     'CACHE_DURATION': 600000,  # 10 dakika - artırıldı
+    'PANEL_CACHE_DURATION': 21600,  # 6 saat - panel verisi olay bazlı geçersiz kılınır
     'MAX_RETRIES': 3,
     'DEFAULT_MTUL_CAM': 1.745,
     'DEFAULT_MTUL_PVC': 11.35,
@@ -92,6 +94,105 @@ def _cache_set(key: str, data: Any, ttl_seconds: int = 600):
     except Exception:
         pass
 
+# Panel verisi (planned/unplanned) cache'i: filtre hash'i ile anahtarlanır, içerdiği
+# Sales Order / Production Plan'larla etiketlenir. Etiketler registry hash'inde, girdinin
+# bitiş zamanıyla birlikte tutulur; süresi dolan etiketler registry'ye her yazma/silmede temizlenir.
+# Belge olayları panel sorgusu çalıştırmadan sadece etiketlerle karar verir (invalidate_panel_cache).
+PANEL_CACHE_PREFIX = "upp:planned-unplanned:"
+PANEL_CACHE_REGISTRY = "upp:planned-unplanned-registry"
+
+def _panel_cache_key(filters: Dict) -> str:
+    filter_str = json.dumps(filters, sort_keys=True, default=str)
+    return f"{PANEL_CACHE_PREFIX}{hashlib.md5(filter_str.encode()).hexdigest()}"
+
+def _get_panel_registry() -> Dict[str, Dict]:
+    """Registry'yi okur, süresi dolmuş (cache girdisi artık olmayan) etiketleri siler."""
+    cache = frappe.cache()
+    registry = cache.hgetall(PANEL_CACHE_REGISTRY) or {}
+    now_ts = time.time()
+    expired = [key for key, meta in registry.items() if float(meta.get("expires_at") or 0) <= now_ts]
+    if expired:
+        cache.hdel(PANEL_CACHE_REGISTRY, expired)
+    return {key: meta for key, meta in registry.items() if key not in expired}
+
+def _set_panel_cache(filters: Dict, planned: List[Dict], unplanned: List[Dict]) -> None:
+    """Panel verisini cache'e yazar ve Sales Order / Production Plan etiketlerini kaydeder."""
+    key = _panel_cache_key(filters)
+    ttl = CONSTANTS['PANEL_CACHE_DURATION']
+    _cache_set(key, {"planned": planned, "unplanned": unplanned}, ttl_seconds=ttl)
+    try:
+        _get_panel_registry()
+        frappe.cache().hset(PANEL_CACHE_REGISTRY, key, {
+            "key": key,
+            "expires_at": time.time() + ttl,
+            "sales_orders": {row.get('sales_order') for row in planned + unplanned},
+            "production_plans": {row.get('uretim_plani') for row in planned},
+        })
+    except Exception:
+        pass
+
+def _get_panel_data(filters: Dict) -> tuple[List[Dict], List[Dict]]:
+    """Filtre bazlı cache'lenmiş planned/unplanned verisi. Cache yoksa get_optimized_data_v2 çalışır."""
+    cached = _cache_get(_panel_cache_key(filters), ttl_seconds=CONSTANTS['PANEL_CACHE_DURATION'])
+    if cached:
+        return cached["planned"], cached["unplanned"]
+
+    planned, unplanned = get_optimized_data_v2(filters)
+    _set_panel_cache(filters, planned, unplanned)
+    return planned, unplanned
+
+def invalidate_panel_cache(sales_orders=None, production_plans=None) -> int:
+    """
+    Etkilenen panel cache girdilerini panel sorgusu çalıştırmadan siler:
+    - Etiketlerinde verilen Sales Order / Production Plan geçen girdiler silinir
+    - Hiçbir girdide etiketli olmayan bir sipariş (yeni submit edilen vb.) herhangi bir filtrede
+      görünebileceği için tüm girdiler silinir
+    """
+    sales_orders = {so for so in (sales_orders or []) if so}
+    production_plans = {pp for pp in (production_plans or []) if pp}
+    if not sales_orders and not production_plans:
+        return 0
+
+    cache = frappe.cache()
+    registry = _get_panel_registry()
+    tagged_sales_orders = set().union(*(meta.get("sales_orders", set()) for meta in registry.values()))
+    evict_all = bool(sales_orders - tagged_sales_orders)
+
+    evicted = []
+    for key, meta in registry.items():
+        if (
+            evict_all
+            or (meta.get("sales_orders", set()) & sales_orders)
+            or (meta.get("production_plans", set()) & production_plans)
+        ):
+            cache.delete_value(key)
+            evicted.append(key)
+    if evicted:
+        cache.hdel(PANEL_CACHE_REGISTRY, evicted)
+    return len(evicted)
+
+def on_panel_source_change(doc, method=None):
+    """
+    Sales Order / Production Plan doc_events hook'u.
+    Commit sonrasında sadece bu belgeyi içeren (veya artık içermesi gereken) panel girdilerini siler.
+    """
+    if doc.doctype == "Production Plan":
+        sales_orders = {row.sales_order for row in doc.get("po_items") or [] if row.sales_order}
+        sales_orders.update(row.sales_order for row in doc.get("sales_orders") or [] if row.get("sales_order"))
+        production_plans = {doc.name}
+    else:
+        sales_orders = {doc.name}
+        production_plans = set()
+
+    def _invalidate():
+        try:
+            evicted = invalidate_panel_cache(sales_orders, production_plans)
+            frappe.logger().info(f"Üretim paneli cache: {doc.doctype} {doc.name} için {evicted} girdi silindi")
+        except Exception as e:
+            frappe.log_error(f"Panel cache invalidation hatası: {str(e)}")
+
+    frappe.db.after_commit.add(_invalidate)
+
 def validate_filters(filters: Dict) -> Dict:
     """Filter validation ve sanitization"""
     validated = {}
@@ -127,6 +228,11 @@ def apply_common_filters(where_conditions: List[str], params: List, filters: Dic
         where_conditions.append(f"WEEK({table_prefix}.transaction_date) = %s")
         params.append(int(filters["hafta"]))
     
+    # Sadece cache geçersiz kılma kontrolü için (kullanıcı filtresi değil, validate_filters geçirmez)
+    if filters.get("sales_orders"):
+        where_conditions.append(f"{table_prefix}.name IN ({', '.join(['%s'] * len(filters['sales_orders']))})")
+        params.extend(filters["sales_orders"])
+
     if filters.get("siparis_no"):
         where_conditions.append(f"{table_prefix}.name LIKE %s")
         params.append(f"%{filters['siparis_no']}%")
@@ -201,206 +307,204 @@ def get_production_planning_data(filters: Optional[Union[str, Dict]] = None) ->
         filters = json.loads(filters) if isinstance(filters, str) else (filters or {})
         filters = validate_filters(filters)
 
-        # Cache kontrolü
-        cache_key = f"upp:planned-unplanned:{json.dumps(filters, sort_keys=True)}"
-        cached = _cache_get(cache_key, ttl_seconds=int(CONSTANTS['CACHE_DURATION'] / 1000))
-        if cached:
-            return cached
-
-        # Tüm verileri tek seferde çek
-        planned, unplanned = get_optimized_data_v2(filters)
-        
-        result = {"planned": planned, "unplanned": unplanned}
-        # Cache'e kaydet
-        _cache_set(cache_key, result)
-        return result
+        # Filtre hash'i ile etiketli cache (olay bazlı geçersiz kılınır)
+        planned, unplanned = _get_panel_data(filters)
+        return {"planned": planned, "unplanned": unplanned}
     except Exception as e:
         frappe.log_error(f"Üretim Paneli Hatası: {str(e)}")
         return {"error": str(e), "planned": [], "unplanned": []}
 
+# Panel sorgularının SELECT ve FROM/WHERE parçaları ayrı tutulur; filtre koşulları
+# build_planned_conditions / build_unplanned_conditions içinde tek yerde kurulur.
+PLANNED_SELECT = """
+    SELECT 
+        pp.name as uretim_plani,
+        pp.custom_opti_no as opti_no,
+        pp.status as plan_status,
+        ppi.sales_order,
+        ppi.sales_order_item,
+        ppi.item_code,
+        ppi.planned_qty as adet,
+        so.customer as bayi,
+        so.custom_end_customer as musteri,
+        so.transaction_date as siparis_tarihi,
+        so.delivery_date as bitis_tarihi,
+        soi.description as aciklama,
+        COALESCE(i.custom_stok_türü, i.item_group) as tip,
+        i.custom_color as renk,
+        WEEK(so.transaction_date) as hafta,
+        COALESCE(so.custom_acil_durum, 0) as acil,
+        so.total_qty as siparis_total_qty,
+        i.item_group as urun_grubu,
+        soi.qty as siparis_item_qty,
+        i.custom_serial as seri,
+        ppi.planned_start_date as planlanan_baslangic_tarihi,
+        ppi.planned_end_date as planned_end_date,
+        CASE 
+            WHEN i.item_group = 'Camlar' OR i.custom_stok_türü = 'Camlar'
+            THEN ppi.planned_qty * COALESCE(ppi.custom_mtul_per_piece, %s)
+            ELSE ppi.planned_qty * COALESCE(i.custom_total_main_profiles_mtul, 0)
+        END as toplam_mtul_m2,
+        ppi.planned_qty as planlanan_miktar,
+        COALESCE(so.custom_remarks, '') as siparis_aciklama,
+        'Not Started' as work_order_status
+"""
+
+PLANNED_FROM = """
+    FROM `tabProduction Plan` pp
+    INNER JOIN `tabProduction Plan Item` ppi ON pp.name = ppi.parent
+    INNER JOIN `tabSales Order` so ON ppi.sales_order = so.name
+    INNER JOIN `tabSales Order Item` soi ON ppi.sales_order_item = soi.name
+    INNER JOIN `tabItem` i ON ppi.item_code = i.name
+    WHERE pp.docstatus = 1 
+    AND ppi.planned_qty > 0
+    AND i.item_group != 'All Item Groups'
+"""
+
+UNPLANNED_SELECT = """
+    SELECT 
+        so.name as sales_order,
+        so.customer as bayi,
+        so.custom_end_customer as musteri,
+        soi.item_code,
+        (soi.qty - COALESCE(planned_qty.planned_qty, 0)) as unplanned_qty,
+        so.transaction_date as siparis_tarihi,
+        so.delivery_date as bitis_tarihi,
+        soi.description as aciklama,
+        COALESCE(i.custom_stok_türü, i.item_group) as tip,
+        i.custom_color as renk,
+        WEEK(so.transaction_date) as hafta,
+        COALESCE(so.custom_acil_durum, 0) as acil,
+        i.item_group as urun_grubu,
+        soi.qty as siparis_item_qty,
+        i.custom_serial as seri,
+        so.custom_remarks as siparis_aciklama,
+        so.status as siparis_durumu,
+        so.workflow_state as is_akisi_durumu,
+        so.docstatus as belge_durumu,
+        COALESCE(so.custom_mly_list_uploaded, 0) as mly_dosyasi_var,
+        CASE 
+            WHEN i.item_group = 'PVC' THEN (soi.qty - COALESCE(planned_qty.planned_qty, 0))
+            ELSE 0 
+        END as pvc_qty,
+        CASE 
+            WHEN i.item_group = 'Camlar' THEN (soi.qty - COALESCE(planned_qty.planned_qty, 0))
+            ELSE 0 
+        END as cam_qty,
+        CASE 
+            WHEN i.custom_amount_per_piece IS NOT NULL AND i.custom_amount_per_piece > 0 
+            THEN (soi.qty - COALESCE(planned_qty.planned_qty, 0)) * i.custom_amount_per_piece
+            ELSE (soi.qty - COALESCE(planned_qty.planned_qty, 0))
+        END as total_mtul,
+        COALESCE(kismi_check.kismi_planlama, 0) as kismi_planlama
+"""
+
+UNPLANNED_FROM = """
+    FROM `tabSales Order` so
+    INNER JOIN `tabSales Order Item` soi ON so.name = soi.parent
+    INNER JOIN `tabItem` i ON soi.item_code = i.name
+    LEFT JOIN (
+        SELECT 
+            ppi.sales_order_item,
+            SUM(ppi.planned_qty) as planned_qty
+        FROM `tabProduction Plan Item` ppi
+        INNER JOIN `tabProduction Plan` pp ON ppi.parent = pp.name
+        WHERE pp.docstatus = 1 AND pp.status != 'Closed'
+        GROUP BY ppi.sales_order_item
+    ) planned_qty ON soi.name = planned_qty.sales_order_item
+    LEFT JOIN `tabSales Order Planning Flag` kismi_check ON kismi_check.sales_order = so.name
+    WHERE so.docstatus = 1
+    AND i.item_group IS NOT NULL
+    AND (i.item_group IN ('PVC', 'Camlar') OR i.custom_stok_türü IN ('PVC', 'Camlar'))
+    AND (soi.qty - COALESCE(planned_qty.planned_qty, 0)) > 0
+"""
+
+def build_planned_conditions(filters: Dict) -> tuple[str, List]:
+    """
+    Planlanan sorgusunun FROM/WHERE kısmını filtrelerle birlikte döndürür.
+    Dönüş: (sql, params) - SELECT parametrelerini içermez
+    """
+    query = PLANNED_FROM
+    where_conditions = []
+    params = []
+    
+    if filters.get("opti_no"):
+        where_conditions.append("pp.custom_opti_no LIKE %s")
+        params.append(f"%{filters['opti_no']}%")
+    
+    apply_common_filters(where_conditions, params, filters)
+    apply_tip_filter(where_conditions, filters, "planned")
+    
+    if where_conditions:
+        query += " AND " + " AND ".join(where_conditions)
+
+    # Planlanan başlangıç tarihi filtreleri (tek taraflı ve aralık)
+    if filters.get("from_date") and filters.get("to_date"):
+        query += " AND ppi.planned_start_date BETWEEN %s AND %s"
+        params.append(filters["from_date"])
+        params.append(filters["to_date"])
+    elif filters.get("from_date") and not filters.get("to_date"):
+        query += " AND ppi.planned_start_date >= %s"
+        params.append(filters["from_date"])
+    elif filters.get("to_date") and not filters.get("from_date"):
+        query += " AND ppi.planned_start_date <= %s"
+        params.append(filters["to_date"])
+    
+    return query, params
+
+def build_unplanned_conditions(filters: Dict) -> tuple[str, List]:
+    """
+    Planlanmamış sorgusunun FROM/WHERE kısmını filtrelerle birlikte döndürür.
+    Dönüş: (sql, params)
+    """
+    query = UNPLANNED_FROM
+    where_conditions = []
+    params = []
+    
+    apply_common_filters(where_conditions, params, filters)
+    
+    if filters.get("siparis_durum"):
+        where_conditions.append("so.status = %s")
+        params.append(filters["siparis_durum"])
+    
+    if filters.get("workflow_state") and filters["workflow_state"].strip():
+        where_conditions.append("so.workflow_state = %s")
+        params.append(filters["workflow_state"])
+    
+    apply_tip_filter_unplanned(where_conditions, filters)
+    
+    if where_conditions:
+        query += " AND " + " AND ".join(where_conditions)
+
+    # Planlanmamış için teslim tarihi filtreleri (tek taraflı ve aralık)
+    if filters.get("delivery_from_date") and filters.get("delivery_to_date"):
+        query += " AND so.delivery_date BETWEEN %s AND %s"
+        params.append(filters["delivery_from_date"])
+        params.append(filters["delivery_to_date"])
+    elif filters.get("delivery_from_date") and not filters.get("delivery_to_date"):
+        query += " AND so.delivery_date >= %s"
+        params.append(filters["delivery_from_date"])
+    elif filters.get("delivery_to_date") and not filters.get("delivery_from_date"):
+        query += " AND so.delivery_date <= %s"
+        params.append(filters["delivery_to_date"])
+    
+    return query, params
+
 def get_optimized_data_v2(filters: Dict) -> tuple[List[Dict], List[Dict]]:
     """
     V2: Daha da optimize edilmiş veri çekme - Subquery'ler JOIN'e çevrildi
     """
     try:
-        limit = filters.get("limit", CONSTANTS['DEFAULT_LIMIT'])  # LIMIT kısıtlaması kaldırıldı
-        
         # Production Plan için optimize edilmiş sorgu - Subquery JOIN'e çevrildi
-        planned_query = """
-            SELECT 
-                pp.name as uretim_plani,
-                pp.custom_opti_no as opti_no,
-                pp.status as plan_status,
-                ppi.sales_order,
-                ppi.sales_order_item,
-                ppi.item_code,
-                ppi.planned_qty as adet,
-                so.customer as bayi,
-                so.custom_end_customer as musteri,
-                so.transaction_date as siparis_tarihi,
-                so.delivery_date as bitis_tarihi,
-                soi.description as aciklama,
-                COALESCE(i.custom_stok_türü, i.item_group) as tip,
-                i.custom_color as renk,
-                WEEK(so.transaction_date) as hafta,
-                COALESCE(so.custom_acil_durum, 0) as acil,
-                so.total_qty as siparis_total_qty,
-                i.item_group as urun_grubu,
-                soi.qty as siparis_item_qty,
-                i.custom_serial as seri,
-                ppi.planned_start_date as planlanan_baslangic_tarihi,
-                ppi.planned_end_date as planned_end_date,
-                CASE 
-                    WHEN i.item_group = 'Camlar' OR i.custom_stok_türü = 'Camlar'
-                    THEN ppi.planned_qty * COALESCE(ppi.custom_mtul_per_piece, %s)
-                    ELSE ppi.planned_qty * COALESCE(i.custom_total_main_profiles_mtul, 0)
-                END as toplam_mtul_m2,
-                ppi.planned_qty as planlanan_miktar,
-                COALESCE(so.custom_remarks, '') as siparis_aciklama,
-                'Not Started' as work_order_status
-            FROM `tabProduction Plan` pp
-            INNER JOIN `tabProduction Plan Item` ppi ON pp.name = ppi.parent
-            INNER JOIN `tabSales Order` so ON ppi.sales_order = so.name
-            INNER JOIN `tabSales Order Item` soi ON ppi.sales_order_item = soi.name
-            INNER JOIN `tabItem` i ON ppi.item_code = i.name
-            WHERE pp.docstatus = 1 
-            AND ppi.planned_qty > 0
-            AND i.item_group != 'All Item Groups'
-        """
-        
-        # Filtreleri ekle
-        where_conditions = []
-        params = [CONSTANTS['DEFAULT_MTUL_CAM']]
-        
-        if filters.get("opti_no"):
-            where_conditions.append("pp.custom_opti_no LIKE %s")
-            params.append(f"%{filters['opti_no']}%")
-        
-        apply_common_filters(where_conditions, params, filters)
-        apply_tip_filter(where_conditions, filters, "planned")
-        
-        if where_conditions:
-            planned_query += " AND " + " AND ".join(where_conditions)
-
-        # Planlanan başlangıç tarihi filtreleri (tek taraflı ve aralık)
-        if filters.get("from_date") and filters.get("to_date"):
-            planned_query += " AND ppi.planned_start_date BETWEEN %s AND %s"
-            params.append(filters["from_date"])
-            params.append(filters["to_date"])
-        elif filters.get("from_date") and not filters.get("to_date"):
-            planned_query += " AND ppi.planned_start_date >= %s"
-            params.append(filters["from_date"])
-        elif filters.get("to_date") and not filters.get("from_date"):
-            planned_query += " AND ppi.planned_start_date <= %s"
-            params.append(filters["to_date"])
-        
-        planned_query += " ORDER BY so.delivery_date ASC"
+        planned_conditions, planned_params = build_planned_conditions(filters)
+        planned_query = PLANNED_SELECT + planned_conditions + " ORDER BY so.delivery_date ASC"
         
         # TÜM VERİLERİ çek - LIMIT yok
-        planned_data = frappe.db.sql(planned_query, params, as_dict=True)
+        planned_data = frappe.db.sql(planned_query, [CONSTANTS['DEFAULT_MTUL_CAM']] + planned_params, as_dict=True)
         
         # Planlanmamış siparişler için optimize edilmiş sorgu - TÜM VERİLER
-        
-        unplanned_query = """
-            SELECT 
-                so.name as sales_order,
-                so.customer as bayi,
-                so.custom_end_customer as musteri,
-                soi.item_code,
-                (soi.qty - COALESCE(planned_qty.planned_qty, 0)) as unplanned_qty,
-                so.transaction_date as siparis_tarihi,
-                so.delivery_date as bitis_tarihi,
-                soi.description as aciklama,
-                COALESCE(i.custom_stok_türü, i.item_group) as tip,
-                i.custom_color as renk,
-                WEEK(so.transaction_date) as hafta,
-                COALESCE(so.custom_acil_durum, 0) as acil,
-                i.item_group as urun_grubu,
-                soi.qty as siparis_item_qty,
-                i.custom_serial as seri,
-                so.custom_remarks as siparis_aciklama,
-                so.status as siparis_durumu,
-                so.workflow_state as is_akisi_durumu,
-                so.docstatus as belge_durumu,
-                COALESCE(so.custom_mly_list_uploaded, 0) as mly_dosyasi_var,
-                CASE 
-                    WHEN i.item_group = 'PVC' THEN (soi.qty - COALESCE(planned_qty.planned_qty, 0))
-                    ELSE 0 
-                END as pvc_qty,
-                CASE 
-                    WHEN i.item_group = 'Camlar' THEN (soi.qty - COALESCE(planned_qty.planned_qty, 0))
-                    ELSE 0 
-                END as cam_qty,
-                CASE 
-                    WHEN i.custom_amount_per_piece IS NOT NULL AND i.custom_amount_per_piece > 0 
-                    THEN (soi.qty - COALESCE(planned_qty.planned_qty, 0)) * i.custom_amount_per_piece
-                    ELSE (soi.qty - COALESCE(planned_qty.planned_qty, 0))
-                END as total_mtul,
-                COALESCE(kismi_check.kismi_planlama, 0) as kismi_planlama
-            FROM `tabSales Order` so
-            INNER JOIN `tabSales Order Item` soi ON so.name = soi.parent
-            INNER JOIN `tabItem` i ON soi.item_code = i.name
-            LEFT JOIN (
-                SELECT 
-                    ppi.sales_order_item,
-                    SUM(ppi.planned_qty) as planned_qty
-                FROM `tabProduction Plan Item` ppi
-                INNER JOIN `tabProduction Plan` pp ON ppi.parent = pp.name
-                WHERE pp.docstatus = 1 AND pp.status != 'Closed'
-                GROUP BY ppi.sales_order_item
-            ) planned_qty ON soi.name = planned_qty.sales_order_item
-            LEFT JOIN (
-                SELECT DISTINCT 
-                    soi2.parent as sales_order,
-                    1 as kismi_planlama
-                FROM `tabProduction Plan Item` ppi2
-                INNER JOIN `tabProduction Plan` pp2 ON ppi2.parent = pp2.name
-                INNER JOIN `tabSales Order Item` soi2 ON ppi2.sales_order_item = soi2.name
-                INNER JOIN `tabItem` i2 ON soi2.item_code = i2.name
-                INNER JOIN `tabSales Order Item` soi3 ON soi2.parent = soi3.parent
-                INNER JOIN `tabItem` i3 ON soi3.item_code = i3.name
-                WHERE pp2.docstatus = 1 AND pp2.status != 'Closed'
-                AND (i2.custom_serial != i3.custom_serial OR i2.custom_color != i3.custom_color)
-            ) kismi_check ON kismi_check.sales_order = so.name
-            WHERE so.docstatus = 1
-            AND i.item_group IS NOT NULL
-            AND (i.item_group IN ('PVC', 'Camlar') OR i.custom_stok_türü IN ('PVC', 'Camlar'))
-            AND (soi.qty - COALESCE(planned_qty.planned_qty, 0)) > 0
-        """
-        
-        # Planlanmamış için filtreleri ekle
-        unplanned_where_conditions = []
-        unplanned_params = []
-        
-        apply_common_filters(unplanned_where_conditions, unplanned_params, filters)
-        
-        if filters.get("siparis_durum"):
-            unplanned_where_conditions.append("so.status = %s")
-            unplanned_params.append(filters["siparis_durum"])
-        
-        if filters.get("workflow_state") and filters["workflow_state"].strip():
-            unplanned_where_conditions.append("so.workflow_state = %s")
-            unplanned_params.append(filters["workflow_state"])
-        
-        apply_tip_filter_unplanned(unplanned_where_conditions, filters)
-        
-        if unplanned_where_conditions:
-            unplanned_query += " AND " + " AND ".join(unplanned_where_conditions)
-
-        # Planlanmamış için teslim tarihi filtreleri (tek taraflı ve aralık)
-        if filters.get("delivery_from_date") and filters.get("delivery_to_date"):
-            unplanned_query += " AND so.delivery_date BETWEEN %s AND %s"
-            unplanned_params.append(filters["delivery_from_date"])
-            unplanned_params.append(filters["delivery_to_date"])
-        elif filters.get("delivery_from_date") and not filters.get("delivery_to_date"):
-            unplanned_query += " AND so.delivery_date >= %s"
-            unplanned_params.append(filters["delivery_from_date"])
-        elif filters.get("delivery_to_date") and not filters.get("delivery_from_date"):
-            unplanned_query += " AND so.delivery_date <= %s"
-            unplanned_params.append(filters["delivery_to_date"])
-
-        # TÜM VERİLERİ çek - LIMIT yok
-        unplanned_query += " ORDER BY so.delivery_date ASC"
+        unplanned_conditions, unplanned_params = build_unplanned_conditions(filters)
+        unplanned_query = UNPLANNED_SELECT + unplanned_conditions + " ORDER BY so.delivery_date ASC"
         
         unplanned_data = frappe.db.sql(unplanned_query, unplanned_params, as_dict=True)
         
@@ -826,19 +930,16 @@ def get_work_order_statuses(production_plans: str) -> Dict[str, str]:
 @frappe.whitelist()
 def refresh_cache_background():
     """
-    Background'da cache'i yenile - Cron job için
+    Background'da varsayılan filtre cache'ini ısıt - Cron job için
+    Girdiler olay bazlı geçersiz kılındığı için sadece cache boşsa yeniden hesaplanır.
     """
     try:
-        # Varsayılan filtrelerle cache'i yenile
         default_filters = validate_filters({})
-        
-        # Ana verileri background'da yükle
+        if _cache_get(_panel_cache_key(default_filters), ttl_seconds=CONSTANTS['PANEL_CACHE_DURATION']):
+            return {"success": True, "skipped": True, "timestamp": time.time()}
+
         planned, unplanned = get_optimized_data_v2(default_filters)
-        
-        # Cache'e kaydet
-        cache_key = f"upp:planned-unplanned:{json.dumps(default_filters, sort_keys=True)}"
-        result = {"planned": planned, "unplanned": unplanned}
-        _cache_set(cache_key, result, ttl_seconds=int(CONSTANTS['CACHE_DURATION'] / 1000))
+        _set_panel_cache(default_filters, planned, unplanned)
         
         frappe.logger().info(f"Background cache refresh tamamlandı: {len(planned)} planlanan, {len(unplanned)} planlanmamış")
         
@@ -1440,20 +1541,9 @@ def get_unplanned_data(filters=None) -> Dict[str, Any]:
             filters = {}
         
         
-        # Cache kontrolü
-        cache_key = f"upp:unplanned:{hash(str(filters))}"
-        cached = _cache_get(cache_key, ttl_seconds=int(CONSTANTS['CACHE_DURATION'] / 1000))
-        if cached:
-            return cached
-
-        # Planlanmamış verileri getir - Gruplama ile birlikte
-        planned, unplanned = get_optimized_data_v2(filters)
-        
-        result = {"unplanned_orders": unplanned}
-        
-        # Cache'e kaydet
-        _cache_set(cache_key, result)
-        return result
+        # Planlanmamış verileri getir - Gruplama ile birlikte (etiketli panel cache'i)
+        planned, unplanned = _get_panel_data(filters)
+        return {"unplanned_orders": unplanned}
         
     except Exception as e:
         frappe.log_error(f"get_unplanned_data hatası: {str(e)}")
@@ -1477,14 +1567,8 @@ def get_unplanned_summary_report(filters=None) -> Dict[str, Any]:
         
         filters = validate_filters(filters)
         
-        # Cache kontrolü
-        cache_key = f"upp:unplanned_summary:{hash(str(filters))}"
-        cached = _cache_get(cache_key, ttl_seconds=int(CONSTANTS['CACHE_DURATION'] / 1000))
-        if cached:
-            return cached
-
-        # Planlanmamış verileri getir
-        planned, unplanned = get_optimized_data_v2(filters)
+        # Planlanmamış verileri getir (etiketli panel cache'i)
+        planned, unplanned = _get_panel_data(filters)
         
         # Özet istatistikleri hesapla
         total_orders = len(unplanned)
@@ -1509,9 +1593,6 @@ def get_unplanned_summary_report(filters=None) -> Dict[str, Any]:
             },
             "filters_applied": filters
         }
-        
-        # Cache'e kaydet
-        _cache_set(cache_key, result)
         return result
         
     except Exception as e:
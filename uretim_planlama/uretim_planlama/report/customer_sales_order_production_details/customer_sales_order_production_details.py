@@ -1,6 +1,6 @@
 import frappe
 from frappe import _  # Kod yorumları: Türkçe
-from typing import List, Dict, Any, Optional, Set
+from typing import List, Dict, Any, Optional, Set, Tuple
 
 
 def execute(filters: Optional[Dict[str, Any]] = None):
@@ -84,24 +84,162 @@ def get_columns(show_wo_fields: bool = True) -> List[Dict[str, Any]]:
 	return cols
 
 
+# Seri / renk için aday alan adları (ilk dolu olan kullanılır)
+SO_ITEM_SERIAL_FIELDS = ["custom_order_serial", "serial_no", "custom_serial_no", "order_serial", "custom_serial"]
+SO_ITEM_COLOR_FIELDS = ["custom_order_color", "color", "custom_color", "order_color"]
+FALLBACK_SERIAL_FIELDS = ["custom_order_serial", "custom_serial_no"]
+FALLBACK_COLOR_FIELDS = ["custom_order_color", "custom_color"]
+
+# Şema bilgisi süreç ve site başına bir kez okunur: {(site, doctype): set(kolonlar)}
+_table_columns: Dict[Tuple[str, str], Set[str]] = {}
+
+
+def existing_columns(doctype: str, candidates: List[str]) -> List[str]:
+	"""
+	Aday kolonlardan tabloda VAR olanları (sırayı koruyarak) döndürür
+	"""
+	key = (frappe.local.site, doctype)
+	if key not in _table_columns:
+		try:
+			_table_columns[key] = set(frappe.db.get_table_columns(doctype))
+		except Exception:
+			_table_columns[key] = set()
+	return [col for col in candidates if col in _table_columns[key]]
+
+
+def first_value(row: Optional[Dict[str, Any]], columns: List[str]) -> Optional[str]:
+	"""
+	Önceden çekilmiş satırda dolu olan ilk kolon değerini döner
+	"""
+	if not row:
+		return None
+	for col in columns:
+		if row.get(col):
+			return row.get(col)
+	return None
+
+
+def _select_fields(doctype: str, base: List[str], candidates: List[str]) -> List[str]:
+	return base + [col for col in existing_columns(doctype, candidates) if col not in base]
+
+
+def prefetch_production_details(sales_orders: List[str]) -> Dict[str, Any]:
+	"""
+	Filtre kapsamındaki tüm verileri birkaç IN sorgusuyla önceden çeker:
+	Sales Order, Sales Order Item, Work Order (+ operasyonlar),
+	Item ve varyant renk bilgileri. Satırlar bu veriden bellekte oluşturulur.
+	"""
+	serial_color = FALLBACK_SERIAL_FIELDS + FALLBACK_COLOR_FIELDS
+
+	so_map = {
+		row.name: row
+		for row in frappe.get_all(
+			"Sales Order",
+			filters={"name": ["in", sales_orders]},
+			fields=_select_fields(
+				"Sales Order",
+				["name", "customer", "custom_end_customer", "status", "docstatus", "transaction_date"],
+				serial_color,
+			),
+		)
+	}
+
+	so_items = frappe.get_all(
+		"Sales Order Item",
+		filters={"parent": ["in", sales_orders]},
+		fields=_select_fields(
+			"Sales Order Item",
+			["name", "parent", "item_code", "item_name", "qty", "delivery_date"],
+			SO_ITEM_SERIAL_FIELDS + SO_ITEM_COLOR_FIELDS,
+		),
+		order_by="parent asc, idx asc",
+	)
+	so_item_map = {row.name: row for row in so_items}
+
+	# Work Order'lar iki index'li kanaldan (sales_order ve sales_order_item) UNION ile;
+	# UNION tekrarları eler. En son planlanan en üstte
+	wo_fields = ", ".join(
+		f"wo.`{col}`"
+		for col in _select_fields(
+			"Work Order",
+			[
+				"name", "production_item", "qty", "produced_qty", "status", "sales_order", "sales_order_item",
+				"planned_start_date", "planned_end_date", "actual_start_date", "actual_end_date", "creation",
+			],
+			serial_color,
+		)
+	)
+	work_orders = frappe.db.sql(
+		f"""
+		SELECT {wo_fields}
+		FROM `tabWork Order` wo
+		WHERE wo.docstatus IN (0, 1)
+			AND wo.sales_order IN %(sales_orders)s
+		UNION
+		SELECT {wo_fields}
+		FROM `tabWork Order` wo
+		INNER JOIN `tabSales Order Item` soi ON soi.name = wo.sales_order_item
+		WHERE wo.docstatus IN (0, 1)
+			AND soi.parent IN %(sales_orders)s
+		ORDER BY planned_start_date DESC, creation ASC
+		""",
+		{"sales_orders": tuple(sales_orders)},
+		as_dict=True,
+	)
+	wo_names = [wo.name for wo in work_orders]
+
+	operations: Dict[str, List[Dict[str, Any]]] = {}
+	if wo_names:
+		for op in frappe.get_all(
+			"Work Order Operation",
+			filters={"parent": ["in", wo_names], "parenttype": "Work Order"},
+			fields=["parent", "operation", "status"],
+			order_by="parent asc, idx asc",
+		):
+			operations.setdefault(op.parent, []).append(op)
+
+	item_codes = list(
+		{wo.production_item for wo in work_orders if wo.production_item}
+		| {si.item_code for si in so_items if si.item_code}
+	)
+	item_map: Dict[str, Any] = {}
+	variant_color: Dict[str, str] = {}
+	if item_codes:
+		item_map = {
+			x.name: x
+			for x in frappe.get_all(
+				"Item",
+				filters={"name": ["in", item_codes]},
+				fields=["name", "custom_serial", "custom_color"],
+			)
+		}
+		# Stok kartı varyantından "Renk/Color" attribute'u
+		for attr in frappe.get_all(
+			"Item Variant Attribute",
+			filters={"parent": ["in", item_codes], "attribute": ["in", ["Renk", "Color"]]},
+			fields=["parent", "attribute_value"],
+			order_by="parent asc, idx asc",
+		):
+			if attr.attribute_value:
+				variant_color.setdefault(attr.parent, attr.attribute_value)
+
+	return {
+		"so_map": so_map,
+		"so_items": so_items,
+		"so_item_map": so_item_map,
+		"work_orders": work_orders,
+		"operations": operations,
+		"item_map": item_map,
+		"variant_color": variant_color,
+	}
+
+
 def get_data(customer: str, sales_order: str) -> List[Dict[str, Any]]:
 	"""
 	Veri kaynağı
-	- Frappe ORM kullan
+	- prefetch_production_details ile tüm veriler toplu çekilir, satırlar bellekte oluşturulur
 	- Doğru ve dinamik durumlar için Work Order ve Job Card ile Stock Entry üzerinden canlı hesaplama
 	"""
-	def get_first_existing_value(doctype: str, name: str, columns: List[str]) -> Optional[str]:
-		# Yalnızca tabloda VAR olan ilk kolonu güvenli şekilde döner
-		for col in columns:
-			try:
-				if frappe.db.has_column(doctype, col):
-					val = frappe.db.get_value(doctype, name, col)
-					if val:
-						return val
-			except Exception:
-				continue
-		return None
-
 	def translate_sales_order_status(status: str) -> str:
 		# Satış siparişi durumlarını Türkçe + inline-style HTML
 		status = (status or "").strip()
@@ -153,76 +291,24 @@ def get_data(customer: str, sales_order: str) -> List[Dict[str, Any]]:
 		if is_planned:
 			return '<span style="background:#d4edda;color:#155724;padding:2px 6px;margin:2px;border-radius:4px;display:inline-block;">Planlandı</span>'
 		return '<span style="background:#fff3cd;color:#856404;padding:2px 6px;margin:2px;border-radius:4px;display:inline-block;">Planlanmadı</span>'
-	# İlgili Sales Order Item kayıtlarını çek (fallback için)
-	so_items = frappe.get_all(
-		"Sales Order Item",
-		filters={"parent": sales_order},
-		fields=["name"],
-	)
-	so_item_names = [it.name for it in so_items] if so_items else []
-
-	# İlgili Work Order'ları iki kanaldan getir (sales_order ve sales_order_item)
-	wo_fields = [
-		"name",
-		"production_item",
-		"qty",
-		"produced_qty",
-		"status",
-		"sales_order_item",
-	]
-
-	wo_by_so = frappe.get_all(
-		"Work Order",
-		filters={"sales_order": sales_order, "docstatus": ["in", [0, 1]]},
-		fields=wo_fields,
-		order_by="creation asc",
-	)
-
-	wo_by_so_item = []
-	if so_item_names:
-		wo_by_so_item = frappe.get_all(
-			"Work Order",
-			filters={"sales_order_item": ["in", so_item_names], "docstatus": ["in", [0, 1]]},
-			fields=wo_fields,
-			order_by="creation asc",
-		)
-
-	# Birleştir ve benzersizleştir
-	work_orders_map: Dict[str, Any] = {}
-	for wo in wo_by_so + wo_by_so_item:
-		work_orders_map[wo.name] = wo
-	work_orders = list(work_orders_map.values())
+	prefetched = prefetch_production_details([sales_order])
+	so_map = prefetched["so_map"]
+	item_map = prefetched["item_map"]
+	work_orders = prefetched["work_orders"]
 
 	if not work_orders:
 		# Plan yapılmamış; SO Item'ları göster
-		so_items = frappe.get_all(
-			"Sales Order Item",
-			filters={"parent": sales_order},
-			fields=["name", "item_code", "item_name", "qty"],
-			order_by="idx asc",
-		)
-		# Üst bilgiler
-		so_doc = frappe.get_doc("Sales Order", sales_order)
-		customer = so_doc.customer
-		end_customer = so_doc.get("custom_end_customer")
-		sales_order_status = so_doc.get("status")
+		so_info = so_map.get(sales_order) or {}
+		customer = so_info.get("customer")
+		end_customer = so_info.get("custom_end_customer")
+		sales_order_status = so_info.get("status")
 		# İlk satır HTML'leri
 		customer_html = f'<span style="color:black;font-weight:bold;">{frappe.safe_decode(customer)}</span>'
 		end_customer_html = f'<span style="color:gray;">{frappe.safe_decode(end_customer or "")}</span>' if end_customer else ""
 		sales_order_html = f'<span style="color:black;font-weight:bold;">{frappe.safe_decode(sales_order)}</span>'
-		# Item custom alanlarını topla
-		item_codes = [x.item_code for x in so_items if x.item_code]
-		item_map = {}
-		if item_codes:
-			items = frappe.get_all(
-				"Item",
-				filters={"name": ["in", item_codes]},
-				fields=["name", "custom_serial", "custom_color"],
-			)
-			item_map = {x.name: x for x in items}
 
 		rows = []
-		for idx, si in enumerate(so_items):
+		for idx, si in enumerate(prefetched["so_items"]):
 			item_info = item_map.get(si.item_code or "", {})
 			serial_no = item_info.get("custom_serial") or ""
 			color = item_info.get("custom_color") or ""
@@ -248,196 +334,60 @@ def get_data(customer: str, sales_order: str) -> List[Dict[str, Any]]:
 			})
 		return rows
 
-	wo_names = [wo.name for wo in work_orders]
-	item_codes = list({wo.production_item for wo in work_orders if wo.production_item})
-
-	# Item isimlerini toplu çek
-	item_name_by_code: Dict[str, str] = {}
-	if item_codes:
-		items = frappe.get_all(
-			"Item",
-			filters={"name": ["in", item_codes]},
-			fields=["name", "item_name"],
-		)
-		item_name_by_code = {it.name: it.item_name for it in items}
-
-	# Operasyon ilerleme ve son işlem için Job Card'lardan özet çıkar
-	job_cards = []
-	if wo_names:
-		job_cards = frappe.get_all(
-			"Job Card",
-			filters={"work_order": ["in", wo_names], "docstatus": 1},
-			fields=[
-				"work_order",
-				"operation",
-				"modified",
-			],
-			order_by="modified desc",
+	# Operasyon rozet HTML (tamamlanan yeşil, bekleyen kırmızı)
+	def tag_list_html(items: List[str], bg: str, fg: str) -> str:
+		if not items:
+			return ""
+		return " ".join(
+			[f'<span style="background:{bg};color:{fg};padding:2px 6px;margin:2px;border-radius:4px;display:inline-block;">{frappe.safe_decode(op)}</span>' for op in items]
 		)
 
-	# Stock Entry (Manufacture) sayısı
-	stock_entries = []
-	if wo_names:
-		stock_entries = frappe.get_all(
-			"Stock Entry",
-			filters={
-				"work_order": ["in", wo_names],
-				"docstatus": 1,
-				"stock_entry_type": "Manufacture",
-			},
-			fields=["name", "work_order"],
-		)
-
-	# Job Card ve Stock Entry verilerini WO bazında grupla
-	wo_to_job_cards: Dict[str, List[Dict[str, Any]]] = {}
-	for jc in job_cards:
-		wo_to_job_cards.setdefault(jc.work_order, []).append(jc)
-
-	wo_to_se_count: Dict[str, int] = {}
-	for se in stock_entries:
-		wo_to_se_count[se.work_order] = wo_to_se_count.get(se.work_order, 0) + 1
-
 	data: List[Dict[str, Any]] = []
 
-	# Sales Order üst bilgileri toplu
-	so_names = list({frappe.get_value("Work Order", w.name, "sales_order") for w in work_orders if frappe.get_value("Work Order", w.name, "sales_order")})
-	so_map: Dict[str, Dict[str, Any]] = {}
-	if so_names:
-		sos = frappe.get_all(
-			"Sales Order",
-			filters={"name": ["in", so_names]},
-			fields=["name", "customer", "custom_end_customer", "status", "docstatus", "transaction_date"],
-		)
-		so_map = {x.name: x for x in sos}
-
-	# Item bilgileri: custom_serial ve custom_color
-	item_codes = list({wo.production_item for wo in work_orders if wo.production_item})
-	item_map: Dict[str, Dict[str, Any]] = {}
-	if item_codes:
-		items = frappe.get_all(
-			"Item",
-			filters={"name": ["in", item_codes]},
-			fields=["name", "custom_serial", "custom_color"],
-		)
-		item_map = {x.name: x for x in items}
-
 	# Tekrarlanan alanları boş göstermek için son değerleri tut
 	last_customer = None
 	last_end_customer = None
 	last_sales_order = None
 
-	for wo in sorted(work_orders, key=lambda r: r.get("planned_start_date") or "", reverse=True):
-		so_name = frappe.get_value("Work Order", wo.name, "sales_order")
+	for wo in work_orders:
+		so_name = wo.sales_order
 		so_info = so_map.get(so_name or "", {})
 		customer = so_info.get("customer") if so_info else None
 		end_customer = so_info.get("custom_end_customer") if so_info else None
 		sales_order_status = so_info.get("status") if so_info else None
 		planned_qty = float(wo.qty or 0)
 		produced_qty = float(wo.produced_qty or 0)
-		pending_qty = max(planned_qty - produced_qty, 0.0)
-
-		# Operasyon ilerleme yüzdesi: Job Card'lardaki tamamlanan/planlanan üzerinden basit oran
-		operations_progress = 0.0
-		last_job_card_date = None
-		last_operation = None
-		jc_list = wo_to_job_cards.get(wo.name, [])
-		if jc_list:
-			for jc in jc_list:
-				if not last_job_card_date or jc.modified > last_job_card_date:
-					last_job_card_date = jc.modified
-					last_operation = jc.operation
-
-		# İlerleme yüzdesi: produced_qty / planned_qty
-		if planned_qty > 0:
-			ratio = produced_qty / planned_qty
-			operations_progress = round(min(max(ratio, 0), 1) * 100.0, 1)
-		else:
-			operations_progress = 0.0
-
-		# Work Order detay tarihleri ve operasyon durumları
-		wo_doc = frappe.get_doc("Work Order", wo.name)
-		planned_start_date = wo_doc.get("planned_start_date")
-		planned_end_date = wo_doc.get("planned_end_date")
-		actual_start_date = wo_doc.get("actual_start_date")
-		actual_end_date = wo_doc.get("actual_end_date")
 
 		# Operasyon listeleri (Work Order Operation child)
 		completed_ops: List[str] = []
 		pending_ops: List[str] = []
-		try:
-			for op in wo_doc.get("operations") or []:
-				op_name = op.operation
-				op_status = (op.status or "").lower()
-				if op_status == "completed":
-					completed_ops.append(op_name)
-				else:
-					pending_ops.append(op_name)
-		except Exception:
-					# child tablo yoksa sessiz geç
-					pass
-
-		# Sales Order Item teslim tarihi
-		so_delivery_date = None
-		soi_serial = None
-		soi_color = None
-		if wo.get("sales_order_item"):
-			try:
-				soi_name = wo.get("sales_order_item")
-				soi = frappe.get_doc("Sales Order Item", soi_name)
-				so_delivery_date = soi.get("delivery_date")
-				# Seri ve renk için çoklu aday alan isimleri
-				def _pick(doc: Any, candidates: List[str]) -> Optional[str]:
-					for fn in candidates:
-						val = doc.get(fn)
-						if val:
-							return val
-					return None
-				soi_serial = _pick(soi, [
-					"custom_order_serial",
-					"serial_no",
-					"custom_serial_no",
-					"order_serial",
-					"custom_serial",
-				])
-				soi_color = _pick(soi, [
-					"custom_order_color",
-					"color",
-					"custom_color",
-					"order_color",
-				])
-			except Exception:
-				so_delivery_date = None
-				soi_serial = None
-				soi_color = None
+		for op in prefetched["operations"].get(wo.name, []):
+			if (op.status or "").lower() == "completed":
+				completed_ops.append(op.operation)
+			else:
+				pending_ops.append(op.operation)
+
+		# Sales Order Item teslim tarihi, seri ve renk
+		soi = prefetched["so_item_map"].get(wo.sales_order_item or "")
+		so_delivery_date = soi.get("delivery_date") if soi else None
+		soi_serial = first_value(soi, SO_ITEM_SERIAL_FIELDS)
+		soi_color = first_value(soi, SO_ITEM_COLOR_FIELDS)
 
 		# Ek fallback: Work Order üzerindeki muhtemel custom alanlar
 		if not soi_serial:
-			soi_serial = get_first_existing_value("Work Order", wo.name, ["custom_order_serial", "custom_serial_no"])
+			soi_serial = first_value(wo, FALLBACK_SERIAL_FIELDS)
 		if not soi_color:
-			soi_color = get_first_existing_value("Work Order", wo.name, ["custom_order_color", "custom_color"])
+			soi_color = first_value(wo, FALLBACK_COLOR_FIELDS)
 
 		# Ek fallback: Sales Order üzerindeki muhtemel custom alanlar
 		if not soi_serial:
-			soi_serial = get_first_existing_value("Sales Order", sales_order, ["custom_order_serial", "custom_serial_no"])
+			soi_serial = first_value(so_map.get(sales_order), FALLBACK_SERIAL_FIELDS)
 		if not soi_color:
-			soi_color = get_first_existing_value("Sales Order", sales_order, ["custom_order_color", "custom_color"])
+			soi_color = first_value(so_map.get(sales_order), FALLBACK_COLOR_FIELDS)
 
-		# Renk hâlâ boşsa, stok kartı varyantından “Renk/Color” attribute'unu dene
+		# Renk hâlâ boşsa, stok kartı varyantından "Renk/Color" attribute'u
 		if not soi_color and wo.production_item:
-			try:
-				attr = frappe.get_all(
-					"Item Variant Attribute",
-					filters={
-						"parent": wo.production_item,
-						"attribute": ["in", ["Renk", "Color"]],
-					},
-					fields=["attribute_value"],
-					limit=1,
-				)
-				if attr:
-					soi_color = attr[0].get("attribute_value")
-			except Exception:
-				pass
+			soi_color = prefetched["variant_color"].get(wo.production_item)
 
 		# Item custom alanları ve seri/renk nihai değerleri
 		item_info = item_map.get(wo.production_item or "", {})
@@ -458,16 +408,6 @@ def get_data(customer: str, sales_order: str) -> List[Dict[str, Any]]:
 			sales_order_html = f'<span style="color:black;font-weight:bold;">{frappe.safe_decode(so_name)}</span>'
 			last_sales_order = so_name
 
-		# Operasyon rozet HTML (tamamlanan yeşil, bekleyen kırmızı)
-		def tag_list_html(items: List[str], bg: str, fg: str) -> str:
-			if not items:
-				return ""
-			return " ".join(
-				[f'<span style="background:{bg};color:{fg};padding:2px 6px;margin:2px;border-radius:4px;display:inline-block;">{frappe.safe_decode(op)}</span>' for op in items]
-			)
-		completed_ops_display = tag_list_html(completed_ops, "#d4edda", "#155724")
-		pending_ops_display = tag_list_html(pending_ops, "#f8d7da", "#721c24")
-
 		data.append(
 			{
 				"customer_html": customer_html,
@@ -482,17 +422,15 @@ def get_data(customer: str, sales_order: str) -> List[Dict[str, Any]]:
 				"produced_qty": produced_qty,
 				"wo_status_html": translate_work_order_status(wo.status),
 				"so_delivery_date": so_delivery_date,
-				"planned_start_date": planned_start_date,
-				"planned_end_date": planned_end_date,
-				"actual_start_date": actual_start_date,
-				"actual_end_date": actual_end_date,
-				"completed_operations_html": completed_ops_display,
-				"pending_operations_html": pending_ops_display,
+				"planned_start_date": wo.planned_start_date,
+				"planned_end_date": wo.planned_end_date,
+				"actual_start_date": wo.actual_start_date,
+				"actual_end_date": wo.actual_end_date,
+				"completed_operations_html": tag_list_html(completed_ops, "#d4edda", "#155724"),
+				"pending_operations_html": tag_list_html(pending_ops, "#f8d7da", "#721c24"),
 			}
 		)
 
 	# Nihai müşteri ve müşteri tekrarlarını HTML ile çözdük (ilk satır dolu, diğerleri boş)
 
 	return data
-
-
@@ -14,40 +14,36 @@ def execute(filters=None):
     item_group = filters.get("item_group")
     warehouse = filters.get("warehouse")
 
+    # PVC ve Camlar ürün gruplarını tamamen hariç tut (liste, grafik ve toplamlar);
+    # filtre ve depo toplamları SQL tarafında uygulanır
     backend_result = frappe.call(
         "uretim_planlama.uretim_planlama.api.stock_value_report.get_warehouse_stock_value",
         item_code=item_code,
         item_group=item_group,
         warehouse=warehouse,
+        exclude_item_groups=["PVC", "Camlar"],
     )
 
     data = []
-    warehouse_totals = {}
     for row in backend_result.get("items", []):
-        warehouse = row.get("warehouse")
-        item_group = row.get("item_group")
-        stock_value = row.get("stock_value") or 0
-
-        # PVC ve Camlar ürün gruplarını tamamen hariç tut (liste, grafik ve toplamlar)
-        if item_group in ("PVC", "Camlar"):
-            continue
-
         data.append(
             {
-                "warehouse": warehouse,
+                "warehouse": row.get("warehouse"),
                 "item_code": row.get("item_code"),
                 "item_name": row.get("item_name"),
-                "item_group": item_group,
+                "item_group": row.get("item_group"),
                 "qty": row.get("qty"),
                 "valuation_rate": row.get("valuation_rate"),
-                "stock_value": stock_value,
+                "stock_value": row.get("stock_value") or 0,
             }
         )
 
-        # Depo bazında toplam stok değeri (grafik için)
-        if warehouse:
-            warehouse_totals.setdefault(warehouse, 0)
-            warehouse_totals[warehouse] += stock_value
+    # Depo bazında toplam stok değeri (grafik için)
+    warehouse_totals = {
+        row.get("warehouse"): row.get("total_stock_value") or 0
+        for row in backend_result.get("warehouse_summary", [])
+        if row.get("warehouse")
+    }
 
     columns = [
         {
@@ -98,7 +94,7 @@ def execute(filters=None):
     ]
 
     total_qty = sum((row.get("qty") or 0) for row in data) if data else 0
-    total_value = sum((row.get("stock_value") or 0) for row in data) if data else 0
+    total_value = sum(warehouse_totals.values())
 
     # Sistem varsayılan para birimi (ör. TRY)
     default_currency = frappe.defaults.get_global_default("currency")
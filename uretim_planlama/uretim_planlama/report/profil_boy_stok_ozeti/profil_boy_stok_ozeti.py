@@ -5,7 +5,7 @@ from frappe import _
 def execute(filters=None):
     """
     Profil Boy Stok Özeti raporu.
-    Profile Stock Ledger + Profile Entry/Exit + Profile Reorder Rule verilerini
+    Profile Stock Ledger + Profile Reorder Status verilerini
     boy (length) ve profil bazında özetler. ERPNext Stok Özeti benzeri kolonlar üretir.
     """
     filters = filters or {}
@@ -25,18 +25,14 @@ def get_columns():
         {"label": _("Toplam (mtül)"), "fieldname": "total_length", "fieldtype": "Float", "precision": 1, "width": 120},
         {"label": _("Minimum Stok Miktarı"), "fieldname": "min_qty", "fieldtype": "Float", "precision": 1, "width": 150},
         {"label": _("Yeniden Sipariş Miktarı"), "fieldname": "reorder_qty", "fieldtype": "Float", "precision": 1, "width": 180},
+        {"label": _("Eksik Miktar"), "fieldname": "deficit", "fieldtype": "Float", "precision": 1, "width": 120},
+        {"label": _("Minimum Altında"), "fieldname": "is_below_min", "fieldtype": "Check", "width": 130},
+        {"label": _("Son Malzeme Talebi"), "fieldname": "last_material_request", "fieldtype": "Link", "options": "Material Request", "width": 160},
         {"label": _("Parça Profil mi?"), "fieldname": "is_scrap_piece", "fieldtype": "Check", "width": 130},
     ]
 
 
 def get_data(filters):
-    where = {}
-    if filters.get("item_code"):
-        where["item_code"] = filters.get("item_code")
-    
-    if filters.get("item_group"):
-        where["item_group"] = filters.get("item_group")
-    
     # Sadece profil ürünlerini göster
     from uretim_planlama.uretim_planlama.utils import get_allowed_profile_groups
     allowed_groups = get_allowed_profile_groups()
@@ -56,17 +52,6 @@ def get_data(filters):
                 input_length_value = float(raw)
             except Exception:
                 input_length_value = None
-    if filters.get("is_scrap_piece") is not None:
-        where["is_scrap_piece"] = int(filters.get("is_scrap_piece"))
-
-    # Mevcut stok kayıtlarını al - sadece profil ürünleri
-    # qty > 0 koşulunu doğrudan sorguda uygula (sıfır stokları hiç getirme)
-    filters_list = []
-    for key, value in where.items():
-        filters_list.append(["Profile Stock Ledger", key, "=", value])
-    if input_length_value is not None:
-        filters_list.append(["Profile Stock Ledger", "length", "=", input_length_value])
-    filters_list.append(["Profile Stock Ledger", "qty", ">", 0])
 
     # Filtreleri SQL'e ekle
     sql_filters = {
@@ -85,130 +70,34 @@ def get_data(filters):
     if input_length_value is not None:
         where_conditions.append("psl.length = %(length)s")
         sql_filters['length'] = input_length_value
-    
-    # Sadece profil ürünlerini al
-    stocks = frappe.db.sql(f"""
-        SELECT psl.item_code, psl.length, psl.qty, psl.total_length, psl.is_scrap_piece, psl.modified, i.item_group
+
+    if filters.get("is_scrap_piece") is not None:
+        where_conditions.append("psl.is_scrap_piece = %(is_scrap_piece)s")
+        sql_filters['is_scrap_piece'] = int(filters.get("is_scrap_piece"))
+
+    # Stok kayıtları + yeniden sipariş durumu (Profile Reorder Status) tek sorguda:
+    # kural/boy eşlemesi ledger güncellemelerinde hesaplanmış olup (item_code, length_mm) index'i ile okunur.
+    # Eksik/minimum altı/son talep bilgisi parça profillerde gösterilmez.
+    result = frappe.db.sql(f"""
+        SELECT
+            psl.item_code, i.item_group, b.length AS length,
+            psl.qty, psl.total_length, psl.is_scrap_piece,
+            COALESCE(rs.min_qty, 0) AS min_qty,
+            COALESCE(rs.reorder_qty, 0) AS reorder_qty,
+            CASE WHEN psl.is_scrap_piece = 0 THEN COALESCE(rs.deficit, 0) ELSE 0 END AS deficit,
+            CASE WHEN psl.is_scrap_piece = 0 THEN COALESCE(rs.is_below_min, 0) ELSE 0 END AS is_below_min,
+            CASE WHEN psl.is_scrap_piece = 0 THEN rs.last_material_request END AS last_material_request
         FROM `tabProfile Stock Ledger` psl
         INNER JOIN `tabItem` i ON psl.item_code = i.name
+        LEFT JOIN `tabBoy` b ON b.name = psl.length
+        LEFT JOIN `tabProfile Reorder Status` rs
+            ON rs.item_code = psl.item_code AND rs.length_mm = b.length_mm
         WHERE {' AND '.join(where_conditions)}
-        ORDER BY psl.item_code, psl.length
+        ORDER BY psl.item_code, b.length, psl.is_scrap_piece
     """, sql_filters, as_dict=True)
 
-    # Item adları
-    item_names = {}
-    result = []
-
-    # Reorder kurallarını indeksle: (profile_type, length, warehouse) -> rule
-    rules = get_reorder_rules(index=True)
-
-    # Boy eşlemesi: Boy.name -> numeric length, hızlı lookup
-    boy_map = get_boy_length_map()
-
-    # Stok kayıtlarını dict'e çevir (hızlı lookup için)
-    stock_dict = {}
-    for stock in stocks:
-        key = (stock.item_code, float(stock.length), stock.is_scrap_piece)
-        stock_dict[key] = stock
-
-    # Sadece stok miktarı > 0 olan kombinasyonları al
-    all_combinations = set()
-    for stock in stocks:
-        key = (stock.item_code, float(stock.length), stock.is_scrap_piece)
-        all_combinations.add(key)
-
-    # Filtre uygula
-    filtered_combinations = []
-    for combination in all_combinations:
-        profile_type, length, is_scrap_piece = combination
-        
-        # Profil filtresi
-        if filters.get("item_code") and profile_type != filters.get("item_code"):
-            continue
-            
-        # Boy filtresi (Boy tablosundan length değeri ile eşleştir)
-        if input_length_value is not None:
-            if float(length) != float(input_length_value):
-                continue
-                
-        # Hurda parça filtresi
-        if filters.get("is_scrap_piece") is not None:
-            if is_scrap_piece != int(filters.get("is_scrap_piece")):
-                continue
-        
-        filtered_combinations.append(combination)
-
-    # Sonuçları oluştur
-    for combination in filtered_combinations:
-        profile_type, length, is_scrap_piece = combination
-        
-        if profile_type not in item_names:
-            item_names[profile_type] = frappe.db.get_value("Item", profile_type, "item_name") or profile_type
-
-        # Stok kaydını al
-        stock = stock_dict.get(combination)
-        
-        # Rule bilgisini al
-        rule = rules.get((profile_type, length))
-        
-        min_qty = (rule or {}).get("min_qty") or 0
-        reorder_qty = (rule or {}).get("reorder_qty") or 0
-
-        # Stok bilgileri (stock zaten mevcut çünkü qty > 0 filtresi uygulandı)
-        qty = stock.qty
-        total_length = stock.total_length
-
-        result.append({
-            "item_code": profile_type,
-            "item_group": stock.item_group,
-            "length": length,
-            "qty": qty,
-            "total_length": total_length,
-            "is_scrap_piece": is_scrap_piece,
-            "min_qty": min_qty,
-            "reorder_qty": reorder_qty,
-        })
-
-    # Sonuçları sırala
-    result.sort(key=lambda x: (x["item_code"], x["length"], x["is_scrap_piece"]))
-
     message = None
     if not result:
         message = _("Kayıt bulunamadı.")
 
     return result, message
-
-
-def get_reorder_rules(index=False):
-    rules = frappe.get_all(
-        "Profile Reorder Rule",
-        filters={"active": 1},
-        fields=[
-            "item_code", "length", "min_qty", "reorder_qty"
-        ]
-    )
-    if not index:
-        return rules
-    # Boy name -> numeric length map
-    boy_map = get_boy_length_map()
-    indexed = {}
-    for r in rules:
-        boy_len_str = boy_map.get(r.length)
-        try:
-            boy_len = float(boy_len_str) if boy_len_str is not None else None
-        except Exception:
-            boy_len = None
-        if boy_len is None:
-            # Boy bulunamazsa bu kuralı atla
-            continue
-        key = (r.item_code, boy_len)
-        indexed[key] = r
-    return indexed
-
-
-def get_boy_length_map():
-    """Boy.name -> Boy.length (string) haritası"""
-    boys = frappe.get_all("Boy", fields=["name", "length"], limit_page_length=10000)
-    return {b.name: b.length for b in boys}
-
-
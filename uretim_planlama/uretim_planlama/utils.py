@@ -5,6 +5,8 @@ import frappe
 import re
 from frappe import _
 
+from uretim_planlama.uretim_planlama.api.boy_registry import get_boy_length, get_boy_name
+
 
 def parse_length(length_value):
     """
@@ -134,16 +136,10 @@ def get_or_create_boy_record(length_value):
     except:
         return None
     
-    # Sayısal değere eşit olan kayıtları ara
-    existing = frappe.db.sql("""
-        SELECT name, length 
-        FROM `tabBoy` 
-        WHERE CAST(REPLACE(REPLACE(length, ',', '.'), ' m', '') AS DECIMAL(10,2)) = %s
-        LIMIT 1
-    """, [numeric_length], as_dict=True)
-    
+    # Sayısal değere eşit kaydı Boy kayıt defterinden ara (length_mm indeksi)
+    existing = get_boy_name(numeric_length) or get_boy_name(formatted_str)
     if existing:
-        return existing[0].name
+        return existing
     
     # Bulunamadıysa yeni kayıt oluştur
     try:
@@ -204,7 +200,7 @@ def get_length_value_from_boy_doctype(length_name):
     if not length_name:
         frappe.throw(_("Boy değeri boş olamaz"))
     
-    length_value = frappe.db.get_value("Boy", length_name, "length")
+    length_value = get_boy_length(length_name)
     
     if not length_value:
         frappe.throw(_("Geçersiz boy: {0}. Boy DocType'ında bu değer bulunamadı.").format(length_name))